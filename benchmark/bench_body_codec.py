@@ -0,0 +1,65 @@
+"""
+메시지 body 형식 벤치마크
+
+패치 대상이 많은 ORDER_FETCH(파일 제공자 -> 서버) body 를 JSON 과 바이너리 형식(body_codec)으로
+인코딩/디코딩 하는 시간과 body 크기를 비교함
+
+사용법
+python benchmark/bench_body_codec.py [--targets 2000] [--repeat 200]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.protocol import body_codec
+from common.protocol.message import ORDER_FETCH
+
+
+def make_order_fetch(target_count: int) -> dict:
+    return {
+        "targets": [{"ip": '10.{}.{}.{}'.format(n // 62500, n // 250 % 250, n % 250 + 1),
+                     "path": '/opt/deploy/agent-{}/package'.format(n)} for n in range(target_count)],
+        "sender_ip": '10.255.0.1',
+        "start_date": '2026-10-18 10:00:00',
+        "file": {"md5": 'd41d8cd98f00b204e9800998ecf8427e', "name": 'package', "ext": 'zip', "size": 1024 * 1024 * 300}
+    }
+
+
+def measure(name, func, repeat):
+    start = time.perf_counter()
+
+    for _ in range(repeat):
+        func()
+
+    elapsed = (time.perf_counter() - start) / repeat
+    print('{:<20}{:.3f}ms'.format(name, elapsed * 1000))
+
+
+def run(target_count, repeat):
+    data = make_order_fetch(target_count)
+    json_body = json.dumps(data).encode('utf-8')
+    binary_body = body_codec.encode(ORDER_FETCH, data)
+
+    assert body_codec.decode(ORDER_FETCH, binary_body) == data
+
+    print('targets : {:,} repeat : {}'.format(target_count, repeat))
+    print('body size : json {:,}byte, binary {:,}byte ({:.0%})'.format(len(json_body), len(binary_body),
+                                                                         len(binary_body) / len(json_body)))
+
+    measure('encode json', lambda: json.dumps(data).encode('utf-8'), repeat)
+    measure('encode binary', lambda: body_codec.encode(ORDER_FETCH, data), repeat)
+    measure('decode json', lambda: json.loads(json_body.decode('utf-8')), repeat)
+    measure('decode binary', lambda: body_codec.decode(ORDER_FETCH, binary_body), repeat)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--targets', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    run(args.targets, args.repeat)
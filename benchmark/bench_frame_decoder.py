@@ -0,0 +1,112 @@
+"""
+FrameDecoder 수신 벤치마크 (파일 조각 위주 트래픽)
+
+SEND_FILE_CHUNK(500KB) 메시지를 연속으로 받아 처리하는 시간과 body 버퍼 할당 수를 비교함
+- no pool: 메시지 마다 body bytearray/bytes 를 새로 할당 (변경 전 동작)
+- pool: 버퍼 풀(BufferPool)의 버퍼를 재사용하고 처리 후 Message.release() 로 돌려줌
+
+처리 중인 body 는 송신 큐에 남아있는 것처럼 최근 --hold 개 만큼 참조를 유지함
+
+사용법
+python benchmark/bench_frame_decoder.py [--count 2000] [--hold 4]
+"""
+import argparse
+import collections
+import gc
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.protocol.buffer_pool import BufferPool
+from common.protocol.frame_decoder import FrameDecoder
+from common.protocol.message import FileChunk, SEND_FILE_CHUNK, HEARTBEAT
+from common.protocol.message_handler import make_message
+
+RECV_SIZE = 1024 * 64
+# 한번의 recv 로 받는 최대 크기
+
+
+class FakeChannel:
+    """
+    미리 만든 byte stream 을 recv_into() 로 나눠서 돌려주는 소켓 대체 객체
+    """
+
+    def __init__(self, stream: bytes):
+        self._view = memoryview(stream)
+        self._pos = 0
+
+    def recv_into(self, buffer) -> int:
+        size = min(len(buffer), RECV_SIZE, len(self._view) - self._pos)
+        buffer[:size] = self._view[self._pos:self._pos + size]
+        self._pos += size
+
+        return size
+
+    @property
+    def is_done(self) -> bool:
+        return self._pos == len(self._view)
+
+
+def make_stream(count: int) -> bytes:
+    binary = os.urandom(1024 * 500)
+    frames = []
+
+    for index in range(count):
+        body = FileChunk.encode(1, index * len(binary), binary)
+        frames.append(bytes(make_message(SEND_FILE_CHUNK, '127.0.0.1', '127.0.0.2', body)))
+        frames.append(bytes(make_message(HEARTBEAT, '127.0.0.1', '127.0.0.2')))
+
+    return b''.join(frames)
+
+
+def run_decoder(name: str, stream: bytes, pool, hold: int):
+    decoder = FrameDecoder(pool=pool)
+    channel = FakeChannel(stream)
+    holding = collections.deque(maxlen=hold)
+    # 송신 큐에 남아있는 body 참조
+    message_count = 0
+
+    gc.collect()
+    gc_before = sum(stat['collections'] for stat in gc.get_stats())
+    start = time.perf_counter()
+
+    while not channel.is_done:
+        for message in decoder.read_from(channel):
+            message_count += 1
+
+            if message.HEADER.CODE == SEND_FILE_CHUNK:
+                FileChunk.decode_meta(message.BODY)
+                holding.append(message.BODY)
+
+            message.release()
+
+    elapsed = time.perf_counter() - start
+    gc_count = sum(stat['collections'] for stat in gc.get_stats()) - gc_before
+
+    print('{:<10}{:.3f}s\t{:,.0f} msg/s\tgc collections : {}'.format(name, elapsed, message_count / elapsed,
+                                                                    gc_count), end='')
+
+    if pool is not None:
+        print('\tbuffers allocated : {} reused : {}'.format(pool.allocated, pool.reused))
+    else:
+        print('\tbuffers allocated : {}'.format(message_count // 2))
+
+
+def run(count: int, hold: int):
+    stream = make_stream(count)
+
+    print('chunks : {:,} ({:,}MB) hold : {}'.format(count, len(stream) // (1024 * 1024), hold))
+
+    run_decoder('no pool', stream, None, hold)
+    run_decoder('pool', stream, BufferPool(), hold)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=2000)
+    parser.add_argument('--hold', type=int, default=4)
+    args = parser.parse_args()
+
+    run(args.count, args.hold)
@@ -0,0 +1,101 @@
+"""
+Header encode/decode 벤치마크
+
+기존 구현(native 정렬 'LB4B4B' + 메시지 마다 inet_aton/inet_ntoa + Header 객체 생성)과
+현재 구현(미리 컴파일한 '<IB4s4s' Struct + ip 변환 캐시 + pack_into/unpack_from) 의 처리량을 비교함
+
+기존 형식은 64bit 리눅스에서 17byte 이므로 서버가 읽는 13byte 와 맞지 않음 (header size 도 같이 출력)
+
+사용법
+python benchmark/bench_header.py [--count 1000000] [--peers 200]
+"""
+import argparse
+import os
+import socket
+import struct
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.protocol.message import Header, HEADER, HEADER_SIZE, SEND_FILE_CHUNK
+
+
+def legacy_encode(header) -> bytes:
+    # 변경 전 Header.encode
+    return struct.pack('LB4B4B', header.SIZE, header.CODE, *socket.inet_aton(header.SENDER),
+                       *socket.inet_aton(header.RECEIVER))
+
+
+def legacy_decode(byte_data: bytes):
+    # 변경 전 Header.decode (64bit 에서는 byte_data 를 17byte 로 받아야 동작함)
+    unpack_header = struct.unpack('LB4B4B', byte_data)
+    offset = struct.calcsize('L')
+
+    return Header(unpack_header[0], unpack_header[1], socket.inet_ntoa(byte_data[offset + 1:offset + 5]),
+                  socket.inet_ntoa(byte_data[offset + 5:offset + 9]))
+
+
+def measure(name, func, count):
+    start = time.perf_counter()
+    func(count)
+    elapsed = time.perf_counter() - start
+
+    print('{:<28}{:.3f}s\t{:,.0f} ops/s'.format(name, elapsed, count / elapsed))
+
+
+def run(count, peer_count):
+    peers = ['10.0.{}.{}'.format(n // 250, n % 250 + 1) for n in range(peer_count)]
+    headers = [Header(1024 * 500, SEND_FILE_CHUNK, '127.0.0.1', peers[n % peer_count]) for n in range(count)]
+
+    legacy_frames = [legacy_encode(header) for header in headers[:peer_count]]
+    frames = [Header.encode(header) for header in headers[:peer_count]]
+    buffer = bytearray(HEADER_SIZE * peer_count)
+    view = memoryview(buffer)
+
+    print('header size : legacy {}byte, current {}byte'.format(struct.calcsize('LB4B4B'), HEADER.size))
+    print('count : {:,} peers : {}'.format(count, peer_count))
+
+    def encode_legacy(count):
+        for header in headers:
+            legacy_encode(header)
+
+    def encode_current(count):
+        for header in headers:
+            Header.encode(header)
+
+    def encode_pack_into(count):
+        for index, header in enumerate(headers):
+            Header.pack_into(buffer, index % peer_count * HEADER_SIZE, header.SIZE, header.CODE, header.SENDER,
+                             header.RECEIVER)
+
+    def decode_legacy(count):
+        for index in range(count):
+            legacy_decode(legacy_frames[index % peer_count])
+
+    def decode_current(count):
+        for index in range(count):
+            Header.decode(frames[index % peer_count])
+
+    def decode_unpack_from(count):
+        for index, frame in enumerate(frames):
+            buffer[index * HEADER_SIZE:(index + 1) * HEADER_SIZE] = frame
+
+        for index in range(count):
+            Header.decode(view, index % peer_count * HEADER_SIZE)
+
+    measure('encode legacy', encode_legacy, count)
+    measure('encode current', encode_current, count)
+    measure('encode current pack_into', encode_pack_into, count)
+    measure('decode legacy', decode_legacy, count)
+    measure('decode current', decode_current, count)
+    measure('decode current unpack_from', decode_unpack_from, count)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=1000000)
+    parser.add_argument('--peers', type=int, default=200)
+    args = parser.parse_args()
+
+    run(args.count, args.peers)
@@ -0,0 +1,106 @@
+"""
+multi_send_message() 벤치마크
+
+기존 구현(클라이언트 마다 header + body 를 새 bytes 로 합쳐서 sendall)과
+현재 구현(body memoryview 공유 + sendmsg) 의 처리량과 메모리 사용량을 비교함
+
+모드 별로 별도 프로세스에서 실행해 RSS 가 서로 영향을 주지 않도록 함
+
+사용법
+python benchmark/bench_multi_send.py [--clients 200] [--chunk-size 512000] [--chunks 50]
+"""
+import argparse
+import os
+import resource
+import selectors
+import socket
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.protocol.message import SEND_FILE_CHUNK
+from common.protocol.message_handler import make_message, multi_send_message
+
+
+class BenchClient:
+    """
+    벤치마크용 클라이언트, Client 와 같은 ip / channel / send() 를 제공
+    """
+
+    def __init__(self, ip, channel):
+        self.ip = ip
+        self.channel = channel
+
+    def send(self, data):
+        self.channel.sendall(data)
+
+
+def legacy_multi_send_message(code, sender_ip, clients, body=None):
+    # 변경 전 multi_send_message -> send_message -> make_message 흐름
+    for client in clients:
+        client.send(make_message(code, sender_ip, client.ip, body))
+
+
+def drain(peers, stop):
+    sel = selectors.DefaultSelector()
+    for peer in peers:
+        sel.register(peer, selectors.EVENT_READ)
+
+    buffer = bytearray(1024 * 1024)
+    while not stop.is_set():
+        for key, _ in sel.select(0.1):
+            key.fileobj.recv_into(buffer)
+
+
+def run(mode, client_count, chunk_size, chunk_count):
+    clients = []
+    peers = []
+    for n in range(client_count):
+        channel, peer = socket.socketpair()
+        clients.append(BenchClient('10.0.{}.{}'.format(n // 250, n % 250 + 1), channel))
+        peers.append(peer)
+
+    stop = threading.Event()
+    drain_task = threading.Thread(target=drain, args=(peers, stop), daemon=True)
+    drain_task.start()
+
+    send = multi_send_message if mode == 'current' else legacy_multi_send_message
+    body = os.urandom(chunk_size)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    for _ in range(chunk_count):
+        send(SEND_FILE_CHUNK, '127.0.0.1', clients, body)
+
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stop.set()
+    drain_task.join()
+
+    frames = client_count * chunk_count
+    print('{}\t{:.3f}s\t{:.0f} frames/s\t{:.1f} MB/s\tpeak alloc {:.1f} MB\tmax rss {:.1f} MB'.format(
+        mode, elapsed, frames / elapsed, frames * chunk_size / elapsed / 1024 / 1024, peak / 1024 / 1024,
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--clients', type=int, default=200)
+    parser.add_argument('--chunk-size', type=int, default=1024 * 500)
+    parser.add_argument('--chunks', type=int, default=50)
+    parser.add_argument('--mode', choices=['legacy', 'current'])
+    args = parser.parse_args()
+
+    if args.mode:
+        run(args.mode, args.clients, args.chunk_size, args.chunks)
+    else:
+        for mode in ('legacy', 'current'):
+            subprocess.run([sys.executable, __file__, '--mode', mode, '--clients', str(args.clients),
+                            '--chunk-size', str(args.chunk_size), '--chunks', str(args.chunks)], check=True)
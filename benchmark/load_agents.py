@@ -0,0 +1,581 @@
+"""
+부하 테스트용 가상 패치 대상 클라이언트(SimAgent)와 파일 제공자(SimUploader)
+
+한 프로세스에서 여러 클라이언트를 실행하기 위해 클라이언트 마다 다른 loopback ip(127.x.x.x)로 서버에 연결함
+(리눅스는 127.0.0.0/8 전체가 loopback)
+
+- SimAgent: 받은 파일 조각을 저장하지 않고 md5 만 계산, 중계 트리 하위 클라이언트에게 받은 그대로 전달
+  느린 링크(link_rate), 패치 중 연결 끊김/재연결(disconnect_after, reconnect_delay) 을 흉내낼 수 있음
+- SimUploader: 파일 내용을 seed 로 만들어 패치 요청(ORDER_FETCH) 후 credit 만큼 파일 조각(SEND_FILE_CHUNK) 전송
+"""
+import hashlib
+import datetime
+import json
+import random
+import socket
+import threading
+import time
+import traceback
+
+from common.protocol import body_codec
+from common.protocol.compression import decompress
+from common.protocol.frame_decoder import FrameDecoder
+from common.protocol.message import Header, Message, FileChunk, CLIENT_WELCOME, ORDER_FETCH, RESULT_FETCH, HEARTBEAT, \
+    RESULT_SEND_FILE, RESULT_PREPARE_FETCH, SEND_FILE_CHUNK, ABORT_FETCH, RELAY_UPDATE, COMPRESSED_FLAG, \
+    BINARY_FLAG, CODE_MASK
+from common.protocol.message_handler import make_message
+
+PIECE_SIZE = 1024 * 500
+# 파일 제공자가 보내는 파일 조각 크기
+
+
+def agent_ip(index: int) -> str:
+    """
+    :param index: 패치 대상 클라이언트 번호
+    :return: 127.1.x.x 대역 ip
+    """
+    return '127.1.{}.{}'.format(index // 250, index % 250 + 1)
+
+
+def uploader_ip(index: int) -> str:
+    """
+    :param index: 파일 제공자 번호
+    :return: 127.2.x.x 대역 ip
+    """
+    return '127.2.{}.{}'.format(index // 250, index % 250 + 1)
+
+
+class SimConnection:
+    """
+    서버 연결 공통 처리 (기능 협상, 메시지 디코딩, 송신)
+    """
+
+    def __init__(self, ip: str, server_address: tuple, codecs: list = None, body_codecs: list = None):
+        """
+        :param ip: 클라이언트 ip (서버 연결 source ip)
+        :param server_address: (서버 ip, 서버 port)
+        :param codecs: CLIENT_WELCOME 으로 알릴 압축 방식 리스트
+        :param body_codecs: CLIENT_WELCOME 으로 알릴 body 형식 리스트
+        """
+        self.ip = ip
+        self.server_address = server_address
+        self.codecs = codecs or []
+        self.body_codecs = body_codecs or []
+
+        self.codec = None
+        self.body_codec = None
+        # 서버가 정한 압축 방식, body 형식
+        self.welcomed = threading.Event()
+        # 서버의 CLIENT_WELCOME 응답을 받은 경우 설정
+
+        self.conn = None
+        self._send_lock = threading.Lock()
+
+    def connect(self, receive_buffer: int = None):
+        conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+        if receive_buffer:
+            conn.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, receive_buffer)
+
+        conn.bind((self.ip, 0))
+        # 서버가 클라이언트를 ip 로 구분하므로 자신의 ip 로 연결
+        conn.connect(self.server_address)
+
+        self.conn = conn
+        self.welcomed.clear()
+        self.send(CLIENT_WELCOME, {"codecs": self.codecs, "body_codecs": self.body_codecs})
+
+    def send(self, code: int, data):
+        """
+        :param code:
+        :param data: dict 이면 body 형식에 맞게 인코딩, bytes-like 면 그대로 전송
+        :return:
+        """
+        if isinstance(data, (dict, list)):
+            body = body_codec.encode(code, data) if self.body_codec == body_codec.BINARY_CODEC else None
+
+            if body is None:
+                body = json.dumps(data).encode('utf-8')
+            else:
+                code |= BINARY_FLAG
+
+            data = body
+
+        self.send_frame(make_message(code, self.ip, self.server_address[0], data))
+
+    def send_frame(self, frame):
+        with self._send_lock:
+            try:
+                self.conn.sendall(frame)
+            except (OSError, AttributeError):
+                pass
+            # 연결이 끊긴 경우 수신 쪽에서 처리
+
+    def close(self):
+        conn = self.conn
+
+        if conn is not None:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            conn.close()
+
+    def decode(self, message) -> tuple:
+        """
+        :param message: 수신 메시지
+        :return: (flag 를 뺀 code, 압축 해제한 body, body 값(JSON, 바이너리 형식 메시지) 혹은 None)
+        """
+        code = message.HEADER.CODE
+        body = message.BODY
+
+        if code & COMPRESSED_FLAG:
+            body = decompress(self.codec, body)
+
+        if code & BINARY_FLAG:
+            return code & CODE_MASK, body, body_codec.decode(code & CODE_MASK, body)
+
+        if code & CODE_MASK == SEND_FILE_CHUNK:
+            return SEND_FILE_CHUNK, body, None
+
+        return code & CODE_MASK, body, json.loads(str(body, 'utf-8')) if len(body) else None
+
+    def on_welcome(self, data: dict):
+        self.codec = data.get('codec')
+        self.body_codec = data.get('body_codec')
+        self.welcomed.set()
+
+
+class SimAgent(SimConnection):
+    """
+    가상 패치 대상 클라이언트
+    """
+
+    def __init__(self, ip: str, server_address: tuple, relay_port: int = None, link_rate: int = None,
+                 disconnect_after: int = None, reconnect_delay: float = None, **kwargs):
+        """
+        :param ip:
+        :param server_address:
+        :param relay_port: 중계 연결을 받을 포트, None 이면 중계 연결을 받지 않음
+        :param link_rate: 수신 속도 제한 (단위: byte/s), None 이면 제한 없음
+        :param disconnect_after: 패치 중 이 크기 만큼 받으면 연결을 끊음 (한번만)
+        :param reconnect_delay: 연결을 끊은 후 재연결 까지 시간 (단위: 초), None 이면 재연결 하지 않음
+        """
+        super().__init__(ip, server_address, **kwargs)
+        self.relay_port = relay_port
+        self.link_rate = link_rate
+        self.disconnect_after = disconnect_after
+        self.reconnect_delay = reconnect_delay
+
+        self.fetches = {}
+        # 패치 id -> 패치 상태
+        self.pending_chunks = {}
+        # ORDER_FETCH 보다 먼저 도착한 중계 조각 (패치 id -> 메시지 리스트)
+        self.results = {}
+        """
+        :type dict(int, dict)
+        패치 id -> 패치 결과 {is_complete, fail_cause, completed_at, received_bytes}
+        """
+        self.received_bytes = 0
+        self.disconnect_count = 0
+        self.error_count = 0
+
+        self.is_running = False
+        self._lock = threading.RLock()
+        self._listener = None
+        self._disconnect_requested = False
+
+    def start(self):
+        self.is_running = True
+
+        if self.relay_port:
+            self._listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self._listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self._listener.bind((self.ip, self.relay_port))
+            self._listener.listen(16)
+            threading.Thread(target=self._accept_relays, daemon=True).start()
+
+        self._connect()
+        threading.Thread(target=self._run, name='agent-{}'.format(self.ip), daemon=True).start()
+
+    def stop(self):
+        self.is_running = False
+        self.close()
+
+        if self._listener is not None:
+            try:
+                self._listener.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self._listener.close()
+            # accept() 대기 중인 스레드를 깨워 다음 시나리오에서 같은 중계 포트를 열 수 있도록 함
+
+        with self._lock:
+            for fetch in self.fetches.values():
+                self._set_children(fetch, [])
+
+    def _connect(self):
+        self.connect(receive_buffer=1024 * 64 if self.link_rate else None)
+        # 느린 링크는 수신 버퍼를 작게 해서 서버 송신 큐에 바로 영향을 주도록 함
+
+    def _run(self):
+        while self.is_running:
+            try:
+                self._receive(self.conn, is_server=True)
+            except (ConnectionError, OSError):
+                pass
+            except Exception:
+                self.error_count += 1
+                traceback.print_exc()
+
+            self.close()
+
+            if not self.is_running or not self._disconnect_requested or self.reconnect_delay is None:
+                break
+
+            self._disconnect_requested = False
+            time.sleep(self.reconnect_delay)
+
+            try:
+                self._connect()
+            except OSError:
+                self.error_count += 1
+                break
+
+    def _accept_relays(self):
+        while self.is_running:
+            try:
+                peer, _ = self._listener.accept()
+            except OSError:
+                return
+
+            threading.Thread(target=self._receive_relay, args=(peer,), daemon=True).start()
+
+    def _receive_relay(self, conn):
+        try:
+            self._receive(conn, is_server=False)
+        except (ConnectionError, OSError):
+            pass
+        except Exception:
+            self.error_count += 1
+            traceback.print_exc()
+        finally:
+            conn.close()
+
+    def _receive(self, conn, is_server: bool):
+        decoder = FrameDecoder(buffer_size=1024 * 64)
+        start = time.perf_counter()
+
+        while self.is_running:
+            messages = decoder.read_from(conn)
+
+            if is_server and self.link_rate:
+                # 받은 양이 제한 속도로 받을 수 있는 양을 넘으면 다음 수신을 늦춤
+                delay = decoder.received_bytes / self.link_rate - (time.perf_counter() - start)
+
+                if delay > 0:
+                    time.sleep(delay)
+
+            for message in messages:
+                try:
+                    self._handle(message)
+                finally:
+                    message.release()
+
+            if is_server and self._disconnect_requested:
+                return
+
+    def _handle(self, message):
+        code, body, data = self.decode(message)
+
+        if code == SEND_FILE_CHUNK:
+            self._on_chunk(message, body)
+        elif code == ORDER_FETCH:
+            self._on_order_fetch(data)
+        elif code == CLIENT_WELCOME:
+            self.on_welcome(data)
+        elif code == RELAY_UPDATE:
+            self._on_relay_update(data)
+        elif code == ABORT_FETCH:
+            self._finish(data['fetch_no'], False, data.get('fail_cause'))
+        elif code == HEARTBEAT:
+            self.send(HEARTBEAT, b'')
+
+    def _on_order_fetch(self, data: dict):
+        fetch_no = data['fetch_no']
+        relay = data.get('relay') or {}
+
+        with self._lock:
+            fetch = self.fetches.get(fetch_no)
+
+            if fetch is None:
+                fetch = self.fetches[fetch_no] = {
+                    'md5': hashlib.md5(),
+                    'expected_md5': data['file']['md5'].lower(),
+                    'size': data['file']['size'],
+                    'written': 0,
+                    'children': {},
+                    'port': relay.get('port', self.relay_port),
+                    'is_complete': False
+                }
+
+            self._set_children(fetch, relay.get('children', []))
+            pending = self.pending_chunks.pop(fetch_no, [])
+
+        for message, body in pending:
+            self._on_chunk(message, body)
+
+    def _on_chunk(self, message, body):
+        fetch_no, offset, flags = FileChunk.decode_meta(body)
+        binary = memoryview(body)[FileChunk.META_SIZE:]
+
+        with self._lock:
+            fetch = self.fetches.get(fetch_no)
+
+            if fetch is None:
+                self.pending_chunks.setdefault(fetch_no, []).append(
+                    (Message(message.HEADER, bytes(message.BODY)), bytes(body)))
+                # 처리 후 수신 버퍼를 돌려주므로 복사해서 보관
+                return
+
+            written = fetch['written']
+
+            if offset > written:
+                self.error_count += 1
+                return
+            # 조각 순서 오류
+
+            if offset + len(binary) > written:
+                # 이미 받은 부분(재연결, 중계 전환 중 중복)은 건너뜀
+                fetch['md5'].update(binary[written - offset:])
+                fetch['written'] = written = offset + len(binary)
+                self.received_bytes += len(binary)
+
+            failed = self._forward(fetch, fetch_no, message)
+            is_final = written >= fetch['size'] and not fetch['is_complete']
+
+            if is_final:
+                fetch['is_complete'] = True
+
+        self.send(RESULT_SEND_FILE, {"fetch_no": fetch_no, "offset": written})
+
+        if failed:
+            self.send(RELAY_UPDATE, {"fetch_no": fetch_no, "failed_children": failed})
+
+        if is_final:
+            is_match = fetch['md5'].hexdigest() == fetch['expected_md5']
+            self._finish(fetch_no, is_match, None if is_match else 1)
+
+            result = {
+                "fetch_no": fetch_no,
+                "end_date": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                "is_complete": is_match
+            }
+
+            if not is_match:
+                result['fail_cause'] = 1
+
+            self.send(RESULT_FETCH, result)
+
+        if self.disconnect_after is not None and written >= self.disconnect_after and not self.disconnect_count:
+            self.disconnect_count += 1
+            self._disconnect_requested = True
+
+    def _forward(self, fetch: dict, fetch_no: int, message) -> list:
+        """
+        하위 클라이언트에게 받은 조각을 그대로(header + body) 전달
+
+        :return: 전달하지 못한 하위 클라이언트 ip 리스트
+        """
+        if not fetch['children']:
+            return []
+
+        header = message.HEADER
+        frame = Header.pack(header.SIZE, header.CODE, header.SENDER, header.RECEIVER) + bytes(message.BODY)
+        failed = []
+
+        for ip, sock in list(fetch['children'].items()):
+            try:
+                if sock is None:
+                    sock = socket.create_connection((ip, fetch['port']), timeout=10, source_address=(self.ip, 0))
+                    fetch['children'][ip] = sock
+
+                sock.sendall(frame)
+            except OSError:
+                fetch['children'].pop(ip, None)
+                failed.append(ip)
+
+        return failed
+
+    @staticmethod
+    def _set_children(fetch: dict, children: list):
+        for ip in list(fetch['children']):
+            if ip not in children:
+                sock = fetch['children'].pop(ip)
+
+                if sock is not None:
+                    sock.close()
+
+        for ip in children:
+            fetch['children'].setdefault(ip, None)
+
+    def _on_relay_update(self, data: dict):
+        with self._lock:
+            fetch = self.fetches.get(data['fetch_no'])
+
+            if fetch is None:
+                return
+
+            self._set_children(fetch, data.get('children', []))
+
+            if data.get('is_done'):
+                self._set_children(fetch, [])
+
+    def _finish(self, fetch_no: int, is_complete: bool, fail_cause: int = None):
+        with self._lock:
+            if fetch_no in self.results:
+                return
+
+            self.results[fetch_no] = {
+                "is_complete": is_complete,
+                "fail_cause": fail_cause,
+                "completed_at": time.perf_counter(),
+                "received_bytes": self.received_bytes
+            }
+
+
+class SimUploader(SimConnection):
+    """
+    가상 파일 제공자
+    """
+
+    def __init__(self, ip: str, server_address: tuple, targets: list, file_size: int, seed: int = 0,
+                 ignore_credits: bool = False, **kwargs):
+        """
+        :param ip:
+        :param server_address:
+        :param targets: 패치 대상 클라이언트 ip 리스트
+        :param file_size: 파일 크기
+        :param seed: 파일 내용 seed, 다른 seed 면 다른 파일(md5)
+        :param ignore_credits: True 면 credit 을 기다리지 않고 파일 조각을 모두 보냄 (서버 credit 강제 확인용)
+        """
+        super().__init__(ip, server_address, **kwargs)
+        self.targets = targets
+        self.file_size = file_size
+        self.ignore_credits = ignore_credits
+
+        rand = random.Random(seed)
+        self._pieces = [bytes(rand.getrandbits(8) for _ in range(256)) * (PIECE_SIZE // 256) for _ in range(4)]
+        # 파일 조각 내용 (4 종류를 번갈아 사용)
+
+        md5 = hashlib.md5()
+        for offset in range(0, file_size, PIECE_SIZE):
+            md5.update(self._piece(offset))
+        self.md5 = md5.hexdigest()
+
+        self.fetch_no = None
+        self.ordered_at = None
+        self.prepared_at = None
+        self.uploaded_at = None
+        self.is_cached = False
+        self.error = None
+
+    def _piece(self, offset: int):
+        piece = self._pieces[offset // PIECE_SIZE % len(self._pieces)]
+        return piece[:min(PIECE_SIZE, self.file_size - offset)]
+
+    def run(self, timeout: float):
+        """
+        패치 요청 후 파일 조각을 모두 보낼 때 까지 실행
+
+        :param timeout: 최대 실행 시간 (단위: 초)
+        :return:
+        """
+        deadline = time.perf_counter() + timeout
+
+        try:
+            self.connect()
+            self.conn.settimeout(timeout)
+            decoder = FrameDecoder()
+
+            self.ordered_at = time.perf_counter()
+            self.send(ORDER_FETCH, {
+                "targets": [{"ip": ip, "path": '/tmp/load_test'} for ip in self.targets],
+                "sender_ip": self.ip,
+                "start_date": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                "file": {
+                    "md5": self.md5,
+                    "name": 'load_test',
+                    "ext": 'bin',
+                    "size": self.file_size
+                }
+            })
+
+            offset = 0
+
+            while offset < self.file_size and time.perf_counter() < deadline:
+                for message in decoder.read_from(self.conn):
+                    code, body, data = self.decode(message)
+                    message.release()
+
+                    if code == CLIENT_WELCOME:
+                        self.on_welcome(data)
+                    elif code == RESULT_PREPARE_FETCH:
+                        self.prepared_at = time.perf_counter()
+
+                        if not data['is_success']:
+                            self.error = 'prepare failed : {}'.format(data.get('fail_clients_ip'))
+                            return
+
+                        self.fetch_no = data['fetch_no']
+
+                        if data.get('is_cached'):
+                            self.is_cached = True
+                            return
+
+                        while self.ignore_credits and offset < self.file_size:
+                            offset = self._send_piece(offset)
+                    elif code == RESULT_SEND_FILE and self.fetch_no is not None and 'credits' in data:
+                        for _ in range(data['credits']):
+                            offset = self._send_piece(offset)
+
+                            if offset >= self.file_size:
+                                break
+                    elif code == ABORT_FETCH:
+                        self.error = 'aborted : {}'.format(data.get('fail_cause'))
+                        return
+                    elif code == HEARTBEAT:
+                        self.send(HEARTBEAT, b'')
+
+            if offset < self.file_size:
+                self.error = 'timeout'
+            else:
+                self.uploaded_at = time.perf_counter()
+        except (ConnectionError, OSError) as e:
+            self.error = repr(e)
+
+    def _send_piece(self, offset: int) -> int:
+        piece = self._piece(offset)
+        is_final = offset + len(piece) >= self.file_size
+
+        self.send_frame(make_message(SEND_FILE_CHUNK, self.ip, self.server_address[0],
+                                     FileChunk.encode(self.fetch_no, offset, piece, is_final)))
+
+        return offset + len(piece)
+
+    def keep_alive(self):
+        """
+        파일 조각을 모두 보낸 후 패치가 끝날 때 까지 연결 유지 (서버는 파일 제공자에게 패치 결과를 보냄)
+        :return:
+        """
+        try:
+            decoder = FrameDecoder()
+            self.conn.settimeout(None)
+
+            while True:
+                for message in decoder.read_from(self.conn):
+                    if message.HEADER.CODE & CODE_MASK == HEARTBEAT:
+                        self.send(HEARTBEAT, b'')
+                    message.release()
+        except (ConnectionError, OSError, AttributeError):
+            pass
@@ -0,0 +1,199 @@
+"""
+부하 테스트용 서버 실행 스크립트 (load_test.py 가 서브 프로세스로 실행)
+
+외부 DB 없이 서버를 실행함
+- memory: 메모리 DB 대체 객체(MemoryDBHandler), 트랜잭션 처리(커넥션 풀, BEGIN/COMMIT)는 Connector 코드를 그대로 사용하고
+          MariaDB DAO 쿼리만 메모리에서 처리함
+- sqlite: SQLiteHandler (임시 디렉터리의 DB 파일)
+
+사용법
+python benchmark/load_server.py --config '{"port": 14494, "host": "127.0.0.1"}' [--engine selectors]
+                                [--db memory|sqlite] [--db-latency 0]
+"""
+import argparse
+import itertools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.db.db_handler import ConnectionPool, Connector, SQLiteHandler
+from server import MainServer
+
+
+COLUMN_DEFAULTS = {
+    'CLIENT': {'LAST_DISCONN_DATE': None, 'DISCONN_CNT': 0}
+}
+"""
+테이블 별 컬럼 기본값 (resource/hamon_fetcher.sql), INSERT 에 없는 컬럼에 사용
+"""
+
+
+class MemoryCursor:
+    """
+    pymysql DictCursor 대체 객체
+    """
+
+    def __init__(self, database):
+        self._database = database
+        self._rows = []
+        self.lastrowid = None
+        self.rowcount = 0
+
+    def execute(self, query: str, args=None):
+        self.lastrowid, self._rows = self._database.execute(query, args)
+        self.rowcount = len(self._rows) or 1
+        return self.rowcount
+
+    def executemany(self, query: str, args):
+        for row in args:
+            self._database.execute(query, row)
+
+        self.rowcount = len(args)
+        return self.rowcount
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        pass
+
+
+class MemoryConnection:
+    """
+    pymysql 커넥션 대체 객체
+    """
+
+    def __init__(self, database):
+        self._database = database
+
+    def cursor(self, cursor_class=None):
+        return MemoryCursor(self._database)
+
+    def begin(self):
+        pass
+
+    def commit(self):
+        self._database.commit_count += 1
+
+    def rollback(self):
+        self._database.rollback_count += 1
+
+    def close(self):
+        pass
+
+
+class MemoryDatabase:
+    """
+    메모리 DB, 서버 DAO 가 사용하는 단순한 쿼리만 처리함
+
+    - INSERT INTO 테이블(컬럼, ...) VALUES (...): 테이블 별 id 를 발급(lastrowid)하고 첫 컬럼 값을 key 로 행 저장
+    - SELECT ... FROM 테이블 ... %s: 첫 인자 값이 key 인 행 (CLIENT 테이블 ip 조회 등)
+    - 그 외(UPDATE 등): 실행 건수만 기록
+    """
+
+    def __init__(self, latency: float = 0.0):
+        """
+        :param latency: 쿼리 마다 추가할 지연 시간 (단위: 초), DB 왕복 시간 흉내
+        """
+        self.latency = latency
+        self.statement_count = 0
+        self.row_count = 0
+        self.commit_count = 0
+        self.rollback_count = 0
+
+        self._ids = {}
+        # 테이블 이름 -> id 발급 counter
+        self._tables = {}
+        # 테이블 이름 -> (첫 컬럼 값 -> 행)
+        self._lock = threading.Lock()
+
+    def execute(self, query: str, args) -> tuple:
+        """
+        :param query:
+        :param args: 쿼리 인자 튜플
+        :return: (lastrowid, 결과 행 리스트)
+        """
+        if self.latency:
+            time.sleep(self.latency)
+
+        words = query.replace('(', ' ( ').split()
+        command = words[0].upper()
+        args = tuple(args or ())
+
+        with self._lock:
+            self.statement_count += 1
+
+            if command == 'INSERT':
+                table = words[2].strip('`').upper()
+                columns = [column.strip('`, ') for column in
+                           query[query.index('(') + 1:query.index(')')].split(',')]
+                counter = self._ids.get(table)
+
+                if counter is None:
+                    counter = self._ids[table] = itertools.count(1)
+
+                row_id = next(counter)
+
+                if args:
+                    row = dict(COLUMN_DEFAULTS.get(table, {}))
+                    row.update(zip(columns, args))
+                    self._tables.setdefault(table, {})[args[0]] = row
+
+                self.row_count += 1
+                return row_id, []
+
+            if command == 'SELECT' and args:
+                table = words[[word.upper() for word in words].index('FROM') + 1].strip('`').upper()
+                row = self._tables.get(table, {}).get(args[0])
+
+                return None, [] if row is None else [dict(row)]
+
+            return None, []
+
+
+class MemoryDBHandler(Connector):
+    """
+    MariaDBHandler 대체 객체 (부하 테스트용), MariaDB DAO 를 사용함
+    """
+
+    dialect = 'maria_db'
+
+    def __init__(self, latency: float = 0.0, pool_size: int = 5):
+        super().__init__()
+        self.database = MemoryDatabase(latency)
+        self.pool = ConnectionPool(self.connect, pool_size)
+
+    def connect(self):
+        return MemoryConnection(self.database)
+
+    def open_cursor(self, connection):
+        return connection.cursor()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--config', default='{"port": 14494, "host": "127.0.0.1"}', help='서버 속성 (JSON)')
+    parser.add_argument('--engine', default='selectors')
+    parser.add_argument('--db', choices=('memory', 'sqlite'), default='memory')
+    parser.add_argument('--db-latency', type=float, default=0.0, help='쿼리 지연 시간 (단위: ms), memory 만 사용')
+    args = parser.parse_args()
+
+    if args.db == 'sqlite':
+        with tempfile.TemporaryDirectory(prefix='hamon_load_') as directory:
+            MainServer.db_connector = SQLiteHandler(os.path.join(directory, 'hamon_fetcher.db'))
+            MainServer.start(engine=args.engine, **json.loads(args.config))
+    else:
+        MainServer.db_connector = MemoryDBHandler(args.db_latency / 1000)
+        MainServer.start(engine=args.engine, **json.loads(args.config))
+
+
+if __name__ == '__main__':
+    main()
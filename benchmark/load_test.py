@@ -0,0 +1,526 @@
+"""
+패치 부하 테스트 (headless)
+
+시나리오 마다 loopback 에서 서버(load_server.py, 메모리 DB 대체 객체 사용)를 새로 실행하고
+가상 패치 대상 클라이언트 N 개와 파일 제공자 M 개(load_agents.py)로 패치를 진행한 뒤 결과를 기록함
+
+측정 항목
+- 처리량: 대상 클라이언트가 받은 파일 크기 합 / 패치 시간, 파일 제공자 업로드 속도
+- 대상 클라이언트 별 패치 완료 시간 (패치 요청 ~ 완료) percentile
+- 서버 CPU 사용 시간/사용률, RSS (최대, 종료 시점), 멀티 프로세스 모드는 워커 프로세스 합
+  (리눅스 /proc 사용)
+
+결과는 output 디렉터리에 저장
+- load_<시각>.json: 실행 환경(커밋, python, cpu 수)과 시나리오 별 전체 결과
+- load_summary.csv: 시나리오 별 요약 한 줄씩 누적 (버전 간 비교용)
+
+시나리오 파일(JSON 리스트) 항목
+[name]: 시나리오 이름
+[file_size]: 파일 크기 (int 혹은 '16MB', '512KB' 형식)
+[targets]: 패치 대상 클라이언트 수
+[uploaders]: 파일 제공자 수 (패치 대상을 나눠서 각자 다른 파일로 패치 요청), 기본값 1
+[ignore_credits]: true 면 파일 제공자가 credit 을 기다리지 않고 파일 조각을 모두 보냄
+[slow]: {count, rate} -> 수신 속도를 rate(byte/s) 로 제한한 대상 클라이언트 수
+[disconnect]: {count, after_bytes, reconnect_delay} -> after_bytes 만큼 받고 연결을 끊는 대상 클라이언트 수,
+              reconnect_delay 초 후 재연결 (null 이면 재연결 안함)
+[codecs]: 대상 클라이언트가 알릴 압축 방식 리스트
+[mixed_codecs]: 압축 방식 리스트의 리스트, 대상 클라이언트 번호 순서대로 돌아가며 알림 (ex: [["zlib"], []])
+[body_codec]: 'binary' 면 바이너리 body 형식 사용
+[engine]: 서버 엔진 ('selectors', 'asyncio')
+[server]: 서버 속성 (MainServer.start kwargs, ex: {"relay_degree": 4, "workers": 2})
+[db]: 서버 DB ('memory', 'sqlite'), 기본값 memory
+[db_latency]: DB 쿼리 지연 시간 (단위: ms), memory 만 사용
+[timeout]: 최대 패치 시간 (단위: 초), 기본값 120
+
+사용법
+python benchmark/load_test.py [--scenarios benchmark/load_scenarios.json] [--only name ...] [--output benchmark/results]
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCHMARK_DIR)
+
+sys.path.insert(0, ROOT_DIR)
+
+from benchmark.load_agents import SimAgent, SimUploader, agent_ip, uploader_ip
+
+SERVER_HOST = '127.0.0.1'
+
+SUMMARY_FIELDS = ('date', 'commit', 'scenario', 'targets', 'file_size', 'completed', 'failed', 'duration',
+                  'throughput_mbps', 'upload_mbps', 'latency_p50', 'latency_p90', 'latency_p99', 'latency_max',
+                  'server_cpu_seconds', 'server_cpu_percent', 'server_rss_peak_mb')
+# load_summary.csv 컬럼
+
+SIZE_UNITS = {'KB': 1024, 'MB': 1024 * 1024, 'GB': 1024 * 1024 * 1024}
+
+
+def parse_size(size) -> int:
+    """
+    :param size: int 혹은 '16MB' 형식 문자열
+    :return: byte 크기
+    """
+    if isinstance(size, int):
+        return size
+
+    size = size.strip().upper()
+
+    for unit, scale in SIZE_UNITS.items():
+        if size.endswith(unit):
+            return int(float(size[:-len(unit)]) * scale)
+
+    return int(size)
+
+
+def percentile(values: list, q: float) -> float:
+    """
+    :param values: 정렬된 값 리스트
+    :param q: 0 ~ 100
+    :return: 선형 보간 percentile, 값이 없으면 None
+    """
+    if not values:
+        return None
+
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+class ProcessMonitor:
+    """
+    서버 프로세스(자식 워커 프로세스 포함)의 CPU 사용 시간과 RSS 를 /proc 에서 주기적으로 읽음
+    """
+
+    def __init__(self, pid: int, interval: float = 0.2):
+        self.pid = pid
+        self.interval = interval
+
+        self.samples = []
+        # (경과 시간, cpu 사용 시간 합, rss 합) 리스트
+
+        self._ticks = os.sysconf('SC_CLK_TCK')
+        self._page_size = os.sysconf('SC_PAGE_SIZE')
+        self._stop = threading.Event()
+        self._thread = None
+        self._start = None
+
+    def start(self):
+        self._start = time.perf_counter()
+        self.sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.sample()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def _tree(self) -> list:
+        """
+        :return: 서버 프로세스와 하위 프로세스 pid 리스트
+        """
+        pids = [self.pid]
+
+        try:
+            with open('/proc/{}/task/{}/children'.format(self.pid, self.pid)) as file:
+                pids += [int(pid) for pid in file.read().split()]
+        except OSError:
+            pass
+
+        return pids
+
+    def sample(self):
+        cpu = 0.0
+        rss = 0
+
+        for pid in self._tree():
+            try:
+                with open('/proc/{}/stat'.format(pid)) as file:
+                    fields = file.read().rpartition(')')[2].split()
+                    # 프로세스 이름 뒤의 필드, utime: 14번째, stime: 15번째 (이름 뒤 기준 11, 12)
+                    cpu += (int(fields[11]) + int(fields[12])) / self._ticks
+
+                with open('/proc/{}/statm'.format(pid)) as file:
+                    rss += int(file.read().split()[1]) * self._page_size
+            except (OSError, IndexError, ValueError):
+                pass
+
+        self.samples.append((time.perf_counter() - self._start, cpu, rss))
+
+    def summary(self) -> dict:
+        if len(self.samples) < 2:
+            return {}
+
+        elapsed = self.samples[-1][0] - self.samples[0][0]
+        cpu_seconds = self.samples[-1][1] - self.samples[0][1]
+
+        return {
+            "cpu_seconds": round(cpu_seconds, 3),
+            "cpu_percent": round(cpu_seconds / elapsed * 100, 1) if elapsed else None,
+            "rss_start_mb": round(self.samples[0][2] / 1024 / 1024, 1),
+            "rss_peak_mb": round(max(sample[2] for sample in self.samples) / 1024 / 1024, 1),
+            "rss_end_mb": round(self.samples[-1][2] / 1024 / 1024, 1)
+        }
+
+
+class ServerProcess:
+    """
+    서버(load_server.py) 서브 프로세스
+    """
+
+    def __init__(self, scenario: dict, port: int, log_path: str):
+        self.scenario = scenario
+        self.port = port
+        self.log_path = log_path
+        self.process = None
+        self._log = None
+
+    @property
+    def config(self) -> dict:
+        config = {
+            "host": SERVER_HOST,
+            "port": self.port,
+            "max_client": self.scenario['targets'] + self.scenario['uploaders'] + 16,
+            "resume_window": 60
+        }
+        config.update(self.scenario.get('server', {}))
+
+        return config
+
+    def start(self, timeout: float = 10):
+        self._log = open(self.log_path, 'w')
+        self.process = subprocess.Popen(
+            [sys.executable, '-u', os.path.join(BENCHMARK_DIR, 'load_server.py'),
+             '--config', json.dumps(self.config),
+             '--engine', self.scenario.get('engine', 'selectors'),
+             '--db', self.scenario.get('db', 'memory'),
+             '--db-latency', str(self.scenario.get('db_latency', 0))],
+            cwd=ROOT_DIR, stdout=self._log, stderr=subprocess.STDOUT, start_new_session=True)
+        # 멀티 프로세스 모드의 워커까지 한번에 종료하도록 새 프로세스 그룹으로 실행
+
+        deadline = time.perf_counter() + timeout
+
+        while time.perf_counter() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError('서버 실행 실패 (로그 : {})'.format(self.log_path))
+
+            try:
+                socket.create_connection((SERVER_HOST, self.port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.1)
+
+        raise RuntimeError('서버 연결 대기 시간 초과 (로그 : {})'.format(self.log_path))
+
+    def stop(self, timeout: float = 10):
+        if self.process is None:
+            return
+
+        try:
+            os.killpg(self.process.pid, signal.SIGINT)
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            os.killpg(self.process.pid, signal.SIGKILL)
+            self.process.wait()
+        except ProcessLookupError:
+            pass
+
+        self._log.close()
+
+
+def free_port() -> int:
+    """
+    :return: 사용하지 않는 loopback 포트 (이전 시나리오 서버의 TIME_WAIT 연결, 종료되지 않은 서버와 겹치지 않도록 함)
+    """
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((SERVER_HOST, 0))
+        return sock.getsockname()[1]
+
+
+def normalize_scenario(scenario: dict) -> dict:
+    scenario = dict(scenario)
+    scenario['file_size'] = parse_size(scenario.get('file_size', '16MB'))
+    scenario.setdefault('targets', 10)
+    scenario.setdefault('uploaders', 1)
+    scenario.setdefault('timeout', 120)
+
+    for key in ('slow', 'disconnect'):
+        if key in scenario:
+            scenario[key] = dict(scenario[key])
+
+    if 'slow' in scenario:
+        scenario['slow']['rate'] = parse_size(scenario['slow']['rate'])
+
+    if 'disconnect' in scenario:
+        scenario['disconnect']['after_bytes'] = parse_size(scenario['disconnect'].get('after_bytes', '1MB'))
+
+    return scenario
+
+
+def make_agents(scenario: dict, server_address: tuple) -> list:
+    """
+    대상 클라이언트 생성, 느린 링크/연결 끊김 클라이언트는 뒤쪽 번호 부터 지정
+    (중계 트리에서는 앞쪽 번호가 상위 노드이므로 하위 노드에 지정됨)
+    """
+    slow = scenario.get('slow', {})
+    disconnect = scenario.get('disconnect', {})
+    relay_degree = scenario.get('server', {}).get('relay_degree', 0)
+    options = {"codecs": scenario.get('codecs'),
+               "body_codecs": [scenario['body_codec']] if scenario.get('body_codec') else None}
+
+    mixed_codecs = scenario.get('mixed_codecs')
+
+    agents = []
+    count = scenario['targets']
+
+    for index in range(count):
+        if mixed_codecs:
+            options['codecs'] = mixed_codecs[index % len(mixed_codecs)]
+
+        agent = SimAgent(agent_ip(index), server_address,
+                         relay_port=scenario.get('server', {}).get('relay_port', 14495) if relay_degree else None,
+                         **options)
+
+        if index >= count - slow.get('count', 0):
+            agent.link_rate = slow['rate']
+        elif index >= count - slow.get('count', 0) - disconnect.get('count', 0):
+            agent.disconnect_after = disconnect['after_bytes']
+            agent.reconnect_delay = disconnect.get('reconnect_delay', 1.0)
+
+        agents.append(agent)
+
+    return agents
+
+
+def run_scenario(scenario: dict, port: int, output: str) -> dict:
+    print('시나리오 {} : 대상 {} 파일 {:,}byte 파일 제공자 {}'.format(scenario['name'], scenario['targets'],
+                                                              scenario['file_size'], scenario['uploaders']))
+
+    server = ServerProcess(scenario, port, os.path.join(output, 'server_{}.log'.format(scenario['name'])))
+    server.start()
+
+    monitor = ProcessMonitor(server.process.pid)
+    server_address = (SERVER_HOST, port)
+    agents = make_agents(scenario, server_address)
+    uploaders = []
+
+    try:
+        for agent in agents:
+            agent.start()
+
+        for agent in agents:
+            agent.welcomed.wait(10)
+
+        uploader_count = scenario['uploaders']
+        options = {"body_codecs": [scenario['body_codec']] if scenario.get('body_codec') else None}
+
+        for index in range(uploader_count):
+            targets = [agent.ip for agent in agents[index::uploader_count]]
+            uploaders.append(SimUploader(uploader_ip(index), server_address, targets, scenario['file_size'],
+                                         seed=int(time.time() * 1000) + index,
+                                         ignore_credits=scenario.get('ignore_credits', False), **options))
+            # seed 가 달라야 이전 실행의 서버 스풀(같은 md5)을 사용하지 않음
+
+        monitor.start()
+
+        threads = [threading.Thread(target=uploader.run, args=(scenario['timeout'],), daemon=True)
+                   for uploader in uploaders]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for uploader in uploaders:
+            if uploader.conn is not None:
+                threading.Thread(target=uploader.keep_alive, daemon=True).start()
+
+        expected = [agent for agent in agents if agent.disconnect_after is None or agent.reconnect_delay is not None]
+        deadline = time.perf_counter() + scenario['timeout']
+
+        while time.perf_counter() < deadline and not all(agent.results for agent in expected):
+            if any(uploader.error for uploader in uploaders):
+                break
+
+            time.sleep(0.05)
+
+        monitor.stop()
+    finally:
+        for agent in agents:
+            agent.stop()
+
+        for uploader in uploaders:
+            uploader.close()
+
+        server.stop()
+
+    return make_result(scenario, agents, uploaders, monitor)
+
+
+def make_result(scenario: dict, agents: list, uploaders: list, monitor: ProcessMonitor) -> dict:
+    ordered_at = {}
+
+    for uploader in uploaders:
+        for ip in uploader.targets:
+            ordered_at[ip] = uploader.ordered_at
+
+    latencies = []
+    completed = failed = 0
+    last_completed_at = None
+
+    for agent in agents:
+        for result in agent.results.values():
+            if result['is_complete']:
+                completed += 1
+                latencies.append(result['completed_at'] - ordered_at[agent.ip])
+                last_completed_at = max(last_completed_at or 0, result['completed_at'])
+            else:
+                failed += 1
+
+    latencies.sort()
+    started_at = min((uploader.ordered_at for uploader in uploaders if uploader.ordered_at), default=None)
+    duration = last_completed_at - started_at if last_completed_at and started_at else None
+    received_bytes = sum(agent.received_bytes for agent in agents)
+
+    upload_times = [uploader.uploaded_at - uploader.ordered_at for uploader in uploaders if uploader.uploaded_at]
+
+    return {
+        "scenario": scenario,
+        "completed": completed,
+        "failed": failed,
+        "timeout": len(agents) - completed - failed,
+        "agent_errors": sum(agent.error_count for agent in agents),
+        "uploader_errors": [uploader.error for uploader in uploaders if uploader.error],
+        "duration": round(duration, 3) if duration else None,
+        "received_bytes": received_bytes,
+        "throughput_mbps": round(received_bytes / duration / 1024 / 1024, 2) if duration else None,
+        "upload_mbps": round(scenario['file_size'] * len(upload_times) / sum(upload_times) / 1024 / 1024, 2)
+        if upload_times and sum(upload_times) else None,
+        "latency": {
+            "min": latencies[0] if latencies else None,
+            "p50": percentile(latencies, 50),
+            "p90": percentile(latencies, 90),
+            "p99": percentile(latencies, 99),
+            "max": latencies[-1] if latencies else None,
+            "mean": sum(latencies) / len(latencies) if latencies else None
+        },
+        "server": monitor.summary()
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(output: str, results: list, meta: dict):
+    name = 'load_{}.json'.format(datetime.datetime.now().strftime('%Y%m%d_%H%M%S'))
+
+    with open(os.path.join(output, name), 'w') as file:
+        json.dump({"meta": meta, "results": results}, file, indent=2)
+
+    summary_path = os.path.join(output, 'load_summary.csv')
+    is_new = not os.path.exists(summary_path)
+
+    with open(summary_path, 'a', newline='') as file:
+        writer = csv.DictWriter(file, SUMMARY_FIELDS)
+
+        if is_new:
+            writer.writeheader()
+
+        for result in results:
+            latency = result['latency']
+            server = result['server']
+
+            writer.writerow({
+                "date": meta['date'],
+                "commit": meta['commit'],
+                "scenario": result['scenario']['name'],
+                "targets": result['scenario']['targets'],
+                "file_size": result['scenario']['file_size'],
+                "completed": result['completed'],
+                "failed": result['failed'] + result['timeout'],
+                "duration": result['duration'],
+                "throughput_mbps": result['throughput_mbps'],
+                "upload_mbps": result['upload_mbps'],
+                "latency_p50": latency['p50'] and round(latency['p50'], 3),
+                "latency_p90": latency['p90'] and round(latency['p90'], 3),
+                "latency_p99": latency['p99'] and round(latency['p99'], 3),
+                "latency_max": latency['max'] and round(latency['max'], 3),
+                "server_cpu_seconds": server.get('cpu_seconds'),
+                "server_cpu_percent": server.get('cpu_percent'),
+                "server_rss_peak_mb": server.get('rss_peak_mb')
+            })
+
+    print('결과 저장 : {}'.format(os.path.join(output, name)))
+
+
+def print_result(result: dict):
+    latency = result['latency']
+    server = result['server']
+
+    print('  완료 {} 실패 {} 시간 초과 {} 시간 {}s 처리량 {}MB/s 업로드 {}MB/s'.format(
+        result['completed'], result['failed'], result['timeout'], result['duration'], result['throughput_mbps'],
+        result['upload_mbps']))
+    print('  완료 시간 p50 {} p90 {} p99 {} max {}'.format(
+        *('-' if latency[key] is None else '{:.3f}s'.format(latency[key]) for key in ('p50', 'p90', 'p99', 'max'))))
+    print('  서버 cpu {}s ({}%) rss peak {}MB end {}MB'.format(
+        server.get('cpu_seconds'), server.get('cpu_percent'), server.get('rss_peak_mb'), server.get('rss_end_mb')))
+
+    if result['uploader_errors']:
+        print('  파일 제공자 오류 : {}'.format(result['uploader_errors']))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scenarios', default=os.path.join(BENCHMARK_DIR, 'load_scenarios.json'))
+    parser.add_argument('--only', nargs='*', help='실행할 시나리오 이름')
+    parser.add_argument('--output', default=os.path.join(BENCHMARK_DIR, 'results'))
+    parser.add_argument('--port', type=int, help='서버 포트, 지정하지 않으면 시나리오 마다 빈 포트 사용')
+    args = parser.parse_args()
+
+    with open(args.scenarios) as file:
+        scenarios = [normalize_scenario(scenario) for scenario in json.load(file)]
+
+    if args.only:
+        scenarios = [scenario for scenario in scenarios if scenario['name'] in args.only]
+
+    os.makedirs(args.output, exist_ok=True)
+
+    meta = {
+        "date": datetime.datetime.now().isoformat(timespec='seconds'),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count()
+    }
+    results = []
+
+    for scenario in scenarios:
+        result = run_scenario(scenario, args.port or free_port(), args.output)
+        print_result(result)
+        results.append(result)
+
+    write_results(args.output, results, meta)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,25 +1,363 @@
-import pymysql
 import datetime
+import importlib
+import os
+import sqlite3
+import threading
+import time
 import traceback
+from collections import deque
+from contextlib import contextmanager, suppress
 
 from abc import *
 
+from common import metrics
+
+
+transaction_time = metrics.registry.histogram('hamon_db_transaction_seconds',
+                                              'DB 트랜잭션 시간 (커넥션 대기 ~ COMMIT/ROLLBACK)')
+transaction_rollbacks = metrics.registry.counter('hamon_db_rollbacks_total', 'DB 트랜잭션 ROLLBACK 수')
+
+SQLITE_SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                                  'resource', 'hamon_fetcher_sqlite.sql')
+
 
 class Connector(metaclass=ABCMeta):
+    """
+    DB 연결 객체
+
+    커넥션/커서는 트랜잭션 범위 동안 스레드 별로 할당되므로 (connection, cursor) 는 현재 스레드의 값을 반환함
+    트랜잭션 처리(커넥션 풀, BEGIN/COMMIT/ROLLBACK)는 이 클래스가 하고 DB 별 구현은 connect(), open_cursor() 와
+    필요한 경우 begin(), commit(), rollback() 을 오버라이딩 함
+    """
+
+    dialect = None
+    """
+    :type str
+    DAO 구현 모듈 이름 접미사 (ex: fetch_dao_maria_db), DAO 인터페이스 모듈이 get_dao() 로 구현 모듈을 찾을 때 사용
+    """
+
     def __init__(self):
-        self.connection = None
+        self._local = threading.local()
+        self.pool = None
+        """
+        :type ConnectionPool
+        """
+
+    @property
+    def connection(self):
+        """
+        :return: 현재 스레드의 트랜잭션에서 사용중인 커넥션, 트랜잭션 밖이면 None
+        """
+        return getattr(self._local, 'connection', None)
+
+    @property
+    def cursor(self):
+        """
+        :return: 현재 스레드의 트랜잭션에서 사용중인 커서, 트랜잭션 밖이면 None
+        """
+        return getattr(self._local, 'cursor', None)
+
+    @abstractmethod
+    def connect(self):
+        """
+        :return: 새 커넥션 (커넥션 풀에서 호출)
+        """
+        pass
+
+    @abstractmethod
+    def open_cursor(self, connection):
+        """
+        :param connection:
+        :return: 트랜잭션에서 사용할 커서, fetchone()/fetchall() 은 (컬럼 이름 -> 값) 딕셔너리를 반환해야 함
+        """
+        pass
+
+    def begin(self, connection):
+        connection.begin()
+
+    def commit(self, connection):
+        connection.commit()
+
+    def rollback(self, connection):
+        connection.rollback()
+
+    def validate(self, connection) -> bool:
+        """
+        풀에서 대기하던 커넥션을 빌려주기 전에 호출, 연결이 끊긴 커넥션(DB 재시작, wait_timeout 등)을 걸러냄
+
+        :param connection:
+        :return: 사용할 수 없는 커넥션이면 False, 풀이 닫고 새 커넥션을 만듦
+        """
+        return True
+
+    @contextmanager
+    def transaction_scope(self):
+        """
+        현재 스레드의 트랜잭션 범위
+
+        가장 바깥 범위에서 풀의 커넥션을 빌려 BEGIN, 정상 종료시 COMMIT 예외 발생시 ROLLBACK 후 반납
+        안쪽 범위는 바깥 범위의 커넥션/트랜잭션을 그대로 사용함
+        :return:
+        """
+        local = self._local
+
+        if getattr(local, 'depth', 0):
+            local.depth += 1
+            try:
+                yield self
+            finally:
+                local.depth -= 1
+            return
+
+        start = time.perf_counter()
+        connection = self.pool.acquire()
+        is_broken = False
+
+        local.depth = 1
+        local.connection = connection
+        local.cursor = None
+
+        try:
+            local.cursor = self.open_cursor(connection)
+            self.begin(connection)
+            yield self
+            self.commit(connection)
+        except Exception as e:
+            transaction_rollbacks.inc()
+
+            try:
+                self.rollback(connection)
+            except Exception:
+                is_broken = True
+            raise e
+        finally:
+            if local.cursor is not None:
+                with suppress(Exception):
+                    local.cursor.close()
+
+            local.depth = 0
+            local.connection = None
+            local.cursor = None
+
+            self.pool.release(connection, discard=is_broken)
+            transaction_time.observe(time.perf_counter() - start)
+
+    @classmethod
+    def get_datetime_db_format(cls,
+                               object_datetime: datetime.datetime):
+        """
+        :param object_datetime: datetime 이 아닌 값(None, DB 에서 읽은 문자열)은 그대로 반환
+        :return:
+        """
+        if not isinstance(object_datetime, datetime.datetime):
+            return object_datetime
+
+        return object_datetime.strftime('%Y-%m-%d %H:%M:%S')
+
+
+class ConnectionPool:
+    """
+    크기가 제한된 DB 커넥션 풀
+
+    selectors 스레드, 이벤트 헨들러 스레드, heartbeat 스레드가 동시에 트랜잭션을 실행하므로
+    하나의 커넥션을 같이 쓰지 않고 트랜잭션 마다 커넥션을 빌려서 사용함
+    커넥션은 필요할 때 생성하며 최대 size 개 까지만 만들고, 모두 사용중이면 반납될 때 까지 대기함
+    대기하던 커넥션은 빌려주기 전에 validate 로 확인하고 끊긴 커넥션은 새 커넥션으로 바꿈
+    """
+
+    def __init__(self, connect, size: int, timeout: float = None, validate=None):
+        """
+        :param connect: 새 커넥션을 만드는 함수
+        :param size: 최대 커넥션 수
+        :param timeout: 커넥션 대기 최대 시간 (단위: 초), None 이면 무제한 대기
+        :param validate: 대기하던 커넥션을 빌려주기 전에 확인하는 함수 (Connector.validate), None 이면 확인하지 않음
+        """
+        self.size = size
+        self.timeout = timeout
+
+        self._connect = connect
+        self._validate = validate
+        self._idle = deque()
+        self._checked_out = set()
+        # 빌려준 커넥션, close() 후 반납되면 닫음
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+        self.checkout_count = 0
+        self.wait_count = 0
+        # 커넥션이 모두 사용 중이어서 대기한 횟수
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+        self.total_checkout_time = 0.0
+        # 커넥션을 얻기 까지 걸린 시간 합 (대기 + 커넥션 생성)
+        self.invalid_count = 0
+        # validate 에 실패해 새로 만든 커넥션 수
+
+        metrics.registry.collector('hamon_db_pool_in_use', '사용 중인 DB 커넥션 수', lambda: self.in_use)
+        metrics.registry.collector('hamon_db_pool_idle', '대기 중인 DB 커넥션 수', lambda: self.idle)
+        metrics.registry.collector('hamon_db_pool_checkouts_total', 'DB 커넥션 대여 수',
+                                   lambda: self.checkout_count, 'counter')
+        metrics.registry.collector('hamon_db_pool_waits_total', '커넥션이 모두 사용 중이어서 대기한 수',
+                                   lambda: self.wait_count, 'counter')
+        metrics.registry.collector('hamon_db_pool_wait_seconds_total', 'DB 커넥션 대기 시간 합',
+                                   lambda: self.total_wait_time, 'counter')
+        metrics.registry.collector('hamon_db_pool_invalid_total', '끊긴 상태여서 새로 만든 DB 커넥션 수',
+                                   lambda: self.invalid_count, 'counter')
+
+    @property
+    def in_use(self) -> int:
+        return self._created - len(self._idle)
+
+    @property
+    def idle(self) -> int:
+        return len(self._idle)
+
+    @property
+    def average_checkout_time(self) -> float:
+        return self.total_checkout_time / self.checkout_count if self.checkout_count else 0.0
+
+    def acquire(self):
+        """
+        :return: 커넥션, 사용 후 release() 로 반납해야 함
+        :raise TimeoutError: timeout 동안 커넥션을 얻지 못한 경우
+        :raise RuntimeError: 닫힌 풀인 경우
+        """
+        start = time.perf_counter()
+        connection = None
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('닫힌 DB 커넥션 풀입니다')
+
+            if not self._idle and self._created >= self.size:
+                self.wait_count += 1
+
+                while not self._idle and self._created >= self.size:
+                    remain = None if self.timeout is None else self.timeout - (time.perf_counter() - start)
+
+                    if remain is not None and remain <= 0:
+                        raise TimeoutError('DB 커넥션 풀 대기 시간 초과')
+
+                    self._cond.wait(remain)
+
+                    if self._closed:
+                        raise RuntimeError('닫힌 DB 커넥션 풀입니다')
+
+                wait_time = time.perf_counter() - start
+                self.total_wait_time += wait_time
+                self.max_wait_time = max(self.max_wait_time, wait_time)
+
+            if self._idle:
+                connection = self._idle.pop()
+            else:
+                self._created += 1
+
+        if connection is not None and not self._is_valid(connection):
+            # 끊긴 커넥션은 닫고 같은 자리에 새 커넥션을 만듦
+            self.invalid_count += 1
+            with suppress(Exception):
+                connection.close()
+            connection = None
+
+        if connection is None:
+            try:
+                connection = self._connect()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+
+        with self._cond:
+            self._checked_out.add(connection)
+
+        self.checkout_count += 1
+        self.total_checkout_time += time.perf_counter() - start
+
+        return connection
+
+    def release(self, connection, discard: bool = False):
+        """
+        :param connection:
+        :param discard: 사용할 수 없는 커넥션(연결 끊김 등)인 경우 True, 풀에 돌려놓지 않고 닫음
+        :return:
+        """
+        with self._cond:
+            self._checked_out.discard(connection)
+            discard = discard or self._closed
+
+            if discard:
+                self._created -= 1
+            else:
+                self._idle.append(connection)
+            self._cond.notify()
+
+        if discard:
+            with suppress(Exception):
+                connection.close()
+
+    def _is_valid(self, connection) -> bool:
+        if self._validate is None:
+            return True
+
+        try:
+            return self._validate(connection)
+        except Exception:
+            return False
+
+    def _after_fork(self):
+        """
+        fork 된 자식 프로세스는 부모 프로세스의 커넥션(소켓)을 같이 쓰면 안되므로 닫지 않고 버림
+        :return:
+        """
+        self._idle = deque()
+        self._checked_out = set()
+        self._created = 0
+        self._cond = threading.Condition()
+
+    def close(self):
+        """
+        대기 중인 커넥션을 닫고 이후 acquire() 를 막음
+        사용 중인 커넥션은 진행 중인 트랜잭션이 끝나도록 바로 닫지 않고 release() 로 반납될 때 닫음
+
+        :return:
+        """
+        with self._cond:
+            self._closed = True
+            idle = list(self._idle)
+            self._idle.clear()
+            self._created -= len(idle)
+            self._cond.notify_all()
+
+        for connection in idle:
+            with suppress(Exception):
+                connection.close()
+
+    @property
+    def checked_out(self) -> int:
+        """
+        :return: 반납되지 않은 커넥션 수 (close() 후 모두 반납되었는지 확인할 때 사용)
+        """
+        with self._cond:
+            return len(self._checked_out)
 
 
 def transaction(func):
     """
     트랜젝션 데코레이터
 
-    DB 별 odbc 트랜젝션 함수를 사용할 수 있음
+    MainServer.db_connector 의 transaction_scope() 로 트랜잭션을 처리함 (DB 별 처리는 Connector 구현 클래스)
 
-    todo: 트랜젝션 겹침 상황에 대한 처리가 미구현, 겹침 발생시 마지막 BEGIN된 함수만 트랜젝션을 처리하고 있음
+    호출 마다 커넥션 풀에서 커넥션을 빌려 트랜잭션을 시작하고 종료시 반납함
+    같은 스레드에서 트랜잭션 함수가 겹쳐서 호출된 경우 바깥 트랜잭션에 합쳐서 처리함
+    MainServer.db_connector 가 없으면 함수를 실행하지 않고 None 반환
     
     :현재 제공 DB
-    MariaDB(pymysql)
+    MariaDB(pymysql), SQLite
 
     :param func: 
     :return: 
@@ -28,33 +366,116 @@ def transaction(func):
 
         from server import MainServer
 
-        if type(MainServer.db_connector) is MariaDBHandler:
-            # 사용하는 DB가 Maria DB인 경우 pymysql 트랜잭션 처리 함수 사용
-            # todo: DB 당 트랜젝션 코드를 이곳에 다 적는게 아닌 Connector transaction() 함수를 만들고 오버라이딩 구현으로 DB당 트랜젝션 처리를 하도록 해야할듯
-            
-            try:
-                MainServer.db_connector.connection.begin()
-                data = func(*args, **kwargs)
-                MainServer.db_connector.connection.commit()
-            except Exception as e:
-                MainServer.db_connector.connection.rollback()
-                raise e
-            else:
-                return data
-        else:
-            pass
+        if MainServer.db_connector is None:
+            # DB 를 설정하지 않은 경우 저장하지 않음
+            return None
+
+        with MainServer.db_connector.transaction_scope():
+            return func(*args, **kwargs)
 
     return wrapper
 
 
 class MariaDBHandler(Connector):
+    """
+    MariaDB(pymysql) 연결 객체
+    pymysql 은 이 객체를 만들 때 import 하므로 SQLite 만 사용하는 경우 설치하지 않아도 됨
+    """
+
+    dialect = 'maria_db'
 
-    def __init__(self, host, user, password, db_name):
+    def __init__(self, host, user, password, db_name, pool_size: int = 5, pool_timeout: float = None):
         super().__init__()
-        self.connection = pymysql.connect(host=host, user=user, password=password, db=db_name, charset='utf8')
-        self.cursor = self.connection.cursor(pymysql.cursors.DictCursor)
+        import pymysql
+        import pymysql.cursors
 
-    @classmethod
-    def get_datetime_db_format(cls,
-                               object_datetime: datetime.datetime):
-        return object_datetime.strftime('%Y-%m-%d %H:%M:%S')
+        self._pymysql = pymysql
+        self._connect_args = dict(host=host, user=user, password=password, db=db_name, charset='utf8')
+        self.pool = ConnectionPool(self.connect, pool_size, pool_timeout, validate=self.validate)
+
+    def connect(self):
+        return self._pymysql.connect(**self._connect_args)
+
+    def validate(self, connection) -> bool:
+        connection.ping(reconnect=True)
+        # 끊긴 커넥션은 같은 커넥션 객체로 다시 연결, 다시 연결하지 못하면 예외 발생 (풀이 새 커넥션으로 바꿈)
+        return True
+
+    def open_cursor(self, connection):
+        return connection.cursor(self._pymysql.cursors.DictCursor)
+
+
+def _dict_row(cursor, row) -> dict:
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLiteHandler(Connector):
+    """
+    SQLite 연결 객체
+
+    외부 DB 없이 서버를 실행하는 소규모 사이트(edge 배포)와 벤치마크용
+    - WAL 모드: 쓰기 트랜잭션 중에도 다른 커넥션의 읽기가 막히지 않음
+    - synchronous=NORMAL: COMMIT 마다 fsync 하지 않고 checkpoint 때 함 (전원 장애시 마지막 트랜잭션만 잃을 수 있음)
+    - 쓰기 트랜잭션은 한번에 하나만 실행되므로 BEGIN IMMEDIATE 로 트랜잭션 시작시 쓰기 잠금을 얻음
+      (읽기 트랜잭션이 쓰기로 바뀔 때 생기는 SQLITE_BUSY 를 피함, 잠금 대기는 busy_timeout 까지)
+    결과 저장은 쓰기 지연 큐(WriteBehindQueue)가 모아서 한 트랜잭션으로 저장하므로 COMMIT 횟수가 적음
+    """
+
+    dialect = 'sqlite'
+
+    def __init__(self, path: str, pool_size: int = 4, pool_timeout: float = None, busy_timeout: float = 5.0,
+                 schema_path: str = SQLITE_SCHEMA_PATH):
+        """
+        :param path: DB 파일 경로 (커넥션 마다 따로 열리므로 ':memory:' 는 사용할 수 없음)
+        :param pool_size:
+        :param pool_timeout:
+        :param busy_timeout: 다른 커넥션의 쓰기 잠금 대기 최대 시간 (단위: 초)
+        :param schema_path: 테이블 생성 스크립트 (CREATE TABLE IF NOT EXISTS), None 이면 생성하지 않음
+        """
+        super().__init__()
+        self.path = path
+        self.busy_timeout = busy_timeout
+        self.pool = ConnectionPool(self.connect, pool_size, pool_timeout)
+
+        if schema_path is not None:
+            self.create_schema(schema_path)
+
+    def connect(self):
+        connection = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                                     check_same_thread=False)
+        # 트랜잭션은 begin() 에서 직접 시작, 커넥션은 풀에서 트랜잭션 마다 다른 스레드가 빌려감
+        connection.row_factory = _dict_row
+        connection.execute('PRAGMA journal_mode=WAL')
+        connection.execute('PRAGMA synchronous=NORMAL')
+
+        return connection
+
+    def open_cursor(self, connection):
+        return connection.cursor()
+
+    def begin(self, connection):
+        connection.execute('BEGIN IMMEDIATE')
+
+    def create_schema(self, schema_path: str):
+        with open(schema_path, encoding='utf-8') as file:
+            script = file.read()
+
+        connection = self.connect()
+
+        try:
+            connection.executescript(script)
+        finally:
+            connection.close()
+
+
+def get_dao(interface: str, connector: Connector):
+    """
+    DAO 인터페이스 모듈 이름과 연결 객체의 dialect 로 구현 모듈을 찾음
+
+    ex) get_dao('server.fetch.persist.fetch_dao', SQLiteHandler(...)) -> server.fetch.persist.fetch_dao_sqlite
+
+    :param interface: DAO 인터페이스 모듈 이름
+    :param connector:
+    :return: DAO 구현 모듈
+    """
+    return importlib.import_module('{}_{}'.format(interface, connector.dialect))
@@ -0,0 +1,231 @@
+import threading
+import time
+import traceback
+
+from common import metrics
+
+write_behind_queues = []
+"""
+:type list(WriteBehindQueue)
+
+생성된 WriteBehindQueue 리스트, 서버 종료시 flush_all() 로 남은 데이터를 모두 저장하기 위해 사용
+"""
+
+
+class WriteBehindQueue:
+    """
+    DB 쓰기 지연 큐
+
+    메시지 처리 스레드에서 INSERT + COMMIT 을 바로 실행하지 않고 큐에 쌓아두었다가
+    별도 스레드에서 max_batch 개가 모이거나 max_delay 초가 지나면 한번에 저장함 (group commit)
+
+    저장에 실패하면(DB 연결 끊김, 잠금 대기 초과 등) retry_delay 부터 2배씩 늘려가며 max_retries 번 다시 시도하고
+    그래도 실패하면 묶음을 반씩 나눠 저장해 저장할 수 없는 데이터(중복 키, 제약 조건 위반 등)만 버림 (유실 수만 출력)
+
+    DB 가 내려가 저장이 밀리는 동안 큐가 max_rows 개를 넘으면 새 데이터는 버리고 dropped_rows 로 셈
+    """
+
+    def __init__(self, name: str, flush_func, max_batch: int = 500, max_delay: float = 0.5,
+                 max_retries: int = 3, retry_delay: float = 0.1, max_rows: int = 100000):
+        """
+        :param name: 큐 이름
+        :param flush_func: 모인 데이터 리스트를 저장하는 함수 (rows: list) -> None
+        :param max_batch: 한번에 저장할 최대 데이터 수
+        :param max_delay: 데이터가 큐에 머무를 수 있는 최대 시간 (단위: 초)
+        :param max_retries: 저장 실패시 다시 시도할 횟수
+        :param retry_delay: 첫번째 재시도 전 대기 시간 (단위: 초), 재시도 마다 2배씩 늘어남
+        :param max_rows: 큐에 쌓아둘 수 있는 최대 데이터 수
+        """
+        self.name = name
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_rows = max_rows
+
+        self._flush_func = flush_func
+        self._rows = []
+        self._first_put_time = None
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+
+        self.flush_count = 0
+        self.flushed_rows = 0
+        self.failed_rows = 0
+        # 재시도 후에도 저장하지 못해 유실된 데이터 수
+        self.dropped_rows = 0
+        # 큐가 가득 차 넣지 못하고 버린 데이터 수
+        self.retry_count = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        # 저장 소요 시간 (단위: 초)
+
+        self._is_dropping = False
+        self._thread = None
+        # 저장 스레드, 처음 put() 할 때 실행 (멀티 프로세스 모드에서 fork 전에 스레드가 생기지 않도록)
+
+        write_behind_queues.append(self)
+
+        metrics.registry.collector('hamon_write_behind_depth', '쓰기 지연 큐 저장 대기 수', lambda: self.depth,
+                                   queue=name)
+        metrics.registry.collector('hamon_write_behind_dropped_total', '쓰기 지연 큐가 가득 차 버린 데이터 수',
+                                   lambda: self.dropped_rows, 'counter', queue=name)
+        metrics.registry.collector('hamon_write_behind_flushed_total', '쓰기 지연 큐 저장 수',
+                                   lambda: self.flushed_rows, 'counter', queue=name)
+        metrics.registry.collector('hamon_write_behind_failed_total', '쓰기 지연 큐 저장 실패(유실) 수',
+                                   lambda: self.failed_rows, 'counter', queue=name)
+        metrics.registry.collector('hamon_write_behind_retries_total', '쓰기 지연 큐 저장 재시도 수',
+                                   lambda: self.retry_count, 'counter', queue=name)
+        metrics.registry.collector('hamon_write_behind_max_flush_seconds', '쓰기 지연 큐 최대 저장 시간',
+                                   lambda: self.max_flush_latency, queue=name)
+
+    @property
+    def depth(self) -> int:
+        """
+        :return: 저장 대기 중인 데이터 수
+        """
+        return len(self._rows)
+
+    def put(self, row) -> bool:
+        """
+        :param row:
+        :return: 큐가 가득 차 버린 경우 False
+        """
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='write-behind-{}'.format(self.name),
+                                                daemon=True)
+                self._thread.start()
+
+            if len(self._rows) >= self.max_rows:
+                self.dropped_rows += 1
+
+                if not self._is_dropping:
+                    self._is_dropping = True
+                    print('쓰기 지연 큐 {} 가득 참 ({}건), 저장이 밀리는 동안 새 데이터를 버림'.format(self.name, self.max_rows))
+
+                return False
+
+            self._is_dropping = False
+
+            if not self._rows:
+                self._first_put_time = time.time()
+
+            self._rows.append(row)
+
+            if len(self._rows) >= self.max_batch:
+                self._cond.notify()
+
+        return True
+
+    def flush(self):
+        """
+        큐에 쌓인 데이터를 바로 저장
+        :return:
+        """
+        with self._flush_lock:
+            while True:
+                with self._cond:
+                    rows = self._rows[:self.max_batch]
+                    del self._rows[:self.max_batch]
+
+                    if not self._rows:
+                        self._first_put_time = None
+
+                if not rows:
+                    return
+
+                self._flush_rows(rows)
+
+    def _flush_rows(self, rows: list):
+        start = time.perf_counter()
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    self._flush_func(rows)
+                except Exception:
+                    traceback.print_exc()
+
+                    if attempt == self.max_retries:
+                        self._flush_split(rows)
+                        return
+
+                    self.retry_count += 1
+                    time.sleep(self.retry_delay * 2 ** attempt)
+                else:
+                    self.flushed_rows += len(rows)
+                    return
+        finally:
+            latency = time.perf_counter() - start
+            self.flush_count += 1
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+
+    def _flush_split(self, rows: list):
+        """
+        재시도 후에도 저장하지 못한 묶음을 반씩 나눠 저장, 하나씩 남을 때 까지 나눠도 실패한 데이터만 버림
+        DB 가 내려간 경우에도 계속 나누지 않도록 저장 시도 횟수는 묶음 크기의 log 에 비례하게 제한하고
+        남은 데이터는 유실된 것으로 봄
+
+        :param rows: 저장에 실패한 묶음
+        :return:
+        """
+        budget = 4 * len(rows).bit_length()
+        parts = [rows]
+        lost = 0
+
+        while parts:
+            part = parts.pop()
+
+            if budget == 0:
+                lost += len(part)
+                continue
+
+            if part is not rows:
+                # 처음 묶음은 이미 실패했으므로 바로 나눔
+                budget -= 1
+
+                try:
+                    self._flush_func(part)
+                except Exception:
+                    pass
+                else:
+                    self.flushed_rows += len(part)
+                    continue
+
+            if len(part) == 1:
+                lost += 1
+            else:
+                parts += [part[len(part) // 2:], part[:len(part) // 2]]
+                # 앞쪽 절반부터 저장하도록 스택에 뒤쪽 절반을 먼저 넣음
+
+        if lost:
+            self.failed_rows += lost
+            print('쓰기 지연 큐 {} 저장 실패, 유실된 데이터 {}건'.format(self.name, lost))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if len(self._rows) >= self.max_batch:
+                        break
+
+                    if self._rows:
+                        remain = self._first_put_time + self.max_delay - time.time()
+                        if remain <= 0:
+                            break
+                        self._cond.wait(remain)
+                    else:
+                        self._cond.wait()
+
+            self.flush()
+
+
+def flush_all():
+    """
+    모든 쓰기 지연 큐의 남은 데이터를 저장 (서버 종료시 호출)
+    :return:
+    """
+    for queue in write_behind_queues:
+        queue.flush()
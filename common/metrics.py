@@ -0,0 +1,326 @@
+"""
+서버 지표(metrics) 수집
+
+운영 중에도 켜둘 수 있도록 지표 갱신 비용을 최소화함
+- 지표 객체는 등록 시점(모듈 import, 객체 생성)에 만들어두고 갱신은 미리 만든 객체/리스트의 값만 증가시킴
+- 갱신에 lock 을 사용하지 않으므로 여러 스레드가 같은 지표를 동시에 갱신하면 드물게 누락될 수 있음 (모니터링 용도로 허용)
+- 송신 큐 크기, 진행 중인 패치 수 처럼 이미 다른 객체가 가지고 있는 값은 조회 함수(collector)로 등록해 내보낼 때만 계산함
+
+내보내기
+- MetricsRegistry.snapshot(): 관리 메시지(REQUEST_METRICS) 응답용 딕셔너리
+- MetricsRegistry.render_text(): Prometheus text 형식, start_http_server() 로 localhost HTTP 로 제공
+"""
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from common.protocol.message import CODE_MASK
+
+LATENCY_BUCKETS = (0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+# 처리 시간 히스토그램 기본 구간 상한 (단위: 초)
+
+METRICS_HOST = '127.0.0.1'
+# 지표 HTTP 서버 ip, 외부에 노출하지 않도록 loopback 에서만 받음
+
+
+def _series(name: str, labels: tuple) -> str:
+    """
+    :param name: 지표 이름
+    :param labels: ((label 이름, 값), ...)
+    :return: 'name{label="값",...}' 형식 이름
+    """
+    if not labels:
+        return name
+
+    return '{}{{{}}}'.format(name, ','.join('{}="{}"'.format(key, value) for key, value in labels))
+
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        return repr(value)
+
+    return str(int(value))
+
+
+class Counter:
+    """
+    누적 값 지표
+    """
+    __slots__ = ('name', 'help', 'labels', 'value')
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.value = 0
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self) -> list:
+        return [(_series(self.name, self.labels), self.value)]
+
+    def snapshot(self) -> dict:
+        return {_series(self.name, self.labels): self.value}
+
+
+class Histogram:
+    """
+    구간 별 횟수 지표 (처리 시간 분포)
+
+    counts[i] 는 bounds[i - 1] 초과 bounds[i] 이하 값의 횟수, 마지막 칸은 bounds[-1] 초과 값의 횟수
+    """
+    __slots__ = ('name', 'help', 'labels', 'bounds', 'counts', 'sum')
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, bounds: tuple = LATENCY_BUCKETS, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(self.counts)
+
+    def samples(self) -> list:
+        samples = []
+        cumulative = 0
+
+        for bound, count in zip(self.bounds + (float('inf'),), self.counts):
+            cumulative += count
+            le = '+Inf' if bound == float('inf') else repr(bound)
+            samples.append((_series(self.name + '_bucket', self.labels + (('le', le),)), cumulative))
+
+        samples.append((_series(self.name + '_sum', self.labels), self.sum))
+        samples.append((_series(self.name + '_count', self.labels), cumulative))
+
+        return samples
+
+    def snapshot(self) -> dict:
+        counts = list(self.counts)
+
+        return {_series(self.name, self.labels): {
+            "count": sum(counts),
+            "sum": self.sum,
+            "buckets": [[bound, count] for bound, count in zip(self.bounds + (None,), counts) if count]
+            # [구간 상한 (None: 마지막 구간 초과), 횟수], 횟수가 0 인 구간은 생략
+        }}
+
+
+class CodeCounter:
+    """
+    메시지 코드 별 누적 값 지표
+
+    코드(CODE_MASK) 수 만큼 미리 할당한 리스트를 코드로 바로 갱신함 (딕셔너리 조회, 객체 생성 없음)
+    """
+    __slots__ = ('name', 'help', 'labels', 'values')
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = [0] * (CODE_MASK + 1)
+
+    def inc(self, code: int, amount=1):
+        """
+        :param code: 메시지 코드 (COMPRESSED_FLAG, BINARY_FLAG 제외)
+        :param amount:
+        :return:
+        """
+        self.values[code] += amount
+
+    def samples(self) -> list:
+        return [(_series(self.name, self.labels + (('code', code),)), value)
+                for code, value in enumerate(list(self.values)) if value]
+
+    def snapshot(self) -> dict:
+        return dict(self.samples())
+
+
+class Collector:
+    """
+    조회 함수 지표, 내보낼 때 func() 를 호출해 값을 계산함
+
+    func() 는 값을 반환하거나 label 을 지정한 경우 (label 값 -> 값) 딕셔너리를 반환함, None 이면 내보내지 않음
+    """
+    __slots__ = ('name', 'help', 'labels', 'func', 'label', 'kind')
+
+    def __init__(self, name: str, help: str, func, kind: str = 'gauge', label: str = None, labels: tuple = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.func = func
+        self.label = label
+        self.kind = kind
+
+    def samples(self) -> list:
+        try:
+            value = self.func()
+        except Exception:
+            # 조회 중 대상 객체가 바뀌는 경우 (클라이언트 종료 등) 이번 조회는 생략
+            return []
+
+        if value is None:
+            return []
+
+        if self.label is None:
+            return [(_series(self.name, self.labels), value)]
+
+        return [(_series(self.name, self.labels + ((self.label, key),)), item) for key, item in value.items()
+                if item is not None]
+
+    def snapshot(self) -> dict:
+        return dict(self.samples())
+
+
+class MetricsRegistry:
+    """
+    지표 목록
+
+    같은 이름, label 로 다시 등록하면 이미 등록된 지표 객체를 반환함
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        """
+        :type dict(tuple, object)
+        (이름, labels) -> 지표 객체, 등록 순서대로 내보냄
+        """
+        self._lock = threading.Lock()
+        # 등록시에만 사용
+
+    def _register(self, key: tuple, factory):
+        with self._lock:
+            metric = self._metrics.get(key)
+
+            if metric is None:
+                metric = self._metrics[key] = factory()
+
+            return metric
+
+    def counter(self, name: str, help: str, **labels) -> Counter:
+        labels = tuple(sorted(labels.items()))
+        return self._register((name, labels), lambda: Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, bounds: tuple = LATENCY_BUCKETS, **labels) -> Histogram:
+        labels = tuple(sorted(labels.items()))
+        return self._register((name, labels), lambda: Histogram(name, help, bounds, labels))
+
+    def code_counter(self, name: str, help: str, **labels) -> CodeCounter:
+        labels = tuple(sorted(labels.items()))
+        return self._register((name, labels), lambda: CodeCounter(name, help, labels))
+
+    def collector(self, name: str, help: str, func, kind: str = 'gauge', label: str = None, **labels) -> Collector:
+        """
+        :param name:
+        :param help:
+        :param func: 값 조회 함수
+        :param kind: 'gauge' (현재 값) 혹은 'counter' (누적 값)
+        :param label: func() 가 딕셔너리를 반환하는 경우 딕셔너리 key 를 값으로 가지는 label 이름
+        :param labels: 고정 label
+        :return:
+        """
+        labels = tuple(sorted(labels.items()))
+        key = (name, labels)
+
+        with self._lock:
+            metric = self._metrics[key] = Collector(name, help, func, kind, label, labels)
+            # 조회 대상 객체가 새로 만들어진 경우(서버 재시작) 새 함수로 교체
+
+        return metric
+
+    def metrics(self) -> list:
+        with self._lock:
+            return list(self._metrics.values())
+
+    def snapshot(self) -> dict:
+        """
+        :return: 시리즈 이름 ('name{label="값"}') -> 값, 히스토그램은 {count, sum, buckets}
+        """
+        snapshot = {}
+
+        for metric in self.metrics():
+            snapshot.update(metric.snapshot())
+
+        return snapshot
+
+    def render_text(self) -> str:
+        """
+        :return: Prometheus text 형식 (version 0.0.4)
+        """
+        families = {}
+        # 이름 -> 지표 리스트, 같은 이름(label 만 다른) 지표는 한 묶음으로 내보내야 함
+
+        for metric in self.metrics():
+            families.setdefault(metric.name, []).append(metric)
+
+        lines = []
+
+        for name, metrics in families.items():
+            lines.append('# HELP {} {}'.format(name, metrics[0].help))
+            lines.append('# TYPE {} {}'.format(name, metrics[0].kind))
+
+            for metric in metrics:
+                lines += ['{} {}'.format(series, _format_value(value)) for series, value in metric.samples()]
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+"""
+서버 전체 지표 목록
+"""
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    """
+    GET /metrics -> registry.render_text()
+    """
+
+    def do_GET(self):
+        if self.path.split('?')[0] not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+
+        body = self.server.registry.render_text().encode('utf-8')
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+        # 요청 마다 출력하지 않음
+
+
+def start_http_server(port: int, host: str = METRICS_HOST, metrics_registry: MetricsRegistry = registry):
+    """
+    지표 HTTP 서버를 별도 스레드로 실행
+
+    :param port:
+    :param host:
+    :param metrics_registry:
+    :return: ThreadingHTTPServer, 종료시 shutdown(), server_close() 호출
+    """
+    server = ThreadingHTTPServer((host, port), MetricsRequestHandler)
+    server.daemon_threads = True
+    server.registry = metrics_registry
+
+    threading.Thread(target=server.serve_forever, name='metrics-http', daemon=True).start()
+
+    return server
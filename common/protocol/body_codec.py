@@ -0,0 +1,418 @@
+import struct
+
+from common.protocol.message import ORDER_FETCH, RESULT_FETCH, RESULT_PREPARE_FETCH, RESPONSE_CLIENT_STATE, \
+    ABORT_FETCH, RELAY_UPDATE, ip_to_bytes, bytes_to_ip
+
+BINARY_CODEC = 'binary'
+# CLIENT_WELCOME 에서 협상하는 body 형식 이름
+
+_COUNT = struct.Struct('<I')
+_STR_SIZE = struct.Struct('<H')
+
+_SCALARS = {
+    'bool': struct.Struct('<?'),
+    'u8': struct.Struct('<B'),
+    'u16': struct.Struct('<H'),
+    'u32': struct.Struct('<I'),
+    'u64': struct.Struct('<Q'),
+}
+
+IP_SIZE = 4
+
+_ip_strings = {}
+# 4byte ip(int) -> ip 문자열 캐시 (열 형식 디코딩)
+
+
+class UnsupportedBody(ValueError):
+    """
+    스키마로 표현할 수 없는 body (스키마에 없는 key, 타입/범위가 맞지 않는 값), JSON 으로 보내야 함
+    """
+    pass
+
+
+def _pack_ip(ip) -> bytes:
+    try:
+        return ip_to_bytes(ip)
+    except (OSError, TypeError, AttributeError):
+        raise UnsupportedBody(ip)
+
+
+def _unpack_ips(buffer, pos: int, count: int) -> list:
+    """
+    열 형식 ip 디코딩, 4byte 정수로 한번에 읽고 캐시에서 문자열을 찾음
+    """
+    values = struct.unpack_from('>{}I'.format(count), buffer, pos)
+
+    try:
+        return list(map(_ip_strings.__getitem__, values))
+    except KeyError:
+        if len(_ip_strings) + count > 65536:
+            _ip_strings.clear()
+
+        for value in values:
+            if value not in _ip_strings:
+                _ip_strings[value] = bytes_to_ip(value.to_bytes(IP_SIZE, 'big'))
+
+        return list(map(_ip_strings.__getitem__, values))
+
+
+def _check_scalar(kind: str, value):
+    if kind == 'bool':
+        if type(value) is not bool:
+            raise UnsupportedBody(value)
+    elif type(value) is not int:
+        raise UnsupportedBody(value)
+
+
+class Struct:
+    """
+    dict 스키마 (필드 이름 -> 타입)
+
+    필드는 모두 생략 가능하며 body 앞의 presence bitmap 으로 key 가 있는 필드를, 이어지는 null bitmap 으로
+    값이 None 인 필드를 표시함 (None 인 필드는 값을 기록하지 않음)
+    디코딩한 dict 에는 key 가 있던 필드만 들어있고 None 값도 그대로 유지되므로 JSON 으로 보낸 것과 같음
+    """
+
+    def __init__(self, *fields):
+        """
+        :param fields: (필드 이름, 타입) 튜플, 타입은 'bool', 'u8', 'u16', 'u32', 'u64', 'ip', 'str', Struct, List
+        """
+        self.fields = fields
+        self.names = frozenset(name for name, _ in fields)
+        self.bitmap_size = (len(fields) + 7) // 8
+
+    def encode(self, out: bytearray, value):
+        if type(value) is not dict or not self.names.issuperset(value):
+            raise UnsupportedBody(value)
+
+        bitmap_pos = len(out)
+        null_pos = bitmap_pos + self.bitmap_size
+        out += bytes(self.bitmap_size * 2)
+
+        for index, (name, kind) in enumerate(self.fields):
+            if name not in value:
+                continue
+
+            field = value[name]
+            out[bitmap_pos + index // 8] |= 1 << index % 8
+
+            if field is None:
+                out[null_pos + index // 8] |= 1 << index % 8
+            else:
+                _encode_value(out, kind, field)
+
+    def decode(self, buffer, pos: int) -> tuple:
+        bitmap = buffer[pos:pos + self.bitmap_size]
+        nulls = buffer[pos + self.bitmap_size:pos + self.bitmap_size * 2]
+        pos += self.bitmap_size * 2
+        value = {}
+
+        if len(nulls) != self.bitmap_size:
+            raise IndexError('bitmap')
+
+        for index, (name, kind) in enumerate(self.fields):
+            if not bitmap[index // 8] & 1 << index % 8:
+                continue
+
+            if nulls[index // 8] & 1 << index % 8:
+                value[name] = None
+            else:
+                value[name], pos = _decode_value(buffer, pos, kind)
+
+        return value, pos
+
+
+class List:
+    """
+    리스트 스키마
+
+    원소가 Struct 이고 Struct 필드가 모두 스칼라/문자열이며 필드 별로 모든 원소에 key 가 있거나 모두 없고
+    값이 모두 None 이거나 모두 None 이 아니면 열(column) 단위로 기록함 (열 형식), 숫자/ip 는 한번의 unpack 으로, 문자열은 NUL 로 이어붙여 한번에 디코딩하므로
+    원소가 많은 리스트(ORDER_FETCH targets 등)도 원소 수 만큼 파이썬 코드를 실행하지 않음
+    그 외에는 원소 별로 기록함 (행 형식)
+
+    count(4byte) + 형식(1byte) + 데이터
+    """
+
+    ROWS = 0
+    COLUMNS = 1
+
+    def __init__(self, item):
+        self.item = item
+        self.is_columnar = isinstance(item, Struct) and all(type(kind) is str for _, kind in item.fields)
+
+    def encode(self, out: bytearray, value):
+        if type(value) is not list:
+            raise UnsupportedBody(value)
+
+        out += _COUNT.pack(len(value))
+
+        if self.is_columnar and value and self._encode_columns(out, value):
+            return
+
+        out.append(List.ROWS)
+
+        for item in value:
+            _encode_value(out, self.item, item)
+
+    def _encode_columns(self, out: bytearray, items: list) -> bool:
+        fields = self.item.fields
+        columns = []
+        bitmap = bytearray(self.item.bitmap_size)
+        nulls = bytearray(self.item.bitmap_size)
+
+        for item in items:
+            if type(item) is not dict or not self.item.names.issuperset(item):
+                raise UnsupportedBody(item)
+
+        for index, (name, kind) in enumerate(fields):
+            present = sum(1 for item in items if name in item)
+
+            if present == 0:
+                continue
+
+            if present != len(items):
+                # 일부 원소에만 있는 필드는 열 형식으로 표현할 수 없음
+                return False
+
+            column = [item[name] for item in items]
+            null_count = column.count(None)
+            bitmap[index // 8] |= 1 << index % 8
+
+            if null_count == len(column):
+                nulls[index // 8] |= 1 << index % 8
+            elif null_count:
+                # 일부 원소만 None 인 필드도 열 형식으로 표현할 수 없음
+                return False
+            else:
+                columns.append((kind, column))
+
+        out.append(List.COLUMNS)
+        out += bitmap
+        out += nulls
+
+        for kind, column in columns:
+            if kind == 'str':
+                if any(type(field) is not str or '\0' in field for field in column):
+                    raise UnsupportedBody(column)
+
+                data = '\0'.join(column).encode('utf-8')
+                out += _COUNT.pack(len(data))
+                out += data
+            elif kind == 'ip':
+                out += b''.join(map(_pack_ip, column))
+                # 4byte ip 를 이어붙인 형식 (big endian 정수 배열과 같음)
+            else:
+                for field in column:
+                    _check_scalar(kind, field)
+
+                try:
+                    out += struct.pack('<{}{}'.format(len(column), _SCALARS[kind].format[1:]), *column)
+                except struct.error:
+                    raise UnsupportedBody(column)
+
+        return True
+
+    def decode(self, buffer, pos: int) -> tuple:
+        count, = _COUNT.unpack_from(buffer, pos)
+        layout = buffer[pos + _COUNT.size]
+        pos += _COUNT.size + 1
+
+        if layout == List.ROWS:
+            items = []
+
+            for _ in range(count):
+                item, pos = _decode_value(buffer, pos, self.item)
+                items.append(item)
+
+            return items, pos
+
+        fields = self.item.fields
+        bitmap = buffer[pos:pos + self.item.bitmap_size]
+        nulls = buffer[pos + self.item.bitmap_size:pos + self.item.bitmap_size * 2]
+        pos += self.item.bitmap_size * 2
+        names = []
+        columns = []
+
+        if len(nulls) != self.item.bitmap_size:
+            raise IndexError('bitmap')
+
+        for index, (name, kind) in enumerate(fields):
+            if not bitmap[index // 8] & 1 << index % 8:
+                continue
+
+            if nulls[index // 8] & 1 << index % 8:
+                column = (None,) * count
+            elif kind == 'str':
+                size, = _COUNT.unpack_from(buffer, pos)
+                pos += _COUNT.size
+                column = bytes(buffer[pos:pos + size]).decode('utf-8').split('\0')
+                pos += size
+
+                if len(column) != count:
+                    raise ValueError('올바르지 않은 문자열 열 입니다')
+            elif kind == 'ip':
+                column = _unpack_ips(buffer, pos, count)
+                pos += IP_SIZE * count
+            else:
+                column_format = struct.Struct('<{}{}'.format(count, _SCALARS[kind].format[1:]))
+                column = column_format.unpack_from(buffer, pos)
+                pos += column_format.size
+
+            names.append(name)
+            columns.append(column)
+
+        if not names:
+            return [{} for _ in range(count)], pos
+
+        return [dict(zip(names, row)) for row in zip(*columns)], pos
+
+
+def _encode_value(out: bytearray, kind, value):
+    if type(kind) is not str:
+        kind.encode(out, value)
+    elif kind == 'str':
+        if type(value) is not str:
+            raise UnsupportedBody(value)
+
+        data = value.encode('utf-8')
+
+        if len(data) > 0xFFFF:
+            raise UnsupportedBody(value)
+
+        out += _STR_SIZE.pack(len(data))
+        out += data
+    elif kind == 'ip':
+        out += _pack_ip(value)
+    else:
+        _check_scalar(kind, value)
+
+        try:
+            out += _SCALARS[kind].pack(value)
+        except struct.error:
+            raise UnsupportedBody(value)
+
+
+def _decode_value(buffer, pos: int, kind) -> tuple:
+    if type(kind) is not str:
+        return kind.decode(buffer, pos)
+
+    if kind == 'str':
+        size, = _STR_SIZE.unpack_from(buffer, pos)
+        pos += _STR_SIZE.size
+        return bytes(buffer[pos:pos + size]).decode('utf-8'), pos + size
+
+    if kind == 'ip':
+        if len(buffer) < pos + IP_SIZE:
+            raise IndexError('ip')
+
+        return bytes_to_ip(bytes(buffer[pos:pos + IP_SIZE])), pos + IP_SIZE
+
+    scalar = _SCALARS[kind]
+    value, = scalar.unpack_from(buffer, pos)
+
+    return value, pos + scalar.size
+
+
+FILE = Struct(
+    ('no', 'u32'),
+    ('md5', 'str'),
+    ('name', 'str'),
+    ('ext', 'str'),
+    ('size', 'u64'),
+)
+
+SCHEMAS = {
+    ORDER_FETCH: Struct(
+        # 파일 제공자 -> 서버 (패치 요청)
+        ('targets', List(Struct(('ip', 'ip'), ('path', 'str')))),
+        ('sender_ip', 'ip'),
+        ('start_date', 'str'),
+        ('file', FILE),
+        # 서버 -> 대상 클라이언트 (패치 준비 요청)
+        ('fetch_no', 'u32'),
+        ('fetch_file_no', 'u32'),
+        ('path', 'str'),
+        ('resume_offset', 'u64'),
+        ('relay', Struct(('port', 'u16'), ('parent', 'ip'), ('children', List('ip')))),
+    ),
+    RESULT_FETCH: Struct(
+        ('fetch_no', 'u32'),
+        ('is_complete', 'bool'),
+        ('fail_cause', 'u8'),
+        ('end_date', 'str'),
+    ),
+    RESULT_PREPARE_FETCH: Struct(
+        ('fetch_no', 'u32'),
+        ('is_success', 'bool'),
+        ('is_cached', 'bool'),
+        ('use_credit', 'bool'),
+        ('fail_clients_ip', List('ip')),
+    ),
+    RESPONSE_CLIENT_STATE: List(Struct(
+        ('ip', 'ip'),
+        ('state', 'u8'),
+        ('working_info', Struct(('fetch_id', 'u32'), ('state', 'u8'))),
+    )),
+    ABORT_FETCH: Struct(
+        ('fetch_no', 'u32'),
+        ('fail_cause', 'u8'),
+    ),
+    RELAY_UPDATE: Struct(
+        ('fetch_no', 'u32'),
+        # 서버 -> 중계 클라이언트 (하위 클라이언트 목록 변경, 중계 종료)
+        ('children', List('ip')),
+        ('is_done', 'bool'),
+        # 중계 클라이언트 -> 서버 (전달하지 못한 하위 클라이언트)
+        ('failed_children', List('ip')),
+    ),
+}
+"""
+:type dict(int, Struct | List)
+
+바이너리 body 를 사용할 수 있는 메시지 코드 별 스키마
+스키마를 바꿀 때는 필드를 뒤에 추가만 해야 이전 클라이언트와 호환됨 (presence bitmap 순서)
+"""
+
+
+def encode(code: int, data) -> bytes:
+    """
+    :param code: 메시지 코드
+    :param data: body 데이터 (JSON 으로 보내던 dict / list)
+    :return: 바이너리 body, 스키마가 없거나 스키마로 표현할 수 없으면 None (JSON 으로 보내야 함)
+    """
+    schema = SCHEMAS.get(code)
+
+    if schema is None:
+        return None
+
+    out = bytearray()
+
+    try:
+        schema.encode(out, data)
+    except UnsupportedBody:
+        return None
+
+    return bytes(out)
+
+
+def decode(code: int, body):
+    """
+    :param code: 메시지 코드 (BINARY_FLAG 제외)
+    :param body: 바이너리 body
+    :return: body 데이터 (dict / list), 올바르지 않은 body 인 경우 ValueError 발생
+    """
+    schema = SCHEMAS.get(code)
+
+    if schema is None:
+        raise ValueError('바이너리 body 스키마가 없는 메시지 코드입니다 : {}'.format(code))
+
+    try:
+        data, pos = schema.decode(body, 0)
+    except (struct.error, IndexError, ValueError) as e:
+        raise ValueError('올바르지 않은 바이너리 body 입니다 : {}'.format(e))
+
+    if pos != len(body):
+        raise ValueError('올바르지 않은 바이너리 body 크기입니다')
+
+    return data
@@ -0,0 +1,158 @@
+import threading
+
+from common import metrics
+
+MIN_BUFFER_SIZE = 1024 * 4
+# 가장 작은 버퍼 크기, 버퍼 크기는 MIN_BUFFER_SIZE 부터 2배씩 커지는 크기 중 하나
+MAX_BUFFER_SIZE = 1024 * 1024 * 16
+# 풀에서 관리하는 가장 큰 버퍼 크기, 넘는 크기는 매번 할당함
+
+
+class BufferPool:
+    """
+    메시지 body 수신 버퍼 풀
+
+    SEND_FILE_CHUNK 처럼 크고 자주 받는 메시지마다 bytearray 를 새로 할당하면 할당/0 초기화 비용과
+    큰 메모리 블록 반환(munmap)이 반복되므로 크기 별(2의 거듭제곱)로 다 쓴 버퍼를 모아두고 재사용함
+
+    - acquire(size): size 이상인 버퍼를 꺼냄 (내용은 초기화하지 않음)
+    - release(buffer): 다 쓴 버퍼를 돌려줌, 버퍼를 참조하는 memoryview 가 남아있으면(송신 큐, checksum 등에서 사용 중)
+      바로 재사용하지 않고 보류해 두었다가 참조가 모두 사라진 후 재사용함
+      bytearray 는 memoryview 가 남아있으면 크기를 바꿀 수 없으므로(BufferError) 이것으로 사용 중 여부를 확인함
+    """
+
+    def __init__(self, max_buffers: int = 32):
+        """
+        :param max_buffers: 크기 별로 보관할 최대 버퍼 수 (보류 중인 버퍼 포함)
+        """
+        self.max_buffers = max_buffers
+
+        self._free = {}
+        """
+        :type dict(int, list(bytearray))
+        버퍼 크기 -> 재사용 가능한 버퍼 리스트
+        """
+        self._pending = {}
+        """
+        :type dict(int, list(bytearray))
+        버퍼 크기 -> 돌려받았지만 아직 참조가 남아있는 버퍼 리스트
+        """
+        self._lock = threading.Lock()
+
+        self.allocated = 0
+        # 새로 할당한 버퍼 수
+        self.reused = 0
+        # 재사용한 버퍼 수
+
+    @staticmethod
+    def size_class(size: int) -> int:
+        """
+        :param size: 필요한 크기
+        :return: size 를 담을 수 있는 버퍼 크기
+        """
+        return max(MIN_BUFFER_SIZE, 1 << (size - 1).bit_length())
+
+    def acquire(self, size: int) -> bytearray:
+        """
+        :param size: 필요한 크기
+        :return: size 이상인 bytearray, MAX_BUFFER_SIZE 보다 크면 size 크기로 새로 할당
+        """
+        if size > MAX_BUFFER_SIZE:
+            self.allocated += 1
+            return bytearray(size)
+
+        buffer_size = self.size_class(size)
+
+        with self._lock:
+            free = self._free.get(buffer_size)
+
+            if not free:
+                free = self._reclaim(buffer_size)
+
+            if free:
+                self.reused += 1
+                return free.pop()
+
+            self.allocated += 1
+
+        buffer = bytearray(buffer_size)
+        self._is_exported(buffer)
+        # 사용 중 확인(append)으로 인한 재할당이 할당 시 한번만 일어나도록 미리 여유 공간을 만들어 둠
+
+        return buffer
+
+    def release(self, buffer: bytearray):
+        """
+        다 쓴 버퍼를 풀에 돌려줌
+        돌려준 후에는 버퍼와 버퍼의 memoryview 를 사용하면 안 됨 (계속 사용할 memoryview 는 버퍼를 재사용하지 않음)
+
+        :param buffer: acquire() 로 꺼낸 버퍼
+        :return:
+        """
+        buffer_size = len(buffer)
+
+        if buffer_size > MAX_BUFFER_SIZE or buffer_size != self.size_class(buffer_size):
+            return
+
+        with self._lock:
+            free = self._free.setdefault(buffer_size, [])
+            pending = self._pending.setdefault(buffer_size, [])
+
+            if len(free) + len(pending) >= self.max_buffers:
+                return
+            # 보관할 수 있는 수를 넘으면 버리고 gc 에 맡김
+
+            if self._is_exported(buffer):
+                pending.append(buffer)
+            else:
+                free.append(buffer)
+
+    def _reclaim(self, buffer_size: int) -> list:
+        """
+        보류 중인 버퍼 중 참조가 모두 사라진 버퍼를 재사용 가능한 버퍼로 옮김
+
+        :param buffer_size:
+        :return: 재사용 가능한 버퍼 리스트
+        """
+        free = self._free.setdefault(buffer_size, [])
+        pending = self._pending.get(buffer_size)
+
+        if pending:
+            still_pending = []
+
+            for buffer in pending:
+                (still_pending if self._is_exported(buffer) else free).append(buffer)
+
+            self._pending[buffer_size] = still_pending
+
+        return free
+
+    @staticmethod
+    def _is_exported(buffer: bytearray) -> bool:
+        """
+        :param buffer:
+        :return: 버퍼를 참조하는 memoryview 가 남아있으면 True
+        """
+        try:
+            buffer.append(0)
+        except BufferError:
+            return True
+
+        del buffer[-1]
+        return False
+
+    def clear(self):
+        with self._lock:
+            self._free.clear()
+            self._pending.clear()
+
+
+buffer_pool = BufferPool()
+"""
+FrameDecoder 가 기본으로 사용하는 프로세스 공용 버퍼 풀
+"""
+
+metrics.registry.collector('hamon_buffer_pool_allocated_total', '버퍼 풀에서 새로 할당한 버퍼 수',
+                           lambda: buffer_pool.allocated, 'counter')
+metrics.registry.collector('hamon_buffer_pool_reused_total', '버퍼 풀에서 재사용한 버퍼 수',
+                           lambda: buffer_pool.reused, 'counter')
@@ -0,0 +1,140 @@
+import bz2
+import lzma
+import threading
+import zlib
+
+from common.protocol.message import MAX_BODY_SIZE
+
+COMPRESS_MIN_SIZE = 1024
+# 압축을 시도할 최소 body 크기, 작은 메시지는 압축 효과보다 비용이 큼
+
+
+def _bounded_decompress(make_decompressor):
+    """
+    압축 해제 크기를 제한하는 해제 함수 생성
+    작은 압축 데이터가 아주 큰 데이터로 풀리는 경우(압축 폭탄) 전체를 메모리에 풀기 전에 중단함
+
+    :param make_decompressor: decompress(data, max_length) 와 eof 를 제공하는 해제 객체 생성 함수
+    :return: (data, max_length) -> bytes, max_length 를 넘거나 압축 데이터가 완전하지 않으면 ValueError 발생
+    """
+    def decompress(data, max_length: int) -> bytes:
+        decompressor = make_decompressor()
+        body = decompressor.decompress(data, max_length + 1)
+
+        if len(body) > max_length:
+            raise ValueError('압축 해제 크기가 최대 크기({})를 넘었습니다'.format(max_length))
+
+        if not decompressor.eof:
+            raise ValueError('압축 데이터가 완전하지 않습니다')
+
+        return body
+
+    return decompress
+
+
+CODECS = {
+    'zlib': (lambda data: zlib.compress(data, 1), _bounded_decompress(zlib.decompressobj)),
+    'lzma': (lambda data: lzma.compress(data, preset=0), _bounded_decompress(lzma.LZMADecompressor)),
+    'bz2': (lambda data: bz2.compress(data, 1), _bounded_decompress(bz2.BZ2Decompressor)),
+}
+"""
+:type dict(str, tuple(function, function))
+
+지원하는 압축 방식 (이름 -> (압축 함수, 해제 함수)), 연결 별로 CLIENT_WELCOME 에서 하나를 정함
+파일 조각은 전달 지연이 없도록 압축률 보다 속도 위주의 설정을 사용
+"""
+
+SUPPORTED_CODECS = ('zlib', 'lzma', 'bz2')
+# 서버 선호 순서
+
+
+def choose_codec(codecs) -> str:
+    """
+    :param codecs: 클라이언트가 지원하는 압축 방식 리스트 (클라이언트 선호 순서)
+    :return: 사용할 압축 방식, 같이 지원하는 방식이 없으면 None
+    """
+    for codec in codecs or ():
+        if codec in CODECS:
+            return codec
+
+    return None
+
+
+def compress(codec: str, data) -> bytes:
+    return CODECS[codec][0](data)
+
+
+def decompress(codec: str, data, max_length: int = MAX_BODY_SIZE) -> bytes:
+    """
+    :param codec:
+    :param data: 압축된 body
+    :param max_length: 최대 해제 크기, 기본값은 header 로 받을 수 있는 최대 body 크기
+    :return: 해제한 body, max_length 를 넘거나 압축 데이터가 완전하지 않으면 ValueError 발생
+    """
+    return CODECS[codec][1](data, max_length)
+
+
+class AdaptiveCompression:
+    """
+    메시지 코드 별 압축률을 측정해 압축 효과가 없는 경우 압축을 건너뜀
+
+    이미 압축된 파일(zip, jpg 등)의 조각은 압축해도 크기가 거의 줄지 않고 CPU 만 사용하므로
+    압축률(압축 후 크기 / 원래 크기)이 max_ratio 를 넘으면 skip_count 번 동안 압축하지 않고 보낸 뒤 다시 측정함
+    """
+
+    def __init__(self, max_ratio: float = 0.9, skip_count: int = 32):
+        self.max_ratio = max_ratio
+        self.skip_count = skip_count
+
+        self._skips = {}
+        """
+        :type dict(int, int)
+        메시지 코드 -> 압축하지 않고 보낼 남은 횟수
+        """
+        self._lock = threading.Lock()
+
+        self.raw_bytes = 0
+        self.compressed_bytes = 0
+        # 압축을 시도한 body 의 압축 전/후 크기 합
+        self.skipped_count = 0
+
+    def should_compress(self, code: int) -> bool:
+        with self._lock:
+            remain = self._skips.get(code, 0)
+
+            if remain:
+                self._skips[code] = remain - 1
+                self.skipped_count += 1
+                return False
+
+            return True
+
+    def record(self, code: int, raw_size: int, compressed_size: int) -> bool:
+        """
+        압축 결과 기록
+
+        :param code:
+        :param raw_size: 압축 전 크기
+        :param compressed_size: 압축 후 크기
+        :return: 압축 효과가 있으면 True
+        """
+        is_effective = compressed_size <= raw_size * self.max_ratio
+
+        with self._lock:
+            self.raw_bytes += raw_size
+            self.compressed_bytes += compressed_size
+
+            if not is_effective:
+                self._skips[code] = self.skip_count
+
+        return is_effective
+
+    @property
+    def ratio(self) -> float:
+        """
+        :return: 누적 압축률
+        """
+        return self.compressed_bytes / self.raw_bytes if self.raw_bytes else 1.0
+
+
+adaptive_compression = AdaptiveCompression()
@@ -0,0 +1,167 @@
+import socket
+
+from common.protocol.buffer_pool import buffer_pool
+from common.protocol.message import Header, Message, HEADER_SIZE
+
+SMALL_BODY_SIZE = 512
+# 이 크기 이하인 body 는 버퍼 풀을 사용하지 않고 bytes 로 복사 (작은 객체 할당이 더 빠름)
+
+
+class FrameDecoder:
+    """
+    연결 별 메시지 프레임 디코더
+
+    non-blocking 소켓에서 읽을 수 있는 만큼만 미리 할당한 bytearray 에 recv_into() 로 받고
+    완성된 메시지들만 돌려줌, 메시지가 덜 들어온 경우 받은 만큼 보관해두고 바로 반환하므로
+    한 클라이언트가 메시지를 천천히 보내더라도 selectors 스레드가 멈추지 않음
+
+    - 수신 버퍼보다 작은 메시지: 수신 버퍼에 모아서 디코딩
+    - 수신 버퍼보다 큰 메시지(SEND_FILE 등): 메시지 크기 이상인 버퍼를 버퍼 풀에서 한번 꺼내고
+      남은 body 는 그 버퍼에 바로 recv_into() 하여 bytes 이어붙이기로 인한 반복 복사를 없앰
+
+    SMALL_BODY_SIZE 보다 큰 body 는 버퍼 풀의 버퍼에 담아 memoryview 로 전달하므로 메시지 처리 후
+    Message.release() 를 호출해 버퍼를 돌려줘야 재사용됨 (호출하지 않으면 gc 가 정리)
+    """
+
+    def __init__(self, buffer_size: int = 1024 * 256, pool=buffer_pool):
+        """
+        :param buffer_size: 수신 버퍼 크기
+        :param pool: body 버퍼 풀 (BufferPool), None 이면 메시지 마다 body 를 새로 할당
+        """
+        self._pool = pool
+        self._buffer = bytearray(buffer_size)
+        self._view = memoryview(self._buffer)
+        self._start = 0
+        # 아직 디코딩 하지 않은 데이터 시작 위치
+        self._end = 0
+        # 수신 버퍼에 받은 데이터 끝 위치
+
+        self._header = None
+        # body 를 기다리고 있는 메시지 header
+
+        self._body = None
+        self._body_view = None
+        self._body_pos = 0
+        self._body_size = 0
+        # 수신 버퍼보다 큰 body 를 직접 받고 있는 경우 사용
+
+        self.received_bytes = 0
+
+    def read_from(self, channel: socket.socket) -> list:
+        """
+        소켓에서 한번 읽고 완성된 메시지들을 반환
+
+        :param channel: non-blocking 클라이언트 통신 소켓
+        :return: 완성된 Message 리스트, 완성된 메시지가 없으면 빈 리스트
+        :raise ConnectionError: 연결이 종료된 경우
+        :raise ValueError: header 가 올바르지 않은 경우
+        """
+        if self._body is not None:
+            return self._read_large_body(channel)
+
+        if self._start == self._end:
+            self._start = self._end = 0
+        else:
+            needed = HEADER_SIZE if self._header is None else self._header.SIZE
+
+            if len(self._buffer) - self._start < needed or self._end == len(self._buffer):
+                self._compact()
+
+        try:
+            received = channel.recv_into(self._view[self._end:])
+        except (BlockingIOError, InterruptedError):
+            return []
+
+        if received == 0:
+            raise ConnectionError('connection closed')
+
+        self.received_bytes += received
+        self._end += received
+
+        return self._decode_buffer()
+
+    def _decode_buffer(self) -> list:
+        messages = []
+
+        while True:
+            if self._header is None:
+                if self._end - self._start < HEADER_SIZE:
+                    break
+
+                self._header = Header.decode(self._view, self._start)
+                self._start += HEADER_SIZE
+
+            size = self._header.SIZE
+            available = self._end - self._start
+
+            if available >= size:
+                messages.append(self._make_message(self._header, self._view[self._start:self._start + size]))
+                self._start += size
+                self._header = None
+            elif size > len(self._buffer):
+                # 수신 버퍼에 담을 수 없는 크기이므로 body 전용 버퍼로 옮겨 받음
+                self._body = bytearray(size) if self._pool is None else self._pool.acquire(size)
+                self._body_view = memoryview(self._body)[:size]
+                self._body_view[:available] = self._view[self._start:self._end]
+                self._body_pos = available
+                self._body_size = size
+                self._start = self._end = 0
+                break
+            else:
+                break
+
+        return messages
+
+    def _read_large_body(self, channel: socket.socket) -> list:
+        try:
+            received = channel.recv_into(self._body_view[self._body_pos:])
+        except (BlockingIOError, InterruptedError):
+            return []
+
+        if received == 0:
+            raise ConnectionError('connection closed')
+
+        self.received_bytes += received
+        self._body_pos += received
+
+        if self._body_pos < self._body_size:
+            return []
+
+        message = Message(self._header, self._body_view, buffer=None if self._pool is None else self._body,
+                          pool=self._pool)
+
+        self._header = None
+        self._body = None
+        self._body_view = None
+        self._body_pos = 0
+        self._body_size = 0
+
+        return [message]
+
+    def _make_message(self, header: Header, body_view: memoryview) -> Message:
+        """
+        수신 버퍼에 모두 들어온 메시지 생성, 수신 버퍼는 다음 수신에 다시 사용하므로 body 는 복사함
+
+        :param header:
+        :param body_view: 수신 버퍼의 body 위치 memoryview
+        :return:
+        """
+        size = len(body_view)
+
+        if self._pool is None or size <= SMALL_BODY_SIZE:
+            return Message(header, bytes(body_view))
+
+        buffer = self._pool.acquire(size)
+        buffer[:size] = body_view
+
+        return Message(header, memoryview(buffer)[:size], buffer=buffer, pool=self._pool)
+
+    def _compact(self):
+        """
+        디코딩 하지 않은 데이터를 수신 버퍼 앞으로 옮겨 뒤쪽 공간을 확보
+        :return:
+        """
+        remain = self._end - self._start
+        self._view[:remain] = self._view[self._start:self._end]
+        self._start = 0
+        self._end = remain
@@ -2,13 +2,71 @@ import struct
 import json
 import socket
 
+# size - 4byte
 # code - 1byte
 # sender - 4byte
 # receiver - 4byte
-# size - 4byte
 # total : 13byte
 
-# data is always json-format
+# data is json-format, or binary-format (body_codec) if code has BINARY_FLAG
+
+HEADER = struct.Struct('<IB4s4s')
+"""
+header 형식, byte order 와 크기를 명시해 플랫폼과 상관없이 13byte
+(native 정렬을 사용하는 'LB4B4B' 는 64bit 리눅스에서 17byte 가 되어 HEADER_SIZE 와 맞지 않음)
+"""
+HEADER_SIZE = HEADER.size
+
+MAX_BODY_SIZE = 1024 * 1024 * 16
+"""
+header SIZE 로 받을 수 있는 최대 body 크기, 넘는 header 는 올바르지 않은 header 로 보고 연결을 끊음
+압축된 body 를 해제한 크기도 이 크기를 넘을 수 없음
+"""
+
+IP_CACHE_SIZE = 4096
+# ip 문자열 <-> 4byte 변환 캐시 최대 크기, 넘으면 비우고 다시 채움
+
+_ip_to_bytes = {}
+_bytes_to_ip = {}
+
+
+def ip_to_bytes(ip: str) -> bytes:
+    """
+    :param ip: ip 문자열
+    :return: 4byte ip, 연결된 클라이언트 ip 는 매번 변환하지 않도록 캐시함
+        점 4개 10진수 형식만 허용하고 아니면 OSError 발생
+        (inet_aton 은 '010.0.0.1' 을 8진수 8.0.0.1 로, '10.1' 을 10.0.0.1 로 변환하므로 사용하지 않음)
+    """
+    packed = _ip_to_bytes.get(ip)
+
+    if packed is None:
+        packed = socket.inet_pton(socket.AF_INET, ip)
+
+        if len(_ip_to_bytes) >= IP_CACHE_SIZE:
+            _ip_to_bytes.clear()
+
+        _ip_to_bytes[ip] = packed
+
+    return packed
+
+
+def bytes_to_ip(packed: bytes) -> str:
+    """
+    :param packed: 4byte ip
+    :return: ip 문자열
+    """
+    ip = _bytes_to_ip.get(packed)
+
+    if ip is None:
+        ip = socket.inet_ntoa(packed)
+
+        if len(_bytes_to_ip) >= IP_CACHE_SIZE:
+            _bytes_to_ip.clear()
+
+        _bytes_to_ip[packed] = ip
+
+    return ip
+
 
 TEST_PACKET = 0
 CLIENT_WELCOME = 1
@@ -25,11 +83,27 @@ REQUEST_CLIENT_STATE = 11
 RESPONSE_CLIENT_STATE = 12
 ALREADY_FETCH_ORDER = 13
 TMP_CHAT = 14
+SEND_FILE_CHUNK = 15
+ABORT_FETCH = 16
+RELAY_UPDATE = 17
+REQUEST_METRICS = 18
+RESPONSE_METRICS = 19
+
+CHUNK_FLAG_FINAL = 0x01
+# SEND_FILE_CHUNK 메타 데이터 flags 값, 마지막 파일 조각일 경우 설정
 
+COMPRESSED_FLAG = 0x80
+# header code 값에 설정되면 body 가 연결 별로 정한 압축 방식(CLIENT_WELCOME)으로 압축되어 있음
+BINARY_FLAG = 0x40
+# header code 값에 설정되면 body 가 JSON 이 아닌 바이너리 형식(body_codec)임, 압축된 경우 압축 해제 후 디코딩
+CODE_MASK = 0x3F
 
 
 
 class Header:
+    __slots__ = ('SIZE', 'CODE', 'SENDER', 'RECEIVER')
+    # 메시지 마다 만들어지므로 __dict__ 없이 속성을 고정함
+
     def __init__(self,
                  size: int,
                  code: int,
@@ -41,11 +115,12 @@ class Header:
         self.RECEIVER = receiver
 
     @classmethod
-    def decode(cls, byte_data: bytes):
+    def decode(cls, byte_data, offset: int = 0):
         """
         bytes(len=13) -> Header 변환 함수
 
-        :param byte_data: bytes(len=13 고정)
+        :param byte_data: header 가 들어있는 bytes-like 객체 (수신 버퍼 memoryview 등, 복사하지 않고 읽음)
+        :param offset: header 시작 위치
 
         size - 4byte
         code - 1byte
@@ -53,31 +128,17 @@ class Header:
         receiver - 1byte * 4 = 4byte
 
         :return:
+        :raise ValueError: header 크기 만큼의 데이터가 없거나 body 크기가 MAX_BODY_SIZE 를 넘는 경우
         """
-        header = None
         try:
-            unpack_header = struct.unpack('LB4B4B', byte_data)
-            """
-            L(size: unsigned long) = 4byte
-            B(code: unsigned char) = 1byte     
-            4B(sender: unsigned char * 4) 정수 값이 0 ~ 256 므로 = 4byte
-            4B(receiver: unsigned char * 4) 정수 값이 0 ~ 256 므로 = 4byte       
-            """
-
-
-            size = unpack_header[0]
-            code = unpack_header[1]
-            sender = socket.inet_ntoa(byte_data[5:9])
-            receiver = socket.inet_ntoa(byte_data[9:13])
+            size, code, sender, receiver = HEADER.unpack_from(byte_data, offset)
+        except struct.error as e:
+            raise ValueError('invalid header') from e
 
+        if size > MAX_BODY_SIZE:
+            raise ValueError('body size {} exceeds {}'.format(size, MAX_BODY_SIZE))
 
-
-            header = Header(size, code, sender, receiver)
-
-        except Exception as e:
-            print(e)
-
-        return header
+        return Header(size, code, bytes_to_ip(sender), bytes_to_ip(receiver))
 
     @classmethod
     def encode(cls, header) -> bytes:
@@ -87,18 +148,145 @@ class Header:
         :param header: 
         :return:
         """
-        return struct.pack('LB4B4B', header.SIZE, header.CODE, *socket.inet_aton(header.SENDER),
-                           *socket.inet_aton(header.RECEIVER))
+        return HEADER.pack(header.SIZE, header.CODE, ip_to_bytes(header.SENDER), ip_to_bytes(header.RECEIVER))
+
+    @staticmethod
+    def pack(size: int, code: int, sender: str, receiver: str) -> bytes:
+        """
+        Header 객체를 만들지 않고 바로 header bytes 생성
+        """
+        return HEADER.pack(size, code, ip_to_bytes(sender), ip_to_bytes(receiver))
+
+    @staticmethod
+    def pack_into(buffer, offset: int, size: int, code: int, sender: str, receiver: str):
+        """
+        미리 할당한 버퍼의 offset 위치에 header 기록
+
+        :param buffer: 쓰기 가능한 bytes-like 객체 (bytearray 등)
+        :param offset:
+        :return:
+        """
+        HEADER.pack_into(buffer, offset, size, code, ip_to_bytes(sender), ip_to_bytes(receiver))
 
 
 class Message:
+    """
+    수신 메시지
+
+    BODY 는 bytes 이거나 버퍼 풀(BufferPool)에서 꺼낸 수신 버퍼의 memoryview 임
+    수신 버퍼를 사용한 메시지는 헨들러 처리가 끝나면 release() 로 버퍼를 풀에 돌려줌 (Server 에서 호출)
+    헨들러가 처리 후에도 body 를 사용해야 하면(송신 큐, 스레드 풀 작업 등) message 가 아닌 BODY(혹은 그 slice)를
+    참조해야 함, 참조가 남아있는 버퍼는 참조가 모두 사라질 때 까지 재사용하지 않음
+    """
+    __slots__ = ('HEADER', 'BODY', 'data', '_buffer', '_pool')
 
     def __init__(self,
                  header: Header,
-                 body: bytes):
+                 body,
+                 data=None,
+                 buffer: bytearray = None,
+                 pool=None):
+        """
+        :param header:
+        :param body: bytes-like 객체
+        :param data: 디코딩한 body 값 (바이너리 형식 body)
+        :param buffer: body 가 들어있는 버퍼 풀의 수신 버퍼
+        :param pool: 수신 버퍼를 돌려줄 버퍼 풀
+        """
         self.HEADER = header
         self.BODY = body
+        self.data = data
+        # 디코딩한 body 값, JSON body 는 json_body 에 처음 접근할 때 한번만 디코딩해서 저장
+        self._buffer = buffer
+        self._pool = pool
 
     @property
     def json_body(self):
-        return json.loads(self.BODY.decode('utf-8'))
+        if self.data is None:
+            self.data = json.loads(str(self.BODY, 'utf-8'))
+
+        return self.data
+
+    def release(self):
+        """
+        수신 버퍼를 풀에 돌려줌, 이후에는 BODY 를 사용할 수 없음 (디코딩한 json_body 는 사용 가능)
+        :return:
+        """
+        buffer = self._buffer
+
+        if buffer is None:
+            return
+
+        self._buffer = None
+        self.BODY = None
+        self._pool.release(buffer)
+
+
+class FileChunk:
+    """
+    SEND_FILE_CHUNK(15) 메시지 body 형식
+
+    SEND_FILE(8)은 파일 조각을 base64 인코딩 후 JSON 으로 감싸서 보내기 때문에 크기가 약 33% 늘어나고
+    조각마다 JSON 파싱이 필요함, 이를 피하기 위해 고정 크기 메타 데이터 뒤에 파일 바이너리를 그대로 붙여서 보냄
+
+    fetch_no - 4byte
+    offset - 8byte (파일 내 조각 시작 위치)
+    flags - 1byte (CHUNK_FLAG_FINAL)
+    binary - header.SIZE - 13byte
+    """
+
+    META = struct.Struct('<IQB')
+    META_SIZE = META.size
+
+    def __init__(self,
+                 fetch_no: int,
+                 offset: int,
+                 flags: int,
+                 binary):
+        self.fetch_no = fetch_no
+        self.offset = offset
+        self.flags = flags
+        self.binary = binary
+
+    @property
+    def is_final(self) -> bool:
+        return bool(self.flags & CHUNK_FLAG_FINAL)
+
+    @classmethod
+    def decode_meta(cls, body) -> tuple:
+        """
+        body 에서 메타 데이터만 읽음, 파일 바이너리는 복사하지 않음
+
+        :param body: SEND_FILE_CHUNK 메시지 body
+        :return: (fetch_no, offset, flags)
+        """
+        return cls.META.unpack_from(body)
+
+    @classmethod
+    def decode(cls, body):
+        """
+        bytes -> FileChunk 변환 함수
+        binary 는 body 를 복사하지 않은 memoryview 임
+
+        :param body:
+        :return:
+        """
+        fetch_no, offset, flags = cls.META.unpack_from(body)
+        return FileChunk(fetch_no, offset, flags, memoryview(body)[cls.META_SIZE:])
+
+    @classmethod
+    def encode_meta(cls, fetch_no: int, offset: int, is_final: bool = False) -> bytes:
+        return cls.META.pack(fetch_no, offset, CHUNK_FLAG_FINAL if is_final else 0)
+
+    @classmethod
+    def encode(cls, fetch_no: int, offset: int, binary, is_final: bool = False) -> bytes:
+        """
+        FileChunk -> bytes 변환 함수
+
+        :param fetch_no:
+        :param offset:
+        :param binary: 파일 바이너리 데이터
+        :param is_final: 마지막 파일 조각 여부
+        :return:
+        """
+        return cls.encode_meta(fetch_no, offset, is_final) + binary
@@ -1,6 +1,12 @@
+import json
+import time
+import traceback
 from abc import ABCMeta, abstractmethod
 
-from common.protocol.message import Message, Header
+from common import metrics
+from common.protocol import body_codec
+from common.protocol.compression import COMPRESS_MIN_SIZE, adaptive_compression, compress, decompress
+from common.protocol.message import Message, Header, HEADER, HEADER_SIZE, COMPRESSED_FLAG, BINARY_FLAG, CODE_MASK
 
 receivers = []
 """
@@ -12,15 +18,86 @@ Server 에서 메시지 수신시 send_message() 호출하고
 
 """
 
+dispatch_table = {}
+"""
+:type dict(int, list(MessageReceiver))
+
+메시지 코드 별 처리 헨들러 객체 리스트
+MessageReceiver.codes 를 지정한 헨들러는 이 테이블에 등록되어 메시지 코드로 바로 찾아 처리함
+(헨들러 수와 상관없이 일정한 비용으로 찾을 수 있음)
+"""
+
+fallback_receivers = []
+"""
+:type list(MessageReceiver)
+
+MessageReceiver.codes 를 지정하지 않은 헨들러 리스트
+메시지를 수신할 때 마다 is_message_take() 로 처리 가능 여부를 확인함
+"""
+
+dispatch_stats = {}
+"""
+:type dict(int, DispatchStat)
+
+메시지 코드 별 처리 횟수/시간 통계
+"""
+
+frames_received = metrics.registry.code_counter('hamon_frames_received_total', '메시지 코드 별 수신 frame 수')
+bytes_received = metrics.registry.code_counter('hamon_bytes_received_total',
+                                               '메시지 코드 별 수신 크기 (header 포함, 압축된 크기)')
+frames_sent = metrics.registry.code_counter('hamon_frames_sent_total', '메시지 코드 별 송신 frame 수')
+bytes_sent = metrics.registry.code_counter('hamon_bytes_sent_total',
+                                           '메시지 코드 별 송신 크기 (header 포함, 압축된 크기)')
+
+
+class DispatchStat:
+    """
+    메시지 코드 별 처리 통계
+    """
+    __slots__ = ('count', 'total_time', 'max_time')
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    @property
+    def average_time(self) -> float:
+        return self.total_time / self.count if self.count else 0.0
+
+    def record(self, elapsed: float):
+        self.count += 1
+        self.total_time += elapsed
+        if elapsed > self.max_time:
+            self.max_time = elapsed
+
 
 class MessageReceiver(metaclass=ABCMeta):
     """
     수신된 메세지를 처리하기 위한 클래스를 만들기 위해선 반드시 해당 클래스를 상속해야함
+
+    처리할 메시지 코드를 codes 에 지정하면 코드 별 디스패치 테이블에 등록되고
+    지정하지 않으면 메시지 마다 is_message_take() 를 호출해 처리 여부를 확인함
+    """
+
+    codes = ()
+    """
+    :type tuple(int)
+    
+    처리할 메시지 코드 목록
     """
 
     def __init__(self):
         receivers.append(self)
 
+        self.dispatch_time = metrics.registry.histogram('hamon_dispatch_seconds', '헨들러 별 메시지 처리 시간',
+                                                        receiver=type(self).__name__)
+
+        if self.codes:
+            register_receiver(self, *self.codes)
+        else:
+            fallback_receivers.append(self)
+
     @abstractmethod
     def receive(self,
                 message: Message,
@@ -34,46 +111,158 @@ class MessageReceiver(metaclass=ABCMeta):
         """
         pass
 
-    @abstractmethod
     def is_message_take(self,
                         message: Message) -> bool:
         """
         처리할 수 있는 메시지인가 확인하는 메소드
+        codes 를 지정하지 않은 헨들러는 반드시 재정의 해야함
 
         :param message:
         :return:
         """
+        return message.HEADER.CODE in self.codes
+
+    def stop(self):
+        """
+        서버 종료시 호출 (stop_receivers()), 헨들러가 실행한 스레드 등을 정리해야 하면 재정의
+        :return:
+        """
         pass
 
 
+def register_receiver(receiver: MessageReceiver,
+                      *codes: int):
+    """
+    메시지 코드 별 디스패치 테이블에 헨들러 등록
+    하나의 코드에 여러 헨들러를 등록할 수 있으며 등록한 순서대로 호출됨
+
+    :param receiver:
+    :param codes: 처리할 메시지 코드
+    :return:
+    """
+    for code in codes:
+        code_receivers = dispatch_table.setdefault(code, [])
+
+        if receiver not in code_receivers:
+            code_receivers.append(receiver)
+
+
+def stop_receivers():
+    """
+    모든 헨들러의 stop() 호출 (서버 종료시 호출)
+    :return:
+    """
+    for receiver in receivers:
+        try:
+            receiver.stop()
+        except Exception as e:
+            traceback.print_exc()
+
+
 def receive_message(client,
                     message: Message):
-    print('receive data')
-    print("protocol received code is {} sender is {} receiver is {} size is {}".format(message.HEADER.CODE,
-                                                                                       message.HEADER.SENDER,
-                                                                                       message.HEADER.RECEIVER,
-                                                                                       message.HEADER.SIZE))
-    for receiver in receivers:
+    frames_received.inc(message.HEADER.CODE & CODE_MASK)
+    bytes_received.inc(message.HEADER.CODE & CODE_MASK, HEADER_SIZE + message.HEADER.SIZE)
+
+    if message.HEADER.CODE & COMPRESSED_FLAG:
+        message = decompress_message(client, message)
+
+    if message.HEADER.CODE & BINARY_FLAG:
+        message = decode_binary_message(message)
+
+    code = message.HEADER.CODE
+    start = time.perf_counter()
+
+    for receiver in dispatch_table.get(code, ()):
+        receiver_start = time.perf_counter()
+        receiver.receive(message, client)
+        receiver.dispatch_time.observe(time.perf_counter() - receiver_start)
+
+    for receiver in fallback_receivers:
         if receiver.is_message_take(message):
             # 등록된 것중 맞는 receiver 찾아 수신처리
+            receiver_start = time.perf_counter()
             receiver.receive(message, client)
+            receiver.dispatch_time.observe(time.perf_counter() - receiver_start)
+
+    stat = dispatch_stats.get(code)
+    if stat is None:
+        stat = dispatch_stats.setdefault(code, DispatchStat())
+    stat.record(time.perf_counter() - start)
+
+
+def decompress_message(client,
+                       message: Message) -> Message:
+    """
+    압축된 메시지(COMPRESSED_FLAG)의 body 를 연결 별로 정한 압축 방식으로 해제
+
+    :param client: 송신 클라이언트
+    :param message:
+    :return: 압축 해제한 메시지, 압축 방식을 정하지 않은 연결이면 ValueError 발생
+    """
+    codec = getattr(client, 'codec', None)
+
+    if codec is None:
+        raise ValueError('압축 방식을 정하지 않은 연결에서 압축된 메시지를 받았습니다')
+
+    body = decompress(codec, message.BODY)
+    header = message.HEADER
+
+    return Message(Header(len(body), header.CODE & ~COMPRESSED_FLAG, header.SENDER, header.RECEIVER), body)
+
+
+def decode_binary_message(message: Message) -> Message:
+    """
+    바이너리 형식 메시지(BINARY_FLAG)의 body 를 디코딩
+    헨들러는 JSON 메시지와 같이 json_body 로 디코딩한 값을 사용함
+
+    :param message:
+    :return: BINARY_FLAG 를 뺀 코드와 디코딩한 값을 가진 메시지, 올바르지 않은 body 이면 ValueError 발생
+    """
+    header = message.HEADER
+    code = header.CODE & ~BINARY_FLAG
+
+    return Message(Header(header.SIZE, code, header.SENDER, header.RECEIVER), message.BODY,
+                   body_codec.decode(code, message.BODY))
+
+
+def encode_body(code: int,
+                codec: str,
+                body):
+    """
+    압축 방식이 정해진 연결로 보낼 body 압축
+    body 가 작거나 최근 압축 효과가 없었던 메시지 코드는 압축하지 않음 (adaptive_compression)
+
+    :param code:
+    :param codec: 연결 별 압축 방식, None 이면 압축하지 않음
+    :param body:
+    :return: (code, body), 압축한 경우 code 에 COMPRESSED_FLAG 설정
+    """
+    if codec is None or body is None or len(body) < COMPRESS_MIN_SIZE:
+        return code, body
+
+    if not adaptive_compression.should_compress(code):
+        return code, body
+
+    compressed = compress(codec, body)
+
+    if not adaptive_compression.record(code, len(body), len(compressed)):
+        return code, body
+
+    return code | COMPRESSED_FLAG, compressed
 
 
 def make_message(code: int,
                  sender_ip: str,
                  receiver_ip: str,
                  body=None):
-    header = Header(0 if body is None else len(body), code, sender_ip, receiver_ip)
-    data = Header.encode(header)
+    size = 0 if body is None else len(body)
+    data = bytearray(HEADER_SIZE + size)
+    # 전체 크기를 미리 알 수 있으므로 한번만 할당하고 header 는 pack_into 로 바로 기록
+    Header.pack_into(data, 0, size, code, sender_ip, receiver_ip)
 
     if body:
-        data += body  # todo: 미리 크기를 알 수 있으므로 리스트를 사용하지 말고, 배열을 이용하여 byte 데이터를 만드는 방식으로 취할것
-
-    # print('send data')
-    # print("protocol received code is {} sender is {} receiver is {} size is {}".format(header.CODE,
-    #                                                                                    header.SENDER,
-    #                                                                                    header.RECEIVER,
-    #                                                                                    header.SIZE))
+        data[HEADER_SIZE:] = body
 
     return data
 
@@ -82,12 +271,168 @@ def send_message(code: int,
                  sender_ip: str,
                  receiver,
                  body: bytes = None):
-    receiver.send(make_message(code, sender_ip, receiver.ip, body))
+    code, body = encode_body(code, getattr(receiver, 'codec', None), body)
+    data = make_message(code, sender_ip, receiver.ip, body)
+    receiver.send(data)
+
+    frames_sent.inc(code & CODE_MASK)
+    bytes_sent.inc(code & CODE_MASK, len(data))
+
+
+def send_data(code: int,
+              sender_ip: str,
+              receiver,
+              data):
+    """
+    body 를 연결 별로 정한 형식으로 인코딩해서 전송
+    바이너리 형식(body_codec)을 정한 연결이고 스키마로 표현할 수 있는 값이면 바이너리로, 아니라면 JSON 으로 보냄
+
+    :param code:
+    :param sender_ip:
+    :param receiver: 수신 클라이언트
+    :param data: body 값 (dict, list)
+    :return:
+    """
+    if getattr(receiver, 'body_codec', None) == body_codec.BINARY_CODEC:
+        body = body_codec.encode(code, data)
+
+        if body is not None:
+            send_message(code | BINARY_FLAG, sender_ip, receiver, body)
+            return
+
+    send_message(code, sender_ip, receiver, json.dumps(data).encode('utf-8'))
+
+
+def send_buffers(receiver,
+                 buffers: list):
+    """
+    여러 버퍼(header, body)를 하나로 합치지 않고 scatter/gather(sendmsg) 방식으로 전송
+
+    receiver 가 send_buffers() 를 제공하면 그 함수를 사용하고
+    아니라면 receiver.channel 소켓에 직접 sendmsg 로 전송함
+
+    :param receiver: 수신 클라이언트
+    :param buffers: 전송할 bytes-like 객체 리스트
+    :return:
+    """
+    receiver_send_buffers = getattr(receiver, 'send_buffers', None)
+
+    if receiver_send_buffers is not None:
+        receiver_send_buffers(buffers)
+        return
+
+    channel = receiver.channel
+
+    if not hasattr(channel, 'sendmsg'):
+        # sendmsg 를 지원하지 않는 플랫폼(windows)은 버퍼 별로 전송
+        for buffer in buffers:
+            channel.sendall(buffer)
+        return
+
+    views = [memoryview(buffer) for buffer in buffers if len(buffer)]
+
+    while views:
+        sent = channel.sendmsg(views)
+
+        while sent:
+            # 일부만 전송된 경우 전송된 만큼 버퍼를 잘라내고 나머지를 다시 전송
+            if sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            else:
+                views[0] = views[0][sent:]
+                sent = 0
+
+
+def send_file_region(receiver,
+                     buffers: list,
+                     file,
+                     offset: int,
+                     count: int,
+                     on_done=None):
+    """
+    buffers 뒤에 파일 영역(file[offset:offset + count])을 이어서 전송
+
+    receiver 가 send_file_region() 을 제공하면(os.sendfile 전송) 그 함수를 사용하고
+    아니라면 파일 영역을 읽어서 send_buffers() 로 전송함
+
+    :param receiver: 수신 클라이언트
+    :param buffers: 파일 영역 앞에 보낼 버퍼 리스트 (header 등)
+    :param file: 열려있는 파일 객체
+    :param offset: 파일 영역 시작 위치
+    :param count: 파일 영역 크기
+    :param on_done: 파일 영역을 더 읽지 않게 된 후(전송 완료, 실패) 한번 호출할 함수 () -> None, 예외가 발생해도 호출됨
+    :return:
+    """
+    receiver_send_file_region = getattr(receiver, 'send_file_region', None)
+
+    if receiver_send_file_region is not None:
+        receiver_send_file_region(buffers, file, offset, count, on_done)
+    else:
+        try:
+            file.seek(offset)
+            binary = file.read(count)
+        finally:
+            if on_done is not None:
+                on_done()
+
+        send_buffers(receiver, list(buffers) + [binary])
+
+    code = HEADER.unpack_from(buffers[0])[1] & CODE_MASK
+    # buffers 의 첫 버퍼는 header
+    frames_sent.inc(code)
+    bytes_sent.inc(code, sum(len(buffer) for buffer in buffers) + count)
 
 
 def multi_send_message(code: int,
                        sender_ip: str,
                        clients,
-                       body: bytes = None):
-    for client in clients:
-        send_message(code, sender_ip, client, body)
+                       body: bytes = None,
+                       is_plain: bool = False):
+    """
+    같은 메시지를 여러 클라이언트에게 전송
+
+    header 는 수신자 ip가 달라 클라이언트 마다 만들지만 body 는 memoryview 하나를 모든 클라이언트가 공유하므로
+    클라이언트 수 만큼 body 가 복사되지 않음
+
+    압축 방식을 정한 클라이언트에게는 압축 방식 별로 한번만 압축한 body 를 공유해서 보냄
+
+    :param code:
+    :param sender_ip:
+    :param clients:
+    :param body:
+    :param is_plain: True 이면 클라이언트 압축 방식과 상관없이 압축하지 않음
+        (받은 메시지를 그대로 다른 클라이언트에게 중계하는 클라이언트, 하위 클라이언트의 압축 방식이 다를 수 있음)
+    :return:
+    """
+    encoded = {}
+    """
+    :type dict(str, tuple(int, memoryview))
+    압축 방식 -> (code, body)
+    """
+
+    headers = memoryview(bytearray(HEADER_SIZE * len(clients)))
+    # 클라이언트 별 header 를 하나의 버퍼에 pack_into 로 기록해 header 마다 bytes 를 할당하지 않음
+    # (송신 큐에 남은 header 가 참조하므로 전송 마다 새로 할당)
+
+    for index, client in enumerate(clients):
+        codec = None if is_plain else getattr(client, 'codec', None)
+        entry = encoded.get(codec)
+
+        if entry is None:
+            client_code, client_body = encode_body(code, codec, body)
+            entry = encoded[codec] = (client_code, memoryview(client_body) if client_body else None)
+
+        client_code, body_view = entry
+        size = 0 if body_view is None else body_view.nbytes
+        Header.pack_into(headers, index * HEADER_SIZE, size, client_code, sender_ip, client.ip)
+        header = headers[index * HEADER_SIZE:(index + 1) * HEADER_SIZE]
+
+        try:
+            send_buffers(client, [header] if body_view is None else [header, body_view])
+            frames_sent.inc(client_code & CODE_MASK)
+            bytes_sent.inc(client_code & CODE_MASK, HEADER_SIZE + size)
+        except OSError:
+            # 한 클라이언트의 전송 실패가 나머지 클라이언트 전송을 막지 않도록 함
+            # 연결 종료 처리는 수신 쪽(Server)에서 진행
+            traceback.print_exc()
@@ -1,6 +1,17 @@
-from common.db.db_handler import MariaDBHandler
+import argparse
+
+from common.db.db_handler import MariaDBHandler, SQLiteHandler
 from server import MainServer
 
 if __name__ == "__main__":
-    MainServer.db_connector = MariaDBHandler(host='127.0.0.1', user='root', password='ntflow', db_name='hamon_fetcher')
-    MainServer.start(port=14494, max_client=10, max_wait_count=3)
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', choices=('maria_db', 'sqlite'), default='maria_db', help='사용할 DB')
+    parser.add_argument('--sqlite-path', default='hamon_fetcher.db', help='SQLite DB 파일 경로, sqlite 만 사용')
+    args = parser.parse_args()
+
+    if args.db == 'sqlite':
+        MainServer.db_connector = SQLiteHandler(args.sqlite_path)
+    else:
+        MainServer.db_connector = MariaDBHandler(host='127.0.0.1', user='root', password='ntflow',
+                                                 db_name='hamon_fetcher')
+    MainServer.start(port=14494, max_client=10, max_wait_count=3)
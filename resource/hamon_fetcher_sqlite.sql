@@ -0,0 +1,50 @@
+-- hamon_fetcher SQLite 스키마 (hamon_fetcher.sql 과 같은 테이블, SQLiteHandler 가 시작시 실행)
+
+CREATE TABLE IF NOT EXISTS `client` (
+  `IP` varchar(15) NOT NULL,
+  `LAST_CONN_DATE` datetime NOT NULL,
+  `LAST_DISCONN_DATE` datetime DEFAULT NULL,
+  `DISCONN_CNT` integer NOT NULL DEFAULT 0,
+  PRIMARY KEY (`IP`)
+);
+
+
+CREATE TABLE IF NOT EXISTS `fetch` (
+  `FETCH_NO` integer PRIMARY KEY AUTOINCREMENT,
+  `FETCH_FILE_NO` varchar(100) DEFAULT NULL,
+  `SENDER_IP` varchar(15) NOT NULL,
+  `START_DATE` datetime NOT NULL
+);
+
+
+CREATE TABLE IF NOT EXISTS `fetch_fail_cause` (
+  `FETCH_NO` integer NOT NULL,
+  `TARGET_IP` varchar(15) NOT NULL,
+  `CAUSE_TYPE` varchar(128) NOT NULL
+);
+
+
+CREATE TABLE IF NOT EXISTS `fetch_file` (
+  `FILE_NO` integer PRIMARY KEY AUTOINCREMENT,
+  `FILE_NAME` varchar(128) NOT NULL,
+  `FILE_EXT` varchar(16) NOT NULL,
+  `FILE_SIZE` integer NOT NULL,
+  `FILE_MD5` varchar(128) NOT NULL,
+  `CREATOR_IP` varchar(15) NOT NULL,
+  `CREATE_DATE` datetime NOT NULL
+);
+
+
+CREATE TABLE IF NOT EXISTS `fetch_result` (
+  `FETCH_NO` integer NOT NULL,
+  `TARGET_IP` varchar(15) NOT NULL,
+  `END_DATE` datetime NOT NULL,
+  `SUCCESS_FLAG` tinyint(1) NOT NULL
+);
+
+
+CREATE TABLE IF NOT EXISTS `client_fetch` (
+  `FETCH_NO` integer NOT NULL,
+  `IP` varchar(15) NOT NULL,
+  `PATH` varchar(256) NOT NULL
+);
@@ -7,7 +7,9 @@ def init_module():
 
     :return:
     """
+    import server.capability
     import server.fetch
+    import server.admin
     import server.echo
     import server.chat
 
@@ -0,0 +1,3 @@
+from server.admin.admin_handler import AdminHandler
+
+AdminHandler()
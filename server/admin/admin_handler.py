@@ -0,0 +1,48 @@
+import os
+
+from common import metrics
+from common.protocol.message import Message, REQUEST_METRICS, RESPONSE_METRICS
+from common.protocol.message_handler import MessageReceiver, send_data
+from server import MainServer
+from server.socket.client import Client
+
+
+class AdminHandler(MessageReceiver):
+    """
+    관리 메시지 헨들러 클래스
+
+    REQUEST_METRICS 를 받으면 서버 지표(common.metrics.registry)를 RESPONSE_METRICS 로 응답함
+    멀티 프로세스 모드에서는 요청한 클라이언트가 연결된 워커의 지표만 응답함
+
+    응답 body (JSON)
+    [pid]: 서버(워커) 프로세스 id
+    [worker]: 워커 번호, 멀티 프로세스 모드가 아니면 None
+    [metrics]: 지표 시리즈 이름 ('name{label="값"}') -> 값, 히스토그램은 {count, sum, buckets}
+    """
+
+    codes = (REQUEST_METRICS,)
+    """
+    수신 가능 메시지 코드
+    - REQUEST_METRICS(18)
+    """
+
+    def receive(self, message: Message, client: Client):
+        data = message.json_body if message.HEADER.SIZE else {}
+        """
+        :type dict
+
+        :key
+        [prefix]: 지표 이름 접두사, 지정하면 해당 지표만 응답 (not require)
+        """
+
+        snapshot = metrics.registry.snapshot()
+        prefix = data.get('prefix')
+
+        if prefix:
+            snapshot = {name: value for name, value in snapshot.items() if name.startswith(prefix)}
+
+        send_data(RESPONSE_METRICS, MainServer.host, client, {
+            "pid": os.getpid(),
+            "worker": None if MainServer.cluster is None else MainServer.cluster.worker_id,
+            "metrics": snapshot
+        })
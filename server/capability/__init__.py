@@ -0,0 +1,3 @@
+from server.capability.capability_handler import CapabilityHandler
+
+CapabilityHandler()
@@ -0,0 +1,47 @@
+import json
+
+from common.protocol.body_codec import BINARY_CODEC
+from common.protocol.compression import SUPPORTED_CODECS, choose_codec
+from common.protocol.message import Message, CLIENT_WELCOME
+from common.protocol.message_handler import MessageReceiver, send_message
+from server import MainServer
+from server.socket.client import Client
+
+
+class CapabilityHandler(MessageReceiver):
+    """
+    연결 기능 협상 헨들러 클래스
+
+    클라이언트는 연결 후 CLIENT_WELCOME 으로 지원하는 기능(압축 방식, body 형식)을 알리고
+    서버는 사용할 압축 방식과 body 형식을 정해 CLIENT_WELCOME 으로 응답함, 이후 해당 연결의 메시지는
+    COMPRESSED_FLAG 가 설정된 경우 정한 방식으로 압축되어 있고 BINARY_FLAG 가 설정된 경우 바이너리 형식(body_codec)임
+    """
+
+    codes = (CLIENT_WELCOME,)
+    """
+    수신 가능 메시지 코드
+    - CLIENT_WELCOME(1)
+    """
+
+    def receive(self, message: Message, client: Client):
+        data = message.json_body
+        """
+        :type dict
+
+        :key
+        [codecs]: 클라이언트가 지원하는 압축 방식 리스트 (선호 순서), (not require)
+        [body_codecs]: 클라이언트가 지원하는 body 형식 리스트 ('binary'), 없으면 JSON 만 사용 (not require)
+        """
+
+        codec = choose_codec(data.get('codecs'))
+        body_codec = BINARY_CODEC if BINARY_CODEC in (data.get('body_codecs') or ()) else None
+
+        send_message(CLIENT_WELCOME, MainServer.host, client, json.dumps({
+            "codec": codec,
+            "codecs": list(SUPPORTED_CODECS),
+            "body_codec": body_codec
+        }).encode('utf-8'))
+        # 응답을 받기 전까지 클라이언트는 압축 여부, body 형식을 알 수 없으므로 응답은 압축하지 않고 JSON 으로 보냄
+
+        client.codec = codec
+        client.body_codec = body_codec
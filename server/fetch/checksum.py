@@ -0,0 +1,144 @@
+import hashlib
+import os
+import re
+import threading
+import time
+import traceback
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+_MD5_PATTERN = re.compile(r'^[0-9a-fA-F]{32}$')
+
+CHECKSUM_MATCH = 0
+# 계산한 md5 와 파일 md5 가 같음
+CHECKSUM_MISMATCH = 1
+# 계산한 md5 와 파일 md5 가 다름
+CHECKSUM_UNVERIFIED = 2
+# 조각 순서가 맞지 않아 검증하지 못함 (is_broken)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """
+    checksum 계산 스레드 풀, 처음 사용할 때 생성
+    hashlib 은 계산 중에 GIL 을 놓으므로 여러 패치의 checksum 을 동시에 계산할 수 있음
+    :return:
+    """
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=min(4, os.cpu_count() or 1), thread_name_prefix='fetch-md5')
+
+    return _executor
+
+
+class StreamingChecksum:
+    """
+    파일 조각을 전달하는 동안 패치 파일 md5 를 계산하는 객체
+
+    메시지 처리 스레드에서는 조각을 큐에 넣기만 하고 계산은 스레드 풀에서 진행함
+    한 패치의 조각은 받은 순서대로 계산되어야 하므로 패치 별로 스레드 풀 작업은 동시에 하나만 실행됨
+
+    - 조각이 파일 순서대로 오지 않으면 계산할 수 없으므로 검증하지 않음 (is_broken, CHECKSUM_UNVERIFIED)
+    """
+
+    def __init__(self, md5: str):
+        self.expected_md5 = md5.lower()
+        self.received_bytes = 0
+        # 계산 큐에 넣은 파일 크기 (다음 조각 시작 위치)
+        self.is_broken = False
+        # 조각 순서가 맞지 않아 검증할 수 없는 경우 True
+
+        self.hashed_bytes = 0
+        self.hash_time = 0.0
+        # 계산 소요 시간 합 (단위: 초)
+
+        self._md5 = hashlib.md5()
+        self._pending = deque()
+        self._is_scheduled = False
+        self._is_closed = False
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def is_valid_md5(md5) -> bool:
+        """
+        :param md5:
+        :return: md5 hex 문자열(32자)인 경우 True, 아니면 검증할 수 없음
+        """
+        return isinstance(md5, str) and bool(_MD5_PATTERN.match(md5))
+
+    def update(self, offset: int, data):
+        """
+        파일 조각을 계산 큐에 추가
+
+        :param offset: 파일 조각 시작 위치
+        :param data: 파일 조각 (bytes-like, 계산이 끝날 때 까지 참조함)
+        :return:
+        """
+        with self._lock:
+            if self.is_broken or self._is_closed:
+                return
+
+            if offset != self.received_bytes:
+                self.is_broken = True
+                self._pending.clear()
+                return
+
+            self.received_bytes += len(data)
+            self._pending.append(data)
+            self._schedule()
+
+    def verify(self, callback):
+        """
+        앞서 넣은 조각을 모두 계산한 후 callback(result) 을 스레드 풀에서 호출
+
+        :param callback: (result: int) -> None
+            CHECKSUM_MATCH, CHECKSUM_MISMATCH, 검증할 수 없는 경우(is_broken) CHECKSUM_UNVERIFIED
+        :return:
+        """
+        with self._lock:
+            self._pending.append(callback)
+            self._schedule()
+
+    def close(self):
+        """
+        남은 계산을 취소 (패치가 끝난 경우)
+        :return:
+        """
+        with self._lock:
+            self._is_closed = True
+            self._pending.clear()
+
+    def _schedule(self):
+        if not self._is_scheduled:
+            self._is_scheduled = True
+            _get_executor().submit(self._drain)
+
+    def _drain(self):
+        while True:
+            with self._lock:
+                if not self._pending:
+                    self._is_scheduled = False
+                    return
+
+                item = self._pending.popleft()
+
+            if callable(item):
+                try:
+                    item(self._result())
+                except Exception as e:
+                    traceback.print_exc()
+            else:
+                start = time.perf_counter()
+                self._md5.update(item)
+                self.hash_time += time.perf_counter() - start
+                self.hashed_bytes += len(item)
+
+    def _result(self) -> int:
+        if self.is_broken:
+            return CHECKSUM_UNVERIFIED
+
+        return CHECKSUM_MATCH if self._md5.hexdigest() == self.expected_md5 else CHECKSUM_MISMATCH
@@ -1,211 +1,355 @@
 import datetime
 import json
-from collections import UserDict
+import os
+import threading
+import time
+import traceback
 
+from common import metrics
 from common.db.db_handler import transaction
+from common.db.write_behind import WriteBehindQueue
 from event import EventManager
-from event.event_manager import DISCONNECTED_CLIENT_EVENT, event_handler
-from common.protocol.message import Message, ORDER_FETCH, RESULT_FETCH, RESULT_SEND_FILE, SEND_FILE, \
-    RESULT_PREPARE_FETCH, \
-    REQUEST_CLIENT_STATE, RESPONSE_CLIENT_STATE
-from common.protocol.message_handler import MessageReceiver, send_message, \
-    multi_send_message
+from event.event_manager import CONNECT_CLIENT_EVENT, DISCONNECTED_CLIENT_EVENT, event_handler
+from common.protocol.message import Header, Message, ORDER_FETCH, RESULT_FETCH, RESULT_SEND_FILE, SEND_FILE, \
+    RESULT_PREPARE_FETCH, SEND_FILE_CHUNK, ABORT_FETCH, RELAY_UPDATE, FileChunk, CHUNK_FLAG_FINAL
+from common.protocol.message_handler import MessageReceiver, send_message, send_data, \
+    multi_send_message, send_file_region
 from server import MainServer
-from server.fetch.persist.fetch_dao_maria_db import insert_fetch, insert_fetch_file, insert_fetch_result, \
-    insert_fetch_fail_cause, insert_client_fetch
+from server.fetch.fetch_registry import FileFetch, FetchRegistry, FetchWorker, WORKER_RESUMING, WORKER_FETCHING, \
+    WORKER_RELAYED
+from server.fetch.checksum import StreamingChecksum, CHECKSUM_MATCH, CHECKSUM_MISMATCH
+from server.fetch.flow_control import CreditController
+from server.fetch.relay_tree import RelayTree, RelayNode
+from server.fetch.spool import FileSpool, SharedFile
+from server.fetch.persist.fetch_dao import insert_fetch, insert_fetch_file, insert_fetch_results, \
+    insert_fetch_fail_causes, insert_client_fetches
 from server.socket.client import Client
+from server.socket.client_registry import CLIENT_IDLE, CLIENT_FETCHING
 
+SPOOL_PIECE_SIZE = 1024 * 500
+# 스풀에서 읽어 전송하는 파일 조각 크기
+SPOOL_WINDOW_BYTES = SPOOL_PIECE_SIZE * 4
+# 스풀 전송시 대상 클라이언트 송신 큐에 쌓아둘 수 있는 최대 크기, 넘으면 줄어들 때 까지 대기
+SPOOL_DRAIN_TIMEOUT = 0.5
+# 스풀 전송시 송신 큐가 줄어들기를 한번에 기다리는 최대 시간, 지나면 대상 클라이언트 상태를 다시 확인 (단위: 초)
+SPOOL_STALL_TIMEOUT = 30
+# 송신 큐가 SPOOL_WINDOW_BYTES 를 넘은 채로 이 시간 동안 줄지 않는 대상 클라이언트는 패치 실패 처리 (단위: 초)
+CREDIT_CHECK_INTERVAL = 0.05
+# credit 을 모두 사용한 파일 제공자에게 다시 지급할 수 있는지 확인하는 주기 (단위: 초)
 
-class FileFetch:
+
+class FetchHandler(MessageReceiver):
     """
-    패치 정보 DTO
+    파일 패치 관련 메시지를 수신/전송하고 컨트롤하는 헨들러 클래스
+
+    - 동시에 여러 패치를 진행할 수 있도록 설계(단, 클라이언트는 동시에 여러 패치를 진행 못함 추후에 가능도록 할 예정)
     """
 
-    def __init__(self, no, file, workers):
-        self.no: int  # 파일 패치 id
-        self.FILE: dict
-        self.workers: list
+    codes = (ORDER_FETCH, RESULT_FETCH, RESULT_SEND_FILE, SEND_FILE, SEND_FILE_CHUNK, RELAY_UPDATE)
+    """
+    수신 가능 메시지 코드
+    - ORDER_FETCH(4)
+    - RESULT_FETCH(5)
+    - RESULT_SEND_FILE(7)
+    - SEND_FILE(8)
+    - SEND_FILE_CHUNK(15)
+    - RELAY_UPDATE(17)
+    """
+
+    def __init__(self):
+        self._handlers = {
+            ORDER_FETCH: self._receive_order_fetch,
+            RESULT_FETCH: self._receive_fetch_result,
+            RESULT_SEND_FILE: self._receive_send_file_result,
+            SEND_FILE: self._send_file,
+            SEND_FILE_CHUNK: self._send_file_chunk,
+            RELAY_UPDATE: self._receive_relay_update,
+        }
         """
-        패치할 클라이언 마다 필요한 정보를 리스트로 담고 있음 (dict 타입)
-        해당 정보는 클라이언트가 패치를 진행되고 있을동안만 유지하고 있으며 실패/성공한 경우
-        바로 삭제된다.
-        
-        worker = workers[n]
-        worker['client']: 클라이언트 래퍼 객체
-        worker['path']: 클라이언트 패치 경로   
+        메시지 코드 별 처리 메소드, 메소드는 (client, message) 인자를 받음
         """
 
-        self.no = no
-        self.FILE = file
-        self.workers = workers
-
-    @property
-    def file(self):
-        return self.FILE
-
-    @property
-    def file_no(self):
+        super().__init__()
+        self.fetch_registry = FetchRegistry()
+        self.result_writer = WriteBehindQueue('fetch_result', self._flush_fetch_results)
+        # 패치 결과(fetch_result, fetch_fail_cause) 쓰기 지연 큐
+        self.spool = FileSpool()
+        self.use_sendfile = hasattr(os, 'sendfile')
+        # 스풀 파일 전송시 os.sendfile() 사용 여부
+        self.credits = CreditController(SPOOL_WINDOW_BYTES)
+        # 파일 제공자 credit 관리 (대상 클라이언트보다 빨리 보내지 않도록 조절)
+
+        metrics.registry.collector('hamon_fetches_active', '진행 중인 패치 수', lambda: len(self.fetch_registry))
+        metrics.registry.collector('hamon_fetch_workers_active', '진행 중인 패치 대상 수',
+                                   self.fetch_registry.worker_count)
+        metrics.registry.collector('hamon_fetch_workers_suspended', '재연결을 기다리는 패치 대상 수',
+                                   self.fetch_registry.suspended_count)
+        metrics.registry.collector('hamon_credit_grants_total', '파일 제공자 credit 지급 수',
+                                   lambda: self.credits.granted_count, 'counter')
+        metrics.registry.collector('hamon_credit_stalls_total', '파일 제공자가 대기 중인데 credit 을 지급하지 못한 수',
+                                   lambda: self.credits.stall_count, 'counter')
+        metrics.registry.collector('hamon_credit_exceeded_total', '파일 제공자가 credit 보다 많이 보낸 조각 수',
+                                   lambda: self.credits.exceeded_count, 'counter')
+        self._relay_fetches = {}
         """
-        :return: 패치 파일 id
+        :type dict(int, FileFetch)
+        중계 트리로 전달 중인 패치, 자신의 패치가 끝난 중계 클라이언트 연결 종료를 처리하기 위해 패치가 끝날 때 까지 유지
         """
-        return self.FILE['no']
 
-    @property
-    def file_md5(self):
-        """        
-        :return: 패치 파일 md5(checkusm) 
-        """
-        return self.FILE['md5']
+        self._credit_monitor = None
+        self._credit_monitor_stop = None
+        # credit 관리 스레드 종료 요청 (threading.Event), 스레드 마다 새로 만듦
+        self._credit_monitor_lock = threading.Lock()
+
+        EventManager.register_handler(CONNECT_CLIENT_EVENT, self._resume_client_fetch)
+        EventManager.register_handler(DISCONNECTED_CLIENT_EVENT, self._check_disconnect_client)
 
-    @property
-    def file_name(self):
+    def _start_credit_monitor(self):
         """
-        :return: 패치 파일 이름 
+        credit 관리 스레드를 처음 패치를 시작할 때 실행
+        핸들러는 import 시점에 생성되므로 생성자에서 실행하면 멀티 프로세스 모드에서 fork 전에 스레드가 생김
+        :return:
         """
-        return self.FILE['name']
-
-    @property
-    def file_ext(self):
+        with self._credit_monitor_lock:
+            if self._credit_monitor is None:
+                self._credit_monitor_stop = threading.Event()
+                self._credit_monitor = threading.Thread(target=self._monitor_credits, args=(self._credit_monitor_stop,),
+                                                        name='fetch-credit', daemon=True)
+                self._credit_monitor.start()
+
+    def stop(self):
         """
-        :return: 패치 파일 확장자 
+        credit 관리 스레드 종료 (서버 종료시), 다시 패치를 시작하면 새로 실행됨
+        :return:
         """
-        return self.FILE['ext']
+        with self._credit_monitor_lock:
+            monitor, self._credit_monitor = self._credit_monitor, None
+
+            if monitor is not None:
+                self._credit_monitor_stop.set()
+
+        if monitor is not None and monitor is not threading.current_thread():
+            monitor.join(CREDIT_CHECK_INTERVAL * 10)
 
-    @property
-    def file_size(self):
+    def receive(self, message: Message, client: Client):
+        self._handlers[message.HEADER.CODE](client, message)
+
+    @event_handler
+    def _check_disconnect_client(self, event: dict):
         """
-        :return: 패치 파일 크기
+        패치중인 클라이언트가 종료될시 패치 실패와 종료 처리
+
+        resume_window 가 설정되어 있고 스풀에서 파일을 다시 읽을 수 있는 패치라면 바로 실패 처리하지 않고
+        resume_window 초 동안 같은 ip 의 재연결을 기다림, 시간이 지나면 패치 실패 처리 (_expire_worker)
+
+        :param event: 
+        :return: 
         """
-        return self.FILE['size']
+        client = event['client']
 
-    @property
-    def is_finish(self):
+        relay_changes = [self._detach_relay_node(file_fetch, client)
+                         for file_fetch in tuple(self._relay_fetches.values())]
+
+        with client:
+            if MainServer.resume_window:
+                workers = self.fetch_registry.suspend(client)
+            else:
+                workers = self.fetch_registry.fail_all(client)
+
+        for file_fetch, orphans, completed in relay_changes:
+            self._finish_relay_nodes(file_fetch, completed)
+            self._failover_relay_nodes(file_fetch, orphans)
+
+        for worker in workers:
+            if worker.state != WORKER_RESUMING:
+                self._write_fail_fetch_result(client, worker.fetch.no, datetime.datetime.now(), 0)
+                self._end_relay_node(worker.fetch, client.ip, True)
+                self._release_fetch(worker.fetch)
+            elif self._is_resumable(worker.fetch):
+                timer = threading.Timer(MainServer.resume_window, self._expire_worker,
+                                        args=(worker, worker.suspend_time))
+                timer.daemon = True
+                timer.start()
+            else:
+                self._expire_worker(worker, worker.suspend_time)
+
+    @event_handler
+    def _resume_client_fetch(self, event: dict):
         """
-        해당 패치가 모두 진행되었는지 확인
-        성공/실패를 떠나서 모든 클라이언트가 패치 완료되었다면 진행 완료 상태로 알림
-        
-        :return: 패치 진행 완료 -> True, 패치 진행 실패 -> False
+        재연결 대기 중인 패치가 있는 ip 의 클라이언트가 연결되면 패치를 이어서 진행
+
+        :param event:
+        :return:
         """
-        return len(self.workers) == 0
+        client = event['client']
 
+        if not MainServer.resume_window:
+            return
 
-class FileFetchDict(UserDict):
-    """
-    동시에 여러 패치를 진행 하기 위해 여러 요청에 대해서
-    필요한 패치 정보를 쉽게 가져올 수 있도록 하기 위해 만든 커스텀 딕셔너리 클래스
-    """
+        with MainServer.lock_clients:
+            workers = self.fetch_registry.resume(client)
+
+            if not workers:
+                return
 
-    def __contains__(self, key: int):
-        return key in self.data
+            MainServer.clients.set_state(client, CLIENT_FETCHING)
 
-    def __setitem__(self, key, value: FileFetch):
+        for worker in workers:
+            threading.Thread(target=self._resume_worker, args=(worker,), daemon=True).start()
+
+    def _expire_worker(self, worker: FetchWorker, suspend_time: float):
         """
-        :param key: fetch.no
-        :param value: 파일 패치 정보 객체
+        재연결 대기 시간이 지난 클라이언트 패치 실패 처리
+
+        :param worker:
+        :param suspend_time:
         :return:
         """
-        if not isinstance(value, FileFetch):
-            raise TypeError
+        if self.fetch_registry.expire(worker, suspend_time):
+            self._write_fail_fetch_result(worker.client, worker.fetch.no, datetime.datetime.now(), 0)
+            self._end_relay_node(worker.fetch, worker.client.ip, True)
+            self._release_fetch(worker.fetch)
 
-        self.data[key] = value
+    def _is_resumable(self, file_fetch: FileFetch) -> bool:
+        """
+        :param file_fetch:
+        :return: 스풀(기록 중인 임시 파일 포함)에서 파일을 다시 읽을 수 있으면 True
+        """
+        return file_fetch.is_cached or file_fetch.spool_writer is not None or \
+            self.spool.has(file_fetch.file_md5, file_fetch.file_size)
 
-    def __getitem__(self, key) -> FileFetch:
+    def _open_spool_source(self, file_fetch: FileFetch):
+        """
+        :param file_fetch:
+        :return: 패치 파일을 읽을 수 있는 스풀 파일 객체, 기록 중이면 임시 파일(.part)
         """
-        :param key: [int, FileFetch, Client]
+        with file_fetch.lock:
+            writer = file_fetch.spool_writer
 
-        if type(key)
+            if writer is not None:
+                return open(writer.part_path, 'rb')
 
-        int -> 파일 패치 id
-        FileFetch -> 파일 패치 객체, no 속성 접근해 패치 id로 다시 찾음
-        Client -> 클라이언트 통신 객체, 클라이언트가 속한 FileFetch 객체를 찾아 리턴
-        클라이언트는 오직 하나의 패치밖에 진행못하므로 여러 FileFetch 에 저장되어 있는 경우는 없음
+        return self.spool.open_reader(file_fetch.file_md5)
 
-        :return: 필요한 FileFetch 없을 시 예외 발생
+    def _resume_worker(self, worker: FetchWorker):
         """
-        if isinstance(key, Client):
-            for fetch in self.data.values():
-                fetch: FileFetch
+        재연결한 클라이언트에게 패치를 이어서 진행 (별도 스레드에서 실행)
 
-                if key in fetch.workers:
-                    return fetch
-        elif isinstance(key, FileFetch):
-            return self.data[key.no]
-        return self.data[key]
+        클라이언트가 마지막으로 알려준 위치(acked_bytes)부터 이어받도록 ORDER_FETCH(resume_offset) 를 보내고
+        그 사이 놓친 파일 조각을 스풀에서 읽어 전송함, 파일 제공자에게 받은 위치까지 따라잡으면
+        file_fetch.lock 안에서 실시간 전달 대상(WORKER_FETCHING)으로 전환하므로 조각 순서가 섞이지 않음
 
-    def finish(self, client):
-        """
-        받아온 클라이언트가 속한 FileFetch 객체를 찾아 완료 처리를 함
-        만약에 모든 클라이언트가 끝맞춰 패치가 완료된 상태라면 해당 딕셔너리에서 삭제
-        :param client: Client 패치 종료된 클라이언트
+        :param worker: 상태가 WORKER_RESUMING 인 FetchWorker
         :return:
         """
-        fetch = self[client]
+        file_fetch = worker.fetch
+        client = worker.client
+        offset = min(worker.acked_bytes, file_fetch.file_size)
 
-        del fetch.workers[client]
+        try:
+            file = self._open_spool_source(file_fetch)
+        except (OSError, ValueError):
+            traceback.print_exc()
+            self._fail_worker(worker)
+            return
 
-        if fetch.is_finish:
-            del self.data[fetch.no]
+        worker.delivered_bytes = offset
 
-        return fetch
+        with SharedFile(file) as shared:
+            # 송신 큐에 남은 파일 영역까지 모두 전송된 후에 파일을 닫음
+            try:
+                self._send_order_fetch(file_fetch, worker, offset)
+
+                while worker.state == WORKER_RESUMING and worker.client is client and offset < file_fetch.file_size:
+                    with file_fetch.lock:
+                        end = file_fetch.file_size if file_fetch.is_cached else file_fetch.received_bytes
+
+                        if worker.state != WORKER_RESUMING or worker.client is not client:
+                            # 전송 중에 다시 끊겼거나 패치가 끝남
+                            return
+
+                        if offset >= end:
+                            worker.state = WORKER_FETCHING
+                            # 따라잡았으므로 이후 조각은 파일 제공자에게 받는 대로 전달
+                            return
+
+                    if not self._wait_client_drain(client, SPOOL_STALL_TIMEOUT):
+                        # 송신 큐가 줄지 않음 (클라이언트가 받지 않음)
+                        self._fail_worker(worker, True)
+                        return
+
+                    count = min(SPOOL_PIECE_SIZE, end - offset)
+                    self._send_spool_region(file_fetch, (worker,), shared, offset, count,
+                                            offset + count >= file_fetch.file_size)
+                    offset += count
+            except OSError:
+                traceback.print_exc()
+
+    def _fail_worker(self, worker: FetchWorker, is_notify: bool = False):
+        """
+        이어받기를 진행할 수 없거나 전송이 멈춘 클라이언트 패치 실패 처리
 
+        :param worker:
+        :param is_notify: 클라이언트에게 패치 중단(ABORT_FETCH) 전송 여부
+        :return:
+        """
+        client = worker.client
 
-class FetchHandler(MessageReceiver):
-    """
-    파일 패치 관련 메시지를 수신/전송하고 컨트롤하는 헨들러 클래스
+        try:
+            file_fetch = self.fetch_registry.fail(client, worker.fetch.no)
+        except KeyError:
+            return
 
-    - 동시에 여러 패치를 진행할 수 있도록 설계(단, 클라이언트는 동시에 여러 패치를 진행 못함 추후에 가능도록 할 예정)
-    """
+        self._write_fail_fetch_result(client, file_fetch.no, datetime.datetime.now(), 0)
+        MainServer.clients.set_state(client, CLIENT_IDLE)
 
-    def __init__(self):
-        super().__init__()
-        self.file_fetch_dict = FileFetchDict()
+        if is_notify and client.state != 2:
+            try:
+                send_data(ABORT_FETCH, MainServer.host, client, {
+                    "fetch_no": file_fetch.no,
+                    "fail_cause": 0
+                })
+            except Exception as e:
+                traceback.print_exc()
 
-        EventManager.register_handler(DISCONNECTED_CLIENT_EVENT, self._check_disconnect_client)
+        self._end_relay_node(file_fetch, client.ip, True)
+        self._release_fetch(file_fetch)
 
-    def is_message_take(self, message: Message) -> bool:
+    def _send_order_fetch(self, file_fetch: FileFetch, worker: FetchWorker, resume_offset: int = None):
         """
-        수신 가능 메시지 코드
-        - ORDER_FETCH(4)
-        - RESULT_FETCH(5)
-        - RESULT_SEND_FILE(7)
-        - SEND_FILE(8)
-        - REQUEST_CLIENT_STATE(11)
+        대상 클라이언트에게 패치 준비 요청(ORDER_FETCH) 전송
+
+        중계 트리로 전달하는 패치는 relay 정보를 같이 보냄
+        - parent: 파일 조각을 전달해 줄 상위 클라이언트 ip, None 이면 서버에게 직접 받음
+        - children: 받은 파일 조각을 그대로(header + body) 전달할 하위 클라이언트 ip 리스트
+        - port: 하위 클라이언트 중계 포트
 
-        :param message:
+        :param file_fetch:
+        :param worker:
+        :param resume_offset: 재연결 후 이어받는 경우 이어받을 위치
         :return:
         """
-        return message.HEADER.CODE == ORDER_FETCH or message.HEADER.CODE == RESULT_FETCH \
-               or message.HEADER.CODE == RESULT_SEND_FILE or message.HEADER.CODE == SEND_FILE \
-               or message.HEADER.CODE == REQUEST_CLIENT_STATE
+        data = {
+            "fetch_no": file_fetch.no,
+            "fetch_file_no": file_fetch.file_no,
+            "file": file_fetch.file,
+            "path": worker.path
+        }
 
-    def receive(self, message: Message, client: Client):
+        if resume_offset is not None:
+            data['resume_offset'] = resume_offset
 
-        if message.HEADER.CODE == ORDER_FETCH:
-            self._receive_order_fetch(client, message)
-        elif message.HEADER.CODE == SEND_FILE:
-            self._send_file(message)
-        elif message.HEADER.CODE == RESULT_FETCH:
-            self._receive_fetch_result(client, message)
-        elif message.HEADER.CODE == REQUEST_CLIENT_STATE:
-            self._client_fetch_state(client)
+        tree = file_fetch.relay_tree
 
-    @event_handler
-    def _check_disconnect_client(self, event: dict):
-        """
-        패치중인 클라이언트가 종료될시 패치 실패와 종료 처리
+        if tree is not None:
+            node = tree.get(worker.client.ip)
+            data['relay'] = {
+                "port": MainServer.relay_port,
+                "parent": None if node is None or node.parent is None else node.parent.ip,
+                "children": tree.children_of(worker.client.ip)
+            }
 
-        :param event: 
-        :return: 
-        """
-        client = event['client']
-
-        try:
-            with client:
-                fetch = self.file_fetch_dict.finish(client)
-        except KeyError:
-            pass
-        else:
-            self._write_fail_fetch_result(client, fetch.no, datetime.datetime.now(), 0)
+        send_data(ORDER_FETCH, MainServer.host, worker.client, data)
 
     def _receive_order_fetch(self, sender, message):
         """
@@ -251,15 +395,13 @@ class FetchHandler(MessageReceiver):
         with MainServer.lock_clients:
             try:
                 for target in data['targets']:
-                    client = next((x for x in MainServer.clients if x.ip == target['ip']), None)
+                    client = MainServer.find_client(target['ip'])
+                    # 멀티 프로세스 모드에서 다른 워커에 연결된 클라이언트는 RemoteClient
 
-                    if not client or client.state == 1:
+                    if not client or client.state != CLIENT_IDLE:
                         fail_client_ip.append(target['ip'])
                     else:
-                        workers[client] = {
-                            'client': client,
-                            'path': target['path']
-                        }
+                        workers[client] = FetchWorker(client, target['path'])
 
                 @transaction
                 def register_fetch_service() -> FileFetch:
@@ -287,9 +429,9 @@ class FetchHandler(MessageReceiver):
                                             START_DATE=datetime.datetime.now())
                     # 패치 정보를 db 저장
 
-                    for worker in workers.values():
-                        insert_client_fetch(MainServer.db_connector, FETCH_NO=fetch_no, IP=worker['client'].ip,
-                                            PATH=worker['path'])
+                    insert_client_fetches(MainServer.db_connector, [
+                        {'FETCH_NO': fetch_no, 'IP': worker.client.ip, 'PATH': worker.path}
+                        for worker in workers.values()])
 
                     return FileFetch(fetch_no, data['file'], workers)
 
@@ -299,31 +441,70 @@ class FetchHandler(MessageReceiver):
                 file_fetch = register_fetch_service()
 
             except Exception as e:
-                send_message(RESULT_PREPARE_FETCH, MainServer.host, sender, json.dumps({
+                send_data(RESULT_PREPARE_FETCH, MainServer.host, sender, {
                     "is_success": False,
                     'fail_clients_ip': [client_ip for client_ip in fail_client_ip]
-                }).encode('utf-8'))
+                })
             else:
-                self.file_fetch_dict[file_fetch.no] = file_fetch
+                file_fetch.uploader = sender
+
+                if MainServer.relay_degree and len(file_fetch.workers) > MainServer.relay_degree:
+                    file_fetch.relay_tree = RelayTree(list(file_fetch.workers.values()), MainServer.relay_degree)
+
+                    for worker in file_fetch.workers.values():
+                        if not file_fetch.relay_tree.is_root(worker.client.ip):
+                            worker.state = WORKER_RELAYED
+                    # 첫 단계 클라이언트만 서버가 직접 전달
+
+                    self._relay_fetches[file_fetch.no] = file_fetch
+
+                self.fetch_registry.add(file_fetch)
+
+                for worker in file_fetch.workers.values():
+                    MainServer.clients.set_state(worker.client, CLIENT_FETCHING)
+                # 대상 클라이언트 상태를 패치 중으로 변경
+
+                file_fetch.is_cached = self.spool.has(file_fetch.file_md5, file_fetch.file_size)
+
+                if not file_fetch.is_cached:
+                    if StreamingChecksum.is_valid_md5(file_fetch.file_md5):
+                        file_fetch.checksum = StreamingChecksum(file_fetch.file_md5)
+
+                        try:
+                            file_fetch.spool_writer = self.spool.open_writer(file_fetch.file_md5, file_fetch.no)
+                            # 같은 파일을 다른 패치가 기록 중이면 None, 이 패치는 스풀에 기록하지 않음
+                        except (OSError, ValueError):
+                            # 스풀에 기록하지 못하더라도 패치는 진행
+                            traceback.print_exc()
+                    # md5 값이 올바르지 않으면 검증할 수 없으므로 스풀에 기록하지 않고 그대로 전달만 함
+
+                    self._start_credit_monitor()
+                    self.credits.add(file_fetch)
 
-                send_message(RESULT_PREPARE_FETCH, MainServer.host, sender, json.dumps({
+                send_data(RESULT_PREPARE_FETCH, MainServer.host, sender, {
                     "fetch_no": file_fetch.no,
-                    "is_success": True
-                }).encode('utf-8'))
+                    "is_success": True,
+                    "is_cached": file_fetch.is_cached,
+                    "use_credit": True
+                })
                 """
                 파일 제공자에게 패치 준비 완료 메시지와 패치 id를 전송 후
                 후에 파일 제공자(웹)은 이 id 함께 파일 바이너리 데이터를 보내야 하며 서버는 이 id 값으로 식별하여
                 필요한 클라이언트들에게 전달
+                
+                서버 스풀에 같은 파일이 있다면(is_cached) 파일 제공자는 파일을 보내지 않고 서버가 스풀에서 읽어 전송
+                use_credit 이면 파일 제공자는 RESULT_SEND_FILE 로 받은 credit 수 만큼만 파일 조각을 보내야 함
                 """
 
-                for worker in file_fetch.workers.values():
-                    send_message(ORDER_FETCH, MainServer.host, worker['client'], json.dumps({
-                        "fetch_no": file_fetch.no,
-                        "fetch_file_no": file_fetch.file_no,
-                        "file": file_fetch.file,
-                        "path": worker["path"]
-                    }).encode('utf-8'))
+                for worker in sorted(file_fetch.workers.values(), key=lambda worker: worker.state == WORKER_FETCHING):
+                    self._send_order_fetch(file_fetch, worker)
                 # 대상 클라이언트들에게 패치 준비 요청 메시지 전송
+                # 중계 받는 클라이언트가 먼저 준비하도록 첫 단계 클라이언트에게 마지막으로 전송
+
+                if file_fetch.is_cached:
+                    threading.Thread(target=self._serve_from_spool, args=(file_fetch,), daemon=True).start()
+                else:
+                    self._grant_credits(file_fetch)
 
     def _receive_fetch_result(self, sender, message):
         """
@@ -345,18 +526,209 @@ class FetchHandler(MessageReceiver):
         """
 
         if data["is_complete"]:
-            self._write_success_fetch_result(sender, data['fetch_no'], datetime.datetime.now())
+            fetch = self.fetch_registry.finish(sender, data['fetch_no'])
+        else:
+            fetch = self.fetch_registry.fail(sender, data['fetch_no'])
+        # 진행 중인 패치 대상이 아니거나(잘못된 fetch_no) 이미 결과를 보낸 경우 KeyError 발생, 결과를 저장하지 않음
+
+        if data["is_complete"]:
+            self._write_success_fetch_result(sender, fetch.no, datetime.datetime.now())
         else:
-            self._write_fail_fetch_result(sender, data['fetch_no'], datetime.datetime.now(), data["fail_cause"])
+            self._write_fail_fetch_result(sender, fetch.no, datetime.datetime.now(), data["fail_cause"])
+
+        relay_fetch = self._relay_fetches.get(fetch.no)
+
+        if relay_fetch is None or not relay_fetch.relay_tree.children_of(sender.ip):
+            MainServer.clients.set_state(sender, CLIENT_IDLE)
+            # 클라이언트 상태를 IDLE 로 변경, 하위 클라이언트에게 중계 중이면 하위 트리 패치가 끝날 때 까지 유지
+
+        self._end_relay_node(fetch, sender.ip, not data["is_complete"])
+        self._release_fetch(fetch)
+
+    def _receive_send_file_result(self, sender, message):
+        """
+        클라이언트가 받아서 기록한 파일 크기 수신 처리 메소드
+        재연결시 이 위치부터 이어서 전송함
+
+        :param sender:
+        :param message: message.code == RESULT_SEND_FILE(7)
+        :return:
+        """
+        data = message.json_body
+        """
+        :type dict
+
+        :key
+        [fetch_no]: 패치 id
+        [offset]: 파일 처음부터 빠짐없이 기록한 크기
+        """
+
+        file_fetch = self.fetch_registry.get(data['fetch_no'])
+        worker = file_fetch.workers.get(sender) if file_fetch else None
+
+        if worker is not None and data['offset'] > worker.acked_bytes:
+            worker.acked_bytes = data['offset']
+
+    def _receive_relay_update(self, sender, message):
+        """
+        중계 클라이언트가 하위 클라이언트에게 전달하지 못한 경우 처리 메소드
+        전달하지 못한 하위 클라이언트는 루트로 옮겨 서버가 직접 전달함
+
+        :param sender: 중계 클라이언트
+        :param message: message.code == RELAY_UPDATE(17)
+        :return:
+        """
+        data = message.json_body
+        """
+        :type dict
+
+        :key
+        [fetch_no]: 패치 id
+        [failed_children]: 전달하지 못한 하위 클라이언트 ip 리스트
+        """
+
+        file_fetch = self._relay_fetches.get(data['fetch_no'])
+
+        if file_fetch is None:
+            return
+
+        tree = file_fetch.relay_tree
+        orphans = []
+        completed = []
+
+        for ip in data.get('failed_children', ()):
+            node = tree.get(ip)
+
+            if node is None or node.parent is None or node.parent.ip != sender.ip:
+                continue
+
+            print('중계 실패 fetch_no : {} relay : {} target : {}'.format(file_fetch.no, sender.ip, ip))
+            completed += tree.promote(ip)
+
+            if node.pending:
+                orphans.append(node)
+
+        self._notify_relay_children(file_fetch, tree.get(sender.ip))
+        self._finish_relay_nodes(file_fetch, completed)
+        self._failover_relay_nodes(file_fetch, orphans)
+
+    def _detach_relay_node(self, file_fetch: FileFetch, client) -> tuple:
+        """
+        연결이 끊긴 클라이언트를 중계 트리에서 떼어냄
+        하위 노드와 자신은 루트로 옮기고(재연결시 서버가 직접 전달) 상위 클라이언트에게 바뀐 하위 클라이언트 목록을 알림
+
+        :param file_fetch:
+        :param client: 연결이 끊긴 클라이언트
+        :return: (file_fetch, 루트로 옮긴 하위 노드 리스트, 하위 트리 패치가 끝난 노드 리스트)
+        """
+        tree = file_fetch.relay_tree
+        node = tree.get(client.ip)
+
+        if node is None or node.worker.client is not client:
+            return file_fetch, [], []
+
+        parent = node.parent
+        orphans, completed = tree.orphan_children(client.ip)
+        completed += tree.promote(client.ip)
+
+        self._notify_relay_children(file_fetch, parent)
+
+        return file_fetch, orphans, completed
+
+    def _end_relay_node(self, file_fetch: FileFetch, ip: str, is_failed: bool):
+        """
+        중계 트리로 전달 중인 패치의 클라이언트 패치 종료 처리
+        패치 실패한 클라이언트는 더 이상 전달할 수 없으므로 하위 노드를 루트로 옮김
+
+        :param file_fetch:
+        :param ip:
+        :param is_failed:
+        :return:
+        """
+        tree = file_fetch.relay_tree
+
+        if tree is None:
+            return
+
+        orphans, completed = tree.orphan_children(ip) if is_failed else ([], [])
+        completed += tree.mark_done(ip)
+
+        self._finish_relay_nodes(file_fetch, completed)
+        self._failover_relay_nodes(file_fetch, orphans)
+
+    def _failover_relay_nodes(self, file_fetch: FileFetch, nodes: list):
+        """
+        상위 클라이언트를 잃은 노드에게 서버가 직접 전달하도록 전환
+        마지막으로 기록했다고 알려준 위치(acked_bytes)부터 스풀에서 이어서 보낸 후 실시간 전달 대상으로 전환 (_resume_worker)
+        스풀에서 읽을 수 없는 패치라면 실패 처리
+
+        :param file_fetch:
+        :param nodes: 루트로 옮긴 RelayNode 리스트
+        :return:
+        """
+        for node in nodes:
+            worker = node.worker
+
+            with file_fetch.lock:
+                if worker.state != WORKER_RELAYED:
+                    # 자신의 패치가 끝났거나 재연결 대기/이어받기 중, 이후 서버가 직접 전달함
+                    continue
+
+                worker.state = WORKER_RESUMING
+
+            if self._is_resumable(file_fetch):
+                threading.Thread(target=self._resume_worker, args=(worker,), daemon=True).start()
+            else:
+                self._fail_worker(worker)
+
+    def _finish_relay_nodes(self, file_fetch: FileFetch, nodes: list):
+        """
+        하위 트리 패치가 모두 끝난 중계 클라이언트에게 중계 종료(RELAY_UPDATE is_done)를 알리고 IDLE 상태로 변경
 
-        sender.state = 0
-        # 클라이언트 상태를 IDLE 로 변경
+        :param file_fetch:
+        :param nodes: 하위 트리 패치가 끝난 RelayNode 리스트
+        :return:
+        """
+        for node in nodes:
+            client = node.worker.client
+
+            if not node.is_relay or client.state == 2:
+                continue
 
-        self.file_fetch_dict.finish(sender)
+            MainServer.clients.set_state(client, CLIENT_IDLE)
+
+            try:
+                send_data(RELAY_UPDATE, MainServer.host, client, {
+                    "fetch_no": file_fetch.no,
+                    "children": [],
+                    "is_done": True
+                })
+            except Exception as e:
+                traceback.print_exc()
+
+    def _notify_relay_children(self, file_fetch: FileFetch, node: RelayNode):
+        """
+        중계 클라이언트에게 바뀐 하위 클라이언트 목록 전송 (RELAY_UPDATE)
+
+        :param file_fetch:
+        :param node:
+        :return:
+        """
+        if node is None or node.worker.client.state == 2:
+            return
+
+        try:
+            send_data(RELAY_UPDATE, MainServer.host, node.worker.client, {
+                "fetch_no": file_fetch.no,
+                "children": file_fetch.relay_tree.children_of(node.ip),
+                "is_done": False
+            })
+        except Exception as e:
+            traceback.print_exc()
 
     # todo: 타켓 클라이언트가 모두 종료되었을때에도 웹쪽에선 파일을 계속 보내고 있다는 문제점이 있음, 받을 클라이언트가 없을시 파일제공자(웹)는 파일 전송을 중단하도록 할 수 있는 처리 필요
     # todo: 파일 제공자(웹)가 파일을 보내고 있을때 끊어진 경우 패치 중인 클라이언트에게 실패 처리 후 패치 종료 알림 메시지 전송이 필요함
-    def _send_file(self, message):
+    def _send_file(self, sender, message):
 
         data = message.json_body
         """
@@ -370,30 +742,474 @@ class FetchHandler(MessageReceiver):
 
         try:
             file_fetch: FileFetch
-            file_fetch = self.file_fetch_dict[data['fetch_no']]
+            file_fetch = self.fetch_registry[data['fetch_no']]
             # 패치 대상 클라이언트들을 찾기 위해 패치 id를 통해 FileFetch 객체를 찾음
         except KeyError:
             pass
         else:
-            multi_send_message(SEND_FILE, MainServer.host, file_fetch.workers, message.BODY)
+            multi_send_message(SEND_FILE, MainServer.host, tuple(file_fetch.workers), message.BODY)
+
+    def _send_file_chunk(self, sender, message):
+        """
+        바이너리 파일 조각(SEND_FILE_CHUNK) 전달 메소드
+
+        body 앞의 고정 크기 메타 데이터에서 패치 id만 읽어 대상 클라이언트를 찾고,
+        body 는 디코딩 없이 그대로 대상 클라이언트들에게 전달함
+
+        전달과 동시에 스레드 풀에서 파일 md5 를 계산하고, 마지막 조각은 검증이 끝난 후에 전달함
+        md5 가 다르면 패치를 바로 중단함 (실패 원인 2)
+
+        :param message: message.code == SEND_FILE_CHUNK(15)
+        :return:
+        """
+        body = message.BODY
+        # 마지막 조각은 처리가 끝난 후(message.release() 이후) checksum 스레드에서 전달하므로 body 를 직접 참조함
+        fetch_no, offset, flags = FileChunk.decode_meta(body)
+
+        try:
+            file_fetch: FileFetch
+            file_fetch = self.fetch_registry[fetch_no]
+        except KeyError:
+            pass
+        else:
+            if file_fetch.is_cached:
+                # 스풀의 파일로 전송 중이므로 파일 제공자가 보낸 조각은 무시
+                return
+
+            checksum = file_fetch.checksum
+
+            if checksum is not None:
+                checksum.update(offset, memoryview(body)[FileChunk.META_SIZE:])
+
+                if checksum.is_broken:
+                    # 조각 순서가 맞지 않아 검증할 수 없음, 스풀에 기록하지 않고 이후 조각은 그대로 전달만 함
+                    self._drop_checksum(file_fetch)
+                elif flags & CHUNK_FLAG_FINAL:
+                    # 마지막 조각은 checksum 검증이 끝난 후에 전달, 불일치하면 대상 클라이언트가 파일을 완성하지 못함
+                    checksum.verify(lambda result: self._complete_upload(file_fetch, body, offset, flags, result))
+                    return
+
+            self._relay_chunk(file_fetch, body, offset, flags)
+
+    @staticmethod
+    def _drop_checksum(file_fetch: FileFetch):
+        """
+        검증할 수 없는 패치의 checksum 계산을 멈추고 스풀에 기록 중인 임시 파일을 삭제
+
+        :param file_fetch:
+        :return:
+        """
+        checksum = file_fetch.checksum
+        file_fetch.checksum = None
+
+        if checksum is not None:
+            checksum.close()
+
+        with file_fetch.lock:
+            writer = file_fetch.spool_writer
+            file_fetch.spool_writer = None
+
+        if writer is not None:
+            writer.abort()
+
+    def _relay_chunk(self, file_fetch: FileFetch, body, offset: int, flags: int, is_verified: bool = False):
+        """
+        파일 제공자에게 받은 파일 조각을 스풀에 기록하고 실시간 전달 대상 클라이언트들에게 전달
+
+        :param file_fetch:
+        :param body: SEND_FILE_CHUNK 메시지 body
+        :param offset: 파일 조각 시작 위치
+        :param flags: 파일 조각 flags
+        :param is_verified: 마지막 조각이고 파일 md5 가 일치한 경우 True, 스풀 저장 완료 여부를 정함
+        :return:
+        """
+        chunk_size = len(body) - FileChunk.META_SIZE
+
+        with file_fetch.lock:
+            # 재연결 클라이언트가 실시간 전달로 전환하는 시점과 순서를 맞춤 (_resume_worker)
+            self._write_spool(file_fetch, offset, flags, body, is_verified)
+
+            if offset + chunk_size > file_fetch.received_bytes:
+                file_fetch.received_bytes = offset + chunk_size
+
+            workers = file_fetch.live_workers()
+            tree = file_fetch.relay_tree
+            clients = []
+            relays = []
+            # 하위 클라이언트에게 받은 그대로 중계하는 클라이언트는 압축하지 않고 보냄 (하위 클라이언트 압축 방식이 다를 수 있음)
+
+            for worker in workers:
+                worker.delivered_bytes += chunk_size
+
+                if tree is not None and tree.children_of(worker.client.ip):
+                    relays.append(worker.client)
+                else:
+                    clients.append(worker.client)
+
+            multi_send_message(SEND_FILE_CHUNK, MainServer.host, clients, body)
+
+            if relays:
+                multi_send_message(SEND_FILE_CHUNK, MainServer.host, relays, body, is_plain=True)
+
+            self.credits.on_chunk(file_fetch, chunk_size)
+
+        if flags & CHUNK_FLAG_FINAL:
+            self._remove_credits(file_fetch)
+            return
+
+        if self.credits.is_exceeded(file_fetch):
+            self._pause_uploader(file_fetch)
+            # credit 보다 많이 보낸 파일 제공자는 credit 을 더 지급할 때 까지 수신을 멈춤 (TCP 흐름 제어로 전송이 멈춤)
+
+        self._grant_credits(file_fetch)
+
+    def _complete_upload(self, file_fetch: FileFetch, body, offset: int, flags: int, result: int):
+        """
+        checksum 검증이 끝난 후 마지막 파일 조각 처리 (checksum 스레드 풀에서 실행)
+        md5 가 일치한 경우에만 스풀에 저장하고, 검증하지 못한 경우는 전달만 함
+
+        :param file_fetch:
+        :param body: 마지막 조각 SEND_FILE_CHUNK 메시지 body
+        :param offset:
+        :param flags:
+        :param result: 검증 결과 (CHECKSUM_MATCH, CHECKSUM_MISMATCH, CHECKSUM_UNVERIFIED)
+        :return:
+        """
+        file_fetch.checksum = None
+
+        if file_fetch.no not in self.fetch_registry:
+            return
+
+        if result == CHECKSUM_MISMATCH:
+            print('패치 파일 checksum 불일치 fetch_no : {} md5 : {}'.format(file_fetch.no, file_fetch.file_md5))
+            self._abort_fetch(file_fetch, 2)
+        else:
+            self._relay_chunk(file_fetch, body, offset, flags, result == CHECKSUM_MATCH)
+
+    def _abort_fetch(self, file_fetch: FileFetch, cause: int):
+        """
+        패치를 모든 대상 클라이언트에 대해 바로 실패 처리하고 대상 클라이언트와 파일 제공자에게 패치 중단(ABORT_FETCH) 전송
+        스풀에 기록 중인 파일은 삭제
+
+        :param file_fetch:
+        :param cause: 패치 실패 원인
+        :return:
+        """
+        self._remove_credits(file_fetch)
+
+        with file_fetch.lock:
+            writer = file_fetch.spool_writer
+            file_fetch.spool_writer = None
+
+        if writer is not None:
+            writer.abort()
+
+        relays = []
+
+        if self._relay_fetches.pop(file_fetch.no, None) is not None:
+            relays = [node.worker.client for node in file_fetch.relay_tree.nodes() if node.is_done and node.pending]
+            # 자신의 패치는 끝났지만 하위 클라이언트에게 중계 중인 클라이언트
+
+        with MainServer.lock_clients:
+            workers = self.fetch_registry.abort(file_fetch)
+
+            for client in [worker.client for worker in workers] + relays:
+                if client.state != 2:
+                    MainServer.clients.set_state(client, CLIENT_IDLE)
+
+        end_date = datetime.datetime.now()
+        data = {
+            "fetch_no": file_fetch.no,
+            "fail_cause": cause
+        }
+
+        for worker in workers:
+            self._write_fail_fetch_result(worker.client, file_fetch.no, end_date, cause)
+
+        for client in [worker.client for worker in workers] + relays + [file_fetch.uploader]:
+            if client is not None and client.state != 2:
+                try:
+                    send_data(ABORT_FETCH, MainServer.host, client, data)
+                    # 연결 별로 정한 body 형식과 압축 방식으로 전송
+                except Exception as e:
+                    traceback.print_exc()
+
+    def _grant_credits(self, file_fetch: FileFetch):
+        """
+        대상 클라이언트 송신 큐와 전체 전달 중인 크기에 여유가 있으면 파일 제공자에게 credit 지급
+
+        :param file_fetch:
+        :return:
+        """
+        credits = self.credits.grant(file_fetch, MainServer.credit_quantile, MainServer.max_inflight_bytes)
+
+        if not credits:
+            return
+
+        try:
+            send_message(RESULT_SEND_FILE, MainServer.host, file_fetch.uploader, json.dumps({
+                "fetch_no": file_fetch.no,
+                "credits": credits
+            }).encode('utf-8'))
+        except Exception as e:
+            traceback.print_exc()
+            self._remove_credits(file_fetch)
+            return
+
+        if not self.credits.is_exceeded(file_fetch):
+            self._resume_uploader(file_fetch)
+
+    def _remove_credits(self, file_fetch: FileFetch):
+        """
+        credit 관리 대상에서 제외하고 멈춘 파일 제공자 수신을 재개
+
+        :param file_fetch:
+        :return:
+        """
+        self.credits.remove(file_fetch)
+        self._resume_uploader(file_fetch)
+
+    def _pause_uploader(self, file_fetch: FileFetch):
+        """
+        패치 파일 제공자의 수신을 멈춤, 다른 워커의 클라이언트(RemoteClient)는 지원하지 않음
+
+        :param file_fetch:
+        :return:
+        """
+        pause_reading = getattr(file_fetch.uploader, 'pause_reading', None)
+
+        if pause_reading is None:
+            return
+
+        pause_reading(file_fetch)
+
+        if file_fetch not in self.credits:
+            # 그 사이 패치가 끝나 credit 관리 대상에서 제외됨, 재개할 곳이 없으므로 바로 재개
+            self._resume_uploader(file_fetch)
+
+    @staticmethod
+    def _resume_uploader(file_fetch: FileFetch):
+        resume_reading = getattr(file_fetch.uploader, 'resume_reading', None)
+
+        if resume_reading is not None:
+            resume_reading(file_fetch)
+
+    def _monitor_credits(self, stop_event: threading.Event):
+        """
+        credit 확인 스레드
+
+        대상 클라이언트 송신 큐가 가득 차 credit 을 지급하지 못한 패치는 파일 조각을 더 받지 않으므로
+        주기적으로 송신 큐가 줄었는지 확인해 다시 지급함
+        한 패치 처리 중 예외가 발생해도 스레드가 종료되지 않도록 출력만 하고 다음 주기에 계속 확인함
+
+        :param stop_event: set 되면 스레드 종료 (stop())
+        :return:
+        """
+        while not stop_event.wait(CREDIT_CHECK_INTERVAL):
+            for file_fetch in self.credits.fetches():
+                try:
+                    if file_fetch.uploader.state == 2:
+                        # 파일 제공자 연결 종료
+                        self._remove_credits(file_fetch)
+                    else:
+                        self._grant_credits(file_fetch)
+                except Exception as e:
+                    traceback.print_exc()
+
+    @staticmethod
+    def _write_spool(file_fetch: FileFetch, offset: int, flags: int, body, is_verified: bool):
+        """
+        파일 제공자에게 받은 파일 조각을 스풀에 기록, 마지막 조각이면 스풀에 저장 완료 처리
+        파일 전체 범위를 빠짐없이 받았고 md5 가 일치한 경우에만 저장하고 아니면 임시 파일을 삭제함
+        스풀 기록에 실패해도 패치는 계속 진행
+
+        :param file_fetch:
+        :param offset: 파일 조각 시작 위치
+        :param flags: 파일 조각 flags
+        :param body: SEND_FILE_CHUNK 메시지 body
+        :param is_verified: 파일 md5 가 일치한 경우 True
+        :return:
+        """
+        writer = file_fetch.spool_writer
+
+        if writer is None:
+            return
+
+        try:
+            writer.write(offset, memoryview(body)[FileChunk.META_SIZE:])
+
+            if flags & CHUNK_FLAG_FINAL:
+                if is_verified:
+                    writer.commit(file_fetch.file_size)
+                else:
+                    writer.abort()
+                file_fetch.spool_writer = None
+        except OSError:
+            traceback.print_exc()
+            writer.abort()
+            file_fetch.spool_writer = None
+
+    def _serve_from_spool(self, file_fetch: FileFetch):
+        """
+        스풀에 저장된 파일을 대상 클라이언트들에게 전송 (별도 스레드에서 실행)
+
+        use_sendfile 인 경우 파일 조각을 메모리로 읽지 않고 클라이언트 별로 header 뒤에 파일 영역을 넣어
+        송신 큐에서 os.sendfile() 로 페이지 캐시에서 소켓으로 바로 전송함 (클라이언트 별 전송 위치는 송신 큐가 관리)
+        아닌 경우 파일 조각을 한번 읽어 모든 대상 클라이언트에게 전송
+
+        대상 클라이언트 송신 큐가 SPOOL_WINDOW_BYTES 를 넘으면 줄어들 때 까지 기다렸다가 다음 조각을 보내므로
+        파일 크기와 상관없이 서버 메모리 사용량이 일정함
+
+        :param file_fetch:
+        :return:
+        """
+        try:
+            with SharedFile(self.spool.open_reader(file_fetch.file_md5)) as shared:
+                # 송신 큐에 남은 파일 영역까지 모두 전송된 후에 파일을 닫음
+                offset = 0
+
+                while offset < file_fetch.file_size and not file_fetch.is_finish:
+                    self._wait_workers_drain(file_fetch)
+
+                    count = min(SPOOL_PIECE_SIZE, file_fetch.file_size - offset)
+                    is_final = offset + count >= file_fetch.file_size
+
+                    workers = file_fetch.live_workers()
+                    # 재연결 후 이어받는 클라이언트는 _resume_worker 에서 따로 전송
+
+                    if self.use_sendfile:
+                        self._send_spool_region(file_fetch, workers, shared, offset, count, is_final)
+                    else:
+                        shared.file.seek(offset)
+                        binary = shared.file.read(count)
+
+                        for worker in workers:
+                            worker.delivered_bytes += count
+
+                        multi_send_message(SEND_FILE_CHUNK, MainServer.host,
+                                           tuple(worker.client for worker in workers),
+                                           FileChunk.encode(file_fetch.no, offset, binary, is_final))
+
+                    offset += count
+        except OSError:
+            traceback.print_exc()
+
+    @staticmethod
+    def _send_spool_region(file_fetch: FileFetch, workers: tuple, shared: SharedFile, offset: int, count: int,
+                           is_final: bool):
+        """
+        SEND_FILE_CHUNK header 와 메타 데이터를 보내고 이어서 파일 영역을 os.sendfile() 로 전송
+        파일 영역 마다 스풀 파일을 acquire() 하고 전송이 끝나면 release() 함
+
+        :param file_fetch:
+        :param workers: 전송 대상 FetchWorker 튜플
+        :param shared: 스풀 파일
+        :param offset: 파일 조각 시작 위치
+        :param count: 파일 조각 크기
+        :param is_final: 마지막 조각 여부
+        :return:
+        """
+        meta = FileChunk.encode_meta(file_fetch.no, offset, is_final)
+        size = FileChunk.META_SIZE + count
+
+        for worker in workers:
+            header = Header.pack(size, SEND_FILE_CHUNK, MainServer.host, worker.client.ip)
+            shared.acquire()
+
+            try:
+                send_file_region(worker.client, [header, meta], shared.file, offset, count, shared.release)
+            except OSError:
+                traceback.print_exc()
+            else:
+                worker.delivered_bytes += count
+
+    def _wait_workers_drain(self, file_fetch: FileFetch):
+        """
+        대상 클라이언트 송신 큐가 SPOOL_WINDOW_BYTES 이하로 줄어들 때 까지 대기
+
+        credit 지급과 같이 송신 큐 크기의 quantile(credit_quantile) 값인 클라이언트를 기다리며
+        SPOOL_STALL_TIMEOUT 동안 송신 큐가 줄지 않는 클라이언트는 패치 실패 처리하므로
+        멈춘 클라이언트 하나 때문에 다른 클라이언트 전송이 계속 멈추지 않음
+
+        :param file_fetch:
+        :return:
+        """
+        while not file_fetch.is_finish:
+            now = time.time()
+
+            for worker in file_fetch.live_workers():
+                if getattr(worker.client, 'queued_bytes', 0) <= SPOOL_WINDOW_BYTES:
+                    worker.stall_time = None
+                elif worker.stall_time is None:
+                    worker.stall_time = now
+                elif now - worker.stall_time >= SPOOL_STALL_TIMEOUT:
+                    self._fail_worker(worker, True)
+
+            client = CreditController.quantile_client(tuple(worker.client for worker in file_fetch.live_workers()),
+                                                      MainServer.credit_quantile)
+
+            if client is None or self._wait_client_drain(client, SPOOL_DRAIN_TIMEOUT):
+                return
+
+    @staticmethod
+    def _wait_client_drain(client, timeout: float) -> bool:
+        """
+        클라이언트 송신 큐가 SPOOL_WINDOW_BYTES 이하로 줄어들 때 까지 대기
+
+        :param client:
+        :param timeout: 최대 대기 시간 (단위: 초)
+        :return: 대기 시간 안에 줄어들지 않은 경우 False
+        """
+        wait_drained = getattr(client, 'wait_drained', None)
+
+        if wait_drained is None:
+            return True
+            # 송신 큐 크기를 알 수 없는 클라이언트
+
+        return wait_drained(SPOOL_WINDOW_BYTES, timeout)
+
+    def _release_fetch(self, file_fetch: FileFetch):
+        """
+        모든 대상 클라이언트의 패치가 끝난 경우 스풀에 기록 중인 파일과 credit 정리
+
+        :param file_fetch:
+        :return:
+        """
+        if not file_fetch.is_finish:
+            return
+
+        self._remove_credits(file_fetch)
+        self._relay_fetches.pop(file_fetch.no, None)
+
+        if file_fetch.checksum is not None:
+            file_fetch.checksum.close()
+            file_fetch.checksum = None
+
+        if file_fetch.spool_writer is not None:
+            file_fetch.spool_writer.abort()
+            file_fetch.spool_writer = None
 
-    @transaction
     def _write_success_fetch_result(self, client: Client, fetch_no: int, end_date: datetime.datetime):
         """
         클라이언트 패치 성공 처리 메소드
+        결과는 바로 저장하지 않고 쓰기 지연 큐에 넣어 모아서 저장함
         
         :param client: 
         :param fetch_no: 
         :param end_date: 
         :return: 
         """
-        insert_fetch_result(MainServer.db_connector, FETCH_NO=fetch_no, TARGET_IP=client.ip, END_DATE=end_date,
-                            SUCCESS_FLAG=True)
+        self.result_writer.put({
+            'FETCH_NO': fetch_no,
+            'TARGET_IP': client.ip,
+            'END_DATE': end_date,
+            'SUCCESS_FLAG': True
+        })
 
-    @transaction
     def _write_fail_fetch_result(self, client: Client, fetch_no: int, end_date: datetime.datetime, cause: int):
         """
         클라이언트 패치 실패 처리 메소드
+        결과는 바로 저장하지 않고 쓰기 지연 큐에 넣어 모아서 저장함
         
         :param client: 
         :param fetch_no: 
@@ -402,13 +1218,32 @@ class FetchHandler(MessageReceiver):
 
         클라이언트 중간 종료 = 0
         클라이언트 잘못된 파일 전송 = 1
+        파일 제공자 파일 checksum 불일치 = 2
 
         
         :return: 
         """
-        insert_fetch_result(MainServer.db_connector, FETCH_NO=fetch_no, TARGET_IP=client.ip, END_DATE=end_date,
-                            SUCCESS_FLAG=False)
-        insert_fetch_fail_cause(MainServer.db_connector, FETCH_NO=fetch_no, TARGET_IP=client.ip, CAUSE_TYPE=cause)
+        self.result_writer.put({
+            'FETCH_NO': fetch_no,
+            'TARGET_IP': client.ip,
+            'END_DATE': end_date,
+            'SUCCESS_FLAG': False,
+            'CAUSE_TYPE': cause
+        })
+
+    @transaction
+    def _flush_fetch_results(self, rows: list):
+        """
+        쓰기 지연 큐에 모인 패치 결과/실패 원인을 한 트랜잭션으로 저장
+
+        :param rows: _write_success_fetch_result(), _write_fail_fetch_result() 에서 넣은 딕셔너리 리스트
+        :return:
+        """
+        insert_fetch_results(MainServer.db_connector, rows)
+
+        fail_causes = [row for row in rows if not row['SUCCESS_FLAG']]
+        if fail_causes:
+            insert_fetch_fail_causes(MainServer.db_connector, fail_causes)
 
     # def _client_fetch_state(self, client):  # todo 수정 필요(구현 안됨)
     #
@@ -0,0 +1,361 @@
+import threading
+import time
+
+WORKER_FETCHING = 0
+WORKER_SUCCESS = 1
+WORKER_FAIL = 2
+WORKER_RESUMING = 3
+WORKER_RELAYED = 4
+"""
+패치 대상 클라이언트(FetchWorker) 상태
+WORKER_RESUMING: 연결이 끊겨 재연결 대기 중이거나, 재연결 후 놓친 파일 조각을 스풀에서 이어받는 중
+WORKER_RELAYED: 서버가 아닌 상위 클라이언트에게 파일 조각을 전달 받는 중 (RelayTree)
+"""
+
+
+class FetchWorker:
+    """
+    패치 대상 클라이언트 하나의 패치 진행 정보
+    패치 대상 수 만큼 만들어지므로 __slots__ 로 속성을 고정해 메모리 사용을 줄임
+    """
+    __slots__ = ('client', 'path', 'state', 'delivered_bytes', 'acked_bytes', 'start_time', 'suspend_time',
+                 'stall_time', 'fetch')
+
+    def __init__(self, client, path: str):
+        self.client = client
+        # 클라이언트 래퍼 객체
+        self.path = path
+        # 클라이언트 패치 경로
+        self.state = WORKER_FETCHING
+        self.delivered_bytes = 0
+        # 클라이언트에게 전달한 파일 크기
+        self.acked_bytes = 0
+        # 클라이언트가 받아서 기록했다고 알려준 파일 크기 (RESULT_SEND_FILE), 재연결시 이 위치부터 이어서 전송
+        self.start_time = time.time()
+        self.suspend_time = None
+        # 마지막으로 재연결 대기 상태가 된 시각
+        self.stall_time = None
+        # 스풀 전송 중 송신 큐가 줄지 않고 쌓이기 시작한 시각 (FetchHandler._wait_workers_drain)
+        self.fetch = None
+        # 속한 FileFetch 객체
+
+
+class FileFetch:
+    """
+    패치 정보 DTO
+    """
+
+    def __init__(self, no, file, workers):
+        self.no: int  # 파일 패치 id
+        self.FILE: dict
+        self.workers: dict
+        """
+        패치할 클라이언트 마다 필요한 정보를 담고 있음 (클라이언트 -> FetchWorker)
+        해당 정보는 클라이언트가 패치를 진행되고 있을동안만 유지하고 있으며 실패/성공한 경우
+        바로 삭제된다.
+        """
+
+        self.no = no
+        self.FILE = file
+        self.workers = workers
+
+        self.is_cached = False
+        # 서버 스풀에 저장된 파일로 전송하는 경우 True (파일 제공자에게 파일을 받지 않음)
+        self.spool_writer = None
+        # 파일 제공자에게 받은 파일 조각을 스풀에 기록하는 객체 (SpoolWriter)
+        self.received_bytes = 0
+        # 파일 제공자에게 받은 파일 크기
+        self.uploader = None
+        # 파일 제공자(웹) 클라이언트
+        self.granted_credits = 0
+        # 파일 제공자에게 지급한 누적 credit 수 (CreditController)
+        self.received_chunks = 0
+        # 파일 제공자에게 받은 파일 조각 수
+        self.chunk_size = None
+        # 파일 제공자가 보내는 파일 조각 크기 (받은 조각 중 가장 큰 크기)
+        self.checksum = None
+        # 파일 조각 전달 중 md5 계산 객체 (StreamingChecksum), md5 를 검증하지 않는 경우 None
+        self.suspended = {}
+        """
+        :type dict(str, FetchWorker)
+        연결이 끊겨 재연결을 기다리는 대상 클라이언트 (ip -> FetchWorker)
+        """
+        self.lock = threading.Lock()
+        # 받은 파일 조각 전달과 재연결 클라이언트의 실시간 전달 전환 순서를 맞추기 위한 lock
+        self.relay_tree = None
+        # 클라이언트 간 중계로 전달하는 경우 중계 트리 (RelayTree), 서버가 모든 대상에게 직접 전달하면 None
+
+        for worker in workers.values():
+            worker.fetch = self
+
+    @property
+    def file(self):
+        return self.FILE
+
+    @property
+    def file_no(self):
+        """
+        :return: 패치 파일 id
+        """
+        return self.FILE['no']
+
+    @property
+    def file_md5(self):
+        """        
+        :return: 패치 파일 md5(checkusm) 
+        """
+        return self.FILE['md5']
+
+    @property
+    def file_name(self):
+        """
+        :return: 패치 파일 이름 
+        """
+        return self.FILE['name']
+
+    @property
+    def file_ext(self):
+        """
+        :return: 패치 파일 확장자 
+        """
+        return self.FILE['ext']
+
+    @property
+    def file_size(self):
+        """
+        :return: 패치 파일 크기
+        """
+        return self.FILE['size']
+
+    def live_workers(self) -> tuple:
+        """
+        :return: 파일 조각을 실시간으로 전달 받는 FetchWorker 튜플
+            (재연결 후 이어받기 전송 중인 클라이언트, 상위 클라이언트에게 중계 받는 클라이언트 제외)
+        """
+        return tuple(worker for worker in tuple(self.workers.values()) if worker.state == WORKER_FETCHING)
+
+    @property
+    def is_finish(self):
+        """
+        해당 패치가 모두 진행되었는지 확인
+        성공/실패를 떠나서 모든 클라이언트가 패치 완료되었다면 진행 완료 상태로 알림
+        재연결을 기다리는 클라이언트가 있으면 진행 중으로 봄
+        
+        :return: 패치 진행 완료 -> True, 패치 진행 실패 -> False
+        """
+        return len(self.workers) == 0 and len(self.suspended) == 0
+
+
+class FetchRegistry:
+    """
+    진행 중인 패치 목록
+
+    패치 id -> FileFetch 와 함께 클라이언트 -> 진행 중인 FileFetch 역 인덱스를 관리해
+    패치 결과 수신(RESULT_FETCH), 클라이언트 종료 처리에서 클라이언트가 속한 패치를
+    모든 패치와 패치 대상을 탐색하지 않고 바로 찾음
+    """
+
+    def __init__(self):
+        self._fetches = {}
+        """
+        :type dict(int, FileFetch)
+        """
+        self._by_client = {}
+        """
+        :type dict(Client, dict(int, FileFetch))
+        """
+        self._suspended = {}
+        """
+        :type dict(str, dict(int, FileFetch))
+        재연결을 기다리는 클라이언트 ip -> 진행 중이던 FileFetch
+        """
+        self._lock = threading.RLock()
+
+    def __contains__(self, fetch_no: int):
+        return fetch_no in self._fetches
+
+    def __getitem__(self, fetch_no: int) -> FileFetch:
+        """
+        :param fetch_no: 패치 id
+        :return: 필요한 FileFetch 없을 시 KeyError 발생
+        """
+        return self._fetches[fetch_no]
+
+    def __len__(self):
+        return len(self._fetches)
+
+    def worker_count(self) -> int:
+        """
+        :return: 진행 중인 패치들의 패치 대상 수 (재연결 대기 제외)
+        """
+        with self._lock:
+            return sum(len(fetch.workers) for fetch in self._fetches.values())
+
+    def suspended_count(self) -> int:
+        """
+        :return: 재연결을 기다리는 클라이언트 수
+        """
+        return len(self._suspended)
+
+    def get(self, fetch_no: int, default=None) -> FileFetch:
+        return self._fetches.get(fetch_no, default)
+
+    def add(self, fetch: FileFetch):
+        with self._lock:
+            self._fetches[fetch.no] = fetch
+
+            for client in fetch.workers:
+                self._by_client.setdefault(client, {})[fetch.no] = fetch
+
+    def fetches_of(self, client) -> tuple:
+        """
+        :param client:
+        :return: 클라이언트가 패치 대상으로 진행 중인 FileFetch 튜플
+        """
+        return tuple(self._by_client.get(client, {}).values())
+
+    def finish(self, client, fetch_no: int = None) -> FileFetch:
+        """
+        클라이언트 패치 성공 처리
+        만약에 모든 클라이언트가 끝맞춰 패치가 완료된 상태라면 목록에서 삭제
+
+        :param client: 패치 종료된 클라이언트
+        :param fetch_no: 패치 id, 없으면 클라이언트가 진행 중인 패치
+        :return: 클라이언트가 속한 FileFetch, 패치 대상이 아닌 경우 KeyError 발생
+        """
+        return self._end(client, fetch_no, WORKER_SUCCESS).fetch
+
+    def fail(self, client, fetch_no: int = None) -> FileFetch:
+        """
+        클라이언트 패치 실패 처리
+
+        :param client: 패치 실패한 클라이언트
+        :param fetch_no: 패치 id, 없으면 클라이언트가 진행 중인 패치
+        :return: 클라이언트가 속한 FileFetch, 패치 대상이 아닌 경우 KeyError 발생
+        """
+        return self._end(client, fetch_no, WORKER_FAIL).fetch
+
+    def fail_all(self, client) -> list:
+        """
+        클라이언트가 진행 중인 모든 패치 실패 처리 (클라이언트 종료시)
+
+        :param client:
+        :return: 실패 처리된 FetchWorker 리스트
+        """
+        with self._lock:
+            return [self._end(client, fetch.no, WORKER_FAIL) for fetch in self.fetches_of(client)]
+
+    def suspend(self, client) -> list:
+        """
+        클라이언트가 진행 중인 모든 패치를 재연결 대기 상태로 옮김 (클라이언트 종료시)
+        대기 중인 동안 해당 패치는 끝나지 않은 상태로 유지됨
+
+        :param client:
+        :return: 재연결 대기 상태로 옮긴 FetchWorker 리스트
+        """
+        with self._lock:
+            workers = []
+
+            for fetch in self._by_client.pop(client, {}).values():
+                worker = fetch.workers.pop(client)
+                worker.state = WORKER_RESUMING
+                worker.suspend_time = time.time()
+
+                fetch.suspended[client.ip] = worker
+                self._suspended.setdefault(client.ip, {})[fetch.no] = fetch
+                workers.append(worker)
+
+            return workers
+
+    def resume(self, client) -> list:
+        """
+        같은 ip 로 재연결한 클라이언트에게 재연결 대기 중인 패치를 다시 연결
+        같은 ip 의 이전 연결이 아직 종료 처리되지 않았다면 이전 연결의 패치도 옮겨옴 (끊긴 연결을 heartbeat 로 알아채기 전에 재연결한 경우)
+
+        :param client: 재연결한 클라이언트
+        :return: 다시 연결된 FetchWorker 리스트, 상태는 WORKER_RESUMING
+        """
+        with self._lock:
+            for old_client in [old for old in self._by_client if old is not client and old.ip == client.ip]:
+                self.suspend(old_client)
+
+            workers = []
+
+            for fetch in self._suspended.pop(client.ip, {}).values():
+                worker = fetch.suspended.pop(client.ip)
+                worker.client = client
+
+                fetch.workers[client] = worker
+                self._by_client.setdefault(client, {})[fetch.no] = fetch
+                workers.append(worker)
+
+            return workers
+
+    def expire(self, worker: FetchWorker, suspend_time: float) -> bool:
+        """
+        재연결 대기 시간이 지난 클라이언트 패치 실패 처리
+
+        :param worker: suspend() 에서 반환된 FetchWorker
+        :param suspend_time: suspend() 당시 worker.suspend_time, 그 사이 재연결 후 다시 끊긴 경우 처리하지 않음
+        :return: 아직 재연결 대기 중이어서 실패 처리한 경우 True
+        """
+        with self._lock:
+            fetch = worker.fetch
+            ip = worker.client.ip
+
+            if fetch.suspended.get(ip) is not worker or worker.suspend_time != suspend_time:
+                return False
+
+            del fetch.suspended[ip]
+            worker.state = WORKER_FAIL
+
+            client_fetches = self._suspended[ip]
+            client_fetches.pop(fetch.no, None)
+            if not client_fetches:
+                del self._suspended[ip]
+
+            if fetch.is_finish:
+                self._fetches.pop(fetch.no, None)
+
+            return True
+
+    def abort(self, fetch: FileFetch) -> list:
+        """
+        패치의 모든 대상 클라이언트(재연결 대기 포함) 실패 처리 후 목록에서 삭제
+
+        :param fetch:
+        :return: 실패 처리된 FetchWorker 리스트
+        """
+        with self._lock:
+            workers = []
+
+            for client in tuple(fetch.workers):
+                workers.append(self._end(client, fetch.no, WORKER_FAIL))
+
+            for ip, worker in tuple(fetch.suspended.items()):
+                if self.expire(worker, worker.suspend_time):
+                    workers.append(worker)
+
+            self._fetches.pop(fetch.no, None)
+
+            return workers
+
+    def _end(self, client, fetch_no, state: int) -> FetchWorker:
+        with self._lock:
+            client_fetches = self._by_client[client]
+
+            if fetch_no is None:
+                fetch_no = next(iter(client_fetches))
+
+            fetch = client_fetches.pop(fetch_no)
+
+            if not client_fetches:
+                del self._by_client[client]
+
+            worker = fetch.workers.pop(client)
+            worker.state = state
+
+            if fetch.is_finish:
+                self._fetches.pop(fetch.no, None)
+
+            return worker
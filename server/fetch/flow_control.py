@@ -0,0 +1,155 @@
+import math
+import threading
+
+DEFAULT_CHUNK_SIZE = 1024 * 500
+# 파일 제공자의 파일 조각 크기를 알기 전에 사용하는 예상 크기
+
+
+class CreditController:
+    """
+    파일 제공자(웹) 전송량 조절을 위한 credit 관리 객체
+
+    파일 제공자는 서버에게 받은 credit 수 만큼만 파일 조각(SEND_FILE_CHUNK)을 보낼 수 있음
+    서버는 대상 클라이언트 송신 큐에 쌓인 크기를 보고 여유가 있을 때만 credit 을 지급하므로
+    대상 클라이언트가 느려도 파일 크기와 상관없이 서버 메모리 사용량이 일정함
+
+    - 패치 별 사용량: 대상 클라이언트 송신 큐 크기의 quantile 값 + 지급했지만 아직 받지 못한 조각 크기
+      (전달하는 조각은 모든 대상 클라이언트가 같은 버퍼를 공유하므로 가장 느린 클라이언트 기준이 실제 메모리 사용량)
+    - 패치 별 사용량이 window_bytes 를, 전체 패치 사용량 합이 budget_bytes 를 넘지 않도록 지급
+    - 지급한 credit 보다 많은 조각을 보낸 파일 제공자(is_exceeded)는 credit 을 더 지급할 때 까지 수신을 멈춤 (FetchHandler)
+    """
+
+    def __init__(self, window_bytes: int, min_grant: int = 2):
+        """
+        :param window_bytes: 패치 하나가 사용할 수 있는 최대 크기
+        :param min_grant: 받지 않은 credit 이 남아 있을 때 한번에 지급할 최소 credit 수 (credit 메시지 수를 줄이기 위함)
+        """
+        self.window_bytes = window_bytes
+        self.min_grant = min_grant
+
+        self._fetches = {}
+        """
+        :type dict(FileFetch, int)
+        credit 을 관리 중인 패치 -> 패치 사용량
+        """
+        self._lock = threading.Lock()
+
+        self.granted_count = 0
+        # 누적 credit 지급 메시지 수
+        self.stall_count = 0
+        # 받지 않은 credit 이 없는데 지급하지 못한 횟수 (파일 제공자가 대기 중)
+        self.exceeded_count = 0
+        # 지급한 credit 보다 많은 조각을 받은 횟수
+
+    def __len__(self):
+        return len(self._fetches)
+
+    def __contains__(self, fetch):
+        return fetch in self._fetches
+
+    def add(self, fetch):
+        with self._lock:
+            self._fetches[fetch] = 0
+
+    def remove(self, fetch):
+        with self._lock:
+            self._fetches.pop(fetch, None)
+
+    def fetches(self) -> tuple:
+        return tuple(self._fetches)
+
+    def on_chunk(self, fetch, chunk_size: int):
+        """
+        파일 제공자에게 파일 조각을 받았을때 호출
+
+        :param fetch:
+        :param chunk_size: 받은 파일 조각 크기
+        :return:
+        """
+        fetch.received_chunks += 1
+
+        if fetch.chunk_size is None or chunk_size > fetch.chunk_size:
+            fetch.chunk_size = chunk_size
+
+        if self.is_exceeded(fetch):
+            self.exceeded_count += 1
+
+    @staticmethod
+    def is_exceeded(fetch) -> bool:
+        """
+        :param fetch:
+        :return: 파일 제공자가 지급한 credit 보다 많은 조각을 보냈으면 True
+        """
+        return fetch.received_chunks > fetch.granted_credits
+
+    def grant(self, fetch, quantile: float, budget_bytes: int) -> int:
+        """
+        지금 지급할 수 있는 credit 계산
+
+        :param fetch:
+        :param quantile: 대상 클라이언트 송신 큐 크기 기준 (1.0 -> 가장 느린 클라이언트, 0.5 -> 중간값)
+        :param budget_bytes: 전체 패치가 사용할 수 있는 최대 크기
+        :return: 지급할 credit 수, 0 이면 지급하지 않음
+        """
+        queued_bytes = self.quantile_queued_bytes(fetch, quantile)
+
+        with self._lock:
+            if fetch not in self._fetches:
+                return 0
+
+            chunk_size = fetch.chunk_size or DEFAULT_CHUNK_SIZE
+            outstanding = max(0, fetch.granted_credits - fetch.received_chunks)
+            usage = queued_bytes + outstanding * chunk_size
+            self._fetches[fetch] = usage
+
+            remain_credits = math.ceil((fetch.file_size - fetch.received_bytes) / chunk_size) - outstanding
+            # 남은 파일을 받는데 필요한 credit 수 (조각 크기가 예상보다 작으면 받은 후에 다시 계산되어 추가 지급됨)
+
+            if remain_credits <= 0:
+                return 0
+
+            free_bytes = min(self.window_bytes - usage, budget_bytes - sum(self._fetches.values()))
+            credits = min(max(0, free_bytes) // chunk_size, remain_credits)
+
+            if credits == 0 and usage == 0:
+                credits = 1
+                # 전송 중인 데이터가 없으면 window 가 조각 크기보다 작아도 멈추지 않도록 하나는 지급
+
+            if credits == 0:
+                if not outstanding:
+                    self.stall_count += 1
+                return 0
+
+            if outstanding and credits < min(self.min_grant, remain_credits):
+                return 0
+
+            fetch.granted_credits += credits
+            self._fetches[fetch] = usage + credits * chunk_size
+            self.granted_count += 1
+
+            return credits
+
+    @staticmethod
+    def quantile_queued_bytes(fetch, quantile: float) -> int:
+        """
+        :param fetch:
+        :param quantile:
+        :return: 실시간 전달 대상 클라이언트 송신 큐 크기의 quantile 값
+        """
+        client = CreditController.quantile_client(tuple(worker.client for worker in fetch.live_workers()), quantile)
+
+        return 0 if client is None else getattr(client, 'queued_bytes', 0)
+
+    @staticmethod
+    def quantile_client(clients: tuple, quantile: float):
+        """
+        :param clients:
+        :param quantile: 송신 큐 크기 기준 (1.0 -> 가장 느린 클라이언트, 0.5 -> 중간값)
+        :return: 송신 큐 크기가 quantile 값인 클라이언트, 없을 경우 None
+        """
+        clients = sorted(clients, key=lambda client: getattr(client, 'queued_bytes', 0))
+
+        if not clients:
+            return None
+
+        return clients[min(len(clients) - 1, max(0, math.ceil(quantile * len(clients)) - 1))]
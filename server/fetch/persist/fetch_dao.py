@@ -0,0 +1,112 @@
+"""
+패치 DAO 인터페이스
+
+연결 객체(Connector)의 dialect 에 맞는 구현 모듈(fetch_dao_maria_db, fetch_dao_sqlite)의 같은 이름 함수를 호출함
+딕셔너리 키(컬럼)는 구현 모듈 함수 설명 참고
+"""
+from common.db.db_handler import Connector, get_dao
+
+
+# fetch
+def insert_fetch(connector: Connector, **fetch) -> int:
+    """
+    패치 정보 저장
+
+    :param connector:
+    :param fetch: FETCH_FILE_NO, SENDER_IP, START_DATE
+    :return: `fetch` id(PK)
+    """
+    return get_dao(__name__, connector).insert_fetch(connector, **fetch)
+
+
+# client_fetch
+def insert_client_fetch(connector: Connector, **client_fetch):
+    """
+    클라이언트 패치 정보 저장
+
+    :param connector:
+    :param client_fetch: FETCH_NO, IP, PATH
+    :return:
+    """
+    get_dao(__name__, connector).insert_client_fetch(connector, **client_fetch)
+
+
+def insert_client_fetches(connector: Connector, client_fetches: list):
+    """
+    여러 클라이언트 패치 정보를 한번에 저장
+
+    :param connector:
+    :param client_fetches: insert_client_fetch() 의 client_fetch 딕셔너리 리스트
+    :return:
+    """
+    get_dao(__name__, connector).insert_client_fetches(connector, client_fetches)
+
+
+# fetch_result
+def insert_fetch_result(connector: Connector, **fetch_result):
+    """
+    패치 결과 저장
+
+    :param connector:
+    :param fetch_result: FETCH_NO, TARGET_IP, END_DATE, SUCCESS_FLAG
+    :return:
+    """
+    get_dao(__name__, connector).insert_fetch_result(connector, **fetch_result)
+
+
+def insert_fetch_results(connector: Connector, fetch_results: list):
+    """
+    여러 패치 결과를 한번에 저장
+
+    :param connector:
+    :param fetch_results: insert_fetch_result() 의 fetch_result 딕셔너리 리스트
+    :return:
+    """
+    get_dao(__name__, connector).insert_fetch_results(connector, fetch_results)
+
+
+# fetch_fail
+def insert_fetch_fail_cause(connector: Connector, **fetch_fail_cause):
+    """
+    패치 실패 원인 저장
+
+    :param connector:
+    :param fetch_fail_cause: FETCH_NO, TARGET_IP, CAUSE_TYPE
+    :return:
+    """
+    get_dao(__name__, connector).insert_fetch_fail_cause(connector, **fetch_fail_cause)
+
+
+def insert_fetch_fail_causes(connector: Connector, fetch_fail_causes: list):
+    """
+    여러 패치 실패 원인을 한번에 저장
+
+    :param connector:
+    :param fetch_fail_causes: insert_fetch_fail_cause() 의 fetch_fail_cause 딕셔너리 리스트
+    :return:
+    """
+    get_dao(__name__, connector).insert_fetch_fail_causes(connector, fetch_fail_causes)
+
+
+# fetch_file
+def insert_fetch_file(connector: Connector, **fetch_file) -> int:
+    """
+    패치 파일 정보 저장
+
+    :param connector:
+    :param fetch_file: FILE_NAME, FILE_EXT, FILE_SIZE, FILE_MD5, CREATOR_IP, CREATE_DATE
+    :return: `fetch_file` id(PK)
+    """
+    return get_dao(__name__, connector).insert_fetch_file(connector, **fetch_file)
+
+
+def update_fetch_file(connector: Connector, file_no, **fetch_file):
+    """
+    패치 파일 변경
+
+    :param connector:
+    :param file_no:
+    :param fetch_file: FILE_NAME, FILE_EXT, FILE_SIZE, FILE_MD5, CREATOR_IP, CREATE_DATE
+    :return:
+    """
+    get_dao(__name__, connector).update_fetch_file(connector, file_no, **fetch_file)
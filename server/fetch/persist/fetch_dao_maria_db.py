@@ -40,6 +40,20 @@ def insert_client_fetch(connector: MariaDBHandler, **client_fetch):
     )
 
 
+def insert_client_fetches(connector: MariaDBHandler, client_fetches: list):
+    """
+    여러 클라이언트 패치 정보를 한번에 DB insert (executemany)
+
+    :param connector:
+    :param client_fetches: insert_client_fetch() 의 client_fetch 딕셔너리 리스트
+    :return:
+    """
+    connector.cursor.executemany(
+        "INSERT INTO CLIENT_FETCH(FETCH_NO, IP, PATH) VALUES (%s, %s, %s)", [
+            (client_fetch['FETCH_NO'], client_fetch['IP'], client_fetch['PATH'])
+            for client_fetch in client_fetches])
+
+
 # fetch_result
 def insert_fetch_result(connector: MariaDBHandler, **fetch_result):
     """
@@ -63,6 +77,20 @@ def insert_fetch_result(connector: MariaDBHandler, **fetch_result):
             fetch_result['SUCCESS_FLAG']))
 
 
+def insert_fetch_results(connector: MariaDBHandler, fetch_results: list):
+    """
+    여러 패치 결과를 한번에 DB 저장 (executemany)
+
+    :param connector:
+    :param fetch_results: insert_fetch_result() 의 fetch_result 딕셔너리 리스트
+    :return:
+    """
+    connector.cursor.executemany(
+        "INSERT INTO FETCH_RESULT(FETCH_NO, TARGET_IP, END_DATE, SUCCESS_FLAG) VALUES (%s, %s, %s, %s)", [
+            (fetch_result['FETCH_NO'], fetch_result['TARGET_IP'], fetch_result['END_DATE'],
+             fetch_result['SUCCESS_FLAG']) for fetch_result in fetch_results])
+
+
 # fetch_fail
 def insert_fetch_fail_cause(connector: MariaDBHandler, **fetch_fail_cause):
     """
@@ -86,6 +114,20 @@ def insert_fetch_fail_cause(connector: MariaDBHandler, **fetch_fail_cause):
             fetch_fail_cause['FETCH_NO'], fetch_fail_cause['TARGET_IP'], fetch_fail_cause['CAUSE_TYPE']))
 
 
+def insert_fetch_fail_causes(connector: MariaDBHandler, fetch_fail_causes: list):
+    """
+    여러 패치 실패 원인을 한번에 DB 저장 (executemany)
+
+    :param connector:
+    :param fetch_fail_causes: insert_fetch_fail_cause() 의 fetch_fail_cause 딕셔너리 리스트
+    :return:
+    """
+    connector.cursor.executemany(
+        "INSERT INTO FETCH_FAIL_CAUSE(FETCH_NO, TARGET_IP, CAUSE_TYPE) VALUES (%s, %s, %s)", [
+            (fetch_fail_cause['FETCH_NO'], fetch_fail_cause['TARGET_IP'], fetch_fail_cause['CAUSE_TYPE'])
+            for fetch_fail_cause in fetch_fail_causes])
+
+
 # fetch_file
 def insert_fetch_file(connector: MariaDBHandler, **fetch_file):
     """
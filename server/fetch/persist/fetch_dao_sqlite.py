@@ -0,0 +1,158 @@
+from common.db.db_handler import SQLiteHandler
+
+
+# fetch
+def insert_fetch(connector: SQLiteHandler, **fetch):
+    """
+    패치 정보를 DB insert
+
+    :param connector:
+    :param fetch:
+
+    fetch['FETCH_FILE_NO']: int -> 패치 파일 id(`fetch_file` fk)
+    fetch['SENDER_IP']: str -> 패치 요청자 ip(`client` fk)
+    fetch['START_DATE']: datetime -> 패치 시작 시각
+    :return: `fetch` id(PK)
+    """
+    connector.cursor.execute(
+        "INSERT INTO `FETCH`(FETCH_FILE_NO, SENDER_IP, START_DATE) VALUES (?, ?, ?)", (
+            fetch['FETCH_FILE_NO'], fetch['SENDER_IP'], connector.get_datetime_db_format(fetch['START_DATE'])))
+    return connector.cursor.lastrowid
+
+
+# client_fetch
+def insert_client_fetch(connector: SQLiteHandler, **client_fetch):
+    """
+    클라이언트 패치 정보 DB insert
+
+    :param connector:
+    :param client_fetch:
+
+    client_fetch['FETCH_NO']: int -> 담당 패치 id(`fetch` fk)
+    client_fetch['IP']: str -> 클라이언트 ip(`client` fk)
+    client_fetch['PATH']: str -> 패치 경로
+    :return:
+    """
+    insert_client_fetches(connector, [client_fetch])
+
+
+def insert_client_fetches(connector: SQLiteHandler, client_fetches: list):
+    """
+    여러 클라이언트 패치 정보를 한번에 DB insert (executemany)
+
+    :param connector:
+    :param client_fetches: insert_client_fetch() 의 client_fetch 딕셔너리 리스트
+    :return:
+    """
+    connector.cursor.executemany(
+        "INSERT INTO CLIENT_FETCH(FETCH_NO, IP, PATH) VALUES (?, ?, ?)", [
+            (client_fetch['FETCH_NO'], client_fetch['IP'], client_fetch['PATH'])
+            for client_fetch in client_fetches])
+
+
+# fetch_result
+def insert_fetch_result(connector: SQLiteHandler, **fetch_result):
+    """
+    패치 결과 DB 저장
+
+    :param connector:
+    :param fetch_result:
+
+    fetch_result['FETCH_NO']: int -> 패치 id(`fetch` fk)
+    fetch_result['TARGET_IP']: str -> 패치한 클라이언트 ip(`client` fk)
+    fetch_result['END_DATE']: datetime -> 패치 종료 시각
+    fetch_result['SUCCESS_FLAG']: bool -> 패치 성공 여부
+    :return:
+    """
+    insert_fetch_results(connector, [fetch_result])
+
+
+def insert_fetch_results(connector: SQLiteHandler, fetch_results: list):
+    """
+    여러 패치 결과를 한번에 DB 저장 (executemany)
+
+    :param connector:
+    :param fetch_results: insert_fetch_result() 의 fetch_result 딕셔너리 리스트
+    :return:
+    """
+    connector.cursor.executemany(
+        "INSERT INTO FETCH_RESULT(FETCH_NO, TARGET_IP, END_DATE, SUCCESS_FLAG) VALUES (?, ?, ?, ?)", [
+            (fetch_result['FETCH_NO'], fetch_result['TARGET_IP'],
+             connector.get_datetime_db_format(fetch_result['END_DATE']), bool(fetch_result['SUCCESS_FLAG']))
+            for fetch_result in fetch_results])
+
+
+# fetch_fail
+def insert_fetch_fail_cause(connector: SQLiteHandler, **fetch_fail_cause):
+    """
+    패치가 실패했을 경우 패치 실패 원인 DB 저장
+
+    :param connector:
+    :param fetch_fail_cause:
+
+    fetch_fail_cause['FETCH_NO']: int -> 패치 id(`fetch` fk)
+    fetch_fail_cause['TARGET_IP']: str -> 패치한 클라이언트 ip(`client` fk)
+    fetch_fail_cause['CAUSE_TYPE']: int -> 패치 원인 코드 값
+    :return:
+    """
+    insert_fetch_fail_causes(connector, [fetch_fail_cause])
+
+
+def insert_fetch_fail_causes(connector: SQLiteHandler, fetch_fail_causes: list):
+    """
+    여러 패치 실패 원인을 한번에 DB 저장 (executemany)
+
+    :param connector:
+    :param fetch_fail_causes: insert_fetch_fail_cause() 의 fetch_fail_cause 딕셔너리 리스트
+    :return:
+    """
+    connector.cursor.executemany(
+        "INSERT INTO FETCH_FAIL_CAUSE(FETCH_NO, TARGET_IP, CAUSE_TYPE) VALUES (?, ?, ?)", [
+            (fetch_fail_cause['FETCH_NO'], fetch_fail_cause['TARGET_IP'], fetch_fail_cause['CAUSE_TYPE'])
+            for fetch_fail_cause in fetch_fail_causes])
+
+
+# fetch_file
+def insert_fetch_file(connector: SQLiteHandler, **fetch_file):
+    """
+    패치 파일 정보 DB 저장
+
+    :param connector:
+    :param fetch_file:
+
+    fetch_file['FILE_NAME']: str -> 패치 파일 이름
+    fetch_file['FILE_EXT']: str -> 패치 파일 확장자
+    fetch_file['FILE_SIZE']: int -> 패치 파일 크기
+    fetch_file['FILE_MD5']: int -> 패치 파일 checksum
+    fetch_file['CREATOR_IP']: str -> 패치 파일 생성자 ip (`client` pk)
+    fetch_file['CREATE_DATE']: datetime -> 패치 파일 생성 시각
+
+    :return: `fetch_file` id(PK)
+    """
+    connector.cursor.execute(
+        "INSERT INTO FETCH_FILE(FILE_NAME, FILE_EXT, FILE_SIZE, FILE_MD5, CREATOR_IP, CREATE_DATE) "
+        "VALUES (?, ?, ?, ?, ?, ?)", (
+            fetch_file['FILE_NAME'], fetch_file['FILE_EXT'], fetch_file['FILE_SIZE'], fetch_file['FILE_MD5'],
+            fetch_file['CREATOR_IP'], connector.get_datetime_db_format(fetch_file['CREATE_DATE'])))
+    return connector.cursor.lastrowid
+
+
+def update_fetch_file(connector: SQLiteHandler, file_no, **fetch_file):
+    """
+    패치 파일 변경
+
+    :param connector:
+    :param file_no:
+    :param fetch_file:
+
+    fetch_file['FILE_NAME']: str -> 패치 파일 이름
+    fetch_file['FILE_EXT']: str -> 패치 파일 확장자
+    fetch_file['FILE_SIZE']: int -> 패치 파일 크기
+    fetch_file['FILE_MD5']: int -> 패치 파일 checksum
+    fetch_file['CREATOR_IP']: str -> 패치 파일 생성자 ip (`client` pk)
+    :return:
+    """
+    connector.cursor.execute(
+        "UPDATE FETCH_FILE SET FILE_NAME = ?, FILE_EXT = ?, FILE_SIZE = ?, FILE_MD5 = ?, CREATOR_IP = ? "
+        "WHERE FILE_NO = ?", (fetch_file['FILE_NAME'], fetch_file['FILE_EXT'], fetch_file['FILE_SIZE'],
+                              fetch_file['FILE_MD5'], fetch_file['CREATOR_IP'], file_no))
@@ -0,0 +1,169 @@
+import threading
+
+
+class RelayNode:
+    """
+    중계 트리의 패치 대상 클라이언트 하나
+    패치 대상 수 만큼 만들어지므로 __slots__ 로 속성을 고정해 메모리 사용을 줄임
+    """
+    __slots__ = ('worker', 'parent', 'children', 'pending', 'is_done', 'is_relay')
+
+    def __init__(self, worker):
+        self.worker = worker
+        # 패치 대상 클라이언트 FetchWorker
+        self.parent = None
+        # 파일 조각을 전달해 주는 클라이언트 노드, None 이면 서버에게 직접 받음 (첫 단계)
+        self.children = []
+        # 파일 조각을 전달해 줄 클라이언트 노드 리스트
+        self.pending = 1
+        # 하위 트리(자신 포함)에서 패치가 끝나지 않은 노드 수, 0 이면 하위 트리 패치 완료
+        self.is_done = False
+        # 자신의 패치가 끝난 경우(성공/실패) True
+        self.is_relay = False
+        # 한번이라도 하위 노드가 있었던 경우 True, 하위 트리 패치 완료를 알려줘야 함
+
+    @property
+    def ip(self) -> str:
+        return self.worker.client.ip
+
+
+class RelayTree:
+    """
+    클라이언트 간 파일 조각 중계 트리
+
+    서버는 첫 단계(루트) 클라이언트에게만 파일 조각을 보내고 각 클라이언트는 받은 조각을 하위 클라이언트 degree 개에게 전달함
+    패치 대상이 n 개이면 서버 송신량은 파일 크기 x degree 로 일정하고 마지막 클라이언트까지 log(n) 단계만 거침
+
+    - 노드 배치: 패치 대상 순서대로 i 번째 노드(i >= degree)의 상위 노드는 (i // degree - 1) 번째 노드
+    - 중계 클라이언트가 끊기거나 하위 클라이언트에게 전달하지 못하면 하위 노드를 루트로 옮김 (promote),
+      옮긴 노드는 서버가 스풀에서 놓친 조각을 보내 준 후 직접 전달함, 옮긴 노드의 하위 트리는 그대로 유지
+    - 노드 별 하위 트리 패치 완료를 관리해 중계 클라이언트가 하위 트리가 끝날 때 까지 전달을 유지하도록 함
+    """
+
+    def __init__(self, workers: list, degree: int):
+        """
+        :param workers: 패치 대상 FetchWorker 리스트
+        :param degree: 클라이언트 하나가 전달할 하위 클라이언트 수 (첫 단계 클라이언트 수)
+        """
+        self.degree = degree
+
+        self._nodes = {}
+        """
+        :type dict(str, RelayNode)
+        클라이언트 ip -> 노드
+        """
+        self._lock = threading.Lock()
+
+        nodes = [RelayNode(worker) for worker in workers]
+
+        for index, node in enumerate(nodes):
+            self._nodes[node.ip] = node
+
+            if index >= degree:
+                parent = nodes[index // degree - 1]
+                node.parent = parent
+                parent.children.append(node)
+                parent.is_relay = True
+
+        for node in reversed(nodes):
+            # 하위 노드가 항상 뒤에 있으므로 역순으로 하위 트리 크기를 더함
+            if node.parent is not None:
+                node.parent.pending += node.pending
+
+    def __contains__(self, ip: str):
+        return ip in self._nodes
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def get(self, ip: str) -> RelayNode:
+        return self._nodes.get(ip)
+
+    def nodes(self) -> tuple:
+        return tuple(self._nodes.values())
+
+    def is_root(self, ip: str) -> bool:
+        """
+        :param ip:
+        :return: 서버에게 직접 파일 조각을 받는 클라이언트인 경우 True
+        """
+        node = self._nodes.get(ip)
+        return node is not None and node.parent is None
+
+    def children_of(self, ip: str) -> list:
+        """
+        :param ip:
+        :return: 클라이언트가 파일 조각을 전달할 하위 클라이언트 ip 리스트
+        """
+        with self._lock:
+            node = self._nodes.get(ip)
+            return [] if node is None else [child.ip for child in node.children]
+
+    def mark_done(self, ip: str) -> list:
+        """
+        클라이언트 패치 종료(성공/실패) 처리
+
+        :param ip:
+        :return: 이번 처리로 하위 트리 패치가 모두 끝난 노드 리스트 (자신 -> 상위 순서)
+        """
+        with self._lock:
+            node = self._nodes.get(ip)
+
+            if node is None or node.is_done:
+                return []
+
+            node.is_done = True
+
+            return self._add_pending(node, -1)
+
+    def promote(self, ip: str) -> list:
+        """
+        노드를 상위 노드에서 떼어 루트로 옮김 (하위 트리는 유지)
+
+        :param ip:
+        :return: 이번 처리로 하위 트리 패치가 모두 끝난 이전 상위 노드 리스트
+        """
+        with self._lock:
+            node = self._nodes.get(ip)
+
+            if node is None or node.parent is None:
+                return []
+
+            parent = node.parent
+            parent.children.remove(node)
+            node.parent = None
+
+            return self._add_pending(parent, -node.pending)
+
+    def orphan_children(self, ip: str) -> tuple:
+        """
+        노드의 하위 노드를 모두 루트로 옮김 (중계 클라이언트 연결 종료, 패치 실패시)
+
+        :param ip:
+        :return: (루트로 옮긴 하위 노드 중 하위 트리 패치가 끝나지 않은 노드 리스트, 하위 트리 패치가 끝난 노드 리스트)
+        """
+        node = self._nodes.get(ip)
+
+        if node is None:
+            return [], []
+
+        orphans = list(node.children)
+        completed = []
+
+        for child in orphans:
+            completed += self.promote(child.ip)
+
+        return [child for child in orphans if child.pending], completed
+
+    def _add_pending(self, node: RelayNode, count: int) -> list:
+        completed = []
+
+        while node is not None and count:
+            node.pending += count
+
+            if node.pending == 0:
+                completed.append(node)
+
+            node = node.parent
+
+        return completed
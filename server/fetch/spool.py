@@ -0,0 +1,231 @@
+import bisect
+import os
+import re
+import threading
+from contextlib import suppress
+
+SPOOL_ROOT = 'spool'
+# 패치 파일 저장 경로 (서버 실행 경로 기준)
+
+_KEY_PATTERN = re.compile(r'^[0-9a-zA-Z]+$')
+
+
+class SpoolWriter:
+    """
+    패치 파일 조각을 스풀에 기록하는 객체
+
+    임시 파일(.part)에 조각 위치(offset) 그대로 기록하고, 파일을 모두 받으면 commit() 으로
+    최종 경로로 옮겨 다른 패치에서 사용할 수 있도록 함
+    받은 조각 범위를 기록해 두고 파일 전체 범위를 빠짐없이 받은 경우에만 최종 경로로 옮김
+    """
+
+    def __init__(self, path: str, part_path: str, on_close=None):
+        """
+        :param path: 최종 경로
+        :param part_path: 임시 파일 경로 (패치 별로 다름)
+        :param on_close: commit() 혹은 abort() 후 호출할 함수 (writer) -> None
+        """
+        self.path = path
+        self.part_path = part_path
+        self.written_bytes = 0
+        # 기록된 파일 끝 위치
+        self.is_closed = False
+
+        self._ranges = []
+        """
+        :type list(list(int, int))
+        기록된 [시작, 끝) 범위 리스트, 시작 위치 순으로 정렬되어 있고 겹치거나 이어진 범위는 합침
+        """
+        self._on_close = on_close
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._fd = os.open(self.part_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC | getattr(os, 'O_BINARY', 0))
+
+    def write(self, offset: int, data):
+        if hasattr(os, 'pwrite'):
+            os.pwrite(self._fd, data, offset)
+        else:
+            os.lseek(self._fd, offset, os.SEEK_SET)
+            os.write(self._fd, data)
+
+        self.written_bytes = max(self.written_bytes, offset + len(data))
+        self._add_range(offset, offset + len(data))
+
+    def _add_range(self, start: int, end: int):
+        ranges = self._ranges
+
+        if start == end:
+            return
+
+        if ranges and ranges[-1][0] <= start <= ranges[-1][1]:
+            # 순서대로 받은 조각은 마지막 범위만 늘림
+            ranges[-1][1] = max(ranges[-1][1], end)
+            return
+
+        index = bisect.bisect_left(ranges, [start, end])
+
+        if index and ranges[index - 1][1] >= start:
+            index -= 1
+            start = ranges[index][0]
+
+        last = index
+
+        while last < len(ranges) and ranges[last][0] <= end:
+            end = max(end, ranges[last][1])
+            last += 1
+
+        ranges[index:last] = [[start, end]]
+
+    def is_complete(self, size: int) -> bool:
+        """
+        :param size: 파일 크기
+        :return: [0, size) 범위를 빠짐없이 기록했으면 True
+        """
+        if size == 0:
+            return not self._ranges
+
+        return self._ranges == [[0, size]]
+
+    def commit(self, size: int) -> bool:
+        """
+        파일 전체를 받은 경우 임시 파일을 최종 경로로 옮기고, 빠진 범위가 있으면 abort()
+
+        :param size: 파일 크기
+        :return: 최종 경로로 옮긴 경우 True
+        """
+        if not self.is_complete(size):
+            self.abort()
+            return False
+
+        self._close()
+        os.replace(self.part_path, self.path)
+
+        return True
+
+    def abort(self):
+        """
+        기록 중인 임시 파일 삭제
+        :return:
+        """
+        self._close()
+        with suppress(OSError):
+            os.remove(self.part_path)
+
+    def _close(self):
+        if not self.is_closed:
+            self.is_closed = True
+            os.close(self._fd)
+
+            if self._on_close is not None:
+                self._on_close(self)
+
+
+class SharedFile:
+    """
+    여러 송신 큐의 파일 영역(FileRegion)이 함께 사용하는 스풀 파일
+
+    with 문으로 사용하며, 파일 영역을 넣을 때 마다 acquire() 하고 영역 전송이 끝나면 release() 함
+    with 문을 벗어나고 모든 파일 영역의 전송(또는 폐기)이 끝나면 파일을 닫음
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self._refs = 1
+        # with 문(생성한 스레드) + 전송이 끝나지 않은 파일 영역 수
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.release()
+
+    def acquire(self):
+        with self._lock:
+            self._refs += 1
+
+    def release(self):
+        with self._lock:
+            self._refs -= 1
+            is_last = self._refs == 0
+
+        if is_last:
+            self.file.close()
+
+
+class FileSpool:
+    """
+    패치 파일 저장소 (content-addressed)
+
+    파일 checksum(md5) 을 키로 서버 디스크에 패치 파일을 저장해두고, 같은 파일의 패치 요청이 오면
+    파일 제공자(웹)에게 다시 받지 않고 저장된 파일을 대상 클라이언트에게 바로 전송함
+
+    저장 경로: {root}/{md5 앞 2글자}/{md5}
+    기록 중인 임시 파일: {저장 경로}.{pid}.{fetch_no}.part
+
+    같은 파일을 동시에 여러 패치가 받는 경우 먼저 시작한 패치만 스풀에 기록함 (md5 별 writer 하나)
+    """
+
+    def __init__(self, root: str = SPOOL_ROOT):
+        self.root = root
+
+        self._writers = {}
+        """
+        :type dict(str, SpoolWriter)
+        md5 -> 기록 중인 writer
+        """
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(md5) -> str:
+        key = str(md5).lower()
+
+        if not _KEY_PATTERN.match(key):
+            raise ValueError('올바르지 않은 파일 checksum 값 입니다 : {}'.format(md5))
+
+        return key
+
+    def path(self, md5) -> str:
+        key = self.key(md5)
+        return os.path.join(self.root, key[:2], key)
+
+    def has(self, md5, size: int = None) -> bool:
+        """
+        :param md5: 파일 checksum
+        :param size: 파일 크기, 지정한 경우 저장된 파일 크기와 같은지도 확인
+        :return: 저장된 파일이 있으면 True
+        """
+        try:
+            stat = os.stat(self.path(md5))
+        except (OSError, ValueError):
+            return False
+
+        return size is None or stat.st_size == size
+
+    def open_writer(self, md5, fetch_no: int):
+        """
+        :param md5: 파일 checksum
+        :param fetch_no: 패치 id, 임시 파일 이름에 사용
+        :return: SpoolWriter, 같은 파일을 다른 패치가 기록 중이면 None
+        """
+        key = self.key(md5)
+        path = self.path(key)
+
+        with self._lock:
+            if key in self._writers:
+                return None
+
+            writer = SpoolWriter(path, '{}.{}.{}.part'.format(path, os.getpid(), fetch_no), self._close_writer)
+            self._writers[key] = writer
+
+        return writer
+
+    def _close_writer(self, writer: SpoolWriter):
+        key = os.path.basename(writer.path)
+
+        with self._lock:
+            if self._writers.get(key) is writer:
+                del self._writers[key]
+
+    def open_reader(self, md5):
+        return open(self.path(md5), 'rb')
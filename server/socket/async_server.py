@@ -0,0 +1,340 @@
+import asyncio
+import concurrent.futures
+import os
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+from event import EventManager
+from event.event_manager import CONNECT_CLIENT_EVENT, DISCONNECTED_CLIENT_EVENT
+from common.protocol.message import Header, Message, HEADER_SIZE, FULL_CONN, HEARTBEAT
+from common.protocol.message_handler import receive_message, send_message, make_message
+
+
+class AsyncClient:
+    """
+    asyncio 엔진에서 사용하는 클라이언트 래퍼 객체
+
+    메시지 헨들러들이 사용하는 Client 인터페이스(ip, address, state, send(), close(), with 문)를 그대로 제공하며
+    실제 전송은 asyncio StreamWriter 에 위임함
+
+    메시지 헨들러, 이벤트 헨들러들은 이벤트 루프가 아닌 스레드에서 실행되므로 이벤트 루프 스레드가 아닌 곳에서 호출된
+    전송/종료는 call_soon_threadsafe() 로 이벤트 루프에 넘겨서 처리
+
+    transport 버퍼에 쌓인 크기가 max_queue_bytes 를 넘으면 selectors 엔진의 송신 큐(OutboundQueue)와 같이
+    전송하지 않고 on_overflow 콜백으로 연결 종료를 요청함
+
+    pause_reading() 으로 수신을 멈추면 수신 루프가 다음 메시지를 읽지 않고 기다림 (StreamReader 버퍼가 차면
+    transport 수신도 멈추므로 TCP 흐름 제어로 상대의 전송이 멈춤)
+    """
+
+    def __init__(self, address, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                 loop: asyncio.AbstractEventLoop, max_queue_bytes: int, on_overflow):
+        self.address = address
+        self.reader = reader
+        self.writer = writer
+        self.state = 0
+        """
+        클라이언트 상태
+        0: IDLE, 1: 패치 중, 2: 종료
+        """
+        self.last_receive_time = None
+        self.wait_count = 0
+        self.codec = None
+        # CLIENT_WELCOME 에서 정한 압축 방식, None 이면 압축하지 않음
+        self.body_codec = None
+        # CLIENT_WELCOME 에서 정한 body 형식, None 이면 JSON
+        self.max_queue_bytes = max_queue_bytes
+        # transport 버퍼에 쌓아둘 수 있는 최대 크기
+        self.is_overflow = False
+        # transport 버퍼가 가득 차 메시지를 보내지 못한 경우 True
+
+        self._loop = loop
+        self._on_overflow = on_overflow
+        self._lock = threading.RLock()
+        self._read_pauses = set()
+        # 수신을 멈춘 대상들 (패치 등), 모두 재개해야 다시 수신함
+        self.readable = asyncio.Event()
+        # 수신을 멈추지 않은 상태이면 set
+        self.readable.set()
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._lock.release()
+
+    @property
+    def ip(self) -> str:
+        return self.address[0]
+
+    @property
+    def channel(self):
+        return self.writer.get_extra_info('socket')
+
+    @property
+    def queued_bytes(self) -> int:
+        """
+        아직 전송되지 못하고 transport 버퍼에 쌓여있는 크기
+        :return:
+        """
+        return self.writer.transport.get_write_buffer_size()
+
+    def pause_reading(self, owner):
+        """
+        :param owner: 수신을 멈춘 대상, 같은 대상으로 resume_reading() 해야 재개됨
+        :return:
+        """
+        with self._lock:
+            is_changed = not self._read_pauses
+            self._read_pauses.add(owner)
+
+        if is_changed:
+            self._call(self._update_readable)
+
+    def resume_reading(self, owner):
+        with self._lock:
+            if owner not in self._read_pauses:
+                return
+
+            self._read_pauses.discard(owner)
+            is_changed = not self._read_pauses
+
+        if is_changed:
+            self._call(self._update_readable)
+
+    def _update_readable(self):
+        if self._read_pauses:
+            self.readable.clear()
+        else:
+            self.readable.set()
+
+    def _call(self, func, *args):
+        if self._in_loop():
+            func(*args)
+        else:
+            self._loop.call_soon_threadsafe(func, *args)
+
+    def _in_loop(self) -> bool:
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def send(self, data: bytes):
+        self.send_buffers([data])
+
+    def send_buffers(self, buffers: list):
+        if self.state == 2:
+            raise ConnectionError('closed client')
+        self._call(self._write, buffers)
+
+    def _write(self, buffers: list):
+        """
+        transport 버퍼에 전송할 버퍼 묶음을 넣음 (이벤트 루프 스레드)
+
+        :param buffers:
+        :return:
+        """
+        if self.state == 2 or self.is_overflow:
+            return
+
+        size = sum(memoryview(buffer).nbytes for buffer in buffers)
+        queued_bytes = self.queued_bytes
+
+        if queued_bytes and queued_bytes + size > self.max_queue_bytes:
+            # 전송 속도가 너무 느린 클라이언트, 버퍼를 더 쌓지 않고 연결 종료
+            self.is_overflow = True
+            self._on_overflow(self)
+            return
+
+        self.writer.writelines(buffers)
+
+    def wait_drained(self, size: int, timeout: float) -> bool:
+        """
+        transport 버퍼가 size 이하로 줄어들 때 까지 대기 (이벤트 루프가 아닌 스레드에서 호출)
+        이벤트 루프에서 writer.drain() 으로 기다리므로 버퍼가 줄어들면 바로 깨어남
+
+        :param size: 기다릴 transport 버퍼 크기
+        :param timeout: 최대 대기 시간 (단위: 초)
+        :return: 대기 시간 안에 줄어들지 않은 경우 False
+        """
+        if self.state == 2 or self.queued_bytes <= size:
+            return True
+
+        if self._in_loop():
+            return False
+            # 이벤트 루프 스레드에서는 기다릴 수 없음
+
+        try:
+            future = asyncio.run_coroutine_threadsafe(self._drain_below(size), self._loop)
+            future.result(timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            return False
+        except (ConnectionError, RuntimeError):
+            pass
+            # 대기 중에 연결이 종료되었거나 이벤트 루프가 종료됨
+
+        return True
+
+    async def _drain_below(self, size: int):
+        while self.state != 2 and self.queued_bytes > size:
+            await self.writer.drain()
+
+            if self.queued_bytes > size:
+                await asyncio.sleep(0.01)
+                # transport 가 전송을 멈추지 않은 크기(high water 이하)면 drain() 이 바로 반환되므로 잠시 대기
+
+    def close(self):
+        self.state = 2
+        self._call(self.writer.close)
+        self._call(self.readable.set)
+        # 수신을 멈추고 기다리던 수신 루프도 종료되도록 깨움
+
+
+class AsyncServerEngine:
+    """
+    selectors + 스레드 대신 하나의 asyncio 이벤트 루프에서 클라이언트 연결/수신/heartbeat 처리를 하는 엔진
+
+    Server.start(engine='asyncio') 로 실행되며 Server 객체의 설정, 클라이언트 목록, 이벤트 헨들러를 그대로 사용함
+    메시지는 기존 Header/Message 형식 그대로 주고 받음
+
+    메시지 헨들러와 이벤트 헨들러는 DB 트랜잭션 등 blocking 처리를 하므로 이벤트 루프가 아닌 스레드 풀에서 실행함
+    한 클라이언트의 메시지는 처리가 끝난 후 다음 메시지를 읽으므로 받은 순서대로 처리됨
+    """
+
+    def __init__(self, server):
+        self._server = server
+        self._loop = None
+        self._stopped = None
+        self._executor = None
+
+    def run(self):
+        self._executor = ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4),
+                                            thread_name_prefix='async-handler')
+
+        try:
+            asyncio.run(self._serve())
+        finally:
+            self._executor.shutdown()
+            # 남은 종료 처리(DB 저장 등)가 끝날 때 까지 대기
+
+    def stop(self):
+        if self._loop is not None and self._stopped is not None:
+            self._loop.call_soon_threadsafe(self._stopped.set)
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stopped = asyncio.Event()
+
+        listener = await asyncio.start_server(self._handle_connection, self._server.host, self._server.port,
+                                              backlog=self._server.max_client, reuse_address=True)
+        monitor_task = asyncio.ensure_future(self._monitor_clients())
+
+        try:
+            await self._stopped.wait()
+        finally:
+            monitor_task.cancel()
+            listener.close()
+            await listener.wait_closed()
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        server = self._server
+        address = writer.get_extra_info('peername')
+
+        if len(server.clients) >= server.max_client:
+            # 최대 클라이언트 연결 수를 넘어갔을 경우 꽉 찼다는 메시지르 보내고 연결 종료
+            writer.write(make_message(FULL_CONN, server.host, address[0]))
+            await writer.drain()
+            writer.close()
+            return
+
+        client = AsyncClient(address, reader, writer, self._loop, server.max_queue_bytes, self._close_client)
+        writer.transport.set_write_buffer_limits(high=server.max_queue_bytes // 2)
+        # drain() 은 최대 크기의 절반이 쌓였을 때 부터 기다림
+
+        server.clients.add(client)
+        server.heartbeat_wheel.schedule(client, server.wait_term)
+
+        await self._loop.run_in_executor(self._executor, self._call_event_handler, CONNECT_CLIENT_EVENT, client)
+
+        try:
+            while server.is_running and client.state != 2:
+                await client.readable.wait()
+                # 수신을 멈춘 클라이언트(credit 보다 많이 보낸 파일 제공자)는 재개될 때 까지 읽지 않음
+
+                header_bytes = await reader.readexactly(HEADER_SIZE)
+
+                client.last_receive_time = time.time()
+                client.wait_count = 0
+                # 수신 한 경우 heartbeat 누적 수를 초기화
+
+                header = Header.decode(header_bytes)
+                body_bytes = await reader.readexactly(header.SIZE)
+
+                await self._loop.run_in_executor(self._executor, receive_message, client, Message(header, body_bytes))
+                # 헨들러는 스레드 풀에서 실행하고 처리가 끝나면 다음 메시지를 읽음
+
+                await writer.drain()
+                # 이 클라이언트에게 보낼 데이터가 많이 쌓였으면 줄어들 때 까지 이 클라이언트 수신을 멈춤
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            traceback.print_exc()
+        finally:
+            # 연결 혹은 받아온 데이터에 문제가 있으면 연결을 끊는거로 처리하고 있음
+            self._close_client(client)
+
+    async def _monitor_clients(self):
+        """
+        selectors 엔진과 같은 HeartbeatWheel 을 사용해 확인 시각이 된 클라이언트만 처리
+        :return:
+        """
+        server = self._server
+        wheel = server.heartbeat_wheel
+
+        while server.is_running:
+            await asyncio.sleep(wheel.tick_interval)
+
+            start = time.perf_counter()
+            due_clients = wheel.advance()
+            now = time.time()
+
+            for client in due_clients:
+                if client.state == 2 or client not in server.clients:
+                    continue
+
+                if client.last_receive_time is not None and now - client.last_receive_time < server.wait_term:
+                    wheel.schedule(client, client.last_receive_time + server.wait_term - now)
+                elif client.wait_count == server.max_wait_count:
+                    # 최대 heartbeat 허용 횟수를 넘긴 상태라면 연결이 끊긴 상태라고 판단
+                    self._close_client(client)
+                else:
+                    try:
+                        send_message(HEARTBEAT, server.host, client)
+                        client.wait_count += 1
+                        wheel.schedule(client, server.wait_term)
+                    except Exception as e:
+                        self._close_client(client)
+
+            wheel.record_tick(len(due_clients), time.perf_counter() - start)
+
+    def _close_client(self, client: AsyncClient):
+        with client:
+            if client.state == 2:
+                return
+
+            client.close()
+
+        self._loop.run_in_executor(self._executor, self._call_event_handler, DISCONNECTED_CLIENT_EVENT, client)
+        # 종료 처리(DB 저장 등)는 스레드 풀에서 실행
+
+    @staticmethod
+    def _call_event_handler(event: str, client: AsyncClient):
+        try:
+            EventManager.call_handler(event, client=client)
+        except Exception as e:
+            traceback.print_exc()
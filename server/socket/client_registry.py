@@ -0,0 +1,137 @@
+import threading
+
+CLIENT_IDLE = 0
+CLIENT_FETCHING = 1
+CLIENT_CLOSING = 2
+"""
+클라이언트 상태 (Client.state)
+"""
+
+
+class ClientRegistry:
+    """
+    연결된 클라이언트 목록
+
+    클라이언트 객체 외에 ip, 상태 별 보조 인덱스를 같이 관리해 추가/삭제/조회를 O(1)로 처리함
+    순회는 추가/삭제 시점에 새로 만든 튜플 스냅샷을 사용하므로 lock 없이 순회할 수 있음 (monitor 스레드)
+
+    - 클라이언트 상태 변경은 인덱스 갱신을 위해 반드시 set_state() 를 사용해야함
+    """
+
+    def __init__(self, on_state_change=None):
+        """
+        :param on_state_change: 클라이언트 상태가 바뀌었을때 호출할 함수 (client, state) -> None
+        """
+        self._on_state_change = on_state_change
+        self._clients = {}
+        """
+        :type dict(Client, int)
+        클라이언트 -> 인덱스에 등록된 상태
+        """
+        self._by_ip = {}
+        """
+        :type dict(str, dict(Client, None))
+        ip -> 클라이언트 (연결 순서 유지)
+        """
+        self._by_state = {CLIENT_IDLE: {}, CLIENT_FETCHING: {}, CLIENT_CLOSING: {}}
+        """
+        :type dict(int, dict(Client, None))
+        상태 -> 클라이언트
+        """
+        self._snapshot = ()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def __contains__(self, client):
+        return client in self._clients
+
+    def __iter__(self):
+        return iter(self._snapshot)
+
+    def snapshot(self) -> tuple:
+        """
+        현재 연결된 클라이언트 튜플, 이후 추가/삭제에 영향을 받지 않음
+        :return:
+        """
+        return self._snapshot
+
+    def add(self, client):
+        with self._lock:
+            if client in self._clients:
+                return
+
+            state = client.state
+            self._clients[client] = state
+            self._by_ip.setdefault(client.ip, {})[client] = None
+            self._by_state.setdefault(state, {})[client] = None
+            self._snapshot = tuple(self._clients)
+
+    def remove(self, client) -> bool:
+        """
+        :param client:
+        :return: 등록되지 않은 클라이언트인 경우 False
+        """
+        with self._lock:
+            state = self._clients.pop(client, None)
+
+            if state is None:
+                return False
+
+            ip_clients = self._by_ip.get(client.ip)
+            if ip_clients is not None:
+                ip_clients.pop(client, None)
+                if not ip_clients:
+                    del self._by_ip[client.ip]
+
+            self._by_state[state].pop(client, None)
+            self._snapshot = tuple(self._clients)
+
+        return True
+
+    def set_state(self, client, state: int):
+        """
+        클라이언트 상태 변경과 상태 인덱스 갱신
+
+        :param client:
+        :param state: CLIENT_IDLE, CLIENT_FETCHING, CLIENT_CLOSING
+        :return:
+        """
+        with self._lock:
+            client.state = state
+            before = self._clients.get(client)
+
+            if before is None or before == state:
+                return
+
+            self._clients[client] = state
+            self._by_state[before].pop(client, None)
+            self._by_state.setdefault(state, {})[client] = None
+
+        if self._on_state_change is not None:
+            self._on_state_change(client, state)
+
+    def get_by_ip(self, ip: str):
+        """
+        :param ip:
+        :return: 해당 ip 로 가장 최근에 연결된 클라이언트, 없을 경우 None
+        """
+        ip_clients = self._by_ip.get(ip)
+
+        if not ip_clients:
+            return None
+
+        try:
+            return next(reversed(ip_clients))
+        except (StopIteration, RuntimeError):
+            # 다른 스레드에서 삭제 중인 경우
+            return None
+
+    def by_state(self, state: int) -> tuple:
+        """
+        :param state:
+        :return: 해당 상태의 클라이언트 튜플
+        """
+        with self._lock:
+            return tuple(self._by_state.get(state, ()))
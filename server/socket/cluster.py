@@ -0,0 +1,585 @@
+import os
+import selectors
+import signal
+import socket
+import struct
+import threading
+import time
+import traceback
+from contextlib import suppress
+
+from event import EventManager
+from event.event_manager import CONNECT_CLIENT_EVENT, DISCONNECTED_CLIENT_EVENT
+from common.protocol.message import Header, Message, RESULT_FETCH, RESULT_SEND_FILE, COMPRESSED_FLAG, \
+    CODE_MASK, ip_to_bytes, bytes_to_ip
+from common.protocol.message_handler import receive_message, decompress_message
+from server.socket.outbound_queue import OutboundQueue
+
+CONTROL = struct.Struct('<IBBB4s')
+"""
+워커 프로세스 <-> 허브 제어 메시지 header
+
+payload size - 4byte
+type - 1byte
+src - 1byte (보낸 워커 번호)
+dst - 1byte (받을 워커 번호, BROADCAST 인 경우 허브가 처리 후 다른 모든 워커에게 전달)
+ip - 4byte (대상 클라이언트 ip)
+"""
+
+BROADCAST = 0xFF
+
+HUB_QUEUE_BYTES = 1024 * 1024 * 256
+# 허브에서 워커 별로 쌓아둘 수 있는 전달 대기 크기, 넘으면 워커가 응답하지 않는 것으로 보고 연결을 끊음
+
+CTRL_HELLO = 1
+CTRL_CLIENT_UP = 2
+# 클라이언트 연결 (BROADCAST)
+CTRL_CLIENT_DOWN = 3
+# 클라이언트 연결 종료 (BROADCAST)
+CTRL_CLIENT_STATE = 4
+# 클라이언트 상태 변경 (BROADCAST), payload: 상태 1byte
+CTRL_FORWARD = 5
+# 다른 워커에 연결된 클라이언트에게 보낼 메시지, payload: header + body
+CTRL_UPSTREAM = 6
+# 다른 워커에 연결된 클라이언트에게 받은 메시지, payload: code 1byte + body
+CTRL_SUBSCRIBE = 7
+# 클라이언트에게 받은 패치 결과 메시지(ROUTED_CODES)를 보낸 워커에게 넘겨달라는 요청
+CTRL_SET_STATE = 8
+# 다른 워커에 연결된 클라이언트 상태 변경 요청, payload: 상태 1byte
+CTRL_CLIENT_DEPTH = 9
+# 구독한 워커에게 알리는 클라이언트 송신 큐 크기, payload: 크기 8byte
+
+DEPTH = struct.Struct('<Q')
+DEPTH_STEP = 1024 * 64
+# 송신 큐 크기가 이 이상 바뀌거나 비었을 때만 알림 (flush 마다 제어 메시지를 보내지 않도록)
+
+ROUTED_CODES = (RESULT_FETCH, RESULT_SEND_FILE)
+"""
+패치를 진행 중인 워커에게 넘겨야 하는 클라이언트 메시지 코드
+"""
+
+
+def _read_frames(channel: socket.socket, buffer: bytearray) -> list:
+    """
+    제어 소켓에서 읽을 수 있는 만큼 읽고 완성된 제어 메시지 리스트 반환
+
+    :param channel:
+    :param buffer: 덜 들어온 제어 메시지를 보관하는 버퍼
+    :return: (type, src, dst, ip, payload) 리스트, 연결이 종료된 경우 ConnectionError 발생
+    """
+    try:
+        data = channel.recv(1024 * 256)
+    except (BlockingIOError, InterruptedError):
+        return []
+
+    if not data:
+        raise ConnectionError('control channel closed')
+
+    buffer += data
+    frames = []
+    position = 0
+
+    while len(buffer) - position >= CONTROL.size:
+        size, control_type, src, dst, ip = CONTROL.unpack_from(buffer, position)
+        end = position + CONTROL.size + size
+
+        if len(buffer) < end:
+            break
+
+        frames.append((control_type, src, dst, ip, bytes(buffer[position + CONTROL.size:end])))
+        position = end
+
+    del buffer[:position]
+
+    return frames
+
+
+class ClusterHub:
+    """
+    멀티 프로세스 모드의 제어 허브 (부모 프로세스에서 실행)
+
+    워커 프로세스들은 unix 소켓으로 허브에 연결하고, 허브는 제어 메시지를 dst 워커에게 전달함
+    클라이언트 연결/종료/상태 메시지(BROADCAST)는 ip -> (워커 번호, 상태) 디렉터리에 반영 후 다른 모든 워커에게 전달하고
+    새로 연결한 워커에게는 현재 디렉터리를 보내 줌
+
+    허브는 메시지 내용을 해석하지 않고 전달만 하므로 GIL 을 오래 잡지 않음
+    워커 별 송신 큐(OutboundQueue)에 넣고 EVENT_WRITE 시점에 전송하므로 느린 워커 때문에 허브가 멈추지 않음
+    (워커가 허브로 전송 중에 막혀 있어도 허브는 계속 읽으므로 서로 기다리는 상황이 생기지 않음)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.is_running = False
+
+        self._directory = {}
+        """
+        :type dict(bytes, tuple(int, int))
+        클라이언트 ip(4byte) -> (워커 번호, 상태)
+        """
+        self._workers = {}
+        """
+        :type dict(int, socket.socket)
+        워커 번호 -> 제어 소켓
+        """
+        self._buffers = {}
+        self._outbounds = {}
+        """
+        :type dict(socket.socket, OutboundQueue)
+        """
+        self._sel = None
+
+        with suppress(OSError):
+            os.remove(path)
+
+        self._listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._listener.bind(path)
+        self._listener.listen(64)
+
+    def close(self):
+        with suppress(OSError):
+            self._listener.close()
+
+    def stop(self):
+        self.is_running = False
+
+    def serve(self, pids: list):
+        """
+        워커 프로세스가 모두 종료될 때 까지 제어 메시지 전달
+
+        :param pids: 워커 프로세스 id 리스트
+        :return:
+        """
+        sel = self._sel = selectors.DefaultSelector()
+        sel.register(self._listener, selectors.EVENT_READ, None)
+        alive = set(pids)
+        is_stop_sent = False
+        self.is_running = True
+
+        try:
+            while alive:
+                for key, mask in sel.select(timeout=0.5):
+                    if key.data is None:
+                        channel, _ = self._listener.accept()
+                        channel.setblocking(False)
+                        self._buffers[channel] = bytearray()
+                        self._outbounds[channel] = OutboundQueue(HUB_QUEUE_BYTES)
+                        sel.register(channel, selectors.EVENT_READ, channel)
+                        continue
+
+                    if mask & selectors.EVENT_WRITE:
+                        self._flush(key.data)
+                    if mask & selectors.EVENT_READ and key.data in self._buffers:
+                        self._receive(key.data)
+
+                for pid in tuple(alive):
+                    with suppress(ChildProcessError):
+                        if os.waitpid(pid, os.WNOHANG)[0] == pid:
+                            alive.discard(pid)
+
+                if not self.is_running and not is_stop_sent:
+                    is_stop_sent = True
+                    for pid in alive:
+                        with suppress(OSError):
+                            os.kill(pid, signal.SIGINT)
+                    # 워커들이 종료 처리를 할 수 있도록 SIGINT 전달 후 종료될 때 까지 대기
+        finally:
+            sel.close()
+            self.close()
+            with suppress(OSError):
+                os.remove(self.path)
+
+    def _receive(self, channel: socket.socket):
+        try:
+            frames = _read_frames(channel, self._buffers[channel])
+        except OSError:
+            self._close(channel)
+            return
+
+        for control_type, src, dst, ip, payload in frames:
+            frame = CONTROL.pack(len(payload), control_type, src, dst, ip) + payload
+
+            if control_type == CTRL_HELLO:
+                self._workers[src] = channel
+
+                for client_ip, (worker_id, state) in tuple(self._directory.items()):
+                    self._send(channel, CONTROL.pack(0, CTRL_CLIENT_UP, worker_id, src, client_ip))
+                    self._send(channel, CONTROL.pack(1, CTRL_CLIENT_STATE, worker_id, src, client_ip) +
+                               bytes((state,)))
+            elif dst == BROADCAST:
+                if control_type == CTRL_CLIENT_UP:
+                    self._directory[ip] = (src, 0)
+                elif control_type == CTRL_CLIENT_STATE and self._directory.get(ip, (None,))[0] == src:
+                    self._directory[ip] = (src, payload[0])
+                elif control_type == CTRL_CLIENT_DOWN and self._directory.get(ip, (None,))[0] == src:
+                    del self._directory[ip]
+
+                for worker_id, worker_channel in tuple(self._workers.items()):
+                    if worker_id != src:
+                        self._send(worker_channel, frame)
+            else:
+                worker_channel = self._workers.get(dst)
+
+                if worker_channel is not None:
+                    self._send(worker_channel, frame)
+
+    def _send(self, channel: socket.socket, frame: bytes):
+        outbound = self._outbounds.get(channel)
+
+        if outbound is None:
+            return
+
+        if not outbound.put([frame]):
+            self._close(channel)
+            return
+
+        self._flush(channel)
+
+    def _flush(self, channel: socket.socket):
+        outbound = self._outbounds.get(channel)
+
+        if outbound is None:
+            return
+
+        try:
+            is_empty = outbound.flush(channel)
+        except OSError:
+            self._close(channel)
+            return
+
+        events = selectors.EVENT_READ if is_empty else selectors.EVENT_READ | selectors.EVENT_WRITE
+
+        with suppress(KeyError, ValueError):
+            if self._sel.get_key(channel).events != events:
+                self._sel.modify(channel, events, channel)
+
+    def _close(self, channel: socket.socket):
+        with suppress(KeyError, ValueError):
+            self._sel.unregister(channel)
+
+        self._buffers.pop(channel, None)
+        self._outbounds.pop(channel, None)
+
+        for worker_id, worker_channel in tuple(self._workers.items()):
+            if worker_channel is channel:
+                del self._workers[worker_id]
+
+        channel.close()
+
+
+class RemoteClient:
+    """
+    다른 워커 프로세스에 연결된 클라이언트 프록시
+
+    메시지 헨들러들이 사용하는 Client 인터페이스(ip, address, state, send(), close(), with 문)를 제공하며
+    전송은 허브를 통해 클라이언트가 연결된 워커에게 넘겨서 처리함
+
+    - 처음 전송할 때 클라이언트가 연결된 워커에게 패치 결과 메시지(ROUTED_CODES)를 이 워커로 넘겨달라고 요청함
+    - queued_bytes 는 클라이언트가 연결된 워커가 알려준 송신 큐 크기 (CTRL_CLIENT_DEPTH, 구독 후 DEPTH_STEP 단위로 갱신)
+      credit 계산시 로컬 클라이언트처럼 느린 클라이언트 기준으로 지급할 수 있도록 하기 위함
+    """
+
+    def __init__(self, link, worker_id: int, ip: str, state: int):
+        self.address = (ip, 0)
+        self.worker_id = worker_id
+        # 클라이언트가 연결된 워커 번호
+        self.codec = None
+        self.body_codec = None
+        self.queued_bytes = 0
+        self.last_receive_time = None
+        self.wait_count = 0
+
+        self._link = link
+        self._state = state
+        self._is_subscribed = False
+        self._lock = threading.RLock()
+        self._depth_changed = threading.Condition()
+        # queued_bytes 가 갱신될 때 wait_drained() 대기 스레드를 깨우기 위해 사용
+
+    def __enter__(self):
+        self._lock.acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._lock.release()
+
+    @property
+    def ip(self) -> str:
+        return self.address[0]
+
+    @property
+    def state(self) -> int:
+        return self._state
+
+    @state.setter
+    def state(self, state: int):
+        """
+        클라이언트가 연결된 워커에게 상태 변경 요청
+        :param state:
+        :return:
+        """
+        self._state = state
+
+        if state != 2:
+            self._link.send_control(CTRL_SET_STATE, self.worker_id, self.ip, bytes((state,)))
+
+    def send(self, data: bytes):
+        if self._state == 2:
+            raise ConnectionError('closed client')
+
+        if not self._is_subscribed:
+            self._is_subscribed = True
+            self._link.send_control(CTRL_SUBSCRIBE, self.worker_id, self.ip)
+
+        self._link.send_control(CTRL_FORWARD, self.worker_id, self.ip, data)
+
+    def send_buffers(self, buffers: list):
+        self.send(b''.join(buffers))
+
+    def update_queued_bytes(self, size: int):
+        """
+        클라이언트가 연결된 워커가 알려준 송신 큐 크기로 갱신 (CTRL_CLIENT_DEPTH)
+        :param size:
+        :return:
+        """
+        with self._depth_changed:
+            self.queued_bytes = size
+            self._depth_changed.notify_all()
+
+    def wait_drained(self, size: int, timeout: float) -> bool:
+        """
+        송신 큐가 size 이하로 줄어들 때 까지 대기, 워커가 송신 큐 크기를 알려줄 때 마다 깨어나서 확인함
+
+        :param size: 기다릴 송신 큐 크기
+        :param timeout: 최대 대기 시간 (단위: 초)
+        :return: 대기 시간 안에 줄어들지 않은 경우 False
+        """
+        with self._depth_changed:
+            return self._depth_changed.wait_for(lambda: self._state == 2 or self.queued_bytes <= size, timeout)
+
+    def close(self):
+        self._state = 2
+
+        with self._depth_changed:
+            self._depth_changed.notify_all()
+
+
+class ClusterLink:
+    """
+    워커 프로세스의 허브 연결
+
+    - 로컬 클라이언트 연결/종료/상태 변경을 허브에 알리고, 다른 워커의 알림으로 클라이언트 디렉터리를 유지함
+      (다른 워커 클라이언트 조회는 로컬 디렉터리에서 처리하므로 허브에 묻지 않음)
+    - 다른 워커에 연결된 클라이언트는 RemoteClient 로 만들어 메시지 헨들러가 로컬 클라이언트처럼 사용함
+    - 제어 메시지 수신은 서버 selectors 루프에서 처리 (read())
+    - 제어 메시지 전송은 송신 큐(OutboundQueue)에 넣고 on_write_pending 콜백으로 Server 에 알림,
+      Server 는 selectors 스레드에서 flush() 하고 다 보내지 못하면 EVENT_WRITE 를 등록함 (허브가 느려도 selectors 스레드가 멈추지 않음)
+    """
+
+    def __init__(self, path: str, worker_id: int):
+        self.path = path
+        self.worker_id = worker_id
+
+        self.channel = None
+        self.outbound = OutboundQueue(HUB_QUEUE_BYTES)
+        self.registered_events = selectors.EVENT_READ
+        # selectors 에 등록되어 있는 이벤트
+        self._buffer = bytearray()
+        self._on_write_pending = None
+
+        self._directory = {}
+        """
+        :type dict(str, tuple(int, int))
+        다른 워커에 연결된 클라이언트 ip -> (워커 번호, 상태)
+        """
+        self._remote_clients = {}
+        """
+        :type dict(str, RemoteClient)
+        """
+        self._routes = {}
+        """
+        :type dict(str, int)
+        로컬 클라이언트 ip -> 패치 결과 메시지를 넘겨줄 워커 번호
+        """
+        self._published_depths = {}
+        """
+        :type dict(str, int)
+        로컬 클라이언트 ip -> 구독한 워커에게 마지막으로 알린 송신 큐 크기
+        """
+
+    def connect(self, on_write_pending):
+        """
+        :param on_write_pending: 송신 큐에 전송할 제어 메시지가 생겼을 때 호출할 함수 (link) -> None
+        :return:
+        """
+        for _ in range(50):
+            try:
+                channel = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+                channel.connect(self.path)
+                break
+            except OSError:
+                channel.close()
+                time.sleep(0.1)
+        else:
+            raise ConnectionError('허브에 연결할 수 없습니다 : {}'.format(self.path))
+
+        channel.sendall(CONTROL.pack(0, CTRL_HELLO, self.worker_id, BROADCAST, ip_to_bytes('0.0.0.0')))
+        # 서버 루프 시작 전이므로 HELLO 는 바로 전송
+        channel.setblocking(False)
+
+        self.channel = channel
+        self._on_write_pending = on_write_pending
+
+    def send_control(self, control_type: int, dst: int, ip: str, payload: bytes = b''):
+        """
+        제어 메시지를 송신 큐에 넣음, frame 과 payload 는 한번에 큐에 들어가므로 여러 스레드에서 보내도 섞이지 않음
+        허브가 HUB_QUEUE_BYTES 보다 많이 밀려 있으면 ConnectionError 발생
+        """
+        frame = CONTROL.pack(len(payload), control_type, self.worker_id, dst, ip_to_bytes(ip))
+
+        if not self.outbound.put([frame, payload]):
+            raise ConnectionError('hub queue overflow')
+
+        self._on_write_pending(self)
+
+    def flush(self) -> bool:
+        """
+        송신 큐에 쌓인 제어 메시지를 non-blocking 으로 전송 (서버 selectors 스레드)
+        :return: 송신 큐를 모두 비운 경우 True
+        """
+        return self.outbound.flush(self.channel)
+
+    def publish_up(self, client):
+        self.send_control(CTRL_CLIENT_UP, BROADCAST, client.ip)
+
+    def publish_down(self, client):
+        self._routes.pop(client.ip, None)
+        self._published_depths.pop(client.ip, None)
+        self.send_control(CTRL_CLIENT_DOWN, BROADCAST, client.ip)
+
+    def publish_state(self, client, state: int):
+        if state != 2:
+            self.send_control(CTRL_CLIENT_STATE, BROADCAST, client.ip, bytes((state,)))
+
+    def publish_depth(self, client):
+        """
+        로컬 클라이언트 송신 큐 크기를 구독한 워커에게 알림 (서버 selectors 스레드, 전송 후 호출)
+
+        :param client: 로컬 클라이언트
+        :return:
+        """
+        worker_id = self._routes.get(client.ip)
+
+        if worker_id is None:
+            return
+
+        size = client.queued_bytes
+        last = self._published_depths.get(client.ip)
+
+        if last is not None and abs(size - last) < DEPTH_STEP and (size or not last):
+            return
+
+        self._published_depths[client.ip] = size
+        self.send_control(CTRL_CLIENT_DEPTH, worker_id, client.ip, DEPTH.pack(size))
+
+    def get_client(self, ip: str):
+        """
+        :param ip:
+        :return: 다른 워커에 연결된 클라이언트 프록시, 없을 경우 None
+        """
+        entry = self._directory.get(ip)
+
+        if entry is None:
+            return None
+
+        worker_id, state = entry
+        client = self._remote_clients.get(ip)
+
+        if client is None or client.worker_id != worker_id or client.state == 2:
+            client = self._remote_clients[ip] = RemoteClient(self, worker_id, ip, state)
+
+        return client
+
+    def route(self, client, message: Message) -> bool:
+        """
+        로컬 클라이언트에게 받은 패치 결과 메시지를 패치를 진행 중인 다른 워커에게 넘김
+
+        :param client: 로컬 클라이언트
+        :param message:
+        :return: 다른 워커에게 넘긴 경우 True (로컬에서 처리하지 않음)
+        """
+        worker_id = self._routes.get(client.ip)
+
+        if worker_id is None or message.HEADER.CODE & CODE_MASK not in ROUTED_CODES:
+            return False
+
+        if message.HEADER.CODE & COMPRESSED_FLAG:
+            message = decompress_message(client, message)
+        # 바이너리 형식(BINARY_FLAG)은 그대로 넘기고 받은 워커에서 디코딩
+
+        self.send_control(CTRL_UPSTREAM, worker_id, client.ip, bytes((message.HEADER.CODE,)) + bytes(message.BODY))
+        return True
+
+    def read(self, server):
+        """
+        허브에게 받은 제어 메시지 처리 (서버 selectors 스레드)
+
+        :param server: Server 객체
+        :return:
+        """
+        for control_type, src, dst, ip, payload in _read_frames(self.channel, self._buffer):
+            try:
+                self._handle(server, control_type, src, bytes_to_ip(ip), payload)
+            except Exception as e:
+                traceback.print_exc()
+
+    def _handle(self, server, control_type: int, src: int, ip: str, payload: bytes):
+        if control_type == CTRL_CLIENT_UP:
+            self._close_remote_client(ip)
+            # 같은 ip 가 다른 워커로 다시 연결된 경우 이전 프록시는 종료 처리
+            self._directory[ip] = (src, 0)
+
+            EventManager.call_handler(CONNECT_CLIENT_EVENT, client=self.get_client(ip))
+            # 재연결 대기 중인 패치를 이어서 진행할 수 있도록 연결 이벤트 발생
+        elif control_type == CTRL_CLIENT_DOWN:
+            if self._directory.get(ip, (None,))[0] == src:
+                del self._directory[ip]
+                self._close_remote_client(ip)
+        elif control_type == CTRL_CLIENT_STATE:
+            if ip in self._directory:
+                self._directory[ip] = (src, payload[0])
+
+            client = self._remote_clients.get(ip)
+            if client is not None and client.worker_id == src and client.state != 2:
+                client._state = payload[0]
+        elif control_type == CTRL_SUBSCRIBE:
+            self._routes[ip] = src
+            self._published_depths.pop(ip, None)
+        elif control_type == CTRL_CLIENT_DEPTH:
+            client = self._remote_clients.get(ip)
+
+            if client is not None and client.worker_id == src:
+                client.update_queued_bytes(DEPTH.unpack(payload)[0])
+        elif control_type == CTRL_FORWARD:
+            client = server.clients.get_by_ip(ip)
+
+            if client is not None:
+                with suppress(OSError):
+                    client.send(payload)
+        elif control_type == CTRL_SET_STATE:
+            client = server.clients.get_by_ip(ip)
+
+            if client is not None:
+                server.clients.set_state(client, payload[0])
+        elif control_type == CTRL_UPSTREAM:
+            client = self._remote_clients.get(ip)
+
+            if client is not None and client.worker_id == src:
+                body = payload[1:]
+                receive_message(client, Message(Header(len(body), payload[0], ip, server.host), body))
+
+    def _close_remote_client(self, ip: str):
+        client = self._remote_clients.pop(ip, None)
+
+        if client is not None and client.state != 2:
+            client.close()
+            EventManager.call_handler(DISCONNECTED_CLIENT_EVENT, client=client)
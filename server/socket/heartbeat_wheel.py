@@ -0,0 +1,108 @@
+import math
+import threading
+
+
+class HeartbeatWheel:
+    """
+    heartbeat 전송 시각 관리를 위한 hashed timer wheel
+
+    클라이언트를 다음 heartbeat 확인 시각에 해당하는 슬롯에 등록해 두고, tick 마다 현재 슬롯에 등록된
+    클라이언트만 꺼내서 확인하므로 전체 클라이언트를 주기적으로 순회하지 않아도 됨
+
+    - 슬롯 수 보다 먼 시각은 남은 바퀴 수(rounds)를 같이 저장
+    - 수신 시 마다 다시 등록하지 않고, 꺼낸 시점에 마지막 수신 시각을 보고 다음 시각으로 다시 등록함 (수신 처리에 lock 없음)
+    """
+
+    def __init__(self, slot_count: int = 512, tick_interval: float = 1.0):
+        self.slot_count = slot_count
+        self.tick_interval = tick_interval
+        # 슬롯 하나가 나타내는 시간 (단위: 초)
+
+        self._slots = [{} for _ in range(slot_count)]
+        """
+        :type list(dict(Client, int))
+        슬롯 별 클라이언트 -> 남은 바퀴 수
+        """
+        self._positions = {}
+        """
+        :type dict(Client, int)
+        클라이언트 -> 등록된 슬롯 위치
+        """
+        self._current = 0
+        self._lock = threading.Lock()
+
+        self.last_tick_work = 0
+        # 마지막 tick 에서 꺼낸 클라이언트 수
+        self.max_tick_work = 0
+        self.last_tick_duration = 0.0
+        # 마지막 tick 처리 시간 (단위: 초)
+        self.tick_count = 0
+
+    def __len__(self):
+        return len(self._positions)
+
+    def __contains__(self, client):
+        return client in self._positions
+
+    def schedule(self, client, delay: float):
+        """
+        delay 초 후에 꺼내지도록 클라이언트 등록, 이미 등록되어 있으면 위치를 옮김
+
+        :param client:
+        :param delay: (단위: 초)
+        :return:
+        """
+        ticks = max(1, math.ceil(delay / self.tick_interval))
+
+        with self._lock:
+            self._remove(client)
+
+            position = (self._current + ticks) % self.slot_count
+            self._slots[position][client] = (ticks - 1) // self.slot_count
+            self._positions[client] = position
+
+    def remove(self, client):
+        with self._lock:
+            self._remove(client)
+
+    def advance(self) -> list:
+        """
+        tick 하나를 진행하고 시각이 된 클라이언트들을 꺼냄
+
+        :return: 시각이 된 클라이언트 리스트 (wheel 에서 삭제됨)
+        """
+        due = []
+
+        with self._lock:
+            self._current = (self._current + 1) % self.slot_count
+            slot = self._slots[self._current]
+
+            for client, rounds in list(slot.items()):
+                if rounds:
+                    slot[client] = rounds - 1
+                else:
+                    del slot[client]
+                    del self._positions[client]
+                    due.append(client)
+
+        return due
+
+    def record_tick(self, work: int, duration: float):
+        """
+        tick 처리 통계 기록
+
+        :param work: 처리한 클라이언트 수
+        :param duration: 처리 시간 (단위: 초)
+        :return:
+        """
+        self.tick_count += 1
+        self.last_tick_work = work
+        self.last_tick_duration = duration
+        if work > self.max_tick_work:
+            self.max_tick_work = work
+
+    def _remove(self, client):
+        position = self._positions.pop(client, None)
+
+        if position is not None:
+            self._slots[position].pop(client, None)
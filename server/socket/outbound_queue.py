@@ -0,0 +1,252 @@
+import os
+import socket
+import threading
+from collections import deque
+
+MAX_IOV = 64
+# sendmsg() 한 번에 넘길 최대 버퍼 수 (IOV_MAX 보다 작게 유지)
+JOIN_LIMIT = 1024 * 64
+# sendmsg 를 지원하지 않는 플랫폼에서 작은 버퍼들을 합쳐서 한번에 보낼 최대 크기
+
+_DONTWAIT = getattr(socket, 'MSG_DONTWAIT', 0)
+
+
+class FileRegion:
+    """
+    송신 큐에 넣는 파일 영역
+
+    파일 내용을 메모리로 읽지 않고 전송 시점에 os.sendfile() 로 페이지 캐시에서 소켓으로 바로 보냄
+    영역을 모두 전송하거나 큐에 넣지 못했거나 큐가 비워지면 on_done 을 한번 호출함 (파일을 닫을 수 있게 알림)
+    """
+    __slots__ = ('file', 'offset', 'nbytes', 'on_done')
+
+    def __init__(self, file, offset: int, count: int, on_done=None):
+        self.file = file
+        self.offset = offset
+        self.nbytes = count
+        self.on_done = on_done
+
+    def done(self):
+        on_done, self.on_done = self.on_done, None
+
+        if on_done is not None:
+            on_done()
+
+
+class OutboundQueue:
+    """
+    클라이언트 별 송신 큐
+
+    전송할 버퍼들을 바로 보내지 않고 큐에 쌓아 두었다가 selectors 가 EVENT_WRITE 를 알려줄 때
+    보낼 수 있는 만큼만 non-blocking 으로 전송함, 한 클라이언트의 느린 네트워크가 다른 클라이언트 전송이나
+    메시지 수신을 막지 않도록 하기 위함
+
+    - put() 으로 넣은 버퍼 묶음(header + body)은 한번에 큐에 들어가므로 여러 스레드가 동시에 넣어도 메시지가 섞이지 않음
+    - 일부만 전송된 버퍼는 전송된 만큼 잘라내고 남은 부분을 다음 flush() 에서 이어서 전송
+    - 버퍼 대신 FileRegion 을 넣으면 해당 파일 영역은 os.sendfile() 로 전송
+    - lock 은 큐에서 보낼 버퍼를 꺼내고 전송된 만큼 정리할 때만 잡으므로 전송 중에도 다른 스레드가 put() 할 수 있음
+      (flush() 는 한 스레드(selectors 스레드)에서만 호출해야 함)
+    - wait_below() 로 큐가 줄어들 때 까지 기다리는 스레드는 flush() 로 전송되거나 clear() 될 때 깨어남
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        # 큐에 쌓아둘 수 있는 최대 크기, 넘을 경우 put() 실패
+
+        self.queued_bytes = 0
+        # 큐에 쌓여 있는 전송 대기 크기
+        self.sent_bytes = 0
+        # 누적 전송 크기
+
+        self._buffers = deque()
+        self._generation = 0
+        # clear() 할 때 마다 증가, 전송 중에 큐가 비워졌는지 확인하기 위해 사용
+        self._lock = threading.Lock()
+        self._drained = threading.Condition(self._lock)
+        # 전송으로 큐 크기가 줄었을 때 wait_below() 대기 스레드를 깨우기 위해 사용
+
+    def __len__(self):
+        return len(self._buffers)
+
+    def put(self, buffers: list) -> bool:
+        """
+        전송할 버퍼 묶음을 큐에 추가
+
+        :param buffers: bytes-like 객체 또는 FileRegion 리스트, bytes-like 객체는 복사하지 않고 memoryview 로 보관
+        :return: 큐 최대 크기를 넘어 추가하지 못한 경우 False
+        """
+        items = []
+
+        for buffer in buffers:
+            item = buffer if isinstance(buffer, FileRegion) else memoryview(buffer)
+            if item.nbytes:
+                items.append(item)
+            elif isinstance(item, FileRegion):
+                item.done()
+
+        size = sum(item.nbytes for item in items)
+
+        with self._lock:
+            is_full = self.queued_bytes and self.queued_bytes + size > self.max_bytes
+
+            if not is_full:
+                self._buffers.extend(items)
+                self.queued_bytes += size
+
+        if is_full:
+            self._done_regions(items)
+            return False
+
+        return True
+
+    def flush(self, channel: socket.socket) -> bool:
+        """
+        소켓 송신 버퍼가 허용하는 만큼 큐에 쌓인 버퍼를 전송
+
+        :param channel: 클라이언트 통신 소켓
+        :return: 큐를 모두 비운 경우 True, 남은 데이터가 있는 경우 False
+        """
+        while True:
+            with self._lock:
+                if not self._buffers:
+                    return True
+
+                head = self._buffers[0]
+                batch = None if isinstance(head, FileRegion) else self._next_batch()
+                generation = self._generation
+
+            try:
+                if batch is None:
+                    batch_size = head.nbytes
+                    sent = self._send_region(channel, head)
+                else:
+                    sent, batch_size = self._send(channel, batch)
+            except (BlockingIOError, InterruptedError):
+                return False
+
+            with self._lock:
+                if generation != self._generation:
+                    # 전송 중에 큐가 비워짐 (연결 종료)
+                    return True
+
+                self.sent_bytes += sent
+                self.queued_bytes -= sent
+                done = self._consume(sent)
+                self._drained.notify_all()
+
+            self._done_regions(done)
+
+            if sent < batch_size:
+                # 일부만 전송됨, 소켓 송신 버퍼가 가득 찬 상태이므로 다음 EVENT_WRITE 까지 대기
+                return False
+
+    def clear(self):
+        with self._lock:
+            items = tuple(self._buffers)
+            self._buffers.clear()
+            self.queued_bytes = 0
+            self._generation += 1
+            self._drained.notify_all()
+
+        self._done_regions(items)
+
+    def wait_below(self, size: int, timeout: float) -> bool:
+        """
+        큐에 쌓인 크기가 size 이하가 될 때 까지 대기
+
+        :param size: 기다릴 큐 크기
+        :param timeout: 최대 대기 시간 (단위: 초)
+        :return: 대기 시간 안에 줄어들지 않은 경우 False
+        """
+        with self._drained:
+            return self._drained.wait_for(lambda: self.queued_bytes <= size, timeout)
+
+    def _consume(self, sent: int) -> list:
+        """
+        전송된 크기 만큼 큐 앞쪽 버퍼를 정리, 일부만 전송된 버퍼는 남은 부분만 남김
+
+        :param sent: 전송된 크기
+        :return: 모두 전송된 FileRegion 리스트
+        """
+        done = []
+
+        while sent:
+            head = self._buffers[0]
+
+            if sent >= head.nbytes:
+                sent -= head.nbytes
+                self._buffers.popleft()
+
+                if isinstance(head, FileRegion):
+                    done.append(head)
+            elif isinstance(head, FileRegion):
+                head.offset += sent
+                head.nbytes -= sent
+                sent = 0
+            else:
+                self._buffers[0] = head[sent:]
+                sent = 0
+
+        return done
+
+    @staticmethod
+    def _done_regions(items):
+        """
+        큐에서 빠진 FileRegion 들의 on_done 호출 (lock 밖에서 호출해야 함)
+
+        :param items: 큐에서 빠진 버퍼 / FileRegion
+        :return:
+        """
+        for item in items:
+            if isinstance(item, FileRegion):
+                item.done()
+
+    def _next_batch(self) -> list:
+        """
+        :return: 큐 앞쪽의 연속된 메모리 버퍼들 (FileRegion 전까지, 최대 MAX_IOV 개)
+        """
+        batch = []
+
+        for item in self._buffers:
+            if isinstance(item, FileRegion) or len(batch) == MAX_IOV:
+                break
+            batch.append(item)
+
+        return batch
+
+    @staticmethod
+    def _send(channel: socket.socket, batch: list) -> tuple:
+        """
+        :param channel:
+        :param batch: 큐 앞쪽의 메모리 버퍼들
+        :return: (전송된 크기, 전송을 시도한 크기)
+        """
+        if hasattr(channel, 'sendmsg'):
+            return channel.sendmsg(batch, [], _DONTWAIT), sum(view.nbytes for view in batch)
+
+        # sendmsg 를 지원하지 않는 플랫폼(windows)은 header 같은 작은 버퍼들을 JOIN_LIMIT 까지 합쳐서 한번에 전송
+        if len(batch) == 1 or batch[0].nbytes >= JOIN_LIMIT:
+            return channel.send(batch[0], _DONTWAIT), batch[0].nbytes
+
+        joined = bytearray()
+
+        for view in batch:
+            if joined and len(joined) + view.nbytes > JOIN_LIMIT:
+                break
+            joined += view
+
+        return channel.send(joined, _DONTWAIT), len(joined)
+
+    @staticmethod
+    def _send_region(channel: socket.socket, region: FileRegion) -> int:
+        if hasattr(os, 'sendfile'):
+            sent = os.sendfile(channel.fileno(), region.file.fileno(), region.offset, region.nbytes)
+        else:
+            # sendfile 을 지원하지 않는 플랫폼은 읽어서 전송
+            region.file.seek(region.offset)
+            sent = channel.send(region.file.read(min(region.nbytes, 1024 * 256)), _DONTWAIT)
+
+        if sent == 0:
+            raise OSError('파일 영역을 전송할 수 없습니다 (파일 크기 부족)')
+
+        return sent
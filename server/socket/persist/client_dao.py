@@ -0,0 +1,38 @@
+"""
+클라이언트 DAO 인터페이스
+
+연결 객체(Connector)의 dialect 에 맞는 구현 모듈(client_dao_maria_db, client_dao_sqlite)의 같은 이름 함수를 호출함
+"""
+from common.db.db_handler import Connector, get_dao
+
+
+def select_client_by_ip(connector: Connector, ip: str):
+    """
+    :param connector:
+    :param ip: 클라이언트 ip(pk)
+    :return: 클라이언트 정보 딕셔너리 (IP, LAST_CONN_DATE, LAST_DISCONN_DATE, DISCONN_CNT), 없으면 None
+    """
+    return get_dao(__name__, connector).select_client_by_ip(connector, ip)
+
+
+def insert_client(connector: Connector, **client):
+    """
+    클라이언트 정보 저장
+
+    :param connector:
+    :param client: IP, LAST_CONN_DATE, LAST_DISCONN_DATE
+    :return:
+    """
+    get_dao(__name__, connector).insert_client(connector, **client)
+
+
+def update_client(connector: Connector, ip: str, **client):
+    """
+    클라이언트 정보 변경
+
+    :param connector:
+    :param ip: 클라이언트 ip(pk)
+    :param client: LAST_CONN_DATE, LAST_DISCONN_DATE, DISCONN_CNT
+    :return:
+    """
+    get_dao(__name__, connector).update_client(connector, ip, **client)
@@ -0,0 +1,51 @@
+from common.db.db_handler import SQLiteHandler
+
+
+def select_client_by_ip(connector: SQLiteHandler, ip: str):
+    """
+    ip 로 클라이언트 정보 조회
+
+    :param connector:
+    :param ip: 클라이언트 ip(pk)
+    :return: 클라이언트 정보 딕셔너리, 없으면 None
+    """
+    connector.cursor.execute(
+        "SELECT IP, LAST_CONN_DATE, LAST_DISCONN_DATE, DISCONN_CNT FROM CLIENT WHERE IP = ?", (ip,))
+    return connector.cursor.fetchone()
+
+
+def insert_client(connector: SQLiteHandler, **client):
+    """
+    클라이언트 정보 DB insert
+
+    :param connector:
+    :param client:
+
+    client['IP']: str -> 클라이언트 ip(pk)
+    client['LAST_CONN_DATE']: datetime -> 마지막 접속 시각
+    client['LAST_DISCONN_DATE']: datetime -> 마지막 접속 종료 시각
+    :return:
+    """
+    connector.cursor.execute(
+        "INSERT INTO CLIENT(IP, LAST_CONN_DATE, LAST_DISCONN_DATE) VALUES (?, ?, ?)", (
+            client['IP'], connector.get_datetime_db_format(client['LAST_CONN_DATE']),
+            connector.get_datetime_db_format(client.get('LAST_DISCONN_DATE'))))
+
+
+def update_client(connector: SQLiteHandler, ip: str, **client):
+    """
+    클라이언트 정보 변경
+
+    :param connector:
+    :param ip: 클라이언트 ip(pk)
+    :param client:
+
+    client['LAST_CONN_DATE']: datetime -> 마지막 접속 시각
+    client['LAST_DISCONN_DATE']: datetime -> 마지막 접속 종료 시각
+    client['DISCONN_CNT']: int -> 접속 종료 횟수
+    :return:
+    """
+    connector.cursor.execute(
+        "UPDATE CLIENT SET LAST_CONN_DATE = ?, LAST_DISCONN_DATE = ?, DISCONN_CNT = ? WHERE IP = ?", (
+            connector.get_datetime_db_format(client['LAST_CONN_DATE']),
+            connector.get_datetime_db_format(client['LAST_DISCONN_DATE']), client['DISCONN_CNT'], ip))
@@ -0,0 +1,141 @@
+import selectors
+import threading
+
+from common.protocol.frame_decoder import FrameDecoder
+from server.socket.client import Client
+from server.socket.outbound_queue import OutboundQueue, FileRegion
+
+
+class SelectorClient(Client):
+    """
+    selectors 엔진에서 사용하는 클라이언트 래퍼 객체
+
+    send() / send_buffers() 는 소켓에 바로 쓰지 않고 송신 큐(OutboundQueue)에 넣은 뒤
+    on_write_pending 콜백으로 Server 에 알림, Server 는 selectors 에 EVENT_WRITE 를 등록하고
+    전송 가능할 때 flush() 를 호출함
+
+    수신은 연결 별 FrameDecoder 가 non-blocking 소켓에서 읽을 수 있는 만큼만 읽어 메시지를 조립함
+    pause_reading() 으로 수신을 멈추면 Server 가 EVENT_READ 를 해제하므로 보낸 데이터는 소켓 수신 버퍼에 남고
+    TCP 흐름 제어로 상대의 전송이 멈춤 (credit 보다 많이 보내는 파일 제공자)
+    """
+
+    def __init__(self, address, channel, on_write_pending, max_queue_bytes: int):
+        super().__init__(address, channel)
+        self.outbound = OutboundQueue(max_queue_bytes)
+        self.decoder = FrameDecoder()
+        self.is_overflow = False
+        # 송신 큐가 가득 차 메시지를 넣지 못한 경우 True, Server 는 해당 클라이언트 연결을 끊음
+        self.registered_events = selectors.EVENT_READ
+        # selectors 에 등록되어 있는 이벤트, 0 이면 등록 해제된 상태 (수신을 멈췄고 보낼 데이터가 없음)
+        self.codec = None
+        # CLIENT_WELCOME 에서 정한 압축 방식, None 이면 압축하지 않음
+        self.body_codec = None
+        # CLIENT_WELCOME 에서 정한 body 형식, None 이면 JSON
+
+        self._on_write_pending = on_write_pending
+        self._read_pauses = set()
+        # 수신을 멈춘 대상들 (패치 등), 모두 재개해야 다시 수신함
+        self._pause_lock = threading.Lock()
+
+    @property
+    def is_write_registered(self) -> bool:
+        """
+        selectors 에 EVENT_WRITE 가 등록되어 있는지 여부
+        :return:
+        """
+        return bool(self.registered_events & selectors.EVENT_WRITE)
+
+    @property
+    def is_read_paused(self) -> bool:
+        return bool(self._read_pauses)
+
+    def pause_reading(self, owner):
+        """
+        수신을 멈춤, selectors 이벤트 변경은 on_write_pending 콜백으로 Server 에 요청함
+
+        :param owner: 수신을 멈춘 대상, 같은 대상으로 resume_reading() 해야 재개됨
+        :return:
+        """
+        with self._pause_lock:
+            is_changed = not self._read_pauses
+            self._read_pauses.add(owner)
+
+        if is_changed:
+            self._on_write_pending(self)
+
+    def resume_reading(self, owner):
+        with self._pause_lock:
+            if owner not in self._read_pauses:
+                return
+
+            self._read_pauses.discard(owner)
+            is_changed = not self._read_pauses
+
+        if is_changed:
+            self._on_write_pending(self)
+
+    @property
+    def queued_bytes(self) -> int:
+        """
+        송신 큐에 쌓여 아직 전송되지 못한 크기
+        :return:
+        """
+        return self.outbound.queued_bytes
+
+    @property
+    def sent_bytes(self) -> int:
+        return self.outbound.sent_bytes
+
+    def send(self, data: bytes):
+        self.send_buffers([data])
+
+    def send_buffers(self, buffers: list):
+        if self.state == 2:
+            raise ConnectionError('closed client')
+
+        if not self.outbound.put(buffers):
+            self.is_overflow = True
+
+        self._on_write_pending(self)
+
+    def send_file_region(self, buffers: list, file, offset: int, count: int, on_done=None):
+        """
+        buffers 뒤에 파일 영역(file[offset:offset + count])을 이어서 전송
+        파일 영역은 메모리로 읽지 않고 송신 큐에서 os.sendfile() 로 전송함
+
+        :param buffers: 파일 영역 앞에 보낼 버퍼 리스트 (header 등)
+        :param file: 열려있는 파일 객체
+        :param offset: 파일 영역 시작 위치
+        :param count: 파일 영역 크기
+        :param on_done: 파일 영역 전송이 끝나거나 실패한 후 한번 호출할 함수 () -> None
+        :return:
+        """
+        region = FileRegion(file, offset, count, on_done)
+
+        try:
+            self.send_buffers(list(buffers) + [region])
+        except Exception:
+            region.done()
+            raise
+
+    def wait_drained(self, size: int, timeout: float) -> bool:
+        """
+        송신 큐가 size 이하로 줄어들 때 까지 대기, 전송될 때 마다 깨어나서 확인함
+
+        :param size: 기다릴 송신 큐 크기
+        :param timeout: 최대 대기 시간 (단위: 초)
+        :return: 대기 시간 안에 줄어들지 않은 경우 False
+        """
+        return self.outbound.wait_below(size, timeout)
+
+    def close(self):
+        super().close()
+        self.outbound.clear()
+        # 더 이상 전송할 수 없으므로 송신 큐를 비워 대기 중인 스레드를 깨우고 버퍼를 해제함
+
+    def flush(self) -> bool:
+        """
+        송신 큐에 쌓인 데이터를 non-blocking 으로 전송
+        :return: 송신 큐를 모두 비운 경우 True
+        """
+        return self.outbound.flush(self.channel)
@@ -1,19 +1,34 @@
 import datetime
+import os
 import selectors
 import socket
 import threading
 import time
 import traceback
 import signal
+import tempfile
 from contextlib import suppress
+from http.server import ThreadingHTTPServer
 
+from common import metrics
 from common.db.db_handler import transaction, Connector
+from common.db.write_behind import flush_all
 from event import EventManager
 from event.event_manager import CONNECT_CLIENT_EVENT, DISCONNECTED_CLIENT_EVENT, event_handler
-from common.protocol.message import Header, Message, FULL_CONN, HEARTBEAT
-from common.protocol.message_handler import receive_message, send_message, make_message
+from common.protocol.message import FULL_CONN, HEARTBEAT
+from common.protocol.message_handler import receive_message, send_message, make_message, stop_receivers
+from server.socket.async_server import AsyncServerEngine
 from server.socket.client import Client
-from server.socket.persist.client_dao_maria_db import select_client_by_ip, insert_client, update_client
+from server.socket.client_registry import ClientRegistry, CLIENT_IDLE, CLIENT_FETCHING, CLIENT_CLOSING
+from server.socket.cluster import ClusterHub, ClusterLink, RemoteClient
+from server.socket.heartbeat_wheel import HeartbeatWheel
+from server.socket.selector_client import SelectorClient
+from server.socket.persist.client_dao import select_client_by_ip, insert_client, update_client
+
+DEFAULT_HOST = '10.1.2.171'
+
+loop_iteration_time = metrics.registry.histogram('hamon_loop_iteration_seconds',
+                                                 'selectors 루프 1회 처리 시간 (select 대기 제외)')
 
 
 class Server:
@@ -24,12 +39,20 @@ class Server:
     def __init__(self):
 
         self._config: dict
-        self.clients: list
+        self.clients: ClientRegistry
         self._server_socket: socket.socket
         self.db_connector: Connector
         self.is_running: bool
         self._sel: selectors.DefaultSelector
+        self._engine: AsyncServerEngine
+        self.heartbeat_wheel: HeartbeatWheel
+        self._wakeup_channels: tuple
+        self._pending_writes: set
+        self._loop_thread_id: int
         self.lock_clients: threading.RLock
+        self.cluster: ClusterLink
+        self._hub: ClusterHub
+        self._metrics_server: ThreadingHTTPServer
 
         self._config = None
         self.clients = None
@@ -38,9 +61,25 @@ class Server:
         self.is_running = False
 
         self._sel = None
+        self._engine = None
+        self.heartbeat_wheel = None
+
+        self._wakeup_channels = None
+        self._pending_writes = set()
+        self._pending_writes_lock = threading.Lock()
+        self._loop_thread_id = None
 
         self.lock_clients = threading.RLock()
 
+        self.cluster = None
+        # 멀티 프로세스 모드의 워커 프로세스인 경우 허브 연결 객체
+        self._hub = None
+        # 멀티 프로세스 모드의 부모 프로세스인 경우 허브 객체
+        self._metrics_server = None
+        # 지표 HTTP 서버 (metrics_port 를 지정한 경우)
+
+        self._register_metrics()
+
         EventManager.register_handler(CONNECT_CLIENT_EVENT, self._handle_connect_client)
         EventManager.register_handler(DISCONNECTED_CLIENT_EVENT, self._handle_disconnect_client)
 
@@ -49,7 +88,11 @@ class Server:
 
     @property
     def host(self) -> str:
-        return '10.1.2.171'
+        """
+        서버 ip, 청취 소켓 주소와 메시지 송신자 ip 로 사용
+        :return:
+        """
+        return DEFAULT_HOST if self._config is None else self._config['host']
 
     @property
     def port(self) -> str:
@@ -79,6 +122,73 @@ class Server:
         """
         return self._config['max_wait_count']
 
+    @property
+    def max_queue_bytes(self) -> int:
+        """
+        클라이언트 별 송신 큐 최대 크기 (단위: byte), 넘을 경우 해당 클라이언트 연결을 끊음
+        :return:
+        """
+        return self._config['max_queue_bytes']
+
+    @property
+    def resume_window(self) -> int:
+        """
+        패치 중 연결이 끊긴 클라이언트의 재연결을 기다리는 시간 (단위: 초), 시간 안에 같은 ip 로 재연결하면 패치를 이어서 진행
+        0 이면 기다리지 않고 바로 패치 실패 처리
+        :return:
+        """
+        return self._config['resume_window']
+
+    @property
+    def credit_quantile(self) -> float:
+        """
+        파일 제공자 credit 지급 기준이 되는 대상 클라이언트 송신 큐 크기 quantile (1.0 -> 가장 느린 클라이언트)
+        :return:
+        """
+        return self._config['credit_quantile']
+
+    @property
+    def max_inflight_bytes(self) -> int:
+        """
+        모든 패치가 전달 중인 파일 조각 크기 합의 최대 값 (단위: byte), 넘지 않도록 파일 제공자에게 credit 을 지급함
+        :return:
+        """
+        return self._config['max_inflight_bytes']
+
+    @property
+    def relay_degree(self) -> int:
+        """
+        클라이언트 간 중계 트리의 단계 별 전달 수, 패치 대상이 이보다 많으면 서버는 첫 단계 클라이언트에게만 전송하고
+        각 클라이언트가 하위 클라이언트에게 전달함, 0 이면 중계를 사용하지 않음
+        :return:
+        """
+        return self._config['relay_degree']
+
+    @property
+    def relay_port(self) -> int:
+        """
+        클라이언트가 다른 클라이언트에게 중계 받을 때 사용하는 포트
+        :return:
+        """
+        return self._config['relay_port']
+
+    @property
+    def workers(self) -> int:
+        """
+        서버 워커 프로세스 수, 1 보다 크면 멀티 프로세스 모드로 실행
+        :return:
+        """
+        return self._config['workers']
+
+    @property
+    def metrics_port(self) -> int:
+        """
+        지표 HTTP 서버 포트 (localhost), None 이면 실행하지 않음
+        멀티 프로세스 모드에서는 워커 마다 metrics_port + 워커 번호(0 부터) 포트를 사용함
+        :return:
+        """
+        return self._config['metrics_port']
+
     @staticmethod
     def _valid_property(**kwargs: dict) -> dict:
         """
@@ -87,9 +197,18 @@ class Server:
 
         설정 가능 속성
         [port]: int  -> (필수) 서버의 포트 값
+        [host]: str -> 서버 ip (기본값 DEFAULT_HOST)
         [max_client]: int -> 최대 클라이언트 접속 가능 수
         [wait_term]: int  -> heartbeat 전송 주기 (단위: 초)
         [max_wait_count]: int -> 최대 Heartbeat 수신 가능 수, 클라이언트가 max_wait_count 만큼 heartbeart를 받고 응답이 없을시 연결을 끊습니다.
+        [max_queue_bytes]: int -> 클라이언트 별 송신 큐 최대 크기 (단위: byte)
+        [resume_window]: int -> 패치 중 끊긴 클라이언트의 재연결 대기 시간 (단위: 초), 0 이면 이어받기 사용 안함
+        [credit_quantile]: float -> credit 지급 기준 대상 클라이언트 송신 큐 크기 quantile (0 초과 1 이하)
+        [max_inflight_bytes]: int -> 모든 패치가 전달 중인 파일 조각 크기 합의 최대 값 (단위: byte)
+        [relay_degree]: int -> 클라이언트 간 중계 트리의 단계 별 전달 수, 0 이면 중계 사용 안함
+        [relay_port]: int -> 클라이언트 중계 포트
+        [workers]: int -> 워커 프로세스 수, 1 보다 크면 SO_REUSEPORT 로 같은 포트를 여는 워커 프로세스들로 실행 (selectors 엔진)
+        [metrics_port]: int -> 지표 HTTP 서버 포트 (127.0.0.1, GET /metrics), 지정하지 않으면 실행하지 않음
 
         :param kwargs:
         :return: 
@@ -108,6 +227,11 @@ class Server:
 
         port = kwargs['port']
 
+        if 'host' in kwargs and type(kwargs['host']) is not str:
+            raise_invalid_value_property('host')
+
+        host = kwargs['host'] if 'host' in kwargs else DEFAULT_HOST
+
         if 'max_client' in kwargs and type(kwargs['max_client']) is not int:
             raise_invalid_value_property('max_client')
 
@@ -123,28 +247,98 @@ class Server:
 
         max_wait_count = kwargs['max_wait_count'] if 'max_wait_count' in kwargs else 10
 
+        if 'max_queue_bytes' in kwargs and type(kwargs['max_queue_bytes']) is not int:
+            raise_invalid_value_property('max_queue_bytes')
+
+        max_queue_bytes = kwargs['max_queue_bytes'] if 'max_queue_bytes' in kwargs else 1024 * 1024 * 16
+
+        if 'resume_window' in kwargs and (type(kwargs['resume_window']) is not int or kwargs['resume_window'] < 0):
+            raise_invalid_value_property('resume_window')
+
+        resume_window = kwargs['resume_window'] if 'resume_window' in kwargs else 60
+
+        if 'credit_quantile' in kwargs and (type(kwargs['credit_quantile']) not in (int, float) or
+                                            not 0 < kwargs['credit_quantile'] <= 1):
+            raise_invalid_value_property('credit_quantile')
+
+        credit_quantile = kwargs['credit_quantile'] if 'credit_quantile' in kwargs else 1.0
+
+        if 'max_inflight_bytes' in kwargs and type(kwargs['max_inflight_bytes']) is not int:
+            raise_invalid_value_property('max_inflight_bytes')
+
+        max_inflight_bytes = kwargs['max_inflight_bytes'] if 'max_inflight_bytes' in kwargs else 1024 * 1024 * 64
+
+        if 'relay_degree' in kwargs and (type(kwargs['relay_degree']) is not int or kwargs['relay_degree'] < 0):
+            raise_invalid_value_property('relay_degree')
+
+        relay_degree = kwargs['relay_degree'] if 'relay_degree' in kwargs else 0
+
+        if 'relay_port' in kwargs and type(kwargs['relay_port']) is not int:
+            raise_invalid_value_property('relay_port')
+
+        relay_port = kwargs['relay_port'] if 'relay_port' in kwargs else 14495
+
+        if 'workers' in kwargs and (type(kwargs['workers']) is not int or not 1 <= kwargs['workers'] < 0xFF):
+            raise_invalid_value_property('workers')
+
+        workers = kwargs['workers'] if 'workers' in kwargs else 1
+
+        if kwargs.get('metrics_port') is not None and type(kwargs['metrics_port']) is not int:
+            raise_invalid_value_property('metrics_port')
+
+        metrics_port = kwargs.get('metrics_port')
+
         return {
             'port': port,
+            'host': host,
             'max_client': max_client,
             'wait_term': wait_term,
-            'max_wait_count': max_wait_count
+            'max_wait_count': max_wait_count,
+            'max_queue_bytes': max_queue_bytes,
+            'resume_window': resume_window,
+            'credit_quantile': credit_quantile,
+            'max_inflight_bytes': max_inflight_bytes,
+            'relay_degree': relay_degree,
+            'relay_port': relay_port,
+            'workers': workers,
+            'metrics_port': metrics_port
         }
 
-    def start(self, **kwargs: dict):
+    def start(self, engine: str = 'selectors', **kwargs: dict):
         """
         서버를 실행 시키는 함수, 청취 소켓을 염, 멀티 플렉싱 서버에 맞게 select() 사용하여
         여러 클라이언트 요청 처리
+
+        :param engine: 서버 엔진
+            'selectors' -> selectors + 스레드 방식 (기본값)
+            'asyncio' -> 하나의 asyncio 이벤트 루프에서 모든 클라이언트를 처리 (AsyncServerEngine)
         :param kwargs: 서버 속성
         :return:
         """
         if self.is_running:
             raise Exception('서버가 이미 실행중입니다.')
 
+        if self.cluster is None and kwargs.get('workers', 1) != 1:
+            if engine != 'selectors':
+                raise Exception("멀티 프로세스 모드는 'selectors' 엔진만 지원합니다")
+
+            self._start_cluster(**kwargs)
+            return
+
+        if engine == 'asyncio':
+            self._start_asyncio(**kwargs)
+            return
+        elif engine != 'selectors':
+            raise Exception("지원하지 않는 서버 엔진 '{}' 입니다".format(engine))
+
         try:
             self._config = self._valid_property(**kwargs)
 
             self._server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self._server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            if self.cluster is not None:
+                self._server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+                # 워커 프로세스들이 같은 포트를 열고 커널이 연결을 나눠줌
             self._server_socket.bind((self.host, self.port))
             self._server_socket.listen(self.max_client)
             self._server_socket.setblocking(False)
@@ -153,13 +347,31 @@ class Server:
             self._sel = selectors.DefaultSelector()
             self._sel.register(self._server_socket, selectors.EVENT_READ, None)
 
-            self.clients = {}
+            self._wakeup_channels = socket.socketpair()
+            for channel in self._wakeup_channels:
+                channel.setblocking(False)
+            self._sel.register(self._wakeup_channels[0], selectors.EVENT_READ, None)
+            # 다른 스레드에서 송신 큐에 메시지를 넣었을때 select() 대기를 깨우기 위한 소켓
+            self._loop_thread_id = threading.get_ident()
+
+            if self.cluster is not None:
+                self.cluster.connect(self._request_write)
+                self._sel.register(self.cluster.channel, selectors.EVENT_READ, None)
+                # 다른 워커 프로세스의 클라이언트 정보와 전달 메시지 수신, 제어 메시지 전송은 EVENT_WRITE 시점에 처리
+
+            self.clients = ClientRegistry(None if self.cluster is None else self.cluster.publish_state)
+            self.heartbeat_wheel = HeartbeatWheel()
             self.is_running = True
+            self._start_metrics_server()
 
             monitor_task = threading.Thread(target=self._monitor_clients)
             monitor_task.start()
 
-            print('서버 시작 ip : {} protocol port : {}'.format(self.host, self.port))
+            if self.cluster is None:
+                print('서버 시작 ip : {} protocol port : {}'.format(self.host, self.port))
+            else:
+                print('서버 워커 시작 ip : {} protocol port : {} worker : {} pid : {}'.format(
+                    self.host, self.port, self.cluster.worker_id, os.getpid()))
 
         except socket.error as e:
             print(e)
@@ -176,16 +388,37 @@ class Server:
                 """
                 pass
             else:
-                for key, _ in events:
+                start = time.perf_counter()
+
+                for key, mask in events:
                     """
-                    selectors 엔 헨들러 2가지를 등록함
+                    selectors 엔 헨들러 3가지를 등록함
                     - 클라이언트 연결 요청 (fileobj: 청취 소켓, arg: 없음)
-                    - 클라이언트 메시지 수신 (fileobj: 클라이언트 통신 소켓, arg: Client 객체)
+                    - 송신 대기 알림 (fileobj: wakeup 소켓, arg: 없음)
+                    - 클라이언트 메시지 수신/전송 (fileobj: 클라이언트 통신 소켓, arg: Client 객체)
                     """
                     if key.fileobj is self._server_socket:
                         self._accept_client()
+                    elif key.fileobj is self._wakeup_channels[0]:
+                        with suppress(OSError):
+                            self._wakeup_channels[0].recv(4096)
+                    elif self.cluster is not None and key.fileobj is self.cluster.channel:
+                        if mask & selectors.EVENT_WRITE:
+                            self._flush_cluster()
+                        if mask & selectors.EVENT_READ and self.is_running:
+                            try:
+                                self.cluster.read(self)
+                            except ConnectionError:
+                                # 허브(부모 프로세스)가 종료됨
+                                self.stop()
                     else:
-                        self._receive_client_message(key.data)
+                        if mask & selectors.EVENT_WRITE:
+                            self._flush_client(key.data)
+                        if mask & selectors.EVENT_READ:
+                            self._receive_client_message(key.data)
+
+                self._register_pending_writes()
+                loop_iteration_time.observe(time.perf_counter() - start)
 
             # with suppress(OSError):
             #     """
@@ -205,17 +438,149 @@ class Server:
             #     else:
             #         self._receive_client_message(key.data)
 
-    def stop(self):
+    def _start_cluster(self, **kwargs: dict):
+        """
+        멀티 프로세스 모드로 서버 실행, 워커 프로세스가 모두 종료될 때 까지 반환되지 않음
+
+        workers 수 만큼 워커 프로세스를 fork 하고 각 워커는 SO_REUSEPORT 로 같은 포트를 열어 전체 핸들러를 실행함
+        부모 프로세스는 허브(ClusterHub)를 실행해 워커들의 클라이언트 디렉터리 공유와 워커 간 메시지 전달을 처리함
+        (다른 워커에 연결된 패치 대상 클라이언트는 RemoteClient 로 사용)
+
+        :param kwargs: 서버 속성
+        :return:
+        """
+        if not hasattr(socket, 'SO_REUSEPORT') or not hasattr(os, 'fork'):
+            raise Exception('멀티 프로세스 모드를 지원하지 않는 플랫폼입니다')
+
+        self._config = self._valid_property(**kwargs)
+
+        hub = ClusterHub(os.path.join(tempfile.mkdtemp(prefix='hamon-'), 'hub.sock'))
+        pids = []
+
+        for worker_id in range(self.workers):
+            pid = os.fork()
+
+            if pid == 0:
+                hub.close()
+                self._config = None
+                self.cluster = ClusterLink(hub.path, worker_id)
+
+                try:
+                    self.start(engine='selectors', **kwargs)
+                except Exception as e:
+                    traceback.print_exc()
+                finally:
+                    os._exit(0)
+
+            pids.append(pid)
+
+        self._hub = hub
+        self.is_running = True
+
+        print('서버 시작(multi process) ip : {} protocol port : {} workers : {}'.format(self.host, self.port,
+                                                                                 self.workers))
+
+        hub.serve(pids)
+
+        self.is_running = False
+
+    def _start_asyncio(self, **kwargs: dict):
+        """
+        asyncio 엔진으로 서버 실행, 서버가 종료될 때 까지 반환되지 않음
+
+        :param kwargs: 서버 속성
+        :return:
+        """
+        self._config = self._valid_property(**kwargs)
+        self.clients = ClientRegistry()
+        self.heartbeat_wheel = HeartbeatWheel()
+        self.is_running = True
+        self._start_metrics_server()
+
+        self._engine = AsyncServerEngine(self)
+
+        print('서버 시작(asyncio) ip : {} protocol port : {}'.format(self.host, self.port))
+
+        self._engine.run()
+
+    def _start_metrics_server(self):
+        """
+        metrics_port 를 지정한 경우 지표 HTTP 서버 실행, 포트를 열지 못해도 서버는 계속 실행함
+        :return:
+        """
+        if self.metrics_port is None:
+            return
+
+        port = self.metrics_port + (0 if self.cluster is None else self.cluster.worker_id)
+
+        try:
+            self._metrics_server = metrics.start_http_server(port)
+        except OSError as e:
+            print('지표 HTTP 서버 실행 실패 port : {} ({})'.format(port, e))
+        else:
+            print('지표 HTTP 서버 시작 http://{}:{}/metrics'.format(metrics.METRICS_HOST, port))
+
+    def _register_metrics(self):
+        """
+        서버 상태 지표 등록 (지표를 내보낼 때 조회)
+        :return:
+        """
+        states = {'idle': CLIENT_IDLE, 'fetching': CLIENT_FETCHING, 'closing': CLIENT_CLOSING}
+
+        def clients_by_state():
+            if self.clients is None:
+                return None
+            return {name: len(self.clients.by_state(state)) for name, state in states.items()}
+
+        def queued_bytes() -> list:
+            return [] if self.clients is None else [client.queued_bytes for client in self.clients.snapshot()]
+
+        metrics.registry.collector('hamon_clients', '상태 별 연결된 클라이언트 수', clients_by_state, label='state')
+        metrics.registry.collector('hamon_outbound_queued_bytes', '전체 클라이언트 송신 큐 크기 합',
+                                   lambda: sum(queued_bytes()))
+        metrics.registry.collector('hamon_outbound_queued_bytes_max', '가장 큰 클라이언트 송신 큐 크기',
+                                   lambda: max(queued_bytes(), default=0))
+        metrics.registry.collector('hamon_outbound_pending_clients', '송신 큐에 전송할 데이터가 남은 클라이언트 수',
+                                   lambda: sum(1 for size in queued_bytes() if size))
+        metrics.registry.collector('hamon_heartbeat_tick_seconds', '마지막 heartbeat tick 처리 시간',
+                                   lambda: None if self.heartbeat_wheel is None else
+                                   self.heartbeat_wheel.last_tick_duration)
+
+    def stop(self, *args):
 
         if self._server_socket is not None:
             self._server_socket.close()
 
+        if self._engine is not None:
+            self._engine.stop()
+
+        if self._hub is not None:
+            self._hub.stop()
+            # 워커 프로세스들에게 종료를 알림
+
         # for client in self.clients:
         #     client.close()
         # todo : (윗코드) DB 에러가 발생함 원인은 send 스레드 해결방안 찾을것
 
         self.is_running = False
 
+        metrics_server, self._metrics_server = self._metrics_server, None
+
+        if metrics_server is not None:
+            metrics_server.shutdown()
+            metrics_server.server_close()
+
+        stop_receivers()
+        # 메시지 헨들러가 실행한 스레드 종료
+
+        flush_all()
+        # 쓰기 지연 큐에 남아있는 데이터 저장
+
+        if self._wakeup_channels is not None:
+            with suppress(OSError):
+                self._wakeup_channels[1].send(b'\0')
+            # select() 대기 중인 서버 루프를 깨워 종료되도록 함
+
         print('서버 종료')
 
     def _accept_client(self):
@@ -225,13 +590,19 @@ class Server:
         channel, address = self._server_socket.accept()
 
         if len(self.clients) != self.max_client:
-            client = Client(address, channel)
+            channel.setblocking(False)
+            client = SelectorClient(address, channel, self._request_write, self.max_queue_bytes)
             # 소켓을 유용하고 편하게 사용하기 위해 Client 래퍼 객체로 생성
+            # 전송은 송신 큐를 통해 EVENT_WRITE 시점에 처리, 수신은 FrameDecoder 로 읽을 수 있는 만큼만 처리
             try:
                 self._sel.register(client.channel, selectors.EVENT_READ, client)  # selectors 이벤트 등록
-                self.clients[client] = client
+                self.clients.add(client)
+                self.heartbeat_wheel.schedule(client, self.wait_term)
                 # 클라이언트 리스트 등록
 
+                if self.cluster is not None:
+                    self.cluster.publish_up(client)
+
                 EventManager.call_handler(CONNECT_CLIENT_EVENT, client=client)
             except socket.error as e: 
                 # todo: (try-except) 이제 이벤트 헨들러는 개별 스레드에서 처리하므로 try-except 필요가 없음
@@ -240,93 +611,227 @@ class Server:
                         client.close()
         else:
             # 최대 클라이언트 연결 수를 넘어갔을 경우 꽉 찼다는 메시지르 보내고 연결 종료
-            channel.sendall(make_message(FULL_CONN, self.host, address[0]))
+            channel.setblocking(False)
+            with suppress(OSError):
+                channel.send(make_message(FULL_CONN, self.host, address[0]))
             channel.close()
 
+    def _request_write(self, client: SelectorClient):
+        """
+        클라이언트 송신 큐에 전송할 데이터가 생겼거나 수신을 멈추고/재개할 때 호출됨
+        (SelectorClient.send_buffers, pause_reading, resume_reading, 허브 송신 큐는 ClusterLink.send_control)
+        selectors 스레드에서 이벤트를 다시 등록하도록 대기 목록에 넣고 select() 대기를 깨움
+
+        :param client: SelectorClient 또는 ClusterLink
+        :return:
+        """
+        with self._pending_writes_lock:
+            self._pending_writes.add(client)
+
+        if threading.get_ident() != self._loop_thread_id and self._wakeup_channels is not None:
+            with suppress(OSError):
+                self._wakeup_channels[1].send(b'\0')
+
+    def _register_pending_writes(self):
+        """
+        송신 대기 클라이언트들을 바로 한번 전송 시도 후 남은 데이터가 있으면 EVENT_WRITE 등록
+        송신 큐가 가득찬 클라이언트는 전송 속도가 너무 느린 것으로 보고 연결을 끊음
+        수신을 멈추거나 재개한 클라이언트는 EVENT_READ 를 해제/등록함
+        :return:
+        """
+        with self._pending_writes_lock:
+            pending_writes = self._pending_writes
+            self._pending_writes = set()
+
+        for client in pending_writes:
+            if client is self.cluster:
+                self._flush_cluster()
+                continue
+
+            if client.state == 2:
+                continue
+
+            if client.is_overflow:
+                self._close_client(client)
+            elif not client.is_write_registered:
+                self._flush_client(client)
+            else:
+                self._update_events(client, False)
+
+    def _flush_cluster(self):
+        """
+        허브 송신 큐 전송, 남은 데이터가 있으면 EVENT_WRITE 등록
+        :return:
+        """
+        try:
+            is_empty = self.cluster.flush()
+        except OSError:
+            # 허브(부모 프로세스)가 종료됨
+            self.stop()
+            return
+
+        events = selectors.EVENT_READ if is_empty else selectors.EVENT_READ | selectors.EVENT_WRITE
+
+        if events != self.cluster.registered_events:
+            with suppress(KeyError, ValueError, OSError):
+                self._sel.modify(self.cluster.channel, events, None)
+                self.cluster.registered_events = events
+
+    def _flush_client(self, client: SelectorClient):
+        try:
+            is_empty = client.flush()
+        except OSError:
+            self._close_client(client)
+            return
+
+        self._update_events(client, is_empty)
+
+        if self.cluster is not None:
+            with suppress(ConnectionError):
+                self.cluster.publish_depth(client)
+                # 다른 워커가 패치 중인 클라이언트면 credit 계산을 위해 송신 큐 크기를 알림
+
+    def _update_events(self, client: SelectorClient, is_empty: bool):
+        """
+        송신 큐에 남은 데이터가 있으면 EVENT_WRITE, 수신을 멈추지 않았으면 EVENT_READ 를 등록
+        둘 다 필요 없으면 selectors 에서 등록 해제함
+
+        :param client:
+        :param is_empty: 송신 큐가 비었으면 True
+        :return:
+        """
+        events = 0 if client.is_read_paused else selectors.EVENT_READ
+
+        if not is_empty:
+            events |= selectors.EVENT_WRITE
+
+        if events == client.registered_events:
+            return
+
+        with suppress(KeyError, ValueError, OSError):
+            if not events:
+                self._sel.unregister(client.channel)
+            elif not client.registered_events:
+                self._sel.register(client.channel, events, client)
+            else:
+                self._sel.modify(client.channel, events, client)
+
+            client.registered_events = events
+
+    @staticmethod
+    def _close_client(client: Client):
+        with client:
+            if client.state != 2:
+                client.close()
+                EventManager.call_handler(DISCONNECTED_CLIENT_EVENT, client=client)
+
     # todo: 잘못된 데이터가 넘어왔을때 처리 생각해야 함
     # todo: sendall(x) send 하고 클라 종료시 에러 발생
-    def _receive_client_message(self, client: Client):
+    def _receive_client_message(self, client: SelectorClient):
         try:
             with client:
+                messages = client.decoder.read_from(client.channel)
+                # 소켓에서 읽을 수 있는 만큼만 읽고 완성된 메시지만 가져옴, 덜 들어온 메시지는 디코더가 보관
+                # 연결이 종료된 경우 ConnectionError 발생
 
                 client.last_receive_time = time.time()
                 client.wait_count = 0
                 # 수신 한 경우 heartbeat 누적 수를 초기화
-                # todo: Cleint receive 함수 내부에 처리할것
 
-                header_bytes = client.receive(13)
-                # 헤더 사이즈 만큼 버퍼에서 가져옴
-                # todo: 사이즈가 작긴 하지만 이 부분도 아래 BODY 데이터를 가지고 오는 것처럼 처리를 해줘야함 (Client receive 함수 내에 처리)
-
-                if not header_bytes:
-                    if client.state != 2:
-                        client.close()
-                        EventManager.call_handler(DISCONNECTED_CLIENT_EVENT, client=client)
-                    # todo: 이벤트 호출자가 제어하지 않고, 함수 안에서 실행을 제어하도록 변경
-                    #   예) 클라이언트 연결 이벤트에서 헨들러 A가 실행할때 어떠한 이유로 클라이언트를 종료시킨 경우 다음 번에 실행될
-                    #   (이벤트에 대한 헨들러들이 순차적으로 실행됨) 클라이언트 연결 이벤트 헨들러 B가 실행 되면 안되므로
-                    return
+                for message in messages:
+                    try:
+                        if self.cluster is None or not self.cluster.route(client, message):
+                            # 다른 워커에서 진행 중인 패치의 결과 메시지는 해당 워커에게 넘김
+                            receive_message(client, message)
+                    finally:
+                        message.release()
+                        # 헨들러 처리가 끝난 수신 버퍼는 풀에 돌려줌
 
-                header = Header.decode(header_bytes)
+        except Exception as e:
+            # 연결 혹은 받아온 데이터에 문제가 있으면 연결을 끊는거로 처리하고 있음
+            self._close_client(client)
+            # receive_message 에서 데이터를 잘못받아도 예외가발생
 
-                if not header:
-                    return
+    def find_client(self, ip: str):
+        """
+        :param ip:
+        :return: 해당 ip 로 연결된 클라이언트, 멀티 프로세스 모드에서 다른 워커에 연결된 경우 RemoteClient, 없을 경우 None
+        """
+        client = self.clients.get_by_ip(ip)
 
-                body_bytes = client.receive(header.SIZE)
-                # body 크기는 가변 적이므로 header에서 body 사이즈를 알아낸 후 버퍼에서 가져옴
+        if client is None and self.cluster is not None:
+            client = self.cluster.get_client(ip)
 
-                while len(body_bytes) < header.SIZE:
-                    body_bytes += client.receive(header.SIZE - len(body_bytes))
-                # 서버 상황상 명시한 사이즈 만큼 데이터를 가지고 온다는 보장이 없으므로, 완전할때까지 버퍼에서 가져옴
+        return client
 
-                receive_message(client, Message(header, body_bytes))
+    def _monitor_clients(self):
+        """
+        heartbeat 확인 스레드
 
-        except Exception as e:
-            # 연결 혹은 받아온 데이터에 문제가 있으면 연결을 끊는거로 처리하고 있음
-            with client:
-                if client.state != 2:
-                    client.close()
-                    EventManager.call_handler(DISCONNECTED_CLIENT_EVENT, client=client)
-            # receive_message 에서 데이터를 잘못받아도 예외가발생
+        전체 클라이언트를 순회하지 않고 tick 마다 HeartbeatWheel 에서 확인 시각이 된 클라이언트만 꺼내서 처리함
+        lock_clients 를 잡지 않으므로 heartbeat 전송 중에도 클라이언트 연결/종료 처리가 막히지 않음
+        :return:
+        """
+        next_tick = time.time()
 
-    def _monitor_clients(self):
         while self.is_running:
-            time.sleep(self.wait_term)
+            next_tick += self.heartbeat_wheel.tick_interval
+            time.sleep(max(0.0, next_tick - time.time()))
+
+            start = time.perf_counter()
+            due_clients = self.heartbeat_wheel.advance()
             now = time.time()
 
-            with self.lock_clients:
-                for client in list(self.clients):
-                    try:
-                        with client:
-                            if client.state == 2:
-                                return
-
-                            if client.last_receive_time is None or int(
-                                    abs(now - client.last_receive_time)) > self.wait_term:
-                                # 클라이언트의 마지막 수신 시각과 현재 시각을 비교해  heartbeat 전송 주기가 돌아오기 전까지 데이터가 수신한 적이 있는지 확인
-                                if client.wait_count == self.max_wait_count:
-                                    """
-                                    클라이언트가 최대 heartbeat 허용 횟수를 넘긴 상태라면 연결이 끊긴 상태라고 판단하고 예외를 발생시켜 except 부분에서 클라이언트
-                                    종료 처리
-                                    """
-                                    raise Exception
-                                else:
-                                    # 허용 횟수를 넘기지 않은 상태라면 heartbeat 메시지 전송 후 heartbeat 전송 횟수를 1 증가 시킴
-                                    send_message(HEARTBEAT, self.host, client)
-                                    client.wait_count += 1
-                    except Exception as e:
-                        with client:
-                            if client.state != 2:
-                                client.close()
-                                EventManager.call_handler(DISCONNECTED_CLIENT_EVENT, client=client)
+            for client in due_clients:
+                self._check_heartbeat(client, now)
+
+            self.heartbeat_wheel.record_tick(len(due_clients), time.perf_counter() - start)
+
+    def _check_heartbeat(self, client, now: float):
+        """
+        heartbeat 확인 시각이 된 클라이언트 처리
+
+        - 확인 시각 전에 수신한 적이 있다면 마지막 수신 시각 기준으로 다시 등록
+        - 수신한 적이 없으면 heartbeat 전송 후 heartbeat 전송 횟수를 1 증가 시키고 다시 등록
+        - 최대 heartbeat 허용 횟수를 넘긴 상태라면 연결이 끊긴 상태라고 판단하고 종료 처리
+
+        :param client:
+        :param now:
+        :return:
+        """
+        try:
+            with client:
+                if client.state == 2 or client not in self.clients:
+                    return
+
+                if client.last_receive_time is not None and now - client.last_receive_time < self.wait_term:
+                    self.heartbeat_wheel.schedule(client, client.last_receive_time + self.wait_term - now)
+                    return
+
+                if client.wait_count == self.max_wait_count:
+                    raise Exception
+
+                send_message(HEARTBEAT, self.host, client)
+                client.wait_count += 1
+                self.heartbeat_wheel.schedule(client, self.wait_term)
+        except Exception as e:
+            self._close_client(client)
 
     @event_handler
-    @transaction
     def _handle_connect_client(self, event):
 
         client = event['client']
+
+        if isinstance(client, RemoteClient):
+            # 다른 워커에 연결된 클라이언트는 해당 워커에서 처리
+            return
+
         print('클라이언트 연결 완료 ip : {}'.format(client.address))
 
+        self._save_client_connect(client)
+
+    @transaction
+    def _save_client_connect(self, client):
         client_pc = select_client_by_ip(self.db_connector, client.ip)
         # db에 등록되어 있는 클라이언트인지 확인 (pk: 클라이언트 ip)
         if client_pc is None:
@@ -338,16 +843,30 @@ class Server:
             update_client(self.db_connector, client_pc['IP'], **client_pc)
 
     @event_handler
-    @transaction
     def _handle_disconnect_client(self, event):
         client = event['client']
 
+        if isinstance(client, RemoteClient):
+            return
+
         print('클라이언트 연결 종료 ip : {}'.format(client.address))
 
-        self._sel.unregister(client.channel)
-        del self.clients[client]
+        if self._sel is not None:
+            with suppress(KeyError, ValueError):
+                self._sel.unregister(client.channel)
+            # asyncio 엔진은 selectors 를 사용하지 않음, 수신을 멈춘 클라이언트는 이미 등록 해제되어 있을 수 있음
+
+        self.clients.remove(client)
+        self.heartbeat_wheel.remove(client)
         # selectors 해당 클라이언트 등록 해제, 클라이언트 리스트에서 삭제
 
+        if self.cluster is not None and self.clients.get_by_ip(client.ip) is None:
+            self.cluster.publish_down(client)
+
+        self._save_client_disconnect(client)
+
+    @transaction
+    def _save_client_disconnect(self, client):
         client_pc = select_client_by_ip(self.db_connector, client.ip)
         client_pc['LAST_DISCONN_DATE'] = datetime.datetime.now()
         client_pc['DISCONN_CNT'] += 1
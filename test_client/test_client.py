@@ -1,14 +1,16 @@
 import socket
 import threading
 import json
+import os
 import struct
 import base64
 import datetime
+import zlib
 
+# size - 4byte
 # code - 1byte
 # sender - 4byte
 # receiver - 4byte
-# size - 4byte
 # total : 13byte
 
 # data is always json-format
@@ -30,6 +32,14 @@ REQUEST_CLIENT_STATE = 11
 RESPONSE_CLIENT_STATE = 12
 ALREADY_FETCH_ORDER = 13
 TMP_CHAT = 14
+SEND_FILE_CHUNK = 15
+ABORT_FETCH = 16
+
+COMPRESSED_FLAG = 0x80
+# header code 에 설정되면 body 가 CLIENT_WELCOME 에서 정한 방식으로 압축되어 있음
+
+CHUNK_META = struct.Struct('<IQB')
+# SEND_FILE_CHUNK body 메타 데이터 (fetch_no, offset, flags), flags & 0x01 -> 마지막 조각
 
 
 class Header:
@@ -45,12 +55,13 @@ class Header:
 
     @classmethod
     def decode(cls, byte_data):
-        header = struct.unpack('B4B4BL', byte_data[0:16])
+        header = struct.unpack('<LB4B4B', byte_data[0:13])
+        # byte order 를 명시해야 서버와 같은 13byte 형식이 됨
 
-        code = header[0]
-        sender = '.'.join(list(map(str, header[1:5])))
-        receiver = '.'.join(list(map(str, header[5:9])))
-        size = header[9]
+        size = header[0]
+        code = header[1]
+        sender = '.'.join(list(map(str, header[2:6])))
+        receiver = '.'.join(list(map(str, header[6:10])))
 
         return Header(code, sender, receiver, size)
 
@@ -61,7 +72,7 @@ class Header:
         sender_ip_pieces = get_ip(packet.SENDER)
         receiver_ip_pieces = get_ip(packet.RECEIVER)
 
-        header = struct.pack('B4B4BL', packet.CODE, *sender_ip_pieces, *receiver_ip_pieces, packet.SIZE)
+        header = struct.pack('<LB4B4B', packet.SIZE, packet.CODE, *sender_ip_pieces, *receiver_ip_pieces)
 
         return header
 
@@ -102,6 +113,7 @@ class TestClient:
         self.is_receiving = False
         self.current_fetch = None
         self.file = None
+        self.codec = None
 
     def start(self):
         client_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
@@ -109,6 +121,9 @@ class TestClient:
 
         print('서버 연결 성공')
 
+        send_message(CLIENT_WELCOME, HOST, client_socket, json.dumps({"codecs": ["zlib"]}).encode('utf-8'))
+        # 지원하는 압축 방식을 알림
+
         self.is_running = True
         self.client_socket = client_socket
 
@@ -133,18 +148,25 @@ class TestClient:
     def receive(self):
         try:
             while self.is_running:
-                header_bytes = self.client_socket.recv(16)
+                header_bytes = self.client_socket.recv(13)
 
                 if not header_bytes:
                     self.close()
                     return
 
+                while len(header_bytes) != 13:
+                    header_bytes += self.client_socket.recv(13 - len(header_bytes))
+
                 header = Header.decode(header_bytes)
                 body_bytes = self.client_socket.recv(header.SIZE)
 
                 while len(body_bytes) != header.SIZE:
                     body_bytes += self.client_socket.recv(header.SIZE - len(body_bytes))
 
+                if header.CODE & COMPRESSED_FLAG:
+                    body_bytes = zlib.decompress(body_bytes)
+                    header.CODE &= ~COMPRESSED_FLAG
+
                 message = Message(header, body_bytes)
 
                 print("message received code is {} sender is {} receiver is {} size is {}".format(message.HEADER.CODE,
@@ -152,22 +174,61 @@ class TestClient:
                                                                                                   message.HEADER.RECEIVER,
                                                                                                   message.HEADER.SIZE))
 
-                if message.HEADER.CODE == ORDER_FETCH:
+                if message.HEADER.CODE == CLIENT_WELCOME:
+                    self.codec = json.loads(message.BODY).get('codec')
+                    print('압축 방식 : {}'.format(self.codec))
+
+                elif message.HEADER.CODE == ORDER_FETCH:
                     json_data = json.loads(message.BODY)
                     self.current_fetch = json_data
                     self.is_receiving = True
 
-                    self.file = open('C:/Users/devbong/Desktop/test_path/{}.{}'.format(json_data['file']['name'] + '-2',
-                                                                                       json_data['file']['ext']), 'wb')
+                    file_path = 'C:/Users/devbong/Desktop/test_path/{}.{}'.format(json_data['file']['name'] + '-2',
+                                                                                  json_data['file']['ext'])
 
-                elif message.HEADER.CODE == SEND_FILE:
+                    if json_data.get('resume_offset') and os.path.exists(file_path):
+                        # 재연결 후 이어받기, 서버에 알려준 위치 이후는 버리고 이어서 기록
+                        self.file = open(file_path, 'r+b')
+                        self.file.truncate(json_data['resume_offset'])
+                    else:
+                        self.file = open(file_path, 'wb')
 
-                    json_data = json.loads(message.BODY.decode('utf-8'))
-                    file_binary = base64.b64decode(json_data['binary'])
+                elif message.HEADER.CODE == ABORT_FETCH:
+                    json_data = json.loads(message.BODY)
+                    print('패치가 중단되었습니다 fetch_no : {} 원인 : {}'.format(json_data['fetch_no'],
+                                                                      json_data['fail_cause']))
+
+                    if self.file is not None:
+                        self.file.close()
+                        os.remove(self.file.name)
+                        self.file = None
+
+                    self.is_receiving = False
+                    self.current_fetch = None
+
+                elif message.HEADER.CODE == SEND_FILE or message.HEADER.CODE == SEND_FILE_CHUNK:
+
+                    if message.HEADER.CODE == SEND_FILE_CHUNK:
+                        fetch_no, offset, flags = CHUNK_META.unpack_from(message.BODY)
+                        file_binary = message.BODY[CHUNK_META.size:]
+                        is_final = bool(flags & 0x01)
+                        self.file.seek(offset)
+                    else:
+                        json_data = json.loads(message.BODY.decode('utf-8'))
+                        file_binary = base64.b64decode(json_data['binary'])
+                        is_final = json_data.get('is_final', False)
 
                     self.file.write(file_binary)
 
-                    if json_data.get('is_final', False):
+                    if message.HEADER.CODE == SEND_FILE_CHUNK:
+                        self.file.flush()
+                        send_message(RESULT_SEND_FILE, '10.1.2.171', self.client_socket, json.dumps({
+                            "fetch_no": fetch_no,
+                            "offset": offset + len(file_binary)
+                        }).encode('utf-8'))
+                        # 기록한 위치를 서버에 알려줌, 연결이 끊겼다 재연결하면 이 위치부터 이어받음
+
+                    if is_final:
                         print('패치 파일을 받았습니다 전송할 결과를 선택하여 주세요')
                         print('성공 : 0, 실패 : 1')
                         choice_number = int(input(">>>"))
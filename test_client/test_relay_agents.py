@@ -0,0 +1,389 @@
+import socket
+import threading
+import json
+import hashlib
+import struct
+import datetime
+import os
+import sys
+import time
+import traceback
+
+# 중계 트리(relay) 테스트용 가상 클라이언트
+#
+# 127.0.0.2 부터 ip 를 하나씩 사용하는 클라이언트 여러 개를 한 프로세스에서 실행함 (리눅스는 127.0.0.0/8 전체가 loopback)
+# 각 클라이언트는 자신의 ip 로 서버에 연결하고 같은 ip 의 RELAY_PORT 로 상위 클라이언트의 중계 연결을 받음
+#
+# python test_relay_agents.py [클라이언트 수] [파일 경로] [--kill ip:bytes]
+#   파일 경로를 주면 127.0.0.1 로 파일 제공자 연결을 만들어 모든 클라이언트에게 패치 요청 후 파일을 보냄
+#   --kill 로 지정한 클라이언트는 bytes 만큼 받은 후 연결을 끊음 (중계 클라이언트 장애 테스트)
+#
+# 서버는 relay_degree 를 설정해 실행해야 함 ex) MainServer.start(port=14494, relay_degree=2, relay_port=14495)
+
+CLIENT_WELCOME = 1
+ORDER_FETCH = 4
+RESULT_FETCH = 5
+HEARTBEAT = 6
+RESULT_SEND_FILE = 7
+RESULT_PREPARE_FETCH = 9
+SEND_FILE_CHUNK = 15
+ABORT_FETCH = 16
+RELAY_UPDATE = 17
+
+HEADER = struct.Struct('<LB4s4s')
+# size - 4byte, code - 1byte, sender - 4byte, receiver - 4byte (total : 13byte)
+
+CHUNK_META = struct.Struct('<IQB')
+# SEND_FILE_CHUNK body 메타 데이터 (fetch_no, offset, flags), flags & 0x01 -> 마지막 조각
+
+HOST = '127.0.0.1'
+PORT = 14494
+RELAY_PORT = 14495
+PIECE_SIZE = 1024 * 500
+
+
+def send_message(code: int, sender: str, receiver: str, conn, body: bytes = b''):
+    conn.sendall(HEADER.pack(len(body), code, socket.inet_aton(sender), socket.inet_aton(receiver)) + body)
+
+
+def read_exactly(conn, size: int) -> bytes:
+    data = bytearray()
+
+    while len(data) < size:
+        piece = conn.recv(size - len(data))
+
+        if not piece:
+            raise ConnectionError('closed')
+
+        data += piece
+
+    return bytes(data)
+
+
+def read_message(conn) -> tuple:
+    """
+    :param conn:
+    :return: (code, header bytes, body)
+    """
+    header = read_exactly(conn, HEADER.size)
+    size, code, _, _ = HEADER.unpack(header)
+
+    return code, header, read_exactly(conn, size)
+
+
+class Agent:
+    """
+    가상 패치 대상 클라이언트
+
+    서버나 상위 클라이언트에게 받은 파일 조각을 메모리에 기록하고 하위 클라이언트에게 받은 그대로(header + body) 전달함
+    이미 받은 위치의 조각(중계 전환 중 중복)은 무시하고, 마지막 조각을 받으면 md5 를 확인해 결과를 보냄
+    """
+
+    def __init__(self, ip: str, kill_after: int = None):
+        self.ip = ip
+        self.kill_after = kill_after
+
+        self.conn = None
+        self.listener = None
+        self.fetches = {}
+        self.pending_chunks = {}
+        # ORDER_FETCH 보다 먼저 도착한 중계 조각 (패치 id -> 메시지 리스트)
+        self.results = {}
+        self.lock = threading.RLock()
+        self.send_lock = threading.Lock()
+        self.is_running = False
+
+    def start(self):
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.listener.bind((self.ip, RELAY_PORT))
+        self.listener.listen(16)
+
+        self.conn = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.conn.bind((self.ip, 0))
+        # 서버가 클라이언트를 ip 로 구분하므로 자신의 ip 로 연결
+        self.conn.connect((HOST, PORT))
+        self.is_running = True
+
+        self.send(CLIENT_WELCOME, json.dumps({"codecs": []}).encode('utf-8'))
+
+        threading.Thread(target=self.accept_relays, daemon=True).start()
+        threading.Thread(target=self.receive, args=(self.conn,), daemon=True).start()
+
+    def send(self, code: int, body: bytes):
+        with self.send_lock:
+            send_message(code, self.ip, HOST, self.conn, body)
+
+    def close(self):
+        self.is_running = False
+
+        for sock in [self.conn, self.listener]:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def accept_relays(self):
+        while self.is_running:
+            try:
+                peer, _ = self.listener.accept()
+            except OSError:
+                return
+
+            threading.Thread(target=self.receive, args=(peer,), daemon=True).start()
+
+    def receive(self, conn):
+        try:
+            while self.is_running:
+                code, header, body = read_message(conn)
+
+                if code == ORDER_FETCH:
+                    self.on_order_fetch(json.loads(body))
+                elif code == SEND_FILE_CHUNK:
+                    self.on_chunk(header, body)
+                elif code == RELAY_UPDATE:
+                    self.on_relay_update(json.loads(body))
+                elif code == ABORT_FETCH:
+                    data = json.loads(body)
+                    print('[{}] 패치 중단 fetch_no : {} 원인 : {}'.format(self.ip, data['fetch_no'], data['fail_cause']))
+                    self.drop_fetch(data['fetch_no'])
+        except (ConnectionError, OSError):
+            pass
+        except Exception as e:
+            traceback.print_exc()
+
+    def on_order_fetch(self, data: dict):
+        fetch_no = data['fetch_no']
+        relay = data.get('relay') or {}
+
+        with self.lock:
+            fetch = self.fetches.get(fetch_no)
+
+            if fetch is None:
+                fetch = self.fetches[fetch_no] = {
+                    'file': data['file'],
+                    'data': bytearray(data['file']['size']),
+                    'written': 0,
+                    'children': {},
+                    'port': relay.get('port', RELAY_PORT),
+                    'is_complete': False
+                }
+
+            if data.get('resume_offset') is not None:
+                fetch['written'] = min(fetch['written'], data['resume_offset'])
+                # 서버가 직접 이어서 보냄 (재연결, 상위 클라이언트 장애)
+
+            self.set_children(fetch, relay.get('children', []))
+
+            pending = self.pending_chunks.pop(fetch_no, [])
+
+        print('[{}] 패치 준비 fetch_no : {} parent : {} children : {} resume : {}'.format(
+            self.ip, fetch_no, relay.get('parent'), relay.get('children'), data.get('resume_offset')))
+
+        for header, body in pending:
+            self.on_chunk(header, body)
+
+    @staticmethod
+    def set_children(fetch: dict, children: list):
+        for ip in list(fetch['children']):
+            if ip not in children:
+                sock = fetch['children'].pop(ip)
+
+                if sock is not None:
+                    sock.close()
+
+        for ip in children:
+            fetch['children'].setdefault(ip, None)
+
+    def on_chunk(self, header: bytes, body: bytes):
+        fetch_no, offset, flags = CHUNK_META.unpack_from(body)
+        binary = body[CHUNK_META.size:]
+
+        with self.lock:
+            fetch = self.fetches.get(fetch_no)
+
+            if fetch is None:
+                self.pending_chunks.setdefault(fetch_no, []).append((header, body))
+                return
+
+            if offset == fetch['written']:
+                fetch['data'][offset:offset + len(binary)] = binary
+                fetch['written'] += len(binary)
+            elif offset > fetch['written']:
+                print('[{}] 조각 순서 오류 offset : {} written : {}'.format(self.ip, offset, fetch['written']))
+                return
+
+            written = fetch['written']
+            failed = self.forward(fetch, fetch_no, header + body)
+            is_final = written >= len(fetch['data']) and not fetch['is_complete']
+
+            if is_final:
+                fetch['is_complete'] = True
+
+        self.send(RESULT_SEND_FILE, json.dumps({"fetch_no": fetch_no, "offset": written}).encode('utf-8'))
+
+        if failed:
+            self.send(RELAY_UPDATE, json.dumps({"fetch_no": fetch_no, "failed_children": failed}).encode('utf-8'))
+
+        if is_final:
+            self.complete(fetch_no, fetch)
+
+        if self.kill_after is not None and written >= self.kill_after:
+            print('[{}] 연결 종료 (테스트)'.format(self.ip))
+            self.close()
+
+    def forward(self, fetch: dict, fetch_no: int, frame: bytes) -> list:
+        """
+        하위 클라이언트에게 받은 조각을 그대로 전달
+        :return: 전달하지 못한 하위 클라이언트 ip 리스트
+        """
+        failed = []
+
+        for ip, sock in list(fetch['children'].items()):
+            try:
+                if sock is None:
+                    sock = socket.create_connection((ip, fetch['port']), timeout=5, source_address=(self.ip, 0))
+                    fetch['children'][ip] = sock
+
+                sock.sendall(frame)
+            except OSError:
+                print('[{}] 중계 실패 fetch_no : {} child : {}'.format(self.ip, fetch_no, ip))
+                fetch['children'].pop(ip, None)
+                failed.append(ip)
+
+        return failed
+
+    def complete(self, fetch_no: int, fetch: dict):
+        is_match = hashlib.md5(fetch['data']).hexdigest() == fetch['file']['md5'].lower()
+        self.results[fetch_no] = is_match
+
+        print('[{}] 패치 완료 fetch_no : {} md5 일치 : {}'.format(self.ip, fetch_no, is_match))
+
+        body = {
+            "fetch_no": fetch_no,
+            "end_date": datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            "is_complete": is_match
+        }
+
+        if not is_match:
+            body['fail_cause'] = 1
+
+        self.send(RESULT_FETCH, json.dumps(body).encode('utf-8'))
+
+    def on_relay_update(self, data: dict):
+        with self.lock:
+            fetch = self.fetches.get(data['fetch_no'])
+
+            if fetch is None:
+                return
+
+            self.set_children(fetch, data['children'])
+
+        if data['is_done']:
+            print('[{}] 하위 트리 패치 완료 fetch_no : {}'.format(self.ip, data['fetch_no']))
+            self.drop_fetch(data['fetch_no'])
+
+    def drop_fetch(self, fetch_no: int):
+        with self.lock:
+            fetch = self.fetches.pop(fetch_no, None)
+
+            if fetch is not None:
+                self.set_children(fetch, [])
+
+
+def upload(path: str, targets: list):
+    """
+    127.0.0.1 로 파일 제공자 연결을 만들어 패치 요청 후 credit 을 받는 만큼 파일 조각 전송
+    """
+    with open(path, 'rb') as file:
+        binary = file.read()
+
+    name, _, ext = os.path.basename(path).partition('.')
+    conn = socket.create_connection((HOST, PORT), source_address=('127.0.0.1', 0))
+    send_message(CLIENT_WELCOME, '127.0.0.1', HOST, conn, json.dumps({"codecs": []}).encode('utf-8'))
+    send_message(ORDER_FETCH, '127.0.0.1', HOST, conn, json.dumps({
+        "targets": [{"ip": ip, "path": '/tmp'} for ip in targets],
+        "sender_ip": '127.0.0.1',
+        "file": {
+            "no": None,
+            "md5": hashlib.md5(binary).hexdigest(),
+            "name": name,
+            "ext": ext,
+            "size": len(binary)
+        }
+    }).encode('utf-8'))
+
+    fetch_no = None
+    offset = 0
+
+    while offset < len(binary):
+        code, _, body = read_message(conn)
+
+        if code == RESULT_PREPARE_FETCH:
+            data = json.loads(body)
+
+            if not data['is_success']:
+                print('패치 준비 실패 : {}'.format(data.get('fail_clients_ip')))
+                return
+
+            fetch_no = data['fetch_no']
+
+            if data.get('is_cached'):
+                print('서버에 저장된 파일로 패치를 진행합니다')
+                return
+        elif code == RESULT_SEND_FILE and fetch_no is not None:
+            for _ in range(json.loads(body)['credits']):
+                piece = binary[offset:offset + PIECE_SIZE]
+                is_final = offset + len(piece) >= len(binary)
+                send_message(SEND_FILE_CHUNK, '127.0.0.1', HOST, conn,
+                             CHUNK_META.pack(fetch_no, offset, 0x01 if is_final else 0) + piece)
+                offset += len(piece)
+
+                if is_final:
+                    break
+        elif code == ABORT_FETCH:
+            print('패치가 중단되었습니다')
+            return
+
+    print('파일 전송 완료 fetch_no : {} size : {}'.format(fetch_no, len(binary)))
+
+
+def main():
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    count = int(args[0]) if args else 7
+    path = args[1] if len(args) > 1 else None
+
+    kills = {}
+    if '--kill' in sys.argv:
+        ip, _, size = sys.argv[sys.argv.index('--kill') + 1].partition(':')
+        kills[ip] = int(size or PIECE_SIZE)
+
+    agents = [Agent('127.0.0.{}'.format(index + 2), kills.get('127.0.0.{}'.format(index + 2)))
+              for index in range(count)]
+
+    for agent in agents:
+        agent.start()
+
+    print('클라이언트 {}개 실행 : {}'.format(count, [agent.ip for agent in agents]))
+    time.sleep(1)
+
+    if path:
+        upload(path, [agent.ip for agent in agents])
+
+    try:
+        while True:
+            time.sleep(1)
+
+            done = sum(1 for agent in agents if agent.results)
+            if path and done == count - len(kills):
+                print('모든 클라이언트 패치 완료 : {}'.format({agent.ip: agent.results for agent in agents}))
+                break
+    except KeyboardInterrupt:
+        pass
+
+    for agent in agents:
+        agent.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,11 @@
 import socket
 import threading
 import json
+import hashlib
 import struct
 import base64
 import datetime
+import zlib
 import os
 import time
 import traceback
@@ -32,6 +34,14 @@ REQUEST_CLIENT_STATE = 11
 RESPONSE_CLIENT_STATE = 12
 ALREADY_FETCH_ORDER = 13
 TMP_CHAT = 14
+SEND_FILE_CHUNK = 15
+ABORT_FETCH = 16
+
+COMPRESSED_FLAG = 0x80
+# header code 에 설정되면 body 가 CLIENT_WELCOME 에서 정한 방식으로 압축되어 있음
+
+CHUNK_META = struct.Struct('<IQB')
+# SEND_FILE_CHUNK body 메타 데이터 (fetch_no, offset, flags), flags & 0x01 -> 마지막 조각
 
 
 # INSTALL = 0x05
@@ -69,7 +79,7 @@ class Header:
         """
         header = None
         try:
-            unpack_header = struct.unpack('LB4B4B', byte_data)
+            unpack_header = struct.unpack('<LB4B4B', byte_data)
             """
             L(size: unsigned long) = 4byte
             B(code: unsigned char) = 1byte     
@@ -99,7 +109,7 @@ class Header:
         :param header:
         :return:
         """
-        return struct.pack('LB4B4B', header.SIZE, header.CODE, *socket.inet_aton(header.SENDER),
+        return struct.pack('<LB4B4B', header.SIZE, header.CODE, *socket.inet_aton(header.SENDER),
                            *socket.inet_aton(header.RECEIVER))
 
 
@@ -144,6 +154,12 @@ class TestClient:
         self.tmp_path = None
         self.current_id = None
 
+        self.use_credit = False
+        self.credits = 0
+        self.credit_cond = threading.Condition()
+        self.codec = None
+        # 서버에게 받은 credit 수 만큼만 파일 조각을 보냄
+
     @property
     def my_ip(self):
         return socket.gethostbyname(socket.getfqdn())
@@ -156,6 +172,9 @@ class TestClient:
 
             print('서버 연결 성공!')
 
+            send_message(CLIENT_WELCOME, HOST, connection_socket, json.dumps({"codecs": ["zlib"]}).encode('utf-8'))
+            # 지원하는 압축 방식을 알림
+
             self.is_running = True
             self.connection_socket = connection_socket
 
@@ -184,7 +203,13 @@ class TestClient:
                     file_name, file_ext = file_full_name.split('.')
                     file_size = os.path.getsize(self.tmp_path)
 
-                    print(file_name, file_ext, file_size)
+                    md5 = hashlib.md5()
+                    with open(self.tmp_path, 'rb') as file:
+                        for piece in iter(lambda: file.read(1024 * 1024), b''):
+                            md5.update(piece)
+                    # 서버는 파일 조각을 전달하면서 md5 를 검증함
+
+                    print(file_name, file_ext, file_size, md5.hexdigest())
 
                     send_message(ORDER_FETCH, '10.1.2.171', connection_socket, json.dumps({
                         "targets": [
@@ -209,7 +234,7 @@ class TestClient:
                         "start_date": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
                         "file": {
                             "no": None,  # None이라면 처음패치 아니라면 재전송
-                            "md5": 77,
+                            "md5": md5.hexdigest(),
                             "name": file_name,
                             "ext": file_ext,
                             "size": file_size,
@@ -246,8 +271,15 @@ class TestClient:
                                                                                                    header.SIZE))
                 body_bytes = self.connection_socket.recv(header.SIZE)
 
+                if header.CODE & COMPRESSED_FLAG:
+                    body_bytes = zlib.decompress(body_bytes)
+                    header.CODE &= ~COMPRESSED_FLAG
+
                 if header.CODE == HEARTBEAT:
                     print('heartbeat')
+                elif header.CODE == CLIENT_WELCOME:
+                    self.codec = json.loads(body_bytes).get('codec')
+                    print('압축 방식 : {}'.format(self.codec))
                 elif header.CODE == START_FETCH:
                     data = json.loads(body_bytes)
 
@@ -256,7 +288,31 @@ class TestClient:
                         continue
 
                     self.current_id = data['fetch_no']
+                    self.use_credit = data.get('use_credit', False)
+
+                    with self.credit_cond:
+                        self.credits = 0
+
+                    if data.get('is_cached', False):
+                        print('서버에 저장된 파일로 패치를 진행합니다')
+                        continue
+
                     threading.Thread(target=self.send_file).start()
+                elif header.CODE == RESULT_SEND_FILE:
+                    data = json.loads(body_bytes)
+
+                    if data['fetch_no'] == self.current_id:
+                        with self.credit_cond:
+                            self.credits += data['credits']
+                            self.credit_cond.notify()
+                elif header.CODE == ABORT_FETCH:
+                    data = json.loads(body_bytes)
+                    print('패치가 중단되었습니다 fetch_no : {} 원인 : {}'.format(data['fetch_no'], data['fail_cause']))
+
+                    if data['fetch_no'] == self.current_id:
+                        with self.credit_cond:
+                            self.current_id = None
+                            self.credit_cond.notify()
                 elif header.CODE == 0x0E:
                     print(body_bytes.decode('utf-8'))
             except socket.error as e:
@@ -267,20 +323,35 @@ class TestClient:
         PIECE_SIZE = 1024 * 500
         # PIECE_SIZE = 500
         file_size = os.path.getsize(self.tmp_path)
+        fetch_no = self.current_id
         try:
             with open(self.tmp_path, 'rb') as file:
                 total_send_size = 0
 
                 while total_send_size != file_size:
+                    if self.use_credit:
+                        with self.credit_cond:
+                            if not self.credit_cond.wait_for(lambda: self.credits > 0 or self.current_id != fetch_no,
+                                                             timeout=30) or self.current_id != fetch_no:
+                                print('서버에게 credit 을 받지 못해 파일 전송을 중단합니다')
+                                return
+                            self.credits -= 1
+
                     current_send_size = PIECE_SIZE if total_send_size + PIECE_SIZE <= file_size else file_size - total_send_size
-                    encoding_binary = base64.b64encode(file.read(current_send_size))
-                    send_json_data = json.dumps({
-                        "fetch_no": self.current_id,
-                        "binary": encoding_binary.decode('utf-8'),
-                        "is_final": total_send_size + PIECE_SIZE > file_size
-                    })
-
-                    send_message(SEND_FILE, '10.1.2.171', self.connection_socket, send_json_data.encode('utf-8'))
+                    is_final = total_send_size + PIECE_SIZE >= file_size
+                    chunk_meta = CHUNK_META.pack(fetch_no, total_send_size, 0x01 if is_final else 0)
+                    # base64/JSON 없이 메타 데이터 + 파일 바이너리 그대로 전송
+
+                    body = chunk_meta + file.read(current_send_size)
+                    code = SEND_FILE_CHUNK
+
+                    if self.codec == 'zlib':
+                        compressed = zlib.compress(body, 1)
+                        if len(compressed) <= len(body) * 0.9:
+                            # 압축 효과가 있는 경우만 압축해서 전송
+                            code, body = SEND_FILE_CHUNK | COMPRESSED_FLAG, compressed
+
+                    send_message(code, '10.1.2.171', self.connection_socket, body)
 
                     total_send_size += current_send_size
                     print(current_send_size, total_send_size, file_size)
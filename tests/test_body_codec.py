@@ -0,0 +1,88 @@
+import unittest
+
+from common.protocol import body_codec
+from common.protocol.body_codec import List
+from common.protocol.message import ORDER_FETCH, RESULT_FETCH, RESULT_PREPARE_FETCH, RESPONSE_CLIENT_STATE, ECHO, \
+    ABORT_FETCH, RELAY_UPDATE
+
+
+class BodyCodecTest(unittest.TestCase):
+
+    def assertRoundTrip(self, code: int, data):
+        body = body_codec.encode(code, data)
+
+        self.assertIsNotNone(body)
+        self.assertEqual(body_codec.decode(code, body), data)
+
+        return body
+
+    def test_order_fetch(self):
+        self.assertRoundTrip(ORDER_FETCH, {
+            "targets": [{"ip": "10.0.{}.{}".format(index // 256, index % 256), "path": "C:/fetch/{}".format(index)}
+                        for index in range(1000)],
+            "sender_ip": "192.168.0.10",
+            "start_date": "2026-10-18 10:00:00",
+            "file": {"no": None, "md5": "0" * 32, "name": "패치", "ext": "zip", "size": 2 ** 40}
+        })
+
+    def test_order_fetch_relay(self):
+        self.assertRoundTrip(ORDER_FETCH, {
+            "fetch_no": 3,
+            "fetch_file_no": 7,
+            "path": "C:/fetch",
+            "file": {"no": 7, "md5": "a" * 32, "name": "file", "ext": "txt", "size": 10},
+            "relay": {"port": 14495, "parent": None, "children": ["10.0.0.2", "10.0.0.3"]}
+        })
+
+    def test_abort_fetch(self):
+        self.assertRoundTrip(ABORT_FETCH, {"fetch_no": 3, "fail_cause": 2})
+
+    def test_relay_update(self):
+        self.assertRoundTrip(RELAY_UPDATE, {"fetch_no": 3, "children": ["10.0.0.2", "10.0.0.3"], "is_done": False})
+        self.assertRoundTrip(RELAY_UPDATE, {"fetch_no": 3, "failed_children": ["10.0.0.4"]})
+
+    def test_explicit_null(self):
+        body = self.assertRoundTrip(RESULT_FETCH, {"fetch_no": 1, "is_complete": False, "fail_cause": None,
+                                                   "end_date": "2026-10-18 10:00:00"})
+        omitted = self.assertRoundTrip(RESULT_FETCH, {"fetch_no": 1, "is_complete": False,
+                                                      "end_date": "2026-10-18 10:00:00"})
+
+        self.assertEqual(len(body), len(omitted))
+        self.assertNotEqual(body, omitted)
+
+    def test_columns_with_null(self):
+        self.assertRoundTrip(RESPONSE_CLIENT_STATE, [{"ip": "10.0.0.1", "state": 0, "working_info": None},
+                                                     {"ip": "10.0.0.2", "state": 1, "working_info": None}])
+        self.assertRoundTrip(RESULT_PREPARE_FETCH, {"fetch_no": 1, "is_success": True, "fail_clients_ip": []})
+
+        targets = [{"ip": "10.0.0.1", "path": None}, {"ip": "10.0.0.2", "path": None}]
+        body = self.assertRoundTrip(ORDER_FETCH, {"targets": targets})
+        self.assertEqual(body[body_codec.SCHEMAS[ORDER_FETCH].bitmap_size * 2 + 4], List.COLUMNS)
+
+    def test_rows_fallback(self):
+        targets = [{"ip": "10.0.0.1", "path": "a"}, {"ip": "10.0.0.2", "path": None}, {"ip": "10.0.0.3"}]
+        body = self.assertRoundTrip(ORDER_FETCH, {"targets": targets})
+
+        self.assertEqual(body[body_codec.SCHEMAS[ORDER_FETCH].bitmap_size * 2 + 4], List.ROWS)
+
+    def test_unsupported(self):
+        self.assertIsNone(body_codec.encode(ECHO, {"a": 1}))
+        self.assertIsNone(body_codec.encode(RESULT_FETCH, {"unknown": 1}))
+        self.assertIsNone(body_codec.encode(RESULT_FETCH, {"fetch_no": -1}))
+        self.assertIsNone(body_codec.encode(RESULT_FETCH, {"fetch_no": 2 ** 32}))
+        self.assertIsNone(body_codec.encode(RESULT_FETCH, {"is_complete": 1}))
+        self.assertIsNone(body_codec.encode(ORDER_FETCH, {"sender_ip": "010.0.0.1"}))
+
+    def test_decode_invalid(self):
+        body = body_codec.encode(RESULT_FETCH, {"fetch_no": 1, "end_date": "2026-10-18"})
+
+        for data in (body[:-1], body + b'\0', b'', b'\xff'):
+            with self.assertRaises(ValueError):
+                body_codec.decode(RESULT_FETCH, data)
+
+        with self.assertRaises(ValueError):
+            body_codec.decode(ECHO, body)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+import hashlib
+import queue
+import unittest
+
+from server.fetch.checksum import StreamingChecksum, CHECKSUM_MATCH, CHECKSUM_MISMATCH, CHECKSUM_UNVERIFIED
+
+DATA = bytes(range(256)) * 40
+
+
+def chunks(size: int) -> list:
+    return [(offset, DATA[offset:offset + size]) for offset in range(0, len(DATA), size)]
+
+
+class StreamingChecksumTest(unittest.TestCase):
+
+    def verify(self, checksum: StreamingChecksum) -> int:
+        results = queue.Queue()
+        checksum.verify(results.put)
+
+        return results.get(timeout=5)
+
+    def test_match(self):
+        checksum = StreamingChecksum(hashlib.md5(DATA).hexdigest().upper())
+
+        for offset, data in chunks(1000):
+            checksum.update(offset, data)
+
+        self.assertEqual(self.verify(checksum), CHECKSUM_MATCH)
+        self.assertEqual(checksum.hashed_bytes, len(DATA))
+
+    def test_mismatch(self):
+        checksum = StreamingChecksum(hashlib.md5(DATA + b'x').hexdigest())
+
+        for offset, data in chunks(1000):
+            checksum.update(offset, data)
+
+        self.assertEqual(self.verify(checksum), CHECKSUM_MISMATCH)
+
+    def test_gap_is_unverified(self):
+        checksum = StreamingChecksum(hashlib.md5(DATA).hexdigest())
+        parts = chunks(1000)
+        del parts[3]
+
+        for offset, data in parts:
+            checksum.update(offset, data)
+
+        self.assertTrue(checksum.is_broken)
+        self.assertEqual(self.verify(checksum), CHECKSUM_UNVERIFIED)
+
+    def test_out_of_order_is_unverified(self):
+        checksum = StreamingChecksum(hashlib.md5(DATA).hexdigest())
+        parts = chunks(1000)
+        parts[2], parts[3] = parts[3], parts[2]
+
+        for offset, data in parts:
+            checksum.update(offset, data)
+
+        self.assertEqual(self.verify(checksum), CHECKSUM_UNVERIFIED)
+
+    def test_repeated_chunk_is_unverified(self):
+        checksum = StreamingChecksum(hashlib.md5(DATA).hexdigest())
+        parts = chunks(1000)
+
+        for offset, data in parts[:3] + parts[2:]:
+            checksum.update(offset, data)
+
+        self.assertEqual(self.verify(checksum), CHECKSUM_UNVERIFIED)
+
+    def test_closed_checksum_ignores_updates(self):
+        checksum = StreamingChecksum(hashlib.md5(DATA).hexdigest())
+        checksum.close()
+        checksum.update(0, DATA)
+
+        self.assertEqual(checksum.received_bytes, 0)
+
+    def test_is_valid_md5(self):
+        self.assertTrue(StreamingChecksum.is_valid_md5('D41D8CD98F00B204E9800998ECF8427E'))
+        self.assertFalse(StreamingChecksum.is_valid_md5('d41d8cd98f00b204e9800998ecf8427'))
+        self.assertFalse(StreamingChecksum.is_valid_md5('z' * 32))
+        self.assertFalse(StreamingChecksum.is_valid_md5(None))
+
+
+if __name__ == '__main__':
+    unittest.main()
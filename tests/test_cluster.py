@@ -0,0 +1,66 @@
+import unittest
+from types import SimpleNamespace
+
+from server.socket.cluster import ClusterLink, CONTROL, DEPTH, DEPTH_STEP, CTRL_CLIENT_DEPTH, CTRL_SUBSCRIBE
+
+
+def _link(worker_id: int = 0) -> ClusterLink:
+    link = ClusterLink('/nonexistent', worker_id)
+    link._on_write_pending = lambda _: None
+    return link
+
+
+def _frames(link: ClusterLink) -> list:
+    data = b''.join(bytes(buffer) for buffer in link.outbound._buffers)
+    frames = []
+
+    while data:
+        size, control_type, src, dst, ip = CONTROL.unpack_from(data)
+        frames.append((control_type, dst, data[CONTROL.size:CONTROL.size + size]))
+        data = data[CONTROL.size + size:]
+
+    return frames
+
+
+class ClusterLinkTest(unittest.TestCase):
+
+    def test_send_control_is_queued(self):
+        link = _link()
+        link.send_control(CTRL_SUBSCRIBE, 1, '10.0.0.1')
+
+        self.assertEqual(_frames(link), [(CTRL_SUBSCRIBE, 1, b'')])
+
+    def test_publish_depth_to_subscriber(self):
+        link = _link()
+        client = SimpleNamespace(ip='10.0.0.1', queued_bytes=DEPTH_STEP * 2)
+
+        link.publish_depth(client)
+        self.assertEqual(_frames(link), [])
+        # 구독하지 않은 클라이언트는 알리지 않음
+
+        link._routes[client.ip] = 1
+        link.publish_depth(client)
+        client.queued_bytes += DEPTH_STEP // 2
+        link.publish_depth(client)
+        client.queued_bytes = 0
+        link.publish_depth(client)
+        link.publish_depth(client)
+
+        self.assertEqual(_frames(link), [(CTRL_CLIENT_DEPTH, 1, DEPTH.pack(DEPTH_STEP * 2)),
+                                         (CTRL_CLIENT_DEPTH, 1, DEPTH.pack(0))])
+
+    def test_remote_client_depth_updated(self):
+        link = _link()
+        link._directory['10.0.0.1'] = (1, 0)
+        client = link.get_client('10.0.0.1')
+
+        link._handle(None, CTRL_CLIENT_DEPTH, 1, '10.0.0.1', DEPTH.pack(12345))
+        self.assertEqual(client.queued_bytes, 12345)
+
+        link._handle(None, CTRL_CLIENT_DEPTH, 2, '10.0.0.1', DEPTH.pack(1))
+        self.assertEqual(client.queued_bytes, 12345)
+        # 다른 워커가 보낸 크기는 무시
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,55 @@
+import os
+import unittest
+
+from common.protocol.compression import CODECS, SUPPORTED_CODECS, compress, decompress, choose_codec
+from common.protocol.message import MAX_BODY_SIZE
+
+
+class CompressionTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        data = b'hamon fetcher ' * 1000 + os.urandom(1000)
+
+        for codec in SUPPORTED_CODECS:
+            self.assertEqual(decompress(codec, compress(codec, data)), data, codec)
+            self.assertEqual(decompress(codec, memoryview(compress(codec, data))), data, codec)
+
+    def test_empty(self):
+        for codec in SUPPORTED_CODECS:
+            self.assertEqual(decompress(codec, compress(codec, b'')), b'', codec)
+
+    def test_limit(self):
+        data = b'\0' * 10000
+
+        for codec in SUPPORTED_CODECS:
+            compressed = compress(codec, data)
+
+            self.assertEqual(decompress(codec, compressed, len(data)), data, codec)
+            with self.assertRaises(ValueError, msg=codec):
+                decompress(codec, compressed, len(data) - 1)
+
+    def test_bomb_rejected_at_default_limit(self):
+        data = b'\0' * (MAX_BODY_SIZE + 1)
+
+        for codec in ('zlib', 'lzma'):
+            with self.assertRaises(ValueError, msg=codec):
+                decompress(codec, compress(codec, data))
+
+    def test_truncated(self):
+        data = os.urandom(5000)
+
+        for codec in SUPPORTED_CODECS:
+            compressed = compress(codec, data)
+
+            with self.assertRaises(ValueError, msg=codec):
+                decompress(codec, compressed[:len(compressed) // 2])
+
+    def test_choose_codec(self):
+        self.assertEqual(choose_codec(['snappy', 'lzma', 'zlib']), 'lzma')
+        self.assertIsNone(choose_codec(['snappy']))
+        self.assertIsNone(choose_codec(None))
+        self.assertEqual(set(CODECS), set(SUPPORTED_CODECS))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+import os
+import subprocess
+import sys
+import threading
+import unittest
+
+from common.db.db_handler import ConnectionPool
+
+
+class FakeConnection:
+
+    def __init__(self, number: int):
+        self.number = number
+        self.closed = False
+        self.alive = True
+
+    def close(self):
+        self.closed = True
+
+
+class ConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.created = []
+
+    def connect(self):
+        connection = FakeConnection(len(self.created))
+        self.created.append(connection)
+        return connection
+
+    def test_reuses_idle_connection(self):
+        pool = ConnectionPool(self.connect, 2)
+        connection = pool.acquire()
+        pool.release(connection)
+
+        self.assertIs(pool.acquire(), connection)
+        self.assertEqual(len(self.created), 1)
+
+    def test_replaces_invalid_connection(self):
+        pool = ConnectionPool(self.connect, 1, validate=lambda connection: connection.alive)
+        first = pool.acquire()
+        pool.release(first)
+        first.alive = False
+
+        second = pool.acquire()
+
+        self.assertIsNot(second, first)
+        self.assertTrue(first.closed)
+        self.assertEqual(pool.invalid_count, 1)
+        self.assertEqual(pool.in_use, 1)
+
+    def test_validate_exception_is_invalid(self):
+        def validate(connection):
+            raise OSError('broken pipe')
+
+        pool = ConnectionPool(self.connect, 1, validate=validate)
+        pool.release(pool.acquire())
+
+        self.assertEqual(pool.acquire().number, 1)
+
+    def test_discard(self):
+        pool = ConnectionPool(self.connect, 1)
+        connection = pool.acquire()
+        pool.release(connection, discard=True)
+
+        self.assertTrue(connection.closed)
+        self.assertEqual((pool.in_use, pool.idle), (0, 0))
+
+    def test_timeout(self):
+        pool = ConnectionPool(self.connect, 1, timeout=0.05)
+        pool.acquire()
+
+        with self.assertRaises(TimeoutError):
+            pool.acquire()
+
+    def test_close_closes_checked_out_connection_on_release(self):
+        pool = ConnectionPool(self.connect, 2)
+        idle = pool.acquire()
+        in_use = pool.acquire()
+        pool.release(idle)
+
+        pool.close()
+
+        self.assertTrue(idle.closed)
+        self.assertFalse(in_use.closed)
+        self.assertEqual(pool.checked_out, 1)
+
+        pool.release(in_use)
+
+        self.assertTrue(in_use.closed)
+        self.assertEqual(pool.checked_out, 0)
+        self.assertEqual((pool.in_use, pool.idle), (0, 0))
+
+        with self.assertRaises(RuntimeError):
+            pool.acquire()
+
+    def test_close_wakes_waiters(self):
+        pool = ConnectionPool(self.connect, 1)
+        connection = pool.acquire()
+        errors = []
+
+        def wait():
+            try:
+                pool.acquire()
+            except RuntimeError as e:
+                errors.append(e)
+
+        thread = threading.Thread(target=wait)
+        thread.start()
+
+        pool.close()
+        pool.release(connection)
+        thread.join(2)
+
+        self.assertEqual(len(errors), 1)
+
+
+class OptionalDriverTest(unittest.TestCase):
+
+    def test_sqlite_without_pymysql(self):
+        code = '\n'.join([
+            "import sys",
+            "sys.modules['pymysql'] = None",
+            "from common.db.db_handler import MariaDBHandler, SQLiteHandler",
+            "connector = SQLiteHandler(':memory:', pool_size=1)",
+            "connector.pool.release(connector.pool.acquire())",
+            "try:",
+            "    MariaDBHandler('localhost', 'user', 'password', 'db')",
+            "except ImportError:",
+            "    print('ImportError')",
+        ])
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.strip(), 'ImportError')
+
+
+if __name__ == '__main__':
+    unittest.main()
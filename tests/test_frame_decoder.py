@@ -0,0 +1,152 @@
+import unittest
+
+from common.protocol.buffer_pool import BufferPool
+from common.protocol.frame_decoder import FrameDecoder
+from common.protocol.message import Header, HEADER_SIZE, ECHO, SEND_FILE_CHUNK
+
+
+class FakeChannel:
+    """
+    recv_into() 호출마다 미리 정한 조각만큼만 돌려주는 non-blocking 소켓 대용
+    조각이 남아있지 않으면 BlockingIOError, close() 후에는 0 (연결 종료)
+    """
+
+    def __init__(self, chunks: list):
+        self.chunks = list(chunks)
+        self.closed = False
+
+    def recv_into(self, view) -> int:
+        if not self.chunks:
+            if self.closed:
+                return 0
+            raise BlockingIOError()
+
+        chunk = self.chunks.pop(0)
+        size = min(len(chunk), len(view))
+        view[:size] = chunk[:size]
+
+        if size < len(chunk):
+            self.chunks.insert(0, chunk[size:])
+
+        return size
+
+
+def frame(code: int, body: bytes) -> bytes:
+    return Header.pack(len(body), code, '10.0.0.1', '10.0.0.2') + body
+
+
+def split(data: bytes, size: int) -> list:
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+def read_all(decoder: FrameDecoder, channel: FakeChannel) -> list:
+    messages = []
+
+    while channel.chunks:
+        messages.extend(decoder.read_from(channel))
+
+    return messages
+
+
+class FrameDecoderTest(unittest.TestCase):
+
+    def test_byte_by_byte(self):
+        data = frame(ECHO, b'hello') + frame(ECHO, b'') + frame(ECHO, b'world')
+        decoder = FrameDecoder(buffer_size=64, pool=None)
+
+        messages = read_all(decoder, FakeChannel(split(data, 1)))
+
+        self.assertEqual([bytes(m.BODY) for m in messages], [b'hello', b'', b'world'])
+        self.assertEqual(messages[0].HEADER.SENDER, '10.0.0.1')
+        self.assertEqual(messages[0].HEADER.RECEIVER, '10.0.0.2')
+        self.assertEqual(decoder.received_bytes, len(data))
+
+    def test_header_split_across_reads(self):
+        body = bytes(range(40))
+        data = frame(ECHO, body)
+        decoder = FrameDecoder(buffer_size=64, pool=None)
+        channel = FakeChannel([data[:5], data[5:HEADER_SIZE + 3], data[HEADER_SIZE + 3:]])
+
+        self.assertEqual(decoder.read_from(channel), [])
+        self.assertEqual(decoder.read_from(channel), [])
+
+        messages = decoder.read_from(channel)
+
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(bytes(messages[0].BODY), body)
+
+    def test_several_frames_in_one_read(self):
+        bodies = [bytes([i]) * i for i in range(1, 8)]
+        data = b''.join(frame(ECHO, body) for body in bodies)
+        decoder = FrameDecoder(buffer_size=1024, pool=None)
+
+        messages = decoder.read_from(FakeChannel([data]))
+
+        self.assertEqual([bytes(m.BODY) for m in messages], bodies)
+
+    def test_compacts_partial_frame_at_buffer_end(self):
+        # 수신 버퍼 끝에 걸친 메시지가 앞으로 옮겨진 후 이어서 디코딩 되어야 함
+        bodies = [bytes([i]) * 20 for i in range(10)]
+        data = b''.join(frame(ECHO, body) for body in bodies)
+        decoder = FrameDecoder(buffer_size=50, pool=None)
+
+        messages = read_all(decoder, FakeChannel(split(data, 7)))
+
+        self.assertEqual([bytes(m.BODY) for m in messages], bodies)
+
+    def test_large_body_larger_than_buffer(self):
+        body = bytes(i % 251 for i in range(10000))
+        data = frame(SEND_FILE_CHUNK, body) + frame(ECHO, b'after')
+        pool = BufferPool()
+        decoder = FrameDecoder(buffer_size=256, pool=pool)
+
+        messages = read_all(decoder, FakeChannel(split(data, 999)))
+
+        self.assertEqual(len(messages), 2)
+        self.assertEqual(messages[0].HEADER.CODE, SEND_FILE_CHUNK)
+        self.assertEqual(bytes(messages[0].BODY), body)
+        self.assertEqual(bytes(messages[1].BODY), b'after')
+
+        messages[0].release()
+        self.assertIsNone(messages[0].BODY)
+
+    def test_pooled_body_is_copied_out_of_receive_buffer(self):
+        # 수신 버퍼는 다음 recv 에 재사용되므로 먼저 받은 메시지 body 가 덮어써지면 안됨
+        first = b'a' * 1000
+        second = b'b' * 1000
+        decoder = FrameDecoder(buffer_size=2048, pool=BufferPool())
+        channel = FakeChannel([frame(ECHO, first), frame(ECHO, second)])
+
+        messages = decoder.read_from(channel) + decoder.read_from(channel)
+
+        self.assertEqual(bytes(messages[0].BODY), first)
+        self.assertEqual(bytes(messages[1].BODY), second)
+
+    def test_would_block_returns_nothing(self):
+        decoder = FrameDecoder(buffer_size=64, pool=None)
+
+        self.assertEqual(decoder.read_from(FakeChannel([])), [])
+
+    def test_closed_connection(self):
+        channel = FakeChannel([frame(ECHO, b'x')[:4]])
+        channel.closed = True
+        decoder = FrameDecoder(buffer_size=64, pool=None)
+
+        self.assertEqual(decoder.read_from(channel), [])
+        with self.assertRaises(ConnectionError):
+            decoder.read_from(channel)
+
+    def test_closed_connection_in_large_body(self):
+        data = frame(SEND_FILE_CHUNK, b'z' * 500)
+        channel = FakeChannel([data[:100], data[100:200]])
+        channel.closed = True
+        decoder = FrameDecoder(buffer_size=64, pool=None)
+
+        read_all(decoder, channel)
+
+        with self.assertRaises(ConnectionError):
+            decoder.read_from(channel)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+import unittest
+
+from server.socket.heartbeat_wheel import HeartbeatWheel
+
+
+def due_tick(wheel: HeartbeatWheel, client, limit: int) -> int:
+    """
+    :return: client 가 꺼내진 tick 번호 (1부터), limit 까지 꺼내지지 않으면 0
+    """
+    for tick in range(1, limit + 1):
+        if client in wheel.advance():
+            return tick
+
+    return 0
+
+
+class HeartbeatWheelTest(unittest.TestCase):
+
+    def test_due_after_delay(self):
+        for delay in (0, 1, 2, 7, 8, 9, 15, 16, 17, 40):
+            wheel = HeartbeatWheel(slot_count=8)
+            wheel.schedule('client', delay)
+
+            self.assertEqual(due_tick(wheel, 'client', 100), max(1, delay), delay)
+            self.assertNotIn('client', wheel)
+
+    def test_rounds_across_wrap(self):
+        # 현재 위치가 wheel 끝에 가까울 때 등록해도 슬롯 수 보다 먼 시각이 정확히 지켜져야 함
+        for start in range(8):
+            for delay in (3, 8, 11, 24, 29):
+                wheel = HeartbeatWheel(slot_count=8)
+
+                for _ in range(start):
+                    wheel.advance()
+
+                wheel.schedule('client', delay)
+
+                self.assertEqual(due_tick(wheel, 'client', 100), delay, (start, delay))
+
+    def test_fractional_delay_rounds_up(self):
+        wheel = HeartbeatWheel(slot_count=8, tick_interval=0.5)
+        wheel.schedule('client', 1.2)
+
+        self.assertEqual(due_tick(wheel, 'client', 20), 3)
+
+    def test_reschedule_moves_client(self):
+        wheel = HeartbeatWheel(slot_count=8)
+        wheel.schedule('client', 3)
+        wheel.schedule('client', 20)
+
+        self.assertEqual(len(wheel), 1)
+        self.assertEqual(due_tick(wheel, 'client', 100), 20)
+
+    def test_remove(self):
+        wheel = HeartbeatWheel(slot_count=8)
+        wheel.schedule('a', 2)
+        wheel.schedule('b', 2)
+        wheel.remove('a')
+        wheel.remove('unknown')
+
+        self.assertEqual(wheel.advance(), [])
+        self.assertEqual(wheel.advance(), ['b'])
+        self.assertEqual(len(wheel), 0)
+
+    def test_same_slot_different_rounds(self):
+        wheel = HeartbeatWheel(slot_count=4)
+        wheel.schedule('near', 2)
+        wheel.schedule('far', 10)
+
+        due = {}
+        for tick in range(1, 12):
+            for client in wheel.advance():
+                due[client] = tick
+
+        self.assertEqual(due, {'near': 2, 'far': 10})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import unittest
+
+from common.protocol.message import Header, HEADER_SIZE, MAX_BODY_SIZE, ECHO, ip_to_bytes, bytes_to_ip
+
+
+class HeaderTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        data = Header.pack(1234, ECHO, '192.168.0.10', '10.0.0.2')
+        header = Header.decode(data)
+
+        self.assertEqual(len(data), HEADER_SIZE)
+        self.assertEqual((header.SIZE, header.CODE, header.SENDER, header.RECEIVER),
+                         (1234, ECHO, '192.168.0.10', '10.0.0.2'))
+
+    def test_decode_at_offset(self):
+        data = b'\x00' * 5 + Header.pack(7, ECHO, '1.2.3.4', '5.6.7.8')
+        header = Header.decode(memoryview(data), 5)
+
+        self.assertEqual((header.SIZE, header.SENDER), (7, '1.2.3.4'))
+
+    def test_decode_short_data(self):
+        with self.assertRaises(ValueError):
+            Header.decode(b'\x00' * (HEADER_SIZE - 1))
+
+    def test_decode_size_limit(self):
+        self.assertEqual(Header.decode(Header.pack(MAX_BODY_SIZE, ECHO, '1.2.3.4', '5.6.7.8')).SIZE, MAX_BODY_SIZE)
+
+        with self.assertRaises(ValueError):
+            Header.decode(Header.pack(MAX_BODY_SIZE + 1, ECHO, '1.2.3.4', '5.6.7.8'))
+
+
+class IpTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for ip in ('0.0.0.0', '10.0.0.1', '192.168.100.200', '255.255.255.255'):
+            self.assertEqual(bytes_to_ip(ip_to_bytes(ip)), ip)
+
+    def test_reject_non_dotted_decimal(self):
+        for ip in ('010.0.0.1', '10.1', '167772161', '0x0a.0.0.1', '10.0.0.256', ' 10.0.0.1', ''):
+            with self.assertRaises(OSError, msg=ip):
+                ip_to_bytes(ip)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,41 @@
+import unittest
+
+from common.protocol.message import Header, HEADER_SIZE, COMPRESSED_FLAG, SEND_FILE_CHUNK
+from common.protocol.message_handler import multi_send_message
+
+
+class FakeClient:
+
+    def __init__(self, ip: str, codec: str = None):
+        self.ip = ip
+        self.codec = codec
+        self.frames = []
+
+    def send_buffers(self, buffers: list):
+        self.frames.append(b''.join(bytes(buffer) for buffer in buffers))
+
+
+class MultiSendMessageTest(unittest.TestCase):
+
+    body = b'hamon fetcher ' * 1000
+
+    def _codes(self, clients: list) -> list:
+        return [Header.decode(client.frames[0][:HEADER_SIZE]).CODE for client in clients]
+
+    def test_compress_per_client_codec(self):
+        clients = [FakeClient('10.0.0.1', 'zlib'), FakeClient('10.0.0.2')]
+        multi_send_message(SEND_FILE_CHUNK, '10.0.0.100', clients, self.body)
+
+        self.assertEqual(self._codes(clients), [SEND_FILE_CHUNK | COMPRESSED_FLAG, SEND_FILE_CHUNK])
+        self.assertEqual(clients[1].frames[0][HEADER_SIZE:], self.body)
+
+    def test_plain_ignores_codec(self):
+        clients = [FakeClient('10.0.0.1', 'zlib'), FakeClient('10.0.0.2')]
+        multi_send_message(SEND_FILE_CHUNK, '10.0.0.100', clients, self.body, is_plain=True)
+
+        self.assertEqual(self._codes(clients), [SEND_FILE_CHUNK, SEND_FILE_CHUNK])
+        self.assertEqual([client.frames[0][HEADER_SIZE:] for client in clients], [self.body, self.body])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,71 @@
+import socket
+import tempfile
+import threading
+import unittest
+
+from server.socket.outbound_queue import OutboundQueue, FileRegion
+
+
+class OutboundQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sender, self.receiver = socket.socketpair()
+        self.sender.setblocking(False)
+
+    def tearDown(self):
+        self.sender.close()
+        self.receiver.close()
+
+    def test_wait_below_wakes_on_flush(self):
+        queue = OutboundQueue(1024 * 1024)
+        queue.put([b'x' * 1000])
+        results = []
+
+        waiter = threading.Thread(target=lambda: results.append(queue.wait_below(0, 5)))
+        waiter.start()
+
+        self.assertTrue(queue.flush(self.sender))
+        waiter.join(5)
+
+        self.assertEqual(results, [True])
+
+    def test_wait_below_timeout(self):
+        queue = OutboundQueue(1024 * 1024)
+        queue.put([b'x' * 1000])
+
+        self.assertFalse(queue.wait_below(0, 0.01))
+        self.assertTrue(queue.wait_below(1000, 0.01))
+
+    def test_wait_below_wakes_on_clear(self):
+        queue = OutboundQueue(1024 * 1024)
+        queue.put([b'x' * 1000])
+
+        threading.Timer(0.01, queue.clear).start()
+
+        self.assertTrue(queue.wait_below(0, 5))
+
+    def test_region_done_after_sent(self):
+        queue = OutboundQueue(1024 * 1024)
+        done = []
+
+        with tempfile.TemporaryFile() as file:
+            file.write(b'abcdef')
+            file.flush()
+
+            queue.put([b'head', FileRegion(file, 1, 4, lambda: done.append(1))])
+            self.assertEqual(done, [])
+
+            self.assertTrue(queue.flush(self.sender))
+
+        self.assertEqual(done, [1])
+        self.assertEqual(self.receiver.recv(100), b'headbcde')
+
+    def test_region_done_on_clear_and_overflow(self):
+        queue = OutboundQueue(10)
+        done = []
+
+        queue.put([b'x' * 10, FileRegion(None, 0, 10, lambda: done.append('clear'))])
+        self.assertFalse(queue.put([FileRegion(None, 0, 10, lambda: done.append('full'))]))
+        queue.clear()
+
+        self.assertEqual(done, ['full', 'clear'])
@@ -0,0 +1,72 @@
+import unittest
+from types import SimpleNamespace
+
+from server.fetch.relay_tree import RelayTree
+
+
+def _workers(count: int) -> list:
+    return [SimpleNamespace(client=SimpleNamespace(ip='10.0.0.{}'.format(index + 1))) for index in range(count)]
+
+
+def _ip(index: int) -> str:
+    return '10.0.0.{}'.format(index + 1)
+
+
+class RelayTreeTest(unittest.TestCase):
+
+    def test_parent_mapping(self):
+        tree = RelayTree(_workers(10), 3)
+
+        for index in range(10):
+            node = tree.get(_ip(index))
+
+            if index < 3:
+                self.assertIsNone(node.parent, index)
+                self.assertTrue(tree.is_root(_ip(index)))
+            else:
+                self.assertEqual(node.parent.ip, _ip(index // 3 - 1), index)
+                self.assertFalse(tree.is_root(_ip(index)))
+
+        self.assertEqual(tree.children_of(_ip(0)), [_ip(3), _ip(4), _ip(5)])
+        self.assertEqual(tree.children_of(_ip(1)), [_ip(6), _ip(7), _ip(8)])
+        self.assertEqual(tree.children_of(_ip(2)), [_ip(9)])
+        self.assertEqual(tree.children_of(_ip(9)), [])
+        self.assertEqual(tree.children_of('10.0.1.1'), [])
+
+    def test_pending_counts(self):
+        tree = RelayTree(_workers(7), 2)
+        # 0 -> 2, 3 / 1 -> 4, 5 / 2 -> 6
+
+        self.assertEqual([tree.get(_ip(index)).pending for index in range(7)], [4, 3, 2, 1, 1, 1, 1])
+        self.assertTrue(tree.get(_ip(0)).is_relay)
+        self.assertFalse(tree.get(_ip(3)).is_relay)
+
+    def test_mark_done_completes_subtree(self):
+        tree = RelayTree(_workers(7), 2)
+
+        self.assertEqual(tree.mark_done(_ip(2)), [])
+        self.assertEqual(tree.mark_done(_ip(2)), [])
+        self.assertEqual([node.ip for node in tree.mark_done(_ip(3))], [_ip(3)])
+        self.assertEqual([node.ip for node in tree.mark_done(_ip(6))], [_ip(6), _ip(2)])
+        self.assertEqual([node.ip for node in tree.mark_done(_ip(0))], [_ip(0)])
+
+    def test_orphan_children(self):
+        tree = RelayTree(_workers(7), 2)
+        tree.mark_done(_ip(3))
+
+        orphans, completed = tree.orphan_children(_ip(0))
+
+        self.assertEqual([node.ip for node in orphans], [_ip(2)])
+        self.assertEqual(completed, [])
+        self.assertTrue(tree.is_root(_ip(2)))
+        self.assertTrue(tree.is_root(_ip(3)))
+        self.assertEqual(tree.children_of(_ip(0)), [])
+        self.assertEqual(tree.children_of(_ip(2)), [_ip(6)])
+        # 옮긴 노드의 하위 트리는 유지
+        self.assertEqual(tree.get(_ip(0)).pending, 1)
+
+        self.assertEqual([node.ip for node in tree.mark_done(_ip(0))], [_ip(0)])
+
+
+if __name__ == '__main__':
+    unittest.main()
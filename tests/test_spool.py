@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+
+from server.fetch.spool import FileSpool, SharedFile
+
+MD5 = 'd41d8cd98f00b204e9800998ecf8427e'
+
+
+class FileSpoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.spool = FileSpool(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read(self) -> bytes:
+        with self.spool.open_reader(MD5) as file:
+            return file.read()
+
+    def test_commit_in_order(self):
+        writer = self.spool.open_writer(MD5, 1)
+        writer.write(0, b'abc')
+        writer.write(3, b'def')
+
+        self.assertTrue(writer.commit(6))
+        self.assertEqual(self.read(), b'abcdef')
+        self.assertFalse(os.path.exists(writer.part_path))
+
+    def test_commit_out_of_order(self):
+        writer = self.spool.open_writer(MD5, 1)
+        writer.write(6, b'ghi')
+        writer.write(0, b'abc')
+        writer.write(3, b'def')
+
+        self.assertTrue(writer.commit(9))
+        self.assertEqual(self.read(), b'abcdefghi')
+
+    def test_gap_aborts(self):
+        writer = self.spool.open_writer(MD5, 1)
+        writer.write(0, b'abc')
+        writer.write(6, b'ghi')
+
+        self.assertFalse(writer.commit(9))
+        self.assertFalse(self.spool.has(MD5))
+        self.assertFalse(os.path.exists(writer.part_path))
+
+    def test_short_file_aborts(self):
+        writer = self.spool.open_writer(MD5, 1)
+        writer.write(0, b'abc')
+
+        self.assertFalse(writer.commit(4))
+        self.assertFalse(self.spool.has(MD5))
+
+    def test_overlapping_ranges(self):
+        writer = self.spool.open_writer(MD5, 1)
+        writer.write(4, b'efgh')
+        writer.write(10, b'kl')
+        writer.write(2, b'cdef')
+        writer.write(0, b'ab')
+        writer.write(7, b'hijk')
+
+        self.assertTrue(writer.is_complete(12))
+        self.assertFalse(writer.is_complete(13))
+
+    def test_empty_file(self):
+        writer = self.spool.open_writer(MD5, 1)
+
+        self.assertTrue(writer.commit(0))
+        self.assertTrue(self.spool.has(MD5, 0))
+
+    def test_single_writer_per_md5(self):
+        writer = self.spool.open_writer(MD5, 1)
+
+        self.assertIsNone(self.spool.open_writer(MD5.upper(), 2))
+
+        writer.abort()
+        other = self.spool.open_writer(MD5, 2)
+
+        self.assertIsNotNone(other)
+        self.assertNotEqual(other.part_path, writer.part_path)
+        other.abort()
+
+    def test_part_path_per_fetch(self):
+        first = self.spool.open_writer(MD5, 1)
+        first.abort()
+        second = self.spool.open_writer(MD5, 2)
+
+        self.assertIn('.1.part', first.part_path)
+        self.assertIn('.2.part', second.part_path)
+        second.abort()
+
+    def test_invalid_md5(self):
+        with self.assertRaises(ValueError):
+            self.spool.open_writer('../etc/passwd', 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
+
+
+class SharedFileTest(unittest.TestCase):
+
+    def test_close_after_last_release(self):
+        with tempfile.TemporaryFile() as file:
+            with SharedFile(file) as shared:
+                shared.acquire()
+
+            self.assertFalse(file.closed)
+
+            shared.release()
+            self.assertTrue(file.closed)
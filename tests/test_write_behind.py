@@ -0,0 +1,100 @@
+import unittest
+
+from common.db.write_behind import WriteBehindQueue
+
+
+class WriteBehindQueueTest(unittest.TestCase):
+
+    def test_flush_in_batches(self):
+        batches = []
+        queue = WriteBehindQueue('test_batches', batches.append, max_batch=3, max_delay=60)
+
+        for row in range(7):
+            queue.put(row)
+        queue.flush()
+
+        self.assertEqual(sum(batches, []), list(range(7)))
+        self.assertTrue(all(len(batch) <= 3 for batch in batches))
+        self.assertEqual(queue.flushed_rows, 7)
+        self.assertEqual(queue.depth, 0)
+
+    def test_thread_starts_on_first_put(self):
+        queue = WriteBehindQueue('test_lazy', lambda rows: None, max_delay=60)
+        self.assertIsNone(queue._thread)
+
+        queue.put('row')
+        self.assertTrue(queue._thread.is_alive())
+
+    def test_retry_after_failure(self):
+        calls = []
+
+        def flush(rows):
+            calls.append(list(rows))
+            if len(calls) < 3:
+                raise OSError('db down')
+
+        queue = WriteBehindQueue('test_retry', flush, max_delay=60, max_retries=3, retry_delay=0.001)
+        queue.put('row')
+        queue.flush()
+
+        self.assertEqual(calls, [['row']] * 3)
+        self.assertEqual((queue.flushed_rows, queue.failed_rows, queue.retry_count), (1, 0, 2))
+
+    def test_rows_lost_after_retries(self):
+        def flush(rows):
+            raise OSError('db down')
+
+        queue = WriteBehindQueue('test_lost', flush, max_delay=60, max_retries=2, retry_delay=0.001)
+        queue.put('a')
+        queue.put('b')
+        queue.flush()
+
+        self.assertEqual((queue.flushed_rows, queue.failed_rows, queue.retry_count), (0, 2, 2))
+
+    def test_only_bad_rows_lost(self):
+        saved = []
+
+        def flush(rows):
+            if 'bad' in rows:
+                raise ValueError('duplicate key')
+            saved.extend(rows)
+
+        rows = list(range(20))
+        rows[13] = 'bad'
+        queue = WriteBehindQueue('test_split', flush, max_delay=60, max_retries=1, retry_delay=0.001)
+
+        for row in rows:
+            queue.put(row)
+        queue.flush()
+
+        self.assertEqual(saved, [row for row in rows if row != 'bad'])
+        self.assertEqual((queue.flushed_rows, queue.failed_rows), (19, 1))
+
+    def test_split_attempts_bounded(self):
+        calls = []
+
+        def flush(rows):
+            calls.append(len(rows))
+            raise OSError('db down')
+
+        queue = WriteBehindQueue('test_split_down', flush, max_batch=500, max_delay=60, max_retries=0)
+
+        for row in range(500):
+            queue.put(row)
+        queue.flush()
+
+        self.assertEqual(queue.failed_rows, 500)
+        self.assertLessEqual(len(calls), 1 + 4 * (500).bit_length())
+
+    def test_drop_when_full(self):
+        queue = WriteBehindQueue('test_full', lambda rows: None, max_delay=60, max_rows=3)
+
+        self.assertEqual([queue.put(row) for row in range(5)], [True, True, True, False, False])
+        self.assertEqual((queue.depth, queue.dropped_rows), (3, 2))
+
+        queue.flush()
+        self.assertTrue(queue.put('row'))
+
+
+if __name__ == '__main__':
+    unittest.main()